@@ -2,28 +2,72 @@
 # 设计为尽量在无管理员权限下运行，提供路径检测、日志与进度反馈
 # 兼容 Python 3.10，使用原生 tkinter 组件
 
-import ctypes
+import time
+
+_STARTUP_T0 = time.perf_counter()
+
+import atexit
+import codecs
+import contextlib
+import functools
+import importlib
+import io
 import locale
+import math
 import os
+import queue
 import re
-import shutil
-import subprocess
+import struct
 import sys
 import threading
 import tkinter as tk
 import tkinter.font as tkfont
+from collections import Counter, OrderedDict, deque
+from collections.abc import Mapping
+from dataclasses import dataclass, field, replace
 from pathlib import Path
 from tkinter import filedialog, scrolledtext, ttk
-import json
-from typing import Callable
-from itertools import chain
-import time
+from types import MappingProxyType, ModuleType
+from typing import TYPE_CHECKING, Callable, Iterable
+from itertools import accumulate, chain
+
+if TYPE_CHECKING:
+    # 仅供类型检查与打包工具静态分析依赖，运行时由 _LazyModule 按需导入
+    import ctypes as _ctypes_static  # noqa: F401
+    import hashlib as _hashlib_static  # noqa: F401
+    import json as _json_static  # noqa: F401
+    import mmap as _mmap_static  # noqa: F401
+    import shutil as _shutil_static  # noqa: F401
+    import subprocess as _subprocess_static  # noqa: F401
+    import zlib as _zlib_static  # noqa: F401
 
 try:
     import winreg  # type: ignore
 except ImportError:
     winreg = None  # 在非 Windows 环境下避免崩溃
 
+class _LazyModule:
+    """首次访问属性时才导入的模块代理，缩短冷启动（窗口出现前不加载检测/写入才用到的模块）。"""
+
+    def __init__(self, name: str) -> None:
+        self._name = name
+        self._module: ModuleType | None = None
+
+    def __getattr__(self, attr: str):
+        module = self._module
+        if module is None:
+            module = self._module = importlib.import_module(self._name)
+        return getattr(module, attr)
+
+
+ctypes = _LazyModule("ctypes")
+hashlib = _LazyModule("hashlib")
+json = _LazyModule("json")
+mmap = _LazyModule("mmap")
+shutil = _LazyModule("shutil")
+subprocess = _LazyModule("subprocess")
+zlib = _LazyModule("zlib")
+
 
 PROFILE_MARKER_START = "# === Code-encoding-fix 配置（自动生成）开始 ==="
 PROFILE_MARKER_END = "# === Code-encoding-fix 配置（自动生成）结束 ==="
@@ -37,3003 +81,7584 @@ VSCODE_MARKER_START_LEGACY = "// Code-encoding-fix block (do not remove)"
 VSCODE_MARKER_END_LEGACY = "// Code-encoding-fix block end"
 
 
-class SetupApp:
-    def __init__(self, root: tk.Tk) -> None:
-        self.root = root
-        self.root.title("Code-encoding-fix 编码配置助手 v1.0.2 - 阿華(github:hellowind777)")
-        self._apply_app_icon()
-        # 默认窗口尺寸与最小尺寸同步下调，保持宽度不变、降低高度以更贴合 1080p 显示
-        self.root.geometry("820x750")
-        self.root.minsize(820, 750)
-        self.root.withdraw()
-        appdata_root = Path(os.environ.get("APPDATA", Path.home()))
-        self._config_dir = appdata_root / "Code-encoding-fix"
-        self._config_path = self._config_dir / "config.json"
-        self._backup_root = self._config_path.parent / "backup"
-        self._console_reg_backup_path = self._backup_root / "shell_reg.orig"
-        self._console_log_buffer: list[tuple[str, str]] = []
-        self._ps5_profile_path = Path.home() / "Documents" / "WindowsPowerShell" / "Microsoft.PowerShell_profile.ps1"
-        self._ps7_profile_path = Path.home() / "Documents" / "PowerShell" / "Microsoft.PowerShell_profile.ps1"
-        self._git_bashrc_path: Path | None = None
+class RegistryBackend:
+    """注册表访问抽象（hive 取 "HKCU"/"HKLM"，subkey 为相对路径，以反斜杠分隔）。
 
-        self.style = ttk.Style()
+    - cycle() 标记一个检测/写入周期：周期内打开的键句柄会被复用，周期结束统一关闭；
+    - write_values 一次打开键写入多个值；
+    - 读取不存在的键返回 None，写入失败抛出 OSError/PermissionError。
+    """
+
+    name = "abstract"
+
+    def __init__(self) -> None:
+        self._cycle_lock = threading.Lock()
+        self._cycle_depth = 0
+
+    @contextlib.contextmanager
+    def cycle(self):
+        with self._cycle_lock:
+            self._cycle_depth += 1
         try:
-            self.style.theme_use("vista")
-        except tk.TclError:
-            self.style.theme_use("clam")
+            yield self
+        finally:
+            with self._cycle_lock:
+                self._cycle_depth -= 1
+                closing = self._cycle_depth == 0
+            if closing:
+                self.close()
 
-        self._init_fonts()
+    @property
+    def in_cycle(self) -> bool:
+        return self._cycle_depth > 0
 
-        self.ps5_path_var = tk.StringVar()
-        self.ps7_path_var = tk.StringVar()
-        self.git_path_var = tk.StringVar()
-        self.vscode_path_var = tk.StringVar()
-        self.status_var = tk.StringVar(value="待检测 Git Bash / Visual Studio Code")
-        self.console_info_var = tk.StringVar(value="控制台编码：待检测")
-        self.tool_info_var = tk.StringVar(value="工具配置：待检测")
-        self.progress_var = tk.IntVar(value=0)
-        self.is_running = False
-        self._is_admin_cached = self._is_admin()
-        self._ps5_available = False
-        self._ps7_available = False
-        self._ps5_exe: Path | None = None
-        self._ps7_exe: Path | None = None
-        self._git_exe: Path | None = None
-        self._row_widgets: dict[str, dict[str, ttk.Widget]] = {}
-        self._detect_cache = {}
-        self._detect_cache_max = 64
-        self._shell_marker_detail = {}
-        self._tool_config_detail = {}
-        self._registry_cache: dict[tuple[str, ...], list[Path]] = {}
-        self._shortcut_cache: dict[tuple[str, ...], list[Path]] = {}
-        self._detecting = False
+    def close(self) -> None:
+        """释放池化的句柄（无句柄的实现无需处理）。"""
 
-        self._build_layout()
-        self._apply_window_position()
-        # 先记录应用启动，再进行 Shell 路径检测，保证日志顺序符合直觉
-        self._log("应用已启动，准备检测 Shell 路径", "info")
-        self._detect_all_paths_in_thread(log=True)
-        self._refresh_env_tool_labels()
-        self._update_restore_button_state()
-        self._refresh_start_button_state()
-        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
-        self.root.deiconify()
+    def read_values(self, hive: str, subkey: str) -> dict[str, object] | None:
+        raise NotImplementedError
 
-    def _apply_app_icon(self) -> None:
-        """为窗口/任务栏设置应用图标（优先使用同目录的 .ico）。"""
-        if not sys.platform.startswith("win"):
-            return
+    def read_value(self, hive: str, subkey: str, name: str) -> object | None:
+        values = self.read_values(hive, subkey)
+        return None if values is None else values.get(name)
 
-        base_dir = Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parent))
-        icon_path = base_dir / "Code-encoding-fix.ico"
-        if not icon_path.exists():
-            return
+    def write_values(self, hive: str, subkey: str, values: Mapping[str, object]) -> None:
+        raise NotImplementedError
+
+    def delete_key(self, hive: str, subkey: str) -> None:
+        raise NotImplementedError
+
+    def query_subkeys(self, hive: str, subkey: str, names: Iterable[str]) -> list[dict[str, object]]:
+        """枚举 subkey 的直接子键，返回每个子键中 names 对应的值（缺失的值不出现在结果中）。"""
+        raise NotImplementedError
+
+
+class WinregBackend(RegistryBackend):
+    """基于 winreg 的实现：周期内按 (hive, subkey, 视图, 读写) 缓存已打开的句柄。"""
+
+    name = "winreg"
+
+    def __init__(self) -> None:
+        super().__init__()
+        self._pool_lock = threading.Lock()
+        self._pool: dict[tuple[str, str, int, bool], object] = {}
+        self._hives = {"HKCU": winreg.HKEY_CURRENT_USER, "HKLM": winreg.HKEY_LOCAL_MACHINE}
+
+    @contextlib.contextmanager
+    def _key(self, hive: str, subkey: str, *, write: bool = False, view: int = 0):
+        pool_key = (hive, subkey.lower(), view, write)
+        with self._pool_lock:
+            handle = self._pool.get(pool_key)
+        if handle is None:
+            if write:
+                handle = winreg.CreateKeyEx(self._hives[hive], subkey, 0, winreg.KEY_READ | winreg.KEY_WRITE | view)
+            else:
+                handle = winreg.OpenKey(self._hives[hive], subkey, 0, winreg.KEY_READ | view)
+            if self.in_cycle:
+                with self._pool_lock:
+                    existing = self._pool.setdefault(pool_key, handle)
+                if existing is not handle:
+                    winreg.CloseKey(handle)
+                    handle = existing
+            else:
+                try:
+                    yield handle
+                finally:
+                    winreg.CloseKey(handle)
+                return
+        yield handle
+
+    def _evict(self, hive: str, subkey: str) -> None:
+        prefix = subkey.lower()
+        with self._pool_lock:
+            stale = [k for k in self._pool if k[0] == hive and k[1] == prefix]
+            handles = [self._pool.pop(k) for k in stale]
+        for handle in handles:
+            try:
+                winreg.CloseKey(handle)
+            except Exception:
+                pass
+
+    def close(self) -> None:
+        with self._pool_lock:
+            handles = list(self._pool.values())
+            self._pool.clear()
+        for handle in handles:
+            try:
+                winreg.CloseKey(handle)
+            except Exception:
+                pass
 
+    def read_values(self, hive: str, subkey: str) -> dict[str, object] | None:
         try:
-            self.root.iconbitmap(default=str(icon_path))
-        except tk.TclError:
-            return
+            with self._key(hive, subkey) as key:
+                values: dict[str, object] = {}
+                count = winreg.QueryInfoKey(key)[1]
+                for index in range(count):
+                    name, value, _ = winreg.EnumValue(key, index)
+                    values[name] = value
+                return values
+        except FileNotFoundError:
+            return None
 
-    def _reset_to_system_default(self) -> None:
-        """恢复控制台 CodePage 到系统默认（不依赖备份），不再改写环境变量。"""
-        if self.is_running:
-            return
-        confirm = self._show_modal(
-            "恢复系统默认编码(控制台配置)",
-            "将删除控制台编码恢复到当前系统语言默认编码(936)，不再改写环境变量。\n\n是否继续？",
-            kind="confirm",
-            confirm_text="继续",
-            cancel_text="取消",
-        )
-        if not confirm:
+    def read_value(self, hive: str, subkey: str, name: str) -> object | None:
+        try:
+            with self._key(hive, subkey) as key:
+                value, _ = winreg.QueryValueEx(key, name)
+                return value
+        except FileNotFoundError:
+            return None
+
+    def write_values(self, hive: str, subkey: str, values: Mapping[str, object]) -> None:
+        with self._key(hive, subkey, write=True) as key:
+            for name, value in values.items():
+                if isinstance(value, int):
+                    winreg.SetValueEx(key, name, 0, winreg.REG_DWORD, value)
+                else:
+                    winreg.SetValueEx(key, name, 0, winreg.REG_SZ, value)
+
+    def delete_key(self, hive: str, subkey: str) -> None:
+        # 先关闭池中指向该键的句柄，避免后续复用到已删除的键
+        self._evict(hive, subkey)
+        try:
+            winreg.DeleteKey(self._hives[hive], subkey)
+        except FileNotFoundError:
             return
-        self.is_running = True
-        self._set_buttons_state(False)
-        threading.Thread(target=self._run_reset_default, daemon=True).start()
 
-    def _run_reset_default(self) -> None:
-        actions: list[tuple[str, str]] = []
+    def query_subkeys(self, hive: str, subkey: str, names: Iterable[str]) -> list[dict[str, object]]:
+        wanted = list(names)
+        views = [0]
+        if hasattr(winreg, "KEY_WOW64_64KEY"):
+            views = [winreg.KEY_WOW64_64KEY, winreg.KEY_WOW64_32KEY]
+        rows: list[dict[str, object]] = []
+        for view in views:
+            try:
+                with self._key(hive, subkey, view=view) as key:
+                    i = 0
+                    while True:
+                        try:
+                            subkey_name = winreg.EnumKey(key, i)
+                        except OSError:
+                            break
+                        i += 1
+                        row: dict[str, object] = {}
+                        try:
+                            with winreg.OpenKey(key, subkey_name, 0, winreg.KEY_READ | view) as child:
+                                for name in wanted:
+                                    try:
+                                        row[name], _ = winreg.QueryValueEx(child, name)
+                                    except OSError:
+                                        continue
+                        except OSError:
+                            continue
+                        rows.append(row)
+            except OSError:
+                continue
+        return rows
+
+
+class MemoryRegistryBackend(RegistryBackend):
+    """内存注册表（可选持久化为 JSON 文件），用于非 Windows 环境运行与基准测试完整流程。
+
+    键路径大小写不敏感；整数值视为 REG_DWORD，其余按字符串保存。
+    """
+
+    name = "memory"
+
+    def __init__(self, path: Path | None = None, data: Mapping[str, Mapping[str, Mapping[str, object]]] | None = None) -> None:
+        super().__init__()
+        self.path = path
+        self._lock = threading.Lock()
+        # {hive: {subkey_lower: {"name": 原始子键路径, "values": {...}}}}
+        self._data: dict[str, dict[str, dict]] = {}
+        if path is not None and path.exists():
+            try:
+                data = json.loads(path.read_text(encoding="utf-8"))
+            except Exception:  # noqa: BLE001
+                data = None
+        for hive, keys in (data or {}).items():
+            for subkey, values in keys.items():
+                self._node(hive, subkey, create=True)["values"].update(values)
+
+    def _node(self, hive: str, subkey: str, create: bool = False) -> dict | None:
+        keys = self._data.setdefault(hive, {}) if create else self._data.get(hive, {})
+        norm = subkey.strip("\\").lower()
+        node = keys.get(norm)
+        if node is None and create:
+            node = keys[norm] = {"name": subkey.strip("\\"), "values": {}}
+        return node
+
+    def _save(self) -> None:
+        if self.path is None:
+            return
+        dump = {
+            hive: {node["name"]: node["values"] for node in keys.values()}
+            for hive, keys in self._data.items()
+        }
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.path.write_text(json.dumps(dump, ensure_ascii=False, indent=2), encoding="utf-8")
+
+    def read_values(self, hive: str, subkey: str) -> dict[str, object] | None:
+        with self._lock:
+            node = self._node(hive, subkey)
+            return None if node is None else dict(node["values"])
+
+    def write_values(self, hive: str, subkey: str, values: Mapping[str, object]) -> None:
+        with self._lock:
+            node = self._node(hive, subkey, create=True)
+            node["values"].update({k: (v if isinstance(v, int) else str(v)) for k, v in values.items()})
+            self._save()
+
+    def delete_key(self, hive: str, subkey: str) -> None:
+        with self._lock:
+            if self._data.get(hive, {}).pop(subkey.strip("\\").lower(), None) is not None:
+                self._save()
+
+    def query_subkeys(self, hive: str, subkey: str, names: Iterable[str]) -> list[dict[str, object]]:
+        wanted = list(names)
+        prefix = subkey.strip("\\").lower() + "\\"
+        with self._lock:
+            rows = []
+            for norm, node in self._data.get(hive, {}).items():
+                if norm.startswith(prefix) and "\\" not in norm[len(prefix):]:
+                    rows.append({k: node["values"][k] for k in wanted if k in node["values"]})
+            return rows
+
+
+def create_registry_backend() -> RegistryBackend:
+    """选择注册表后端：环境变量 CODE_ENCODING_FIX_REGISTRY 指向 JSON 文件时使用文件后端，
+    否则 Windows 上使用 winreg，其他平台使用内存后端。"""
+    json_path = os.environ.get("CODE_ENCODING_FIX_REGISTRY")
+    if json_path:
+        return MemoryRegistryBackend(Path(json_path))
+    if winreg is not None:
+        return WinregBackend()
+    return MemoryRegistryBackend()
+
+
+class _Span:
+    """单个计时区间（仅在 Tracer 启用时创建）。"""
+
+    __slots__ = ("_tracer", "_name", "_cat", "_args", "_start")
+
+    def __init__(self, tracer: "Tracer", name: str, cat: str, args: dict) -> None:
+        self._tracer = tracer
+        self._name = name
+        self._cat = cat
+        self._args = args
+        self._start = 0.0
+
+    def __enter__(self) -> "_Span":
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        end = time.perf_counter()
+        if exc_type is not None:
+            self._args["error"] = exc_type.__name__
+        self._tracer._record(self._name, self._cat, self._start, end, self._args)
+
+
+class Tracer:
+    """轻量级分阶段计时：记录 span，导出 Chrome trace-event JSON（chrome://tracing 或 Perfetto 打开）。
+
+    未启用时 span() 返回共享的空上下文，traced 包装只多一次属性判断，开销可忽略。
+    """
+
+    def __init__(self, max_events: int = 200_000) -> None:
+        self.enabled = False
+        self.output: Path | None = None
+        self.max_events = max_events
+        self._lock = threading.Lock()
+        self._events: list[dict] = []
+        self._thread_names: dict[int, str] = {}
+        self._t0 = time.perf_counter()
+        self._null = contextlib.nullcontext()
+
+    def enable(self, output: Path | None = None) -> None:
+        """开始记录；指定 output 时在进程退出前自动导出。"""
+        with self._lock:
+            self._events.clear()
+            self._thread_names.clear()
+            self._t0 = time.perf_counter()
+        if output is not None and self.output is None:
+            atexit.register(self.export)
+        self.output = output
+        self.enabled = True
+
+    def span(self, name: str, cat: str = "app", **args: object):
+        if not self.enabled:
+            return self._null
+        return _Span(self, name, cat, args)
+
+    def traced(self, name: str, cat: str = "app") -> Callable[[Callable], Callable]:
+        """方法装饰器：调用期间记录一个 span。"""
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled:
+                    return func(*args, **kwargs)
+                with _Span(self, name, cat, {}):
+                    return func(*args, **kwargs)
+
+            return wrapper
+
+        return decorator
+
+    def _record(self, name: str, cat: str, start: float, end: float, args: dict) -> None:
+        tid = threading.get_ident()
+        event = {
+            "name": name,
+            "cat": cat,
+            "ph": "X",
+            "ts": round((start - self._t0) * 1e6, 1),
+            "dur": round((end - start) * 1e6, 1),
+            "pid": os.getpid(),
+            "tid": tid,
+        }
+        if args:
+            event["args"] = {k: str(v) if isinstance(v, Path) else v for k, v in args.items()}
+        with self._lock:
+            if tid not in self._thread_names:
+                self._thread_names[tid] = threading.current_thread().name
+            if len(self._events) < self.max_events:
+                self._events.append(event)
+
+    def events(self) -> list[dict]:
+        with self._lock:
+            return list(self._events)
+
+    def export(self, path: Path | None = None) -> Path | None:
+        """写出 trace 文件，返回路径；未启用或无输出路径时返回 None。"""
+        target = path or self.output
+        if target is None or not self.enabled:
+            return None
+        pid = os.getpid()
+        with self._lock:
+            meta = [
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": tid, "args": {"name": tname}}
+                for tid, tname in self._thread_names.items()
+            ]
+            events = meta + list(self._events)
         try:
-            default_lang, default_lc_all, default_cp = self._system_default_locale()
+            target.parent.mkdir(parents=True, exist_ok=True)
+            target.write_text(json.dumps({"traceEvents": events, "displayTimeUnit": "ms"}), encoding="utf-8")
+        except Exception:  # noqa: BLE001
+            return None
+        return target
+
+
+# 全局 tracer：--trace FILE 或环境变量 CODE_ENCODING_FIX_TRACE 启用
+TRACER = Tracer()
+
+
+class FieldProfiler:
+    """现场性能诊断：对关键流程套上 cProfile 与 tracemalloc，把 .pstats 与内存分配排行写入备份目录。
+
+    - 同一时刻只采样一个流程（cProfile 不支持多个实例同时启用），嵌套或并发的调用直接执行；
+    - cProfile 只采样启用它的线程：被采样流程交给线程池（SetupApp._io_map）的任务经 instrument() 包装，
+      在工作线程中各自采样，写报告时用 pstats.Stats.add 合并。Python 3.12 起 cProfile 基于 sys.monitoring，
+      主线程的 Profile 已覆盖所有线程，工作线程无法再启用第二个，任务直接执行；
+    - 报告目录总大小与文件数超出上限时按时间从旧到新轮换删除。
+    """
+
+    def __init__(self, max_bytes: int = 20 * 1024 * 1024, max_files: int = 40, top_allocations: int = 30) -> None:
+        self.enabled = False
+        self.output_dir: Path | None = None
+        self.max_bytes = max_bytes
+        self.max_files = max_files
+        self.top_allocations = top_allocations
+        self._slot = threading.Lock()
+        # 正在采样的流程所在线程，以及其线程池任务的采样结果
+        self._owner: int | None = None
+        self._worker_profiles: list = []
+        self._worker_lock = threading.Lock()
+
+    def enable(self, output_dir: Path | None = None) -> None:
+        if output_dir is not None:
+            self.output_dir = output_dir
+        self.enabled = True
+
+    def profiled(self, name: str) -> Callable[[Callable], Callable]:
+        """方法装饰器：启用时对最外层调用采样并写出报告。"""
+
+        def decorator(func: Callable) -> Callable:
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if not self.enabled or not self._slot.acquire(blocking=False):
+                    return func(*args, **kwargs)
+                try:
+                    return self._run(name, func, args, kwargs)
+                finally:
+                    self._slot.release()
 
-            self._log_separator("恢复系统默认(不含工具)开始")
-            self._log("控制台编码：", "info")
+            return wrapper
 
-            console_logs = self._set_console_codepage_all(default_cp)
-            for level, message in console_logs:
-                self._log(message, level)
-            self._log_separator("恢复系统默认(不含工具)结束")
+        return decorator
 
-            # 刷新检测与状态
-            self._ui_call(self._detect_all_paths, False)
-            self._ui_call(self._refresh_env_tool_labels)
-            self._ui_call(self._refresh_config_status_label)
-            self._ui_call(self._refresh_start_button_state)
-        except Exception as exc:  # noqa: BLE001
-            self._log(f"恢复系统默认失败(不含工具): {exc}", "error")
+    def instrument(self, func: Callable) -> Callable:
+        """包装即将交给线程池的任务：调用方正在被采样时，任务在工作线程中单独采样；否则原样返回 func。"""
+        if self._owner != threading.get_ident():
+            return func
+
+        def wrapper(*args, **kwargs):
+            import cProfile
+
+            profile = cProfile.Profile()
+            try:
+                profile.enable()
+            except ValueError:
+                # Python 3.12+：另一个 Profile 已启用且对所有线程生效
+                return func(*args, **kwargs)
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
+                with self._worker_lock:
+                    self._worker_profiles.append(profile)
+
+        return wrapper
+
+    def _run(self, name: str, func: Callable, args: tuple, kwargs: dict):
+        import cProfile
+        import tracemalloc
+
+        # 外部已开启 tracemalloc（如 -X tracemalloc）时不由这里停止
+        owns_tracemalloc = not tracemalloc.is_tracing()
+        if owns_tracemalloc:
+            tracemalloc.start(10)
+        profile = cProfile.Profile()
+        started = time.perf_counter()
+        self._owner = threading.get_ident()
+        try:
+            profile.enable()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                profile.disable()
         finally:
-            self.is_running = False
-            self._ui_call(self._set_buttons_state, True)
-            rs = self._runtime_status()
-            console_lines = rs.get("console", [])
-            summary_parts = [
-                "恢复系统默认完成(不含工具)。",
-                "",
-                "当前控制台编码：",
-            ]
-            summary_parts.extend([f"• {line}" for line in console_lines] or ["• 未检测到控制台状态"])
-            summary = "\n".join(summary_parts)
-            self._ui_call(self._show_modal, "完成", summary, "info")
+            self._owner = None
+            with self._worker_lock:
+                workers, self._worker_profiles = self._worker_profiles, []
+            elapsed = time.perf_counter() - started
+            snapshot = tracemalloc.take_snapshot()
+            _, peak = tracemalloc.get_traced_memory()
+            if owns_tracemalloc:
+                tracemalloc.stop()
+            try:
+                self._write_reports(name, profile, snapshot, elapsed, peak, workers)
+            except Exception:  # noqa: BLE001
+                pass
 
-    def _pick_ui_font_family(self) -> str:
-        # 避免指定西文字体导致中文回退（出现“字体不一致/中文发虚”）
-        candidates = [
-            "Microsoft YaHei UI",
-            "Microsoft YaHei",
-            "微软雅黑",
-            "Segoe UI",
+    def _write_reports(self, name: str, profile, snapshot, elapsed: float, peak: int, workers: list = ()) -> None:
+        import pstats
+        import tracemalloc
+
+        out_dir = self.output_dir
+        if out_dir is None:
+            return
+        out_dir.mkdir(parents=True, exist_ok=True)
+        stamp = time.strftime("%Y%m%d-%H%M%S") + f"-{int(time.time() * 1000) % 1000:03d}"
+        base = out_dir / f"{stamp}-{name}"
+        stats = pstats.Stats(profile)
+        for worker in workers:
+            stats.add(worker)
+        stats.dump_stats(str(base.with_suffix(".pstats")))
+
+        snapshot = snapshot.filter_traces(
+            [
+                tracemalloc.Filter(False, tracemalloc.__file__),
+                tracemalloc.Filter(False, "<frozen importlib._bootstrap*>"),
+            ]
+        )
+        lines = [
+            f"流程: {name}",
+            f"耗时: {elapsed:.3f}s",
+            f"峰值内存: {peak / 1024:.1f} KiB",
+            f"Python: {sys.version.split()[0]}  平台: {sys.platform}",
+            "",
+            f"内存分配排行（前 {self.top_allocations}，按源码行汇总）：",
         ]
+        for index, stat in enumerate(snapshot.statistics("lineno")[: self.top_allocations], 1):
+            frame = stat.traceback[0]
+            lines.append(f"{index:3d}. {frame.filename}:{frame.lineno}  {stat.size / 1024:.1f} KiB  ({stat.count} 块)")
+        lines.extend(["", "累计耗时排行（前 30）："])
+        buffer = io.StringIO()
+        stats.stream = buffer
+        stats.sort_stats("cumulative").print_stats(30)
+        lines.append(buffer.getvalue())
+        base.with_name(base.name + "-alloc.txt").write_text("\n".join(lines), encoding="utf-8")
+        self._rotate(out_dir)
+
+    def _rotate(self, out_dir: Path) -> None:
+        """超出文件数或总大小上限时，从最旧的报告开始删除。"""
+        files = []
+        for entry in os.scandir(out_dir):
+            if entry.is_file() and entry.name.endswith((".pstats", "-alloc.txt")):
+                st = entry.stat()
+                files.append((st.st_mtime, st.st_size, entry.path))
+        files.sort()
+        total = sum(size for _, size, _ in files)
+        while files and (len(files) > self.max_files or total > self.max_bytes):
+            _, size, path = files.pop(0)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            total -= size
+
+
+# 全局现场诊断：--profile 或环境变量 CODE_ENCODING_FIX_PROFILE=1 启用，报告写入 备份目录/profiles
+PROFILER = FieldProfiler()
+
+
+class LruCache:
+    """线程安全的 LRU 缓存：可选 TTL（秒），统计命中/未命中/淘汰/过期次数，便于按数据调整容量。"""
+
+    def __init__(self, name: str, max_size: int = 128, ttl: float | None = None) -> None:
+        self.name = name
+        self.max_size = max(1, max_size)
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._data: OrderedDict[object, tuple[object, float | None]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.expirations = 0
+
+    def get(self, key: object, default: object = None) -> object:
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                self.misses += 1
+                return default
+            value, expires_at = item
+            if expires_at is not None and time.monotonic() >= expires_at:
+                del self._data[key]
+                self.expirations += 1
+                self.misses += 1
+                return default
+            self._data.move_to_end(key)
+            self.hits += 1
+            return value
+
+    def put(self, key: object, value: object) -> None:
+        expires_at = time.monotonic() + self.ttl if self.ttl is not None else None
+        with self._lock:
+            self._data[key] = (value, expires_at)
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+                self.evictions += 1
+
+    def clear(self) -> None:
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def stats(self) -> dict[str, object]:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "max_size": self.max_size,
+                "ttl": self.ttl,
+                "hits": self.hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": round(self.hits / lookups, 3) if lookups else None,
+            }
 
-        try:
-            families = set(tkfont.families(self.root))
-        except Exception:
-            families = set()
 
-        for family in candidates:
-            if family in families:
-                return family
+class BackupIntegrityError(Exception):
+    """备份对象缺失、无法解压或内容与清单中的大小/哈希不符。"""
 
-        try:
-            return tkfont.nametofont("TkDefaultFont").cget("family")
-        except Exception:
-            return "TkDefaultFont"
 
-    def _init_fonts(self) -> None:
-        self.ui_font_family = self._pick_ui_font_family()
+class BackupStore:
+    """内容寻址的备份库：按内容哈希命名的压缩对象 + 每代一份小清单。
 
-        try:
-            default_font = tkfont.nametofont("TkDefaultFont")
-            self.ui_font_size = int(default_font.cget("size"))
-            default_font.configure(family=self.ui_font_family)
-        except Exception:
-            self.ui_font_size = 10
+    目录结构（位于备份目录下）：
+      objects/ab/<sha256>.zst|.z   原始内容经 zstd（已安装 zstandard 时）或 zlib 压缩，相同内容只存一份
+      generations/<id>.json        一代快照：{目标键: {"sha256", "size"} 或 {"empty": true}}
+      index.json                   下一代编号与各目标的“原始配置”条目（首次配置前的状态，供恢复使用）
 
-        try:
-            self.style.configure(".", font=(self.ui_font_family, self.ui_font_size))
-        except Exception:
-            pass
+    保存一代只写入新出现的对象；恢复任意一代只改写与当前内容不同的目标。与上一代完全相同的快照不新建代次。
+    旧版的 <key>.orig 单文件备份在首次访问时迁移为原始配置条目。
 
-        # 显式字体（保持原字号，仅替换 family）
-        self.font_title = (self.ui_font_family, 16, "bold")
-        self.font_subtitle = (self.ui_font_family, 10)
-        self.font_log = (self.ui_font_family, 10)
+    读取对象时按清单中的 size/sha256 校验，不符时抛出 BackupIntegrityError；verify() 流式校验全部对象，
+    已校验且文件大小/修改时间未变的对象记录在 verify-stamps.json 中，下次跳过（登录时运行也很便宜）。
+    """
 
-    def _build_layout(self) -> None:
-        header = ttk.Frame(self.root, padding="12 8")
-        header.pack(fill="x")
-        ttk.Label(
-            header,
-            text="Code-encoding-fix 编码配置助手",
-            font=self.font_title,
-        ).pack(anchor="center")
-        ttk.Label(
-            header,
-            text="一键修复Codex for Windows 运行乱码问题，完成 工具/shell UTF-8 编码配置",
-            font=self.font_subtitle,
-            foreground="#555",
-        ).pack(anchor="center", pady=(1, 0))
+    LEGACY_KEYS = ("ps5", "ps7", "git_bash", "vscode", "shell_reg")
+    EMPTY_MARKER = b"__EMPTY_BACKUP__"
 
-        path_frame = ttk.LabelFrame(self.root, text="工具配置", padding="8")
-        path_frame.pack(fill="x", padx=12, pady=4)
-        path_frame.columnconfigure(1, weight=1)
+    def __init__(self, root: Path, max_generations: int = 50) -> None:
+        self.root = root
+        self.max_generations = max(1, max_generations)
+        self._lock = threading.RLock()
+        self._index: dict | None = None
+        self._index_mtime: float | None = None
+        self._codec: tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes]] | None = None
 
-        row_idx = 0
-        row_idx = self._build_shell_row(
-            parent=path_frame,
-            key="ps5",
-            label_text="Windows PowerShell 5.1",
-            var=self.ps5_path_var,
-            open_cmd=lambda: self._open_path("ps5"),
-            start_row=row_idx,
-        )
-        row_idx = self._build_shell_row(
-            parent=path_frame,
-            key="ps7",
-            label_text="PowerShell 7+",
-            var=self.ps7_path_var,
-            open_cmd=lambda: self._open_path("ps7"),
-            start_row=row_idx,
-        )
-        row_idx = self._build_shell_row(
-            parent=path_frame,
-            key="git",
-            label_text="Git Bash",
-            var=self.git_path_var,
-            open_cmd=lambda: self._open_path("git"),
-            start_row=row_idx,
-        )
-        row_idx = self._build_shell_row(
-            parent=path_frame,
-            key="vscode",
-            label_text="Visual Studio Code",
-            var=self.vscode_path_var,
-            open_cmd=lambda: self._open_path("vscode"),
-            start_row=row_idx,
-            readonly=True,
-        )
+    @property
+    def objects_dir(self) -> Path:
+        return self.root / "objects"
 
-        console_frame = ttk.LabelFrame(self.root, text="控制台配置", padding="8")
-        console_frame.pack(fill="x", padx=12, pady=(2, 4))
-        ttk.Label(console_frame, textvariable=self.console_info_var, foreground="#444").pack(anchor="w")
+    @property
+    def generations_dir(self) -> Path:
+        return self.root / "generations"
 
-        # 状态摘要条（独立放置在语言环境分区下方）
-        status_frame = ttk.Frame(self.root, padding="10 2")
-        status_frame.pack(fill="x", padx=0, pady=(0, 4))
-        self.admin_label = ttk.Label(status_frame, textvariable=self.status_var, foreground="#0063b1")
-        self.admin_label.pack(side="left", anchor="w")
-        ttk.Button(status_frame, text="重新检测", command=lambda: self._detect_all_paths_in_thread(log=True)).pack(side="right")
+    @property
+    def index_path(self) -> Path:
+        return self.root / "index.json"
 
-        progress_frame = ttk.Frame(self.root, padding="12 2 12 0")
-        progress_frame.pack(fill="x")
-        ttk.Label(progress_frame, text="执行进度").pack(anchor="w")
-        self.progress = ttk.Progressbar(progress_frame, variable=self.progress_var, maximum=100)
-        self.progress.pack(fill="x", pady=4)
+    @property
+    def stamps_path(self) -> Path:
+        return self.root / "verify-stamps.json"
 
-        control_row = ttk.Frame(progress_frame)
-        control_row.pack(fill="x", pady=(1, 0))
-        self.start_btn = ttk.Button(control_row, text="开始执行配置", command=self._start_setup)
-        self.start_btn.pack(side="left")
-        self.reset_default_btn = ttk.Button(
-            control_row,
-            text="恢复系统默认编码(控制台配置)",
-            width=24,
-            command=self._reset_to_system_default,
-        )
-        self.reset_default_btn.pack(side="left", padx=(8, 0))
-        self.restore_btn = ttk.Button(
-            control_row,
-            text="恢复已备份配置",
-            width=20,
-            command=self._restore_configs,
-        )
-        self.restore_btn.pack(side="left", padx=(8, 0))
-        ttk.Button(control_row, text="退出", command=self.root.destroy).pack(side="right")
-        self.backup_btn = ttk.Button(
-            control_row,
-            text="备份目录",
-            command=self._open_backup_dir,
-        )
-        self.backup_btn.pack(side="right", padx=(0, 8))
+    # ---- 对象 ----
 
-        log_frame = ttk.LabelFrame(self.root, text="日志输出", padding="12")
-        log_frame.pack(fill="both", expand=True, padx=12, pady=4)
-        self.log_text = scrolledtext.ScrolledText(
-            log_frame, height=10, state="disabled", font=self.font_log
-        )
-        self.log_text.pack(fill="both", expand=True)
-        self.log_text.tag_config("info", foreground="#222")
-        self.log_text.tag_config("success", foreground="#0b6e35")
-        self.log_text.tag_config("warning", foreground="#b8860b")
-        self.log_text.tag_config("error", foreground="#b00020")
-        # 右键菜单：清空日志
-        self.log_menu = tk.Menu(self.root, tearoff=0)
-        self.log_menu.add_command(label="清空日志", command=self._clear_log)
-        self.log_text.bind("<Button-3>", self._show_log_menu)
+    @staticmethod
+    def digest(data: bytes) -> str:
+        return hashlib.sha256(data).hexdigest()
 
-        # 底部留白以保证布局呼吸感
-        ttk.Frame(self.root, height=2).pack(fill="x")
+    def _compressor(self) -> tuple[str, Callable[[bytes], bytes], Callable[[bytes], bytes]]:
+        if self._codec is None:
+            try:
+                import zstandard  # type: ignore
+
+                self._codec = (".zst", zstandard.ZstdCompressor(level=10).compress, zstandard.ZstdDecompressor().decompress)
+            except ImportError:
+                self._codec = (".z", lambda data: zlib.compress(data, 9), zlib.decompress)
+        return self._codec
+
+    def _object_path(self, digest: str) -> Path | None:
+        folder = self.objects_dir / digest[:2]
+        for suffix in (".zst", ".z"):
+            path = folder / (digest + suffix)
+            if path.exists():
+                return path
+        return None
 
-    def _build_shell_row(
-        self,
-        parent: ttk.Frame,
-        key: str,
-        label_text: str,
-        var: tk.StringVar,
-        open_cmd,
-        start_row: int,
-        readonly: bool = False,
-    ) -> None:
-        ttk.Label(parent, text=label_text + ":", width=22).grid(
-            row=start_row, column=0, sticky="e", padx=(0, 6), pady=(2, 0)
-        )
-        entry = ttk.Entry(parent, textvariable=var, state="readonly" if readonly else "normal")
-        entry.grid(row=start_row, column=1, sticky="we", padx=(0, 6), pady=(2, 0))
-        btn = ttk.Button(parent, text="打开", command=open_cmd, width=8)
-        btn.grid(row=start_row, column=2, sticky="e", padx=(0, 0), pady=(2, 0))
+    def put(self, data: bytes | None) -> dict[str, object]:
+        """写入内容并返回清单条目；None、空内容与旧版占位标记记为 empty。已存在的对象不重复写入。"""
+        if not data or data == self.EMPTY_MARKER:
+            return {"empty": True}
+        digest = self.digest(data)
+        if self._object_path(digest) is None:
+            suffix, compress, _ = self._compressor()
+            self._write_atomic(self.objects_dir / digest[:2] / (digest + suffix), compress(data))
+        return {"sha256": digest, "size": len(data)}
+
+    def put_file(self, path: Path, chunk_size: int = 1 << 20) -> dict[str, object]:
+        """流式写入文件内容并返回与 put() 相同格式的条目；大文件不整体读入内存。"""
+        hasher = hashlib.sha256()
+        size = 0
+        with open(path, "rb") as fh:
+            while chunk := fh.read(chunk_size):
+                hasher.update(chunk)
+                size += len(chunk)
+        if not size:
+            return {"empty": True}
+        digest = hasher.hexdigest()
+        if self._object_path(digest) is None:
+            suffix, _, _ = self._compressor()
+            target = self.objects_dir / digest[:2] / (digest + suffix)
+            target.parent.mkdir(parents=True, exist_ok=True)
+            tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+            with open(path, "rb") as src, open(tmp, "wb") as dst:
+                if suffix == ".zst":
+                    import zstandard  # type: ignore
+
+                    zstandard.ZstdCompressor(level=10).copy_stream(src, dst, read_size=chunk_size)
+                else:
+                    compressor = zlib.compressobj(9)
+                    while chunk := src.read(chunk_size):
+                        dst.write(compressor.compress(chunk))
+                    dst.write(compressor.flush())
+            os.replace(tmp, target)
+        return {"sha256": digest, "size": size}
+
+    def load(self, entry: Mapping[str, object]) -> bytes | None:
+        """读取并校验条目内容；empty 条目返回 None。对象缺失、损坏或与清单不符时抛出 BackupIntegrityError。"""
+        if entry.get("empty"):
+            return None
+        digest = str(entry.get("sha256", ""))
+        path = self._object_path(digest)
+        if path is None:
+            raise BackupIntegrityError(f"备份对象缺失: {digest[:12]}")
+        try:
+            data = b"".join(self._iter_object(path))
+        except BackupIntegrityError:
+            raise
+        except Exception as exc:  # noqa: BLE001
+            raise BackupIntegrityError(f"备份对象无法解压 {digest[:12]}: {exc}") from exc
+        if len(data) != entry.get("size") or self.digest(data) != digest:
+            raise BackupIntegrityError(f"备份对象内容与清单不符 {digest[:12]}（期望 {entry.get('size')} 字节，实际 {len(data)} 字节）")
+        return data
+
+    def _iter_object(self, path: Path, chunk_size: int = 1 << 16) -> Iterable[bytes]:
+        """按块解压对象内容，校验大文件时内存占用恒定。"""
+        with open(path, "rb") as fh:
+            if path.suffix == ".zst":
+                try:
+                    import zstandard  # type: ignore
+                except ImportError as exc:
+                    raise BackupIntegrityError(f"读取 {path.name} 需要安装 zstandard") from exc
+                reader = zstandard.ZstdDecompressor().stream_reader(fh)
+                while chunk := reader.read(chunk_size):
+                    yield chunk
+                return
+            decompressor = zlib.decompressobj()
+            while chunk := fh.read(chunk_size):
+                out = decompressor.decompress(chunk)
+                if out:
+                    yield out
+            tail = decompressor.flush()
+            if tail:
+                yield tail
+            if not decompressor.eof:
+                raise BackupIntegrityError(f"备份对象被截断: {path.name}")
+
+    def verify_object(self, digest: str, size: object) -> str | None:
+        """流式解压并计算哈希，返回错误描述；一致时返回 None。"""
+        path = self._object_path(digest)
+        if path is None:
+            return "对象缺失"
+        hasher = hashlib.sha256()
+        total = 0
+        try:
+            for chunk in self._iter_object(path):
+                hasher.update(chunk)
+                total += len(chunk)
+        except BackupIntegrityError as exc:
+            return str(exc)
+        except Exception as exc:  # noqa: BLE001
+            return f"无法解压: {exc}"
+        if total != size:
+            return f"大小不符（期望 {size} 字节，实际 {total} 字节）"
+        if hasher.hexdigest() != digest:
+            return "哈希不符"
+        return None
 
-        status_full = ttk.Label(parent, text="", foreground="#444", anchor="w", justify="left", wraplength=620)
-        status_full.grid(row=start_row + 1, column=1, columnspan=2, sticky="w", pady=(0, 4))
+    def verify(self, full: bool = False, workers: int = 4) -> dict[str, object]:
+        """校验原始配置与全部代次引用的对象，多个对象并行校验。
 
-        self._row_widgets[key] = {"entry": entry, "btn": btn, "status_full": status_full}
-        return start_row + 2
+        full=False 时跳过上次已校验且文件大小/修改时间未变的对象。返回
+        {"objects", "checked", "skipped", "failed": [{"sha256", "error", "refs"}], "bad_manifests"}。
+        """
+        with self._lock:
+            refs: dict[str, dict] = {}
+
+            def add(entry: Mapping[str, object], label: str) -> None:
+                if entry.get("empty"):
+                    return
+                item = refs.setdefault(str(entry.get("sha256")), {"size": entry.get("size"), "refs": []})
+                item["refs"].append(label)
+
+            for key, entry in sorted(self._load_index()["originals"].items()):
+                add(entry, f"原始配置/{key}")
+            bad_manifests: list[int] = []
+            for generation in self.generation_ids():
+                manifest = self.manifest(generation)
+                if manifest is None or not isinstance(manifest.get("entries"), dict):
+                    bad_manifests.append(generation)
+                    continue
+                for key, entry in sorted(manifest["entries"].items()):
+                    add(entry, f"代次 {generation}/{key}")
 
-    def _update_console_state_label(self) -> None:
-        status_label = self._console_config_state()
-        summary_full = self._console_status_summary()
-        summary_short = self._console_status_summary(short=True)
-        self._console_summary_short = summary_short
-        self._console_summary_list = summary_short.split(" ") if summary_short else []
-        self._console_config_status = status_label
-        self.console_info_var.set(f"控制台编码：{summary_full}")
+            stamps: dict[str, list] = {}
+            if not full:
+                try:
+                    stamps = json.loads(self.stamps_path.read_text(encoding="utf-8"))
+                except (OSError, ValueError):
+                    stamps = {}
+            pending: list[tuple[str, list | None]] = []
+            new_stamps: dict[str, list] = {}
+            for digest in refs:
+                path = self._object_path(digest)
+                stamp = None
+                if path is not None:
+                    st = path.stat()
+                    stamp = [st.st_size, st.st_mtime_ns]
+                    if stamps.get(digest) == stamp:
+                        new_stamps[digest] = stamp
+                        continue
+                pending.append((digest, stamp))
 
-    def _refresh_env_tool_labels(self) -> None:
-        # 语言环境改由注册表 CodePage 控制，实时显示当前检测结果
-        # 语言环境提示已合并到控制台状态，不再单独显示
-        self._env_summary_short = ""
-        self._env_status_short = ""
+            def check(item: tuple[str, list | None]) -> str | None:
+                return self.verify_object(item[0], refs[item[0]]["size"])
 
-        appdata = os.environ.get("APPDATA")
-        settings_path = Path(appdata) / "Code" / "User" / "settings.json" if appdata else None
-        # 尝试定位 Visual Studio Code 可执行文件
-        vscode_exe = shutil.which("code") or shutil.which("code.cmd")
-        vscode_path_display = None
-        if vscode_exe:
-            resolved = Path(vscode_exe).resolve()
-            if resolved.name.lower() == "code.cmd":
-                candidate = resolved.parent.parent / "Code.exe"
-                vscode_path_display = candidate if candidate.exists() else resolved
-            elif resolved.name.lower() == "code":
-                candidate = resolved.parent / "Code.exe"
-                vscode_path_display = candidate if candidate.exists() else resolved
+            if len(pending) > 1 and workers > 1:
+                from concurrent.futures import ThreadPoolExecutor
+
+                with ThreadPoolExecutor(max_workers=min(workers, len(pending)), thread_name_prefix="verify") as pool:
+                    errors = list(pool.map(check, pending))
             else:
-                vscode_path_display = resolved
-        if settings_path and settings_path.exists():
-            exe_part = f"{vscode_path_display}" if vscode_path_display else None
-            if exe_part:
-                self.tool_info_var.set(f"已检测到 Visual Studio Code: {exe_part}")
+                errors = [check(item) for item in pending]
+
+            failed: list[dict[str, object]] = []
+            for (digest, stamp), error in zip(pending, errors):
+                if error is None:
+                    if stamp is not None:
+                        new_stamps[digest] = stamp
+                else:
+                    failed.append({"sha256": digest, "error": error, "refs": refs[digest]["refs"]})
+            try:
+                self._write_atomic(self.stamps_path, json.dumps(new_stamps).encode("utf-8"))
+            except OSError:
+                pass
+            return {
+                "objects": len(refs),
+                "checked": len(pending),
+                "skipped": len(refs) - len(pending),
+                "failed": failed,
+                "bad_manifests": bad_manifests,
+            }
+
+    def matches(self, entry: Mapping[str, object], data: bytes | None) -> bool:
+        """当前内容是否与条目一致（用于跳过无需改写的目标）。"""
+        if entry.get("empty"):
+            return not data or data == self.EMPTY_MARKER
+        return bool(data) and len(data) == entry.get("size") and self.digest(data) == entry.get("sha256")
+
+    def file_matches(self, entry: Mapping[str, object], path: Path, chunk_size: int = 1 << 20) -> bool:
+        """与 matches() 相同，但直接比较磁盘上的文件：大小不同时不读内容，否则流式计算哈希。"""
+        if not path.is_file():
+            return bool(entry.get("empty"))
+        size = path.stat().st_size
+        if entry.get("empty"):
+            return not size or (size == len(self.EMPTY_MARKER) and path.read_bytes() == self.EMPTY_MARKER)
+        if size != entry.get("size"):
+            return False
+        hasher = hashlib.sha256()
+        with open(path, "rb") as fh:
+            while chunk := fh.read(chunk_size):
+                hasher.update(chunk)
+        return hasher.hexdigest() == entry.get("sha256")
+
+    def restore_file(self, entry: Mapping[str, object], path: Path) -> None:
+        """把非 empty 条目的内容写回 path：逐块解压到同目录的临时文件，校验大小与哈希后原子替换，不整体读入内存。
+        对象缺失、损坏或与清单不符时抛出 BackupIntegrityError，原文件保持不变。"""
+        digest = str(entry.get("sha256", ""))
+        source = self._object_path(digest)
+        if source is None:
+            raise BackupIntegrityError(f"备份对象缺失: {digest[:12]}")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp: Path | None = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.restore.tmp")
+        hasher = hashlib.sha256()
+        total = 0
+        try:
+            with open(tmp, "wb") as out:
+                try:
+                    for chunk in self._iter_object(source):
+                        hasher.update(chunk)
+                        total += len(chunk)
+                        out.write(chunk)
+                except BackupIntegrityError:
+                    raise
+                except Exception as exc:  # noqa: BLE001
+                    raise BackupIntegrityError(f"备份对象无法解压 {digest[:12]}: {exc}") from exc
+            if total != entry.get("size") or hasher.hexdigest() != digest:
+                raise BackupIntegrityError(f"备份对象内容与清单不符 {digest[:12]}（期望 {entry.get('size')} 字节，实际 {total} 字节）")
+            if path.is_file():
+                shutil.copymode(path, tmp)
+            os.replace(tmp, path)
+            tmp = None
+        finally:
+            if tmp is not None:
+                tmp.unlink(missing_ok=True)
+
+    @staticmethod
+    def _write_atomic(path: Path, data: bytes) -> None:
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = path.with_name(f".{path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+        tmp.write_bytes(data)
+        os.replace(tmp, path)
+
+    # ---- 索引与原始配置 ----
+
+    def _load_index(self) -> dict:
+        try:
+            mtime = self.index_path.stat().st_mtime
+        except OSError:
+            mtime = None
+        if self._index is not None and mtime == self._index_mtime:
+            return self._index
+        index: dict = {"next_generation": 1, "originals": {}}
+        if mtime is not None:
+            try:
+                loaded = json.loads(self.index_path.read_text(encoding="utf-8"))
+                if isinstance(loaded, dict):
+                    index.update(loaded)
+            except Exception:  # noqa: BLE001
+                pass
+        self._index, self._index_mtime = index, mtime
+        self._migrate_legacy(index)
+        return index
+
+    def _save_index(self, index: dict) -> None:
+        self._write_atomic(self.index_path, json.dumps(index, ensure_ascii=False, indent=2).encode("utf-8"))
+        self._index = index
+        try:
+            self._index_mtime = self.index_path.stat().st_mtime
+        except OSError:
+            self._index_mtime = None
+
+    def _migrate_legacy(self, index: dict) -> None:
+        """把旧版 <key>.orig 文件转为原始配置条目（已有条目的不覆盖），迁移后删除旧文件。"""
+        migrated = False
+        for key in self.LEGACY_KEYS:
+            legacy = self.root / f"{key}.orig"
+            if not legacy.is_file():
+                continue
+            try:
+                if key not in index["originals"]:
+                    index["originals"][key] = self.put(legacy.read_bytes())
+                legacy.unlink()
+                migrated = True
+            except OSError:
+                continue
+        if migrated:
+            self._save_index(index)
+
+    def originals(self) -> dict[str, dict]:
+        with self._lock:
+            return dict(self._load_index()["originals"])
+
+    def original(self, key: str) -> dict | None:
+        with self._lock:
+            return self._load_index()["originals"].get(key)
+
+    def has_original(self, key: str) -> bool:
+        return self.original(key) is not None
+
+    def set_original(self, key: str, data: bytes | None) -> bool:
+        """记录目标的原始配置；已存在时不覆盖（恢复始终回到首次配置前的状态）。返回是否新建。"""
+        with self._lock:
+            index = self._load_index()
+            if key in index["originals"]:
+                return False
+            index["originals"][key] = self.put(data)
+            self._save_index(index)
+            return True
+
+    def clear_originals(self, keys: Iterable[str] | None = None) -> None:
+        """清除原始配置条目（恢复完成后调用）；历史代次保留，孤立对象随之回收。"""
+        with self._lock:
+            index = self._load_index()
+            if keys is None:
+                index["originals"] = {}
             else:
-                self.tool_info_var.set("已检测到 Visual Studio Code")
-            self.vscode_path_var.set(str(settings_path))
-        else:
-            self.tool_info_var.set("未检测到 Visual Studio Code，请在安装后再次执行配置")
-            self.vscode_path_var.set("未检测到 Visual Studio Code，请在安装后再次执行配置")
+                for key in keys:
+                    index["originals"].pop(key, None)
+            self._save_index(index)
+            self._collect_garbage()
 
-    def _append_console_logs(self, messages: list[tuple[str, str]]) -> None:
-        if not messages:
-            return
-        self._console_log_buffer.extend(messages)
+    # ---- 代次 ----
 
-    def _file_marker_status(self, path: Path | None, start: str, end: str) -> str:
-        """
-        返回标记状态:
-        - "full": 同时存在 start/end
-        - "partial": 仅存在 start 或 end
-        - "none": 未检测到
-        - "error": 读取失败
-        """
-        if not path:
-            return "none"
+    def generation_ids(self) -> list[int]:
         try:
-            if not path.exists():
-                return "none"
-            text = path.read_text(encoding="utf-8", errors="ignore")
-        except OSError as exc:
+            names = [entry.name for entry in os.scandir(self.generations_dir) if entry.name.endswith(".json")]
+        except OSError:
+            return []
+        return sorted(int(name[:-5]) for name in names if name[:-5].isdigit())
+
+    def manifest(self, generation: int) -> dict | None:
+        try:
+            return json.loads((self.generations_dir / f"{generation:06d}.json").read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            return None
+
+    def generations(self) -> list[dict]:
+        return [m for m in (self.manifest(g) for g in self.generation_ids()) if m is not None]
+
+    def commit(self, contents: Mapping[str, bytes | None], reason: str) -> int:
+        """保存一代快照并返回代次编号；与最新一代内容完全相同时直接返回最新代次。"""
+        with self._lock:
+            return self.commit_entries({key: self.put(data) for key, data in contents.items()}, reason)
+
+    def commit_entries(self, entries: Mapping[str, Mapping[str, object]], reason: str) -> int:
+        """用已写入的对象条目（put/put_file 的返回值）保存一代快照，规则同 commit()。"""
+        with self._lock:
+            entries = {key: dict(entry) for key, entry in entries.items()}
+            ids = self.generation_ids()
+            if ids:
+                latest = self.manifest(ids[-1])
+                if latest is not None and latest.get("entries") == entries:
+                    return ids[-1]
+            index = self._load_index()
+            generation = max([index.get("next_generation", 1), *(g + 1 for g in ids)])
+            manifest = {
+                "id": generation,
+                "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+                "reason": reason,
+                "entries": entries,
+            }
+            self._write_atomic(
+                self.generations_dir / f"{generation:06d}.json",
+                json.dumps(manifest, ensure_ascii=False, indent=2).encode("utf-8"),
+            )
+            index["next_generation"] = generation + 1
+            self._save_index(index)
+            if len(ids) + 1 > self.max_generations:
+                self._prune(ids[: len(ids) + 1 - self.max_generations])
+            return generation
+
+    def _prune(self, generations: Iterable[int]) -> None:
+        for generation in generations:
             try:
-                self._log(f"读取 {path} 失败: {exc}", "warning")
-            except Exception:
+                (self.generations_dir / f"{generation:06d}.json").unlink()
+            except OSError:
                 pass
-            return "error"
-        has_start = start in text
-        has_end = end in text
-        if has_start and has_end:
-            return "full"
-        if has_start or has_end:
-            return "partial"
-        return "none"
+        self._collect_garbage()
 
-    @staticmethod
-    def _normalize_block_text(text: str) -> str:
-        """归一化配置块文本，用于比较差异（忽略换行差异与行尾空格）。"""
-        normalized = text.replace("\r\n", "\n").replace("\r", "\n")
-        lines = [line.rstrip() for line in normalized.split("\n")]
-        # 去掉首尾空行，避免误报
-        while lines and lines[0] == "":
-            lines.pop(0)
-        while lines and lines[-1] == "":
-            lines.pop()
-        return "\n".join(lines)
+    def _collect_garbage(self) -> None:
+        """删除不再被任何代次或原始配置引用的对象。"""
+        referenced = {e.get("sha256") for e in self._load_index()["originals"].values()}
+        for manifest in self.generations():
+            referenced.update(e.get("sha256") for e in manifest.get("entries", {}).values())
+        try:
+            folders = [entry.path for entry in os.scandir(self.objects_dir) if entry.is_dir()]
+        except OSError:
+            return
+        for folder in folders:
+            for entry in os.scandir(folder):
+                digest = entry.name.split(".", 1)[0]
+                if digest not in referenced and not entry.name.startswith("."):
+                    try:
+                        os.remove(entry.path)
+                    except OSError:
+                        pass
 
-    @staticmethod
-    def _extract_marker_blocks(text: str, start: str, end: str) -> list[str]:
-        """提取由 start/end 包裹的所有配置块（包含 start/end 行本身）。"""
-        pattern = re.compile(re.escape(start) + r".*?" + re.escape(end), re.DOTALL)
-        return pattern.findall(text)
 
-    @staticmethod
-    def _expected_powershell_block() -> str:
-        """当前工具写入 PowerShell Profile 的标准配置块（含标记）。"""
-        return "\n".join(
-            [
-                PROFILE_MARKER_START,
-                "chcp 65001 | Out-Null",
-                "[Console]::InputEncoding  = [System.Text.UTF8Encoding]::new()",
-                "[Console]::OutputEncoding = [System.Text.UTF8Encoding]::new()",
-                "$OutputEncoding = [System.Text.UTF8Encoding]::new()",
-                "$PSDefaultParameterValues['Get-Content:Encoding']    = 'utf8'",
-                "$PSDefaultParameterValues['Set-Content:Encoding']    = 'utf8'",
-                "$PSDefaultParameterValues['Add-Content:Encoding']    = 'utf8'",
-                "$PSDefaultParameterValues['Out-File:Encoding']       = 'utf8'",
-                "$PSDefaultParameterValues['Select-String:Encoding']  = 'utf8'",
-                "$PSDefaultParameterValues['Import-Csv:Encoding']     = 'utf8'",
-                "$PSDefaultParameterValues['Export-Csv:Encoding']     = 'utf8'",
-                "$PSDefaultParameterValues['*:Encoding']              = 'utf8'",
-                '$env:LANG = "zh_CN.UTF-8"',
-                PROFILE_MARKER_END,
-            ]
-        )
+class ProgressModel:
+    """按目标汇总的进度：每个目标等权、可分若干步推进，总进度为各目标完成比例之和。
 
-    @staticmethod
-    def _expected_bash_block() -> str:
-        """当前工具写入 Git Bash ~/.bashrc 的标准配置块（含标记）。"""
-        return "\n".join(
-            [
-                BASH_MARKER_START,
-                'export LANG="zh_CN.UTF-8"',
-                'export LC_ALL="zh_CN.UTF-8"',
-                'export LC_CTYPE="zh_CN.UTF-8"',
-                'export LC_MESSAGES="zh_CN.UTF-8"',
-                'if command -v chcp >/dev/null 2>&1; then chcp 65001 >/dev/null 2>&1; fi',
-                "git config --global core.quotepath false",
-                "git config --global i18n.commitencoding utf-8",
-                "git config --global i18n.logoutputencoding utf-8",
-                BASH_MARKER_END,
-            ]
-        )
+    目标可在不同工作线程中并发推进；百分比变化时调用 on_change(percent)。
+    """
 
-    @staticmethod
-    def _is_utf8_locale_value(value: object) -> bool:
-        if not isinstance(value, str):
-            return False
-        return bool(re.search(r"utf-?8", value, flags=re.IGNORECASE))
+    def __init__(self, on_change: Callable[[int], None]) -> None:
+        self._on_change = on_change
+        self._lock = threading.Lock()
+        # 目标名 -> [已完成步数, 总步数]
+        self._targets: dict[str, list[int]] = {}
+        self._percent = -1
 
-    @staticmethod
-    def _equivalent_powershell_profile(text: str) -> tuple[bool, str]:
-        """在无工具标记块时，保守判断 PowerShell profile 是否已做 UTF-8 等效配置。"""
-        has_input = bool(re.search(r"\[console\]::\s*inputencoding\s*=\s*.*utf8", text, flags=re.IGNORECASE))
-        has_output = bool(re.search(r"\[console\]::\s*outputencoding\s*=\s*.*utf8", text, flags=re.IGNORECASE))
-        has_outputencoding = bool(re.search(r"\$outputencoding\s*=\s*.*utf8", text, flags=re.IGNORECASE))
-        has_psdefaults = ("$psdefaultparametervalues" in text.lower()) and (":encoding" in text.lower()) and ("utf8" in text.lower())
-        has_chcp = bool(re.search(r"(?:^|\s)chcp\s+65001\b", text, flags=re.IGNORECASE))
-        ok = has_input and has_output and (has_psdefaults or has_outputencoding or has_chcp)
-        if not ok:
-            return False, ""
-        reasons: list[str] = []
-        if has_chcp:
-            reasons.append("检测到 chcp 65001")
-        if has_outputencoding:
-            reasons.append("检测到 $OutputEncoding=UTF-8")
-        if has_psdefaults:
-            reasons.append("检测到 PSDefaultParameterValues(Encoding)")
-        return True, "；".join(reasons) if reasons else "检测到关键 UTF-8 设置"
+    def start(self, targets: Iterable[str], steps: int = 1) -> None:
+        with self._lock:
+            self._targets = {name: [0, max(1, steps)] for name in targets}
+            self._percent = -1
+        self._notify()
+
+    def advance(self, target: str, steps: int = 1) -> None:
+        with self._lock:
+            state = self._targets.get(target)
+            if state is None:
+                return
+            state[0] = min(state[1], state[0] + steps)
+        self._notify()
+
+    def finish(self, target: str) -> None:
+        with self._lock:
+            state = self._targets.get(target)
+            if state is None:
+                return
+            state[0] = state[1]
+        self._notify()
+
+    def fractions(self) -> dict[str, float]:
+        with self._lock:
+            return {name: done / total for name, (done, total) in self._targets.items()}
+
+    def percent(self) -> int:
+        fractions = self.fractions()
+        if not fractions:
+            return 0
+        return int(sum(fractions.values()) * 100 / len(fractions))
+
+    def _notify(self) -> None:
+        percent = self.percent()
+        with self._lock:
+            if percent == self._percent:
+                return
+            self._percent = percent
+        self._on_change(percent)
+
+
+class PathProber:
+    """批量探测安装位置候选路径：归一化去重、并发 stat、周期内缓存未命中结果。
+
+    - 同一检测周期内（begin_cycle 之间）不存在/超时的路径只探测一次；
+    - 一次查找的所有候选共用一个截止时间，最坏情况只等待 timeout，而不是候选数 × timeout；
+    - 每个 key 记录命中的候选，下次启动时最先发出该路径的探测（warm start）；结果仍按候选优先级判定，
+      过期的命中记录不会压过优先级更高的路径。
+    """
+
+    def __init__(self, timeout: float = 1.5, max_workers: int = 8) -> None:
+        self.timeout = timeout
+        self.max_workers = max(1, max_workers)
+        self._lock = threading.Lock()
+        self._missing: set[str] = set()
+        self._results: dict[str, bool] = {}
+        self._winners: dict[str, str] = {}
+        self._hints_dirty = False
 
     @staticmethod
-    def _equivalent_bashrc(text: str) -> tuple[bool, str]:
-        """在无工具标记块时，保守判断 bashrc 是否已做 UTF-8 等效配置。"""
-        has_lang = bool(re.search(r"^\s*export\s+LANG\s*=\s*['\"]?.*utf-?8", text, flags=re.IGNORECASE | re.MULTILINE))
-        has_lc_all = bool(re.search(r"^\s*export\s+LC_ALL\s*=\s*['\"]?.*utf-?8", text, flags=re.IGNORECASE | re.MULTILINE))
-        lower = text.lower()
-        has_git = ("core.quotepath" in lower) or ("i18n.commitencoding" in lower) or ("i18n.logoutputencoding" in lower)
-        ok = has_lang and has_lc_all and has_git
-        if not ok:
-            return False, ""
-        return True, "检测到 LANG/LC_ALL 为 UTF-8 且包含 git 编码配置"
+    def normalize(path: Path | str) -> str:
+        """归一化路径用于去重：展开环境变量、统一分隔符与大小写（Windows）。"""
+        text = os.path.expandvars(os.path.expanduser(str(path)))
+        return os.path.normcase(os.path.normpath(text))
+
+    def begin_cycle(self) -> None:
+        """开始新的检测周期：清空未命中缓存，保留命中记录。"""
+        with self._lock:
+            self._missing.clear()
+            self._results.clear()
+
+    def load_hints(self, hints: object) -> None:
+        if not isinstance(hints, dict):
+            return
+        with self._lock:
+            for key, value in hints.items():
+                if isinstance(key, str) and isinstance(value, str) and value:
+                    self._winners.setdefault(key, value)
+
+    def export_hints(self) -> dict[str, str]:
+        with self._lock:
+            return dict(self._winners)
+
+    def take_hints_dirty(self) -> bool:
+        """返回命中记录自上次保存后是否变化，并复位标志。"""
+        with self._lock:
+            dirty, self._hints_dirty = self._hints_dirty, False
+            return dirty
+
+    def _record_winner(self, key: str, norm: str) -> None:
+        if not key:
+            return
+        with self._lock:
+            if self._winners.get(key) != norm:
+                self._winners[key] = norm
+                self._hints_dirty = True
+
+    def _probe_many(self, paths: list[str]) -> dict[str, threading.Event]:
+        """并发 stat（按 paths 顺序发出）：使用守护线程，避免网络盘卡住时阻塞进程退出。"""
+        events = {p: threading.Event() for p in paths}
+        pending: "queue.SimpleQueue[str]" = queue.SimpleQueue()
+        for p in paths:
+            pending.put(p)
+
+        def _worker() -> None:
+            while True:
+                try:
+                    p = pending.get_nowait()
+                except queue.Empty:
+                    return
+                try:
+                    ok = os.path.exists(p)
+                except Exception:  # noqa: BLE001
+                    ok = False
+                with self._lock:
+                    self._results[p] = ok
+                    if not ok:
+                        self._missing.add(p)
+                events[p].set()
+
+        for _ in range(min(len(paths), self.max_workers)):
+            threading.Thread(target=_worker, daemon=True).start()
+        return events
+
+    def first_existing(self, key: str, candidates: Iterable[Path | str | None]) -> Path | None:
+        """按优先级返回第一个存在的候选路径；所有 stat 并发发出，截止时间前未返回的视为不存在。"""
+        ordered: list[tuple[str, Path]] = []
+        seen: set[str] = set()
+        for cand in candidates:
+            if not cand:
+                continue
+            norm = self.normalize(cand)
+            if norm in seen:
+                continue
+            seen.add(norm)
+            ordered.append((norm, Path(cand)))
+        if not ordered:
+            return None
 
-    def _analyze_marker_block(
-        self,
-        path: Path | None,
-        start: str,
-        end: str,
-        expected_block: str,
-        equivalent_check: Callable[[str], tuple[bool, str]] | None = None,
-    ) -> dict[str, object]:
-        """分析配置文件中工具生成的配置块是否存在漂移（被手动改动/重复/截断）。"""
+        with self._lock:
+            hint = self._winners.get(key)
+            missing = set(self._missing)
+        todo = [(n, p) for n, p in ordered if n not in missing]
+        if not todo:
+            return None
+        # warm start：上次命中的候选最先探测；是否采用仍按优先级判定
+        probes = [n for n, _ in todo]
+        if hint in probes:
+            probes.remove(hint)
+            probes.insert(0, hint)
+        events = self._probe_many(probes)
+        deadline = time.monotonic() + self.timeout
+        for norm, path in todo:
+            if not events[norm].wait(max(0.0, deadline - time.monotonic())):
+                # 超时：本周期内按未命中处理
+                with self._lock:
+                    self._missing.add(norm)
+                continue
+            with self._lock:
+                ok = self._results.get(norm, False)
+            if ok:
+                self._record_winner(key, norm)
+                return path
+        return None
+
+    def exists(self, path: Path | str | None) -> bool:
+        """单路径探测（同样受周期缓存与超时约束）。"""
         if not path:
-            return {"state": "missing", "summary": "未定位到配置文件路径"}
+            return False
+        return self.first_existing("", [path]) is not None
+
+
+def _frozen_mapping(data: Mapping) -> Mapping:
+    """返回只读映射视图（浅拷贝），用于快照内的 dict 字段。"""
+    return MappingProxyType(dict(data))
+
+
+def _normalize_block_text(text: str) -> str:
+    """归一化配置块文本，用于比较差异（忽略换行差异与行尾空格）。"""
+    normalized = text.replace("\r\n", "\n").replace("\r", "\n")
+    lines = [line.rstrip() for line in normalized.split("\n")]
+    # 去掉首尾空行，避免误报
+    while lines and lines[0] == "":
+        lines.pop(0)
+    while lines and lines[-1] == "":
+        lines.pop()
+    return "\n".join(lines)
+
+
+@dataclass(frozen=True)
+class EquivalenceRule:
+    """“已等效配置 UTF-8”判定规则：profile 为适用的配置类型（powershell / bash），
+    同一 profile 下每个 group 至少命中一条规则才判定为等效；reason 非空时写入判定说明。"""
+
+    profile: str
+    name: str
+    group: str
+    pattern: str
+    reason: str = ""
+
+
+@dataclass(frozen=True)
+class EquivalenceResult:
+    ok: bool
+    reason: str
+    # 命中的规则与行号（1 起），按出现顺序排列
+    matches: tuple[tuple[str, int], ...] = ()
+
+
+DEFAULT_EQUIVALENCE_RULES: tuple[EquivalenceRule, ...] = (
+    EquivalenceRule("powershell", "ps.input_encoding", "input", r"\[console\]::\s*inputencoding\s*=\s*.*utf8"),
+    EquivalenceRule("powershell", "ps.console_output_encoding", "output", r"\[console\]::\s*outputencoding\s*=\s*.*utf8"),
+    EquivalenceRule("powershell", "ps.chcp", "session", r"(?<!\S)chcp\s+65001\b", "检测到 chcp 65001"),
+    EquivalenceRule("powershell", "ps.output_encoding", "session", r"\$outputencoding\s*=\s*.*utf8", "检测到 $OutputEncoding=UTF-8"),
+    EquivalenceRule(
+        "powershell",
+        "ps.default_parameter_encoding",
+        "session",
+        # 键与值可分行写在同一个哈希表里（@{ ... }），匹配范围限定在第一个 } 之前
+        r"\$psdefaultparametervalues\b[^}]*?:encoding[^}]*?utf8",
+        "检测到 PSDefaultParameterValues(Encoding)",
+    ),
+    EquivalenceRule("bash", "bash.lang", "lang", r"^\s*export\s+LANG\s*=\s*['\"]?.*utf-?8"),
+    EquivalenceRule("bash", "bash.lc_all", "lc_all", r"^\s*export\s+LC_ALL\s*=\s*['\"]?.*utf-?8"),
+    # git 键拆成同组的两条规则，命中第一条即跳过其余。以不分大小写的 "." 开头、用后顾断言核对前半段：
+    # re 可按字面前缀直接跳到 "."，不必在每个位置逐字符比较 core / i18n
+    EquivalenceRule("bash", "bash.git_quotepath", "git", r"\.(?<=core\.)quotepath"),
+    EquivalenceRule("bash", "bash.git_i18n_encoding", "git", r"\.(?<=i18n\.)(?:commit|logoutput)encoding"),
+)
+_EQUIVALENCE_DEFAULT_REASONS = {
+    "powershell": "检测到关键 UTF-8 设置",
+    "bash": "检测到 LANG/LC_ALL 为 UTF-8 且包含 git 编码配置",
+}
+
+
+class EquivalenceEngine:
+    """按 profile 预编译等效规则，逐组惰性求值。
+
+    同一 group 的规则依次查找，命中一条即视为该组满足、跳过组内其余不带说明的规则；某组全部未命中时判定为
+    不等效并立即结束，不再查找后面的组。所有组满足后，只补查带说明（reason）且尚未命中的规则，判定说明与逐条
+    匹配的结果一致。每条规则各自 search（不生成小写副本），同一位置上重叠的规则互不遮挡；不拼成一条组合正则，
+    因为 re 对多分支的组合正则无法按前缀跳过不可能的位置，逐位置尝试每个分支，比各自查找慢 2~3 倍。
+    站点规则来自 config.json 的 equivalence_rules，无需改代码即可追加。
+    """
+
+    FLAGS = re.IGNORECASE | re.MULTILINE
+
+    def __init__(self, rules: Iterable[EquivalenceRule]) -> None:
+        self._base = tuple(rules)
+        self._site: tuple[EquivalenceRule, ...] = ()
+        self.revision = 0
+        self._compile()
+
+    @property
+    def rules(self) -> tuple[EquivalenceRule, ...]:
+        return self._base + self._site
+
+    def _compile(self) -> None:
+        by_profile: dict[str, list[EquivalenceRule]] = {}
+        for rule in self.rules:
+            by_profile.setdefault(rule.profile, []).append(rule)
+        state: dict[str, tuple] = {}
+        for profile, profile_rules in by_profile.items():
+            rules = tuple(profile_rules)
+            groups: dict[str, list[int]] = {}
+            for idx, rule in enumerate(rules):
+                groups.setdefault(rule.group, []).append(idx)
+            compiled = tuple(re.compile(rule.pattern, self.FLAGS) for rule in rules)
+            state[profile] = (compiled, rules, tuple(groups.values()))
+        # 一次性替换，检测线程读到的总是完整的一组编译结果
+        self._state = state
+        self.revision += 1
+
+    @classmethod
+    def validate(cls, rule: EquivalenceRule) -> None:
+        """校验单条规则可编译且不匹配空字符串。"""
+        if not rule.profile or not rule.name or not rule.group:
+            raise ValueError("规则缺少 profile/name/group")
         try:
-            if not path.exists():
-                return {"state": "missing", "summary": "配置文件不存在"}
-            text = path.read_text(encoding="utf-8", errors="ignore")
-        except OSError as exc:
-            self._log(f"读取 {path} 失败: {exc}", "warning")
-            return {"state": "unreadable", "summary": "读取失败"}
+            compiled = re.compile(rule.pattern, cls.FLAGS)
+        except re.error as exc:
+            raise ValueError(f"正则无效: {exc}") from exc
+        if compiled.search(""):
+            raise ValueError("正则不能匹配空字符串")
+
+    def set_site_rules(self, raw: object) -> list[str]:
+        """加载站点规则（config.json 中的 equivalence_rules 列表），返回被跳过规则的原因。"""
+        rules: list[EquivalenceRule] = []
+        errors: list[str] = []
+        for idx, item in enumerate(raw if isinstance(raw, list) else []):
+            try:
+                if not isinstance(item, Mapping):
+                    raise ValueError("应为对象")
+                rule = EquivalenceRule(
+                    profile=str(item.get("profile", "")),
+                    name=str(item.get("name") or f"site.{idx}"),
+                    group=str(item.get("group", "")),
+                    pattern=str(item.get("pattern", "")),
+                    reason=str(item.get("reason", "")),
+                )
+                self.validate(rule)
+            except ValueError as exc:
+                errors.append(f"第{idx + 1}条: {exc}")
+                continue
+            rules.append(rule)
+        if tuple(rules) != self._site:
+            self._site = tuple(rules)
+            self._compile()
+        return errors
 
-        has_start = start in text
-        has_end = end in text
-        if not has_start and not has_end:
-            if equivalent_check:
-                ok, reason = equivalent_check(text)
-                if ok:
-                    suffix = f"：{reason}" if reason else ""
-                    return {"state": "ok", "summary": f"等效配置已存在（无工具标记块）{suffix}"}
-                # 无标记且未命中等效 UTF-8 配置：对用户更友好的摘要，避免误导为“仅缺少标记”
-                return {"state": "missing", "summary": "未发现 UTF-8 配置"}
-            return {"state": "missing", "summary": "未检测到配置块标记"}
-        if has_start ^ has_end:
-            return {"state": "partial", "summary": "检测到部分标记(可能被截断)"}
+    @staticmethod
+    def _find(pattern: "re.Pattern[str]", text: str) -> int | None:
+        """规则第一次命中的位置；跳过匹配开头的空白（^\s* 可能从前面的空行开始匹配），行号指向规则所在行。"""
+        match = pattern.search(text)
+        if match is None:
+            return None
+        pos, end = match.span()
+        while pos < end and text[pos].isspace():
+            pos += 1
+        return pos
 
-        blocks = self._extract_marker_blocks(text, start, end)
-        if not blocks:
-            # 理论上 has_start/has_end 成立时不应为空，这里兜底处理为“部分标记”
-            return {"state": "partial", "summary": "检测到标记但无法提取完整配置块"}
-        if len(blocks) > 1:
-            return {"state": "duplicate", "summary": f"检测到重复配置块({len(blocks)}个)"}
+    @staticmethod
+    def _with_lines(found: dict[int, int], text: str) -> list[tuple[int, int]]:
+        """把 {规则序号: 位置} 换算为按位置排列的 (规则序号, 行号)。"""
+        hits: list[tuple[int, int]] = []
+        line = 1
+        line_pos = 0
+        for pos, idx in sorted((pos, idx) for idx, pos in found.items()):
+            line += text.count("\n", line_pos, pos)
+            line_pos = pos
+            hits.append((idx, line))
+        return hits
+
+    def scan(self, profile: str, text: str) -> list[tuple[EquivalenceRule, int]]:
+        """返回 profile 下每条命中规则的 (规则, 首次命中的行号)，按出现顺序排列。查找全部规则，不提前结束。"""
+        entry = self._state.get(profile)
+        if entry is None:
+            return []
+        compiled, rules, _groups = entry
+        found = {idx: pos for idx, pattern in enumerate(compiled) if (pos := self._find(pattern, text)) is not None}
+        return [(rules[idx], line) for idx, line in self._with_lines(found, text)]
+
+    def evaluate(self, profile: str, text: str) -> EquivalenceResult:
+        """判定是否等效；matches 只含求值过程中查找并命中的规则（判定为不等效时在第一个未满足的组处停止）。"""
+        entry = self._state.get(profile)
+        if entry is None:
+            return EquivalenceResult(False, "")
+        compiled, rules, groups = entry
+        found: dict[int, int] = {}
+        for members in groups:
+            for idx in members:
+                pos = self._find(compiled[idx], text)
+                if pos is not None:
+                    found[idx] = pos
+                    break
+            else:
+                matches = tuple((rules[idx].name, line) for idx, line in self._with_lines(found, text))
+                return EquivalenceResult(False, "", matches)
+        for idx, rule in enumerate(rules):
+            if rule.reason and idx not in found:
+                pos = self._find(compiled[idx], text)
+                if pos is not None:
+                    found[idx] = pos
+        matches = tuple((rules[idx].name, line) for idx, line in self._with_lines(found, text))
+        # 说明按规则定义顺序输出，同一说明只保留一次（站点规则可能与内置规则说明相同）
+        reasons = dict.fromkeys(rules[idx].reason for idx in sorted(found) if rules[idx].reason)
+        reason = "；".join(reasons) or _EQUIVALENCE_DEFAULT_REASONS.get(profile, "检测到 UTF-8 等效配置")
+        return EquivalenceResult(True, reason, matches)
+
+    def checker(self, profile: str) -> Callable[[str], EquivalenceResult]:
+        return functools.partial(self.evaluate, profile)
+
+
+EQUIVALENCE = EquivalenceEngine(DEFAULT_EQUIVALENCE_RULES)
+
+
+def _equivalent_powershell_profile(text: str) -> tuple[bool, str]:
+    """在无工具标记块时，保守判断 PowerShell profile 是否已做 UTF-8 等效配置。"""
+    result = EQUIVALENCE.evaluate("powershell", text)
+    return result.ok, result.reason
+
+
+def _equivalent_bashrc(text: str) -> tuple[bool, str]:
+    """在无工具标记块时，保守判断 bashrc 是否已做 UTF-8 等效配置。"""
+    result = EQUIVALENCE.evaluate("bash", text)
+    return result.ok, result.reason
+
+
+POWERSHELL_BLOCK_LINES = (
+    "chcp 65001 | Out-Null",
+    "[Console]::InputEncoding  = [System.Text.UTF8Encoding]::new()",
+    "[Console]::OutputEncoding = [System.Text.UTF8Encoding]::new()",
+    "$OutputEncoding = [System.Text.UTF8Encoding]::new()",
+    "$PSDefaultParameterValues['Get-Content:Encoding']    = 'utf8'",
+    "$PSDefaultParameterValues['Set-Content:Encoding']    = 'utf8'",
+    "$PSDefaultParameterValues['Add-Content:Encoding']    = 'utf8'",
+    "$PSDefaultParameterValues['Out-File:Encoding']       = 'utf8'",
+    "$PSDefaultParameterValues['Select-String:Encoding']  = 'utf8'",
+    "$PSDefaultParameterValues['Import-Csv:Encoding']     = 'utf8'",
+    "$PSDefaultParameterValues['Export-Csv:Encoding']     = 'utf8'",
+    "$PSDefaultParameterValues['*:Encoding']              = 'utf8'",
+    '$env:LANG = "zh_CN.UTF-8"',
+)
+
+BASH_BLOCK_LINES = (
+    'export LANG="zh_CN.UTF-8"',
+    'export LC_ALL="zh_CN.UTF-8"',
+    'export LC_CTYPE="zh_CN.UTF-8"',
+    'export LC_MESSAGES="zh_CN.UTF-8"',
+    'if command -v chcp >/dev/null 2>&1; then chcp 65001 >/dev/null 2>&1; fi',
+    "git config --global core.quotepath false",
+    "git config --global i18n.commitencoding utf-8",
+    "git config --global i18n.logoutputencoding utf-8",
+)
+
+
+def _documents_path(*parts: str) -> Path:
+    return Path.home().joinpath("Documents", *parts)
+
+
+def _vscode_settings_path() -> Path | None:
+    appdata = os.environ.get("APPDATA")
+    return Path(appdata) / "Code" / "User" / "settings.json" if appdata else None
+
+
+@dataclass(frozen=True)
+class ConfigTarget:
+    """一个受管理的配置目标：检测、写入、漂移分析、备份与恢复都遍历 CONFIG_TARGETS 完成。
+
+    - key：检测状态/界面行使用的键；backup_key：备份库中原始配置条目的键；step：配置/恢复步骤名（trace span）；
+    - exe_field / path_var：检测快照中的可执行文件字段、界面中的路径变量名；
+    - resolve_path：返回配置文件路径（运行时按环境变量计算）；
+    - kind 为 "marker" 的目标写入带标记的配置块：template 为标准模板，template_normalized 与
+      block_pattern 在模块加载时预先构建；equivalence 为无标记时使用的等效规则 profile（见 EquivalenceEngine）；
+    - requires_exe：未检测到可执行文件时是否跳过配置与恢复。
+    """
+
+    key: str
+    label: str
+    backup_key: str
+    step: str
+    exe_field: str
+    path_var: str
+    resolve_path: Callable[[], Path | None]
+    kind: str = "marker"
+    marker_start: str = ""
+    marker_end: str = ""
+    template: str = ""
+    equivalence: str = ""
+    file_desc: str = "配置文件"
+    requires_exe: bool = True
+    template_normalized: str = field(init=False, default="")
+    block_pattern: "re.Pattern[str] | None" = field(init=False, default=None)
+
+    def __post_init__(self) -> None:
+        if self.kind == "marker":
+            object.__setattr__(self, "template_normalized", _normalize_block_text(self.template))
+            pattern = re.compile(re.escape(self.marker_start) + r".*?" + re.escape(self.marker_end), re.DOTALL)
+            object.__setattr__(self, "block_pattern", pattern)
+
+
+def _marker_template(start: str, end: str, lines: Iterable[str]) -> str:
+    return "\n".join([start, *lines, end])
+
+
+CONFIG_TARGETS: tuple[ConfigTarget, ...] = (
+    ConfigTarget(
+        key="ps5",
+        label="Windows PowerShell 5.1",
+        backup_key="ps5",
+        step="ps5_profile",
+        exe_field="ps5_exe",
+        path_var="ps5_path_var",
+        resolve_path=lambda: _documents_path("WindowsPowerShell", "Microsoft.PowerShell_profile.ps1"),
+        marker_start=PROFILE_MARKER_START,
+        marker_end=PROFILE_MARKER_END,
+        template=_marker_template(PROFILE_MARKER_START, PROFILE_MARKER_END, POWERSHELL_BLOCK_LINES),
+        equivalence="powershell",
+    ),
+    ConfigTarget(
+        key="ps7",
+        label="PowerShell 7+",
+        backup_key="ps7",
+        step="ps7_profile",
+        exe_field="ps7_exe",
+        path_var="ps7_path_var",
+        resolve_path=lambda: _documents_path("PowerShell", "Microsoft.PowerShell_profile.ps1"),
+        marker_start=PROFILE_MARKER_START,
+        marker_end=PROFILE_MARKER_END,
+        template=_marker_template(PROFILE_MARKER_START, PROFILE_MARKER_END, POWERSHELL_BLOCK_LINES),
+        equivalence="powershell",
+    ),
+    ConfigTarget(
+        key="git",
+        label="Git Bash",
+        backup_key="git_bash",
+        step="git_bashrc",
+        exe_field="git_exe",
+        path_var="git_path_var",
+        resolve_path=lambda: Path.home() / ".bashrc",
+        marker_start=BASH_MARKER_START,
+        marker_end=BASH_MARKER_END,
+        template=_marker_template(BASH_MARKER_START, BASH_MARKER_END, BASH_BLOCK_LINES),
+        equivalence="bash",
+        file_desc="用户态配置文件",
+        # bash.exe 在执行前单独校验；未检测到 Git 时 ~/.bashrc 仍可能由工具写入过，恢复不依赖检测结果
+        requires_exe=False,
+    ),
+    ConfigTarget(
+        key="vscode",
+        label="Visual Studio Code",
+        backup_key="vscode",
+        step="vscode_settings",
+        exe_field="vscode_exe",
+        path_var="vscode_path_var",
+        resolve_path=_vscode_settings_path,
+        kind="vscode",
+    ),
+)
+TARGETS_BY_KEY: Mapping[str, ConfigTarget] = MappingProxyType({target.key: target for target in CONFIG_TARGETS})
+TARGETS_BY_BACKUP_KEY: Mapping[str, ConfigTarget] = MappingProxyType(
+    {target.backup_key: target for target in CONFIG_TARGETS}
+)
+MARKER_TARGETS: tuple[ConfigTarget, ...] = tuple(target for target in CONFIG_TARGETS if target.kind == "marker")
+TARGET_LABELS: Mapping[str, str] = MappingProxyType({target.key: target.label for target in CONFIG_TARGETS})
+
+
+_LOG_SEPARATOR_BAR = "-" * 24
+# 检测块的首尾分隔行 -> 日志文本框中的 mark 名称
+_LOG_BLOCK_MARKS = {
+    f"{_LOG_SEPARATOR_BAR} 检测开始 {_LOG_SEPARATOR_BAR}": "detect_start",
+    f"{_LOG_SEPARATOR_BAR} 检测结束 {_LOG_SEPARATOR_BAR}": "detect_end",
+}
+
+
+class DetectionCancelled(Exception):
+    """检测代次已被更新的代次取代。"""
+
+
+@dataclass(frozen=True)
+class DetectionSnapshot:
+    """一次检测代次的不可变结果；发布后 UI 与工作线程只读访问，无需加锁。"""
+
+    generation: int = 0
+    ps5_exe: Path | None = None
+    ps7_exe: Path | None = None
+    git_exe: Path | None = None
+    git_bashrc_path: Path | None = None
+    vscode_exe: Path | None = None
+    vscode_settings_path: Path | None = None
+    wt_exe: Path | None = None
+    cmd_exe: Path | None = None
+    profile_exists: Mapping[str, bool] = field(default_factory=lambda: _frozen_mapping({}))
+    shell_status: Mapping[str, bool] = field(default_factory=lambda: _frozen_mapping({}))
+    marker_detail: Mapping[str, str] = field(default_factory=lambda: _frozen_mapping({}))
+    tool_detail: Mapping[str, Mapping[str, object]] = field(default_factory=lambda: _frozen_mapping({}))
+    console_summary: str = ""
+    console_summary_short: str = ""
+    console_state: str = "未配置UTF-8"
+    console_available: int = 0
+    console_configured: int = 0
+    system_default_console: bool = True
+    has_original_backup: bool = False
+    logs: tuple[tuple[str, str], ...] = ()
+    elapsed: float = 0.0
+
+    @property
+    def availability(self) -> dict[str, bool]:
+        return {target.key: getattr(self, target.exe_field) is not None for target in CONFIG_TARGETS}
+
+
+class SnapshotStore:
+    """按代次发布检测快照：begin() 开启新代次（旧代次随即过期），publish() 原子替换当前快照。
+
+    current 为普通属性，引用替换在 CPython 中是原子操作，读取方无需加锁。
+    """
+
+    def __init__(self) -> None:
+        self._lock = threading.Lock()
+        self._latest = 0
+        self.current = DetectionSnapshot()
+
+    def begin(self) -> int:
+        with self._lock:
+            self._latest += 1
+            return self._latest
+
+    def is_stale(self, generation: int) -> bool:
+        return generation != self._latest
+
+    def publish(self, snapshot: DetectionSnapshot) -> bool:
+        """仅当快照属于最新代次时发布，返回是否发布成功。"""
+        with self._lock:
+            if snapshot.generation != self._latest or snapshot.generation <= self.current.generation:
+                return False
+            self.current = snapshot
+            return True
 
-        actual = self._normalize_block_text(blocks[0])
-        expected = self._normalize_block_text(expected_block)
-        if actual == expected:
-            return {"state": "ok", "summary": "与标准模板一致"}
 
-        # 生成简短差异摘要：定位首个不一致行
-        actual_lines = actual.split("\n")
-        expected_lines = expected.split("\n")
-        first_idx: int | None = None
-        for idx in range(max(len(actual_lines), len(expected_lines))):
-            a = actual_lines[idx] if idx < len(actual_lines) else "<缺失>"
-            e = expected_lines[idx] if idx < len(expected_lines) else "<多余>"
-            if a != e:
-                first_idx = idx
-                break
-        if first_idx is None:
-            summary = "与标准模板不一致"
-        else:
-            a = actual_lines[first_idx] if first_idx < len(actual_lines) else "<缺失>"
-            e = expected_lines[first_idx] if first_idx < len(expected_lines) else "<多余>"
-            summary = f"第{first_idx + 1}行不一致：期望 `{e}`，实际 `{a}`"
-        return {"state": "modified", "summary": summary}
+class SetupApp:
+    def __init__(
+        self,
+        root: tk.Tk,
+        startup_trace: bool = False,
+        registry: RegistryBackend | None = None,
+        debug: bool = False,
+    ) -> None:
+        self.root = root
+        # 启动耗时打点（--startup-trace）：模块加载起点 -> 首帧绘制 -> 首次检测完成
+        self._startup_marks: dict[str, float] | None = {} if startup_trace else None
+        self._trace_startup("import")
+        self.root.title("Code-encoding-fix 编码配置助手 v1.0.2 - 阿華(github:hellowind777)")
+        self._apply_app_icon()
+        # 默认窗口尺寸与最小尺寸同步下调，保持宽度不变、降低高度以更贴合 1080p 显示
+        self.root.geometry("820x750")
+        self.root.minsize(820, 750)
+        self.root.withdraw()
+        startup_config = self._init_state(registry, debug=debug)
 
-    def _detect_vscode_settings_drift(self) -> dict[str, object]:
-        """检测 Visual Studio Code settings.json 是否满足工具期望的 UTF-8 配置。"""
-        appdata = os.environ.get("APPDATA")
-        if not appdata:
-            return {"state": "missing", "summary": "无法定位 APPDATA"}
-        settings_path = Path(appdata) / "Code" / "User" / "settings.json"
-        cache_key = None
+        self.style = ttk.Style()
         try:
-            st = settings_path.stat()
-            cache_key = ('vscode_drift', str(settings_path), getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size)
-        except FileNotFoundError:
-            cache_key = ('vscode_drift', str(settings_path), 'missing')
-        except OSError:
-            cache_key = ('vscode_drift', str(settings_path), 'unreadable')
-        if cache_key and hasattr(self, '_detect_cache') and isinstance(self._detect_cache, dict):
-            cached = self._detect_cache.get(cache_key)
-            if cached is not None:
-                return cached
-        def _ret(d):
-            if cache_key and hasattr(self, '_detect_cache') and isinstance(self._detect_cache, dict):
-                if len(self._detect_cache) >= getattr(self, '_detect_cache_max', 64):
-                    self._detect_cache.clear()
-                self._detect_cache[cache_key] = d
-            return d
-        if not settings_path.exists():
-            return {"state": "missing", "summary": "未找到 settings.json"}
+            self.style.theme_use("vista")
+        except tk.TclError:
+            self.style.theme_use("clam")
 
-        try:
-            raw_text = settings_path.read_text(encoding="utf-8")
-        except Exception as exc:  # noqa: BLE001
-            return {"state": "unreadable", "summary": f"读取失败: {exc}"}
+        self._init_fonts(startup_config.get("ui_font"))
 
-        # 如果未写入过工具标记块，判定为“缺失”而非“漂移”（兼容旧版英文标记）
-        start_hits = any(m in raw_text for m in (VSCODE_MARKER_START, VSCODE_MARKER_START_LEGACY))
-        end_hits = any(m in raw_text for m in (VSCODE_MARKER_END, VSCODE_MARKER_END_LEGACY))
-        if not (start_hits and end_hits):
-            return {"state": "missing", "summary": "未检测到工具标记块"}
+        self.ps5_path_var = tk.StringVar()
+        self.ps7_path_var = tk.StringVar()
+        self.git_path_var = tk.StringVar()
+        self.vscode_path_var = tk.StringVar()
+        self.status_var = tk.StringVar(value="待检测 Git Bash / Visual Studio Code")
+        self.console_info_var = tk.StringVar(value="控制台编码：待检测")
+        self.tool_info_var = tk.StringVar(value="工具配置：待检测")
+        self.progress_var = tk.IntVar(value=0)
+        self._row_widgets: dict[str, dict[str, ttk.Widget]] = {}
 
-        data, err = self._load_json_relaxed(settings_path)
-        if err or not isinstance(data, dict):
-            return {"state": "unreadable", "summary": err or "解析失败"}
+        # 工作线程通过 _ui_call 投递回调，主线程用 after() 定时批量取出执行
+        self._ui_queue: "queue.SimpleQueue[tuple[Callable, tuple, dict]]" = queue.SimpleQueue()
+        self._ui_poll_ms = 15
+        # 日志先进入有界队列，再由主线程按批写入文本框；文本框只保留最近 _log_max_lines 行
+        self._log_max_lines = 5000
+        self._log_batch_max = 1000
+        self._log_poll_ms = 10
+        self._log_queue: deque[tuple[str, str, str | None]] = deque(maxlen=self._log_max_lines)
+        self._log_dropped = 0
 
-        issues: list[str] = []
-        # 1) files.encoding：允许大小写差异，但仍坚持 utf8（无 BOM）
-        if "files.encoding" not in data:
-            issues.append("缺少 `files.encoding`")
-        else:
-            enc = data.get("files.encoding")
-            if not isinstance(enc, str):
-                issues.append(f"`files.encoding` 当前={enc!r}，期望='utf8'")
-            elif enc.lower() != "utf8":
-                issues.append(f"`files.encoding` 当前={enc!r}，期望='utf8'")
+        self._build_layout()
+        self.root.after(self._ui_poll_ms, self._drain_ui_queue)
+        self.root.after(self._log_poll_ms, self._drain_log_queue)
+        self._apply_window_position()
+        self.root.protocol("WM_DELETE_WINDOW", self._on_close)
+        self.root.bind("<Map>", self._on_first_map, add="+")
+        self.root.deiconify()
+        self._trace_startup("layout")
+        # 窗口先出现，检测等非必要工作推迟到首帧之后的空闲时刻
+        self.root.after_idle(self._finish_startup)
 
-        # 2) autoGuessEncoding：必须为 true
-        if "files.autoGuessEncoding" not in data:
-            issues.append("缺少 `files.autoGuessEncoding`")
-        elif data.get("files.autoGuessEncoding") is not True:
-            issues.append(f"`files.autoGuessEncoding` 当前={data.get('files.autoGuessEncoding')!r}，期望=true")
+    @staticmethod
+    def _default_config_dir() -> Path:
+        return Path(os.environ.get("APPDATA", Path.home())) / "Code-encoding-fix"
 
-        # 3) 默认终端：允许等效 PowerShell（不同版本/命名）
-        if "terminal.integrated.defaultProfile.windows" not in data:
-            issues.append("缺少 `terminal.integrated.defaultProfile.windows`")
-        else:
-            prof = data.get("terminal.integrated.defaultProfile.windows")
-            if not isinstance(prof, str):
-                issues.append(f"`terminal.integrated.defaultProfile.windows` 当前={prof!r}，期望为 PowerShell")
-            elif "powershell" not in prof.lower():
-                issues.append(f"`terminal.integrated.defaultProfile.windows` 当前={prof!r}，期望为 PowerShell")
+    def _init_state(self, registry: RegistryBackend | None = None, debug: bool = False) -> dict:
+        """初始化与界面无关的状态（路径、缓存、注册表后端等），返回启动时读取的 config.json 内容。
 
-        env = data.get("terminal.integrated.env.windows")
-        if not isinstance(env, dict):
-            issues.append("缺少 `terminal.integrated.env.windows`")
-        else:
-            for ek, ev in (("LANG", "zh_CN.UTF-8"), ("LC_ALL", "zh_CN.UTF-8")):
-                v = env.get(ek)
-                if not self._is_utf8_locale_value(v):
-                    issues.append(f"`terminal.integrated.env.windows.{ek}` 当前={v!r}，期望为 UTF-8 locale（如 {ev!r}）")
+        无界面宿主（基准/端到端测试）可只调用此方法来复用检测与写入流程。
+        """
+        self._config_dir = self._default_config_dir()
+        self._config_path = self._config_dir / "config.json"
+        self._backup_root = self._config_path.parent / "backup"
+        # 原始配置与历史快照存放在内容寻址备份库中（见 BackupStore）
+        self._backups = BackupStore(self._backup_root)
+        if PROFILER.enabled and PROFILER.output_dir is None:
+            PROFILER.output_dir = self._backup_root / "profiles"
+        self._console_log_buffer: list[tuple[str, str]] = []
+        self._ps5_profile_path = TARGETS_BY_KEY["ps5"].resolve_path()
+        self._ps7_profile_path = TARGETS_BY_KEY["ps7"].resolve_path()
+        # 检测结果以不可变快照按代次发布；_ps5_exe/_git_exe 等均为快照的只读视图
+        self._snapshots = SnapshotStore()
+        self.is_running = False
+        # debug 为 True 时在检测日志中追加缓存统计等调试信息
+        self._debug = debug
+        # 检测结果缓存：键中已含文件 mtime/size，无需 TTL；安装位置与快捷方式在软件安装后会变化，按 TTL 过期
+        self._detect_cache = LruCache("detect", max_size=64)
+        self._registry_cache = LruCache("registry_install_locations", max_size=32, ttl=300.0)
+        self._shortcut_cache = LruCache("shortcut_targets", max_size=32, ttl=300.0)
+        # 最近一次后台检测的代次（无后台检测时为 None），由它结束时恢复按钮状态
+        self._detecting: int | None = None
+        # 恢复与快照时各目标文件相互独立，按目标并发读写；1 表示串行（基准对比用）
+        self._io_workers = 5
+        self._io_pool: tuple[int, object] | None = None
+        self._restore_progress = ProgressModel(self._set_progress)
+        # 注册表后端：Windows 为 winreg，其他平台/基准测试可用内存或 JSON 文件后端
+        self._registry = registry if registry is not None else create_registry_backend()
+
+        # 启动阶段只读取一次 config.json（字体缓存、路径探测提示）
+        startup_config = self._load_config_raw()
+        # 候选安装路径探测：并发 stat + 周期内未命中缓存，命中记录持久化到 config.json
+        self._prober = PathProber()
+        self._prober.load_hints(startup_config.get("probe_hints"))
+        # 站点自定义的等效规则（config.json 的 equivalence_rules），无效条目跳过并在启动日志中提示
+        self._equivalence_rule_errors = EQUIVALENCE.set_site_rules(startup_config.get("equivalence_rules"))
+        return startup_config
+
+    def _finish_startup(self) -> None:
+        # 先记录应用启动，再进行 Shell 路径检测，保证日志顺序符合直觉
+        self._log("应用已启动，准备检测 Shell 路径", "info")
+        for error in getattr(self, "_equivalence_rule_errors", ()):
+            self._log(f"config.json 中的等效规则已跳过（{error}）", "warning")
+        self._detect_all_paths_in_thread(log=True)
+        self._refresh_env_tool_labels()
+        self._update_restore_button_state()
+        self._refresh_start_button_state()
 
-        if not issues:
-            return {"state": "ok", "summary": "关键键值与期望一致"}
-        return _ret({"state": "modified", "summary": "；".join(issues[:3]) + ("；..." if len(issues) > 3 else "")})
+    def _on_first_map(self, event: tk.Event) -> None:
+        if event.widget is not self.root or self._startup_marks is None or "first_paint" in self._startup_marks:
+            return
+        # Map 之后的第一个空闲回调晚于 Tk 的重绘回调，近似为首帧绘制完成
+        self.root.after_idle(lambda: self._trace_startup("first_paint"))
 
-    def _detect_console_codepage_drift(self, expected_cp: int = 65001) -> list[str]:
-        """检测 HKCU\\Console 目标键的 CodePage 是否与期望一致，返回差异摘要列表。"""
-        diffs: list[str] = []
-        for label, path in self._console_targets():
-            key_name = self._console_key_from_path(path)
-            values = self._read_console_values(key_name)
-            current = None if not values else values.get("CodePage")
-            try:
-                current_int = int(current) if current is not None else None
-            except Exception:
-                current_int = None
-            if current_int is None:
-                diffs.append(f"{label}: 未检测到 CodePage（期望 {expected_cp}）")
-            elif current_int != expected_cp:
-                diffs.append(f"{label}: CodePage={current_int}（期望 {expected_cp}）")
-        return diffs
+    def _trace_startup(self, name: str) -> None:
+        marks = self._startup_marks
+        if marks is None or name in marks:
+            return
+        marks[name] = (time.perf_counter() - _STARTUP_T0) * 1000
+        if name == "detection":
+            parts = "，".join(f"{key} {value:.0f} ms" for key, value in marks.items())
+            print(f"[startup-trace] {parts}", flush=True)
+            self._log(f"启动耗时：{parts}", "info")
 
-    def _log_config_drift_report(self) -> None:
-        """输出“哪些内容被手动更改”的差异提示（用于启动自动检测与手动重新检测）。"""
-        labels = {
-            "ps5": "Windows PowerShell 5.1",
-            "ps7": "PowerShell 7+",
-            "git": "Git Bash",
-            "vscode": "Visual Studio Code",
-        }
-        availability = {
-            "ps5": getattr(self, "_ps5_available", False),
-            "ps7": getattr(self, "_ps7_available", False),
-            "git": self._git_exe is not None,
-            "vscode": bool(getattr(self, "_vscode_available", False)),
-        }
+    def _apply_app_icon(self) -> None:
+        """为窗口/任务栏设置应用图标（优先使用同目录的 .ico）。"""
+        if not sys.platform.startswith("win"):
+            return
 
-        # 先触发一次检测，确保 detail 缓存可用
-        self._detect_shell_config_status()
-        details: dict[str, dict[str, object]] = getattr(self, "_tool_config_detail", {})
+        base_dir = Path(getattr(sys, "_MEIPASS", Path(__file__).resolve().parent))
+        icon_path = base_dir / "Code-encoding-fix.ico"
+        if not icon_path.exists():
+            return
 
-        console_lines: list[tuple[str, str]] = []
+        try:
+            self.root.iconbitmap(default=str(icon_path))
+        except tk.TclError:
+            return
 
-        # 控制台编码漂移：仅在“看起来曾执行过配置”时强调期望为 UTF-8
-        should_expect_utf8 = bool(self._console_reg_backup_path.exists()) or self._has_any_original_backup()
-        if should_expect_utf8:
-            console_diffs = self._detect_console_codepage_drift(expected_cp=65001)
-            for diff in console_diffs:
-                console_lines.append(("warning", f"控制台编码: {diff}"))
+    def _reset_to_system_default(self) -> None:
+        """恢复控制台 CodePage 到系统默认（不依赖备份），不再改写环境变量。"""
+        if self.is_running:
+            return
+        confirm = self._show_modal(
+            "恢复系统默认编码(控制台配置)",
+            "将删除控制台编码恢复到当前系统语言默认编码(936)，不再改写环境变量。\n\n是否继续？",
+            kind="confirm",
+            confirm_text="继续",
+            cancel_text="取消",
+        )
+        if not confirm:
+            return
+        self.is_running = True
+        self._set_buttons_state(False)
+        threading.Thread(target=self._run_reset_default, daemon=True).start()
 
-        # 输出顺序：工具摘要（缺失/漂移）→ 控制台编码（漂移/缺失）
-        # ===== 工具配置与控制台编码 =====
-        # 漂移日志分级：missing 不视为手动改动，partial 可自动清理
-        def _level_for_state(s):
-            if s in ('ok',):
-                return 'success'
-            if s in ('missing',):
-                return 'warning'
-            if s in ('partial', 'duplicate', 'modified'):
-                return 'warning'
-            if s in ('unreadable', 'error'):
-                return 'error'
-            return 'info'
+    @PROFILER.profiled("reset_default")
+    def _run_reset_default(self) -> None:
+        actions: list[tuple[str, str]] = []
+        try:
+            default_lang, default_lc_all, default_cp = self._system_default_locale()
 
-        def _brief_state(item):
-            if not isinstance(item, dict):
-                return '未检测'
-            s = str(item.get('state') or 'unknown')
-            summary = str(item.get('summary') or '').strip()
-            if s == 'ok':
-                return 'utf-8编码已正确配置'
-            if s == 'missing':
-                return '未检测到 UTF-8 配置（可能被删除或尚未配置）'
-            if s == 'partial':
-                return '残缺标记（可自动清理）'
-            if s == 'duplicate':
-                return '重复块（将自动去重）'
-            if s == 'modified':
-                return '已偏离（执行时将覆盖修复）'
-            if s == 'unreadable':
-                return '不可读取'
-            return s
+            self._log_separator("恢复系统默认(不含工具)开始")
+            self._log("控制台编码：", "info")
 
-        for key, label in (
-            ("ps5", "Windows PowerShell 5.1"),
-            ("ps7", "PowerShell 7+"),
-            ("git", "Git Bash"),
-            ("vscode", "Visual Studio Code"),
-        ):
-            if not availability.get(key):
-                continue
-            item = details.get(key) if isinstance(details, dict) else None
-            state = str((item or {}).get('state') or 'unknown')
-            self._log(f"{label}: { _brief_state(item) }", _level_for_state(state))
+            console_logs = self._set_console_codepage_all(default_cp)
+            for level, message in console_logs:
+                self._log(message, level)
+            self._log_separator("恢复系统默认(不含工具)结束")
+
+            # 刷新检测与状态（在当前工作线程生成新快照，界面刷新由快照发布后统一完成）
+            self._detect_all_paths(log=False)
+        except Exception as exc:  # noqa: BLE001
+            self._log(f"恢复系统默认失败(不含工具): {exc}", "error")
+        finally:
+            self.is_running = False
+            self._ui_call(self._set_buttons_state, True)
+            rs = self._runtime_status()
+            console_lines = rs.get("console", [])
+            summary_parts = [
+                "恢复系统默认完成(不含工具)。",
+                "",
+                "当前控制台编码：",
+            ]
+            summary_parts.extend([f"• {line}" for line in console_lines] or ["• 未检测到控制台状态"])
+            summary = "\n".join(summary_parts)
+            self._ui_call(self._show_modal, "完成", summary, "info")
 
-        if console_lines:
-            for level, message in console_lines:
-                self._log(f"• {message}", level)
-    def _vscode_backup_path(self) -> Path:
-        # 采用与其他备份一致的固定命名
-        return self._backup_root / "vscode.orig"
+    def _pick_ui_font_family(self, cached: object = None) -> str:
+        # 避免指定西文字体导致中文回退（出现“字体不一致/中文发虚”）
+        candidates = [
+            "Microsoft YaHei UI",
+            "Microsoft YaHei",
+            "微软雅黑",
+            "Segoe UI",
+        ]
 
-    def _system_default_locale(self) -> tuple[str, str, int]:
-        """获取系统默认的 LANG/LC_ALL/CodePage，失败时回退到 936。"""
-        try:
-            # Python 3.15 将移除 getdefaultlocale()，改用 setlocale/getlocale/getencoding 系列 API
+        # 优先使用 config.json 中缓存的结果：只解析单个字体，避免枚举全部字体（字体多时很慢）
+        if isinstance(cached, str) and cached in candidates:
             try:
-                locale.setlocale(locale.LC_ALL, "")
+                if str(tkfont.Font(root=self.root, family=cached).actual("family")).lower() == cached.lower():
+                    return cached
             except Exception:
                 pass
-            lang, enc = locale.getlocale() or (None, None)
+
+        try:
+            families = set(tkfont.families(self.root))
         except Exception:
-            lang, enc = (None, None)
-        if not lang:
-            fallback_lang = os.environ.get("LANG", "")
-            lang = fallback_lang.split(".", 1)[0] if fallback_lang else "zh_CN"
-        cp: int | None = None
+            families = set()
+
+        for family in candidates:
+            if family in families:
+                self._save_config_values(ui_font=family)
+                return family
+
         try:
-            cp = int(ctypes.windll.kernel32.GetACP())
+            return tkfont.nametofont("TkDefaultFont").cget("family")
+        except Exception:
+            return "TkDefaultFont"
+
+    def _init_fonts(self, cached_family: object = None) -> None:
+        self.ui_font_family = self._pick_ui_font_family(cached_family)
+
+        try:
+            default_font = tkfont.nametofont("TkDefaultFont")
+            self.ui_font_size = int(default_font.cget("size"))
+            default_font.configure(family=self.ui_font_family)
+        except Exception:
+            self.ui_font_size = 10
+
+        try:
+            self.style.configure(".", font=(self.ui_font_family, self.ui_font_size))
+        except Exception:
+            pass
+
+        # 显式字体（保持原字号，仅替换 family）
+        self.font_title = (self.ui_font_family, 16, "bold")
+        self.font_subtitle = (self.ui_font_family, 10)
+        self.font_log = (self.ui_font_family, 10)
+
+    def _build_layout(self) -> None:
+        header = ttk.Frame(self.root, padding="12 8")
+        header.pack(fill="x")
+        ttk.Label(
+            header,
+            text="Code-encoding-fix 编码配置助手",
+            font=self.font_title,
+        ).pack(anchor="center")
+        ttk.Label(
+            header,
+            text="一键修复Codex for Windows 运行乱码问题，完成 工具/shell UTF-8 编码配置",
+            font=self.font_subtitle,
+            foreground="#555",
+        ).pack(anchor="center", pady=(1, 0))
+
+        path_frame = ttk.LabelFrame(self.root, text="工具配置", padding="8")
+        path_frame.pack(fill="x", padx=12, pady=4)
+        path_frame.columnconfigure(1, weight=1)
+
+        row_idx = 0
+        for target in CONFIG_TARGETS:
+            row_idx = self._build_shell_row(
+                parent=path_frame,
+                key=target.key,
+                label_text=target.label,
+                var=getattr(self, target.path_var),
+                open_cmd=lambda key=target.key: self._open_path(key),
+                start_row=row_idx,
+                readonly=target.kind == "vscode",
+            )
+
+        console_frame = ttk.LabelFrame(self.root, text="控制台配置", padding="8")
+        console_frame.pack(fill="x", padx=12, pady=(2, 4))
+        ttk.Label(console_frame, textvariable=self.console_info_var, foreground="#444").pack(anchor="w")
+
+        # 状态摘要条（独立放置在语言环境分区下方）
+        status_frame = ttk.Frame(self.root, padding="10 2")
+        status_frame.pack(fill="x", padx=0, pady=(0, 4))
+        self.admin_label = ttk.Label(status_frame, textvariable=self.status_var, foreground="#0063b1")
+        self.admin_label.pack(side="left", anchor="w")
+        ttk.Button(status_frame, text="重新检测", command=lambda: self._detect_all_paths_in_thread(log=True)).pack(side="right")
+
+        progress_frame = ttk.Frame(self.root, padding="12 2 12 0")
+        progress_frame.pack(fill="x")
+        ttk.Label(progress_frame, text="执行进度").pack(anchor="w")
+        self.progress = ttk.Progressbar(progress_frame, variable=self.progress_var, maximum=100)
+        self.progress.pack(fill="x", pady=4)
+
+        control_row = ttk.Frame(progress_frame)
+        control_row.pack(fill="x", pady=(1, 0))
+        self.start_btn = ttk.Button(control_row, text="开始执行配置", command=self._start_setup)
+        self.start_btn.pack(side="left")
+        self.reset_default_btn = ttk.Button(
+            control_row,
+            text="恢复系统默认编码(控制台配置)",
+            width=24,
+            command=self._reset_to_system_default,
+        )
+        self.reset_default_btn.pack(side="left", padx=(8, 0))
+        self.restore_btn = ttk.Button(
+            control_row,
+            text="恢复已备份配置",
+            width=20,
+            command=self._restore_configs,
+        )
+        self.restore_btn.pack(side="left", padx=(8, 0))
+        ttk.Button(control_row, text="退出", command=self.root.destroy).pack(side="right")
+        self.backup_btn = ttk.Button(
+            control_row,
+            text="备份目录",
+            command=self._open_backup_dir,
+        )
+        self.backup_btn.pack(side="right", padx=(0, 8))
+
+        log_frame = ttk.LabelFrame(self.root, text="日志输出", padding="12")
+        log_frame.pack(fill="both", expand=True, padx=12, pady=4)
+        self.log_text = scrolledtext.ScrolledText(
+            log_frame, height=10, state="disabled", font=self.font_log
+        )
+        self.log_text.pack(fill="both", expand=True)
+        self.log_text.tag_config("info", foreground="#222")
+        self.log_text.tag_config("success", foreground="#0b6e35")
+        self.log_text.tag_config("warning", foreground="#b8860b")
+        self.log_text.tag_config("error", foreground="#b00020")
+        # 右键菜单：清空日志
+        self.log_menu = tk.Menu(self.root, tearoff=0)
+        self.log_menu.add_command(label="清空日志", command=self._clear_log)
+        self.log_text.bind("<Button-3>", self._show_log_menu)
+
+        # 底部留白以保证布局呼吸感
+        ttk.Frame(self.root, height=2).pack(fill="x")
+
+    def _build_shell_row(
+        self,
+        parent: ttk.Frame,
+        key: str,
+        label_text: str,
+        var: tk.StringVar,
+        open_cmd,
+        start_row: int,
+        readonly: bool = False,
+    ) -> None:
+        ttk.Label(parent, text=label_text + ":", width=22).grid(
+            row=start_row, column=0, sticky="e", padx=(0, 6), pady=(2, 0)
+        )
+        entry = ttk.Entry(parent, textvariable=var, state="readonly" if readonly else "normal")
+        entry.grid(row=start_row, column=1, sticky="we", padx=(0, 6), pady=(2, 0))
+        btn = ttk.Button(parent, text="打开", command=open_cmd, width=8)
+        btn.grid(row=start_row, column=2, sticky="e", padx=(0, 0), pady=(2, 0))
+
+        status_full = ttk.Label(parent, text="", foreground="#444", anchor="w", justify="left", wraplength=620)
+        status_full.grid(row=start_row + 1, column=1, columnspan=2, sticky="w", pady=(0, 4))
+
+        self._row_widgets[key] = {"entry": entry, "btn": btn, "status_full": status_full}
+        return start_row + 2
+
+    def _update_console_state_label(self) -> None:
+        """主线程：用当前快照中的控制台状态刷新标签（注册表读取已在检测线程完成）。"""
+        snapshot = self._snapshots.current
+        status_label = snapshot.console_state
+        summary_full = snapshot.console_summary or "待检测"
+        summary_short = snapshot.console_summary_short
+        self._console_summary_short = summary_short
+        self._console_summary_list = summary_short.split(" ") if summary_short else []
+        self._console_config_status = status_label
+        self.console_info_var.set(f"控制台编码：{summary_full}")
+
+    def _refresh_env_tool_labels(self) -> None:
+        # 语言环境改由注册表 CodePage 控制，实时显示当前检测结果
+        # 语言环境提示已合并到控制台状态，不再单独显示
+        self._env_summary_short = ""
+        self._env_status_short = ""
+
+        # 可执行文件与 settings.json 是否存在均取自检测快照，避免在主线程做文件系统访问
+        snapshot = self._snapshots.current
+        settings_path = snapshot.vscode_settings_path
+        vscode_path_display = snapshot.vscode_exe
+        if settings_path and snapshot.profile_exists.get("vscode", False):
+            exe_part = f"{vscode_path_display}" if vscode_path_display else None
+            if exe_part:
+                self.tool_info_var.set(f"已检测到 Visual Studio Code: {exe_part}")
+            else:
+                self.tool_info_var.set("已检测到 Visual Studio Code")
+            self.vscode_path_var.set(str(settings_path))
+        else:
+            self.tool_info_var.set("未检测到 Visual Studio Code，请在安装后再次执行配置")
+            self.vscode_path_var.set("未检测到 Visual Studio Code，请在安装后再次执行配置")
+
+    def _append_console_logs(self, messages: list[tuple[str, str]]) -> None:
+        if not messages:
+            return
+        self._console_log_buffer.extend(messages)
+
+    def _file_marker_status(self, path: Path | None, start: str, end: str) -> str:
+        """
+        返回标记状态:
+        - "full": 同时存在 start/end
+        - "partial": 仅存在 start 或 end
+        - "none": 未检测到
+        - "error": 读取失败
+        """
+        if not path:
+            return "none"
+        try:
+            if not path.exists():
+                return "none"
+            text = path.read_text(encoding="utf-8", errors="ignore")
+        except OSError as exc:
+            try:
+                self._log(f"读取 {path} 失败: {exc}", "warning")
+            except Exception:
+                pass
+            return "error"
+        has_start = start in text
+        has_end = end in text
+        if has_start and has_end:
+            return "full"
+        if has_start or has_end:
+            return "partial"
+        return "none"
+
+    _normalize_block_text = staticmethod(_normalize_block_text)
+
+    @staticmethod
+    def _extract_marker_blocks(
+        text: str, start: str, end: str, pattern: "re.Pattern[str] | None" = None
+    ) -> list[str]:
+        """提取由 start/end 包裹的所有配置块（包含 start/end 行本身）；已知目标可传入预编译的 pattern。"""
+        if pattern is None:
+            pattern = re.compile(re.escape(start) + r".*?" + re.escape(end), re.DOTALL)
+        return pattern.findall(text)
+
+    @staticmethod
+    def _expected_powershell_block() -> str:
+        """当前工具写入 PowerShell Profile 的标准配置块（含标记）。"""
+        return TARGETS_BY_KEY["ps5"].template
+
+    @staticmethod
+    def _expected_bash_block() -> str:
+        """当前工具写入 Git Bash ~/.bashrc 的标准配置块（含标记）。"""
+        return TARGETS_BY_KEY["git"].template
+
+    @staticmethod
+    def _is_utf8_locale_value(value: object) -> bool:
+        if not isinstance(value, str):
+            return False
+        return bool(re.search(r"utf-?8", value, flags=re.IGNORECASE))
+
+    _equivalent_powershell_profile = staticmethod(_equivalent_powershell_profile)
+    _equivalent_bashrc = staticmethod(_equivalent_bashrc)
+
+    @TRACER.traced("detect.analyze_marker_block", "detect")
+    def _analyze_marker_block(
+        self,
+        path: Path | None,
+        start: str,
+        end: str,
+        expected_block: str,
+        equivalent_check: Callable[[str], tuple[bool, str] | EquivalenceResult] | None = None,
+        *,
+        pattern: "re.Pattern[str] | None" = None,
+        expected_normalized: str | None = None,
+    ) -> dict[str, object]:
+        """分析配置文件中工具生成的配置块是否存在漂移（被手动改动/重复/截断）。
+
+        pattern / expected_normalized 为注册表目标预先构建的正则与归一化模板，省去每次检测的重复计算。
+        """
+        if not path:
+            return {"state": "missing", "summary": "未定位到配置文件路径"}
+        try:
+            if not path.exists():
+                return {"state": "missing", "summary": "配置文件不存在"}
+            text = path.read_text(encoding="utf-8", errors="ignore")
+        except OSError as exc:
+            self._log(f"读取 {path} 失败: {exc}", "warning")
+            return {"state": "unreadable", "summary": "读取失败"}
+
+        has_start = start in text
+        has_end = end in text
+        if not has_start and not has_end:
+            if equivalent_check:
+                result = equivalent_check(text)
+                if isinstance(result, EquivalenceResult):
+                    ok, reason, matched = result.ok, result.reason, [list(m) for m in result.matches]
+                else:
+                    (ok, reason), matched = result, []
+                if ok:
+                    suffix = f"：{reason}" if reason else ""
+                    return {"state": "ok", "summary": f"等效配置已存在（无工具标记块）{suffix}", "matched": matched}
+                # 无标记且未命中等效 UTF-8 配置：对用户更友好的摘要，避免误导为“仅缺少标记”
+                return {"state": "missing", "summary": "未发现 UTF-8 配置", "matched": matched}
+            return {"state": "missing", "summary": "未检测到配置块标记"}
+        if has_start ^ has_end:
+            return {"state": "partial", "summary": "检测到部分标记(可能被截断)"}
+
+        blocks = self._extract_marker_blocks(text, start, end, pattern)
+        if not blocks:
+            # 理论上 has_start/has_end 成立时不应为空，这里兜底处理为“部分标记”
+            return {"state": "partial", "summary": "检测到标记但无法提取完整配置块"}
+        if len(blocks) > 1:
+            return {"state": "duplicate", "summary": f"检测到重复配置块({len(blocks)}个)"}
+
+        actual = self._normalize_block_text(blocks[0])
+        expected = expected_normalized if expected_normalized is not None else self._normalize_block_text(expected_block)
+        if actual == expected:
+            return {"state": "ok", "summary": "与标准模板一致"}
+
+        # 生成简短差异摘要：定位首个不一致行
+        actual_lines = actual.split("\n")
+        expected_lines = expected.split("\n")
+        first_idx: int | None = None
+        for idx in range(max(len(actual_lines), len(expected_lines))):
+            a = actual_lines[idx] if idx < len(actual_lines) else "<缺失>"
+            e = expected_lines[idx] if idx < len(expected_lines) else "<多余>"
+            if a != e:
+                first_idx = idx
+                break
+        if first_idx is None:
+            summary = "与标准模板不一致"
+        else:
+            a = actual_lines[first_idx] if first_idx < len(actual_lines) else "<缺失>"
+            e = expected_lines[first_idx] if first_idx < len(expected_lines) else "<多余>"
+            summary = f"第{first_idx + 1}行不一致：期望 `{e}`，实际 `{a}`"
+        return {"state": "modified", "summary": summary}
+
+    def _detect_vscode_settings_drift(self) -> dict[str, object]:
+        """检测 Visual Studio Code settings.json 是否满足工具期望的 UTF-8 配置。"""
+        settings_path = TARGETS_BY_KEY["vscode"].resolve_path()
+        if not settings_path:
+            return {"state": "missing", "summary": "无法定位 APPDATA"}
+        cache_key = None
+        try:
+            st = settings_path.stat()
+            cache_key = ('vscode_drift', str(settings_path), getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size)
+        except FileNotFoundError:
+            cache_key = ('vscode_drift', str(settings_path), 'missing')
+        except OSError:
+            cache_key = ('vscode_drift', str(settings_path), 'unreadable')
+        cached = self._detect_cache_get(cache_key)
+        if cached is not None:
+            return cached
+        def _ret(d):
+            self._detect_cache_put(cache_key, d)
+            return d
+        if not settings_path.exists():
+            return {"state": "missing", "summary": "未找到 settings.json"}
+
+        try:
+            raw_text = settings_path.read_text(encoding="utf-8")
+        except Exception as exc:  # noqa: BLE001
+            return {"state": "unreadable", "summary": f"读取失败: {exc}"}
+
+        # 如果未写入过工具标记块，判定为“缺失”而非“漂移”（兼容旧版英文标记）
+        start_hits = any(m in raw_text for m in (VSCODE_MARKER_START, VSCODE_MARKER_START_LEGACY))
+        end_hits = any(m in raw_text for m in (VSCODE_MARKER_END, VSCODE_MARKER_END_LEGACY))
+        if not (start_hits and end_hits):
+            return {"state": "missing", "summary": "未检测到工具标记块"}
+
+        data, err = self._load_json_relaxed(settings_path)
+        if err or not isinstance(data, dict):
+            return {"state": "unreadable", "summary": err or "解析失败"}
+
+        issues: list[str] = []
+        # 1) files.encoding：允许大小写差异，但仍坚持 utf8（无 BOM）
+        if "files.encoding" not in data:
+            issues.append("缺少 `files.encoding`")
+        else:
+            enc = data.get("files.encoding")
+            if not isinstance(enc, str):
+                issues.append(f"`files.encoding` 当前={enc!r}，期望='utf8'")
+            elif enc.lower() != "utf8":
+                issues.append(f"`files.encoding` 当前={enc!r}，期望='utf8'")
+
+        # 2) autoGuessEncoding：必须为 true
+        if "files.autoGuessEncoding" not in data:
+            issues.append("缺少 `files.autoGuessEncoding`")
+        elif data.get("files.autoGuessEncoding") is not True:
+            issues.append(f"`files.autoGuessEncoding` 当前={data.get('files.autoGuessEncoding')!r}，期望=true")
+
+        # 3) 默认终端：允许等效 PowerShell（不同版本/命名）
+        if "terminal.integrated.defaultProfile.windows" not in data:
+            issues.append("缺少 `terminal.integrated.defaultProfile.windows`")
+        else:
+            prof = data.get("terminal.integrated.defaultProfile.windows")
+            if not isinstance(prof, str):
+                issues.append(f"`terminal.integrated.defaultProfile.windows` 当前={prof!r}，期望为 PowerShell")
+            elif "powershell" not in prof.lower():
+                issues.append(f"`terminal.integrated.defaultProfile.windows` 当前={prof!r}，期望为 PowerShell")
+
+        env = data.get("terminal.integrated.env.windows")
+        if not isinstance(env, dict):
+            issues.append("缺少 `terminal.integrated.env.windows`")
+        else:
+            for ek, ev in (("LANG", "zh_CN.UTF-8"), ("LC_ALL", "zh_CN.UTF-8")):
+                v = env.get(ek)
+                if not self._is_utf8_locale_value(v):
+                    issues.append(f"`terminal.integrated.env.windows.{ek}` 当前={v!r}，期望为 UTF-8 locale（如 {ev!r}）")
+
+        if not issues:
+            return {"state": "ok", "summary": "关键键值与期望一致"}
+        return _ret({"state": "modified", "summary": "；".join(issues[:3]) + ("；..." if len(issues) > 3 else "")})
+
+    def _detect_console_codepage_drift(
+        self, expected_cp: int = 65001, snapshot: DetectionSnapshot | None = None
+    ) -> list[str]:
+        """检测 HKCU\\Console 目标键的 CodePage 是否与期望一致，返回差异摘要列表。"""
+        diffs: list[str] = []
+        for label, path in self._console_targets(snapshot):
+            key_name = self._console_key_from_path(path)
+            values = self._read_console_values(key_name)
+            current = None if not values else values.get("CodePage")
+            try:
+                current_int = int(current) if current is not None else None
+            except Exception:
+                current_int = None
+            if current_int is None:
+                diffs.append(f"{label}: 未检测到 CodePage（期望 {expected_cp}）")
+            elif current_int != expected_cp:
+                diffs.append(f"{label}: CodePage={current_int}（期望 {expected_cp}）")
+        return diffs
+
+    def _config_drift_report_lines(self, snapshot: DetectionSnapshot) -> list[tuple[str, str]]:
+        """生成“哪些内容被手动更改”的差异提示行（用于启动自动检测与手动重新检测）。"""
+        availability = snapshot.availability
+        details = snapshot.tool_detail
+        lines: list[tuple[str, str]] = []
+
+        console_lines: list[tuple[str, str]] = []
+
+        # 控制台编码漂移：仅在“看起来曾执行过配置”时强调期望为 UTF-8
+        should_expect_utf8 = self._has_any_original_backup()
+        if should_expect_utf8:
+            console_diffs = self._detect_console_codepage_drift(expected_cp=65001, snapshot=snapshot)
+            for diff in console_diffs:
+                console_lines.append(("warning", f"控制台编码: {diff}"))
+
+        # 输出顺序：工具摘要（缺失/漂移）→ 控制台编码（漂移/缺失）
+        # ===== 工具配置与控制台编码 =====
+        # 漂移日志分级：missing 不视为手动改动，partial 可自动清理
+        def _level_for_state(s):
+            if s in ('ok',):
+                return 'success'
+            if s in ('missing',):
+                return 'warning'
+            if s in ('partial', 'duplicate', 'modified'):
+                return 'warning'
+            if s in ('unreadable', 'error'):
+                return 'error'
+            return 'info'
+
+        def _brief_state(item):
+            if not isinstance(item, Mapping):
+                return '未检测'
+            s = str(item.get('state') or 'unknown')
+            summary = str(item.get('summary') or '').strip()
+            if s == 'ok':
+                return 'utf-8编码已正确配置'
+            if s == 'missing':
+                return '未检测到 UTF-8 配置（可能被删除或尚未配置）'
+            if s == 'partial':
+                return '残缺标记（可自动清理）'
+            if s == 'duplicate':
+                return '重复块（将自动去重）'
+            if s == 'modified':
+                return '已偏离（执行时将覆盖修复）'
+            if s == 'unreadable':
+                return '不可读取'
+            return s
+
+        for target in CONFIG_TARGETS:
+            if not availability.get(target.key):
+                continue
+            item = details.get(target.key)
+            state = str((item or {}).get('state') or 'unknown')
+            lines.append((_level_for_state(state), f"{target.label}: { _brief_state(item) }"))
+
+        for level, message in console_lines:
+            lines.append((level, f"• {message}"))
+        return lines
+
+    @staticmethod
+    def _system_default_locale() -> tuple[str, str, int]:
+        """获取系统默认的 LANG/LC_ALL/CodePage，失败时回退到 936。"""
+        try:
+            # Python 3.15 将移除 getdefaultlocale()，改用 setlocale/getlocale/getencoding 系列 API
+            try:
+                locale.setlocale(locale.LC_ALL, "")
+            except Exception:
+                pass
+            lang, enc = locale.getlocale() or (None, None)
+        except Exception:
+            lang, enc = (None, None)
+        if not lang:
+            fallback_lang = os.environ.get("LANG", "")
+            lang = fallback_lang.split(".", 1)[0] if fallback_lang else "zh_CN"
+        cp: int | None = None
+        try:
+            cp = int(ctypes.windll.kernel32.GetACP())
         except Exception:
             cp = None
         if cp is None:
             try:
-                enc_pref = locale.getpreferredencoding(False)
-                m = re.search(r"(\\d{3,5})", enc_pref or "")
-                if m:
-                    cp = int(m.group(1))
+                enc_pref = locale.getpreferredencoding(False)
+                m = re.search(r"(\\d{3,5})", enc_pref or "")
+                if m:
+                    cp = int(m.group(1))
+            except Exception:
+                cp = None
+        if cp is None:
+            cp = 936
+        encoding = enc or f"cp{cp}"
+        lang_val = f"{lang}.{encoding}"
+        lc_all_val = lang_val
+        return lang_val, lc_all_val, cp
+
+    def _is_system_default_env(self, snapshot: DetectionSnapshot | None = None) -> bool:
+        """判断当前 LANG/LC_ALL/CHCP 与控制台 CodePage 是否均为系统默认（读注册表，需在工作线程调用）。"""
+        _, _, default_cp = self._system_default_locale()
+        env_ok = True  # 语言环境不再依赖环境变量
+
+        def _console_ok(cp_expected: int) -> bool:
+            for _label, path in self._console_targets(snapshot):
+                values = self._read_console_values(self._console_key_from_path(path))
+                if values is None:
+                    continue  # 视为默认
+                code = values.get("CodePage")
+                if code is None:
+                    continue
+                if code != cp_expected:
+                    return False
+            return True
+
+        return env_ok and _console_ok(default_cp)
+
+    @staticmethod
+    def _strip_json_comments_and_trailing_commas(text: str) -> str:
+        """去除注释/尾逗号并清理非法控制字符，避免误删字符串内的 //。"""
+        out: list[str] = []
+        i = 0
+        in_str = False
+        esc = False
+        while i < len(text):
+            ch = text[i]
+            nxt = text[i + 1] if i + 1 < len(text) else ""
+            if not in_str and ch == "/" and nxt == "/":
+                # 行注释，跳到行末
+                i = text.find("\n", i)
+                if i == -1:
+                    break
+                out.append("\n")
+                i += 1
+                continue
+            if not in_str and ch == "/" and nxt == "*":
+                # 块注释
+                end = text.find("*/", i + 2)
+                i = end + 2 if end != -1 else len(text)
+                continue
+            out.append(ch)
+            if ch == "\"" and not esc:
+                in_str = not in_str
+            esc = (ch == "\\" and not esc and in_str)
+            i += 1
+        cleaned = "".join(out)
+        cleaned = re.sub(r",\s*([}\]])", r"\1", cleaned)  # 尾随逗号
+        cleaned = re.sub(r"[\x00-\x08\x0B\x0C\x0E-\x1F]", "", cleaned)  # 清理控制字符（保留 \t\r\n）
+        return cleaned
+
+    def _append_vscode_block(self, raw_text: str, preserved_custom_lines: list[str] | None = None) -> tuple[str, bool, str | None]:
+        """删除冲突键后在末尾追加统一块；保留原注释和行序，并尽量保留用户在标记块中的自定义键。
+
+        返回 (新文本, 是否写入, 错误消息)；错误时不改动原文本。
+        """
+        marker_start = VSCODE_MARKER_START
+        marker_end = VSCODE_MARKER_END
+        marker_start_candidates = (VSCODE_MARKER_START, VSCODE_MARKER_START_LEGACY)
+        marker_end_candidates = (VSCODE_MARKER_END, VSCODE_MARKER_END_LEGACY)
+        # 历史版本可能存在文案差异；重复执行时需一并清理，避免残留“仅注释块”
+        orphan_comment_lines = {
+            VSCODE_MARKER_START,
+            VSCODE_MARKER_END,
+            VSCODE_MARKER_START_LEGACY,
+            VSCODE_MARKER_END_LEGACY,
+            "// 自动猜测编码以兼容混合文件",
+            "// 终端默认使用 PowerShell",
+            "// VS Code 终端环境：统一 UTF-8",
+            "// Visual Studio Code 终端环境：统一 UTF-8",
+        }
+        expected_lines_set = {
+            f'    "files.encoding": "utf8",',
+            f"    // 自动猜测编码以兼容混合文件",
+            f'    "files.autoGuessEncoding": true,',
+            f"    // 终端默认使用 PowerShell",
+            f'    "terminal.integrated.defaultProfile.windows": "PowerShell",',
+            f"    // Visual Studio Code 终端环境：统一 UTF-8",
+            f'    "terminal.integrated.env.windows": {{',
+            f'        "LANG": "zh_CN.UTF-8",',
+            f'        "LC_ALL": "zh_CN.UTF-8"',
+            f"    }}",
+        }
+        preserved_custom_lines = preserved_custom_lines or []
+
+        newline = "\r\n" if "\r\n" in raw_text else "\n"
+
+        target_keys = [
+            '"files.encoding"',
+            '"files.autoGuessEncoding"',
+            '"terminal.integrated.defaultProfile.windows"',
+        ]
+        target_env_key = '"terminal.integrated.env.windows"'
+
+        # 1) 优先移除完整标记块（包含 start/end 行），解决重复块/旧块残留问题，
+        #    同时保留用户在标记块内额外添加的键/注释，稍后再插回去。
+        lines = raw_text.splitlines(keepends=True)
+        cleaned_lines: list[str] = []
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            if any(m in line for m in marker_start_candidates):
+                j = i + 1
+                while j < len(lines) and not any(m in lines[j] for m in marker_end_candidates):
+                    j += 1
+                if j < len(lines) and any(m in lines[j] for m in marker_end_candidates):
+                    # 收集自定义行（非预期行）以便后续保留（保留原始换行与缩进）
+                    for ln in lines[i + 1 : j]:
+                        stripped = ln.strip()
+                        if stripped and stripped not in expected_lines_set and stripped not in orphan_comment_lines:
+                            preserved_custom_lines.append(ln)
+                    # 跳过整个块
+                    i = j + 1
+                    continue
+            cleaned_lines.append(line)
+            i += 1
+
+        # 2) 清理残缺块的可识别片段（仅删除工具可识别的标记/注释行，避免误伤用户配置）
+        lines = [ln for ln in cleaned_lines if ln.strip() not in orphan_comment_lines]
+
+        new_lines: list[str] = []
+        in_env = False
+        brace_depth = 0
+
+        for line in lines:
+            stripped = line.strip()
+            if in_env:
+                brace_depth += line.count("{") - line.count("}")
+                if brace_depth <= 0:
+                    in_env = False
+                continue
+            if any(k in stripped for k in target_keys):
+                continue
+            if target_env_key in stripped:
+                in_env = True
+                brace_depth = line.count("{") - line.count("}")
+                if brace_depth <= 0:
+                    in_env = False
+                continue
+            new_lines.append(line)
+
+        closing_idx = None
+        for i in range(len(new_lines) - 1, -1, -1):
+            if "}" in new_lines[i]:
+                closing_idx = i
+                break
+        if closing_idx is None:
+            return raw_text, False, "settings.json 缺少结束大括号"
+
+        insert_pos = closing_idx
+        j = closing_idx - 1
+        while j >= 0:
+            t = new_lines[j].strip()
+            if t == "" or t.startswith("//"):
+                j -= 1
+                continue
+            if not t.endswith(",") and t not in ("{", "["):
+                new_lines[j] = new_lines[j].rstrip("\n").rstrip() + ",\n"
+            break
+
+        env_lines = [
+            f'        "LANG": "zh_CN.UTF-8",{newline}',
+            f'        "LC_ALL": "zh_CN.UTF-8"{newline}',
+        ]
+        block = [
+            f"    {marker_start}{newline}",
+            f'    "files.encoding": "utf8",{newline}',
+            f"    // 自动猜测编码以兼容混合文件{newline}",
+            f'    "files.autoGuessEncoding": true,{newline}',
+            f"    // 终端默认使用 PowerShell{newline}",
+            f'    "terminal.integrated.defaultProfile.windows": "PowerShell",{newline}',
+            f"    // Visual Studio Code 终端环境：统一 UTF-8{newline}",
+            f'    "terminal.integrated.env.windows": {{{newline}',
+            *env_lines,
+            f"    }}{newline}",
+            f"    {marker_end}{newline}",
+            *preserved_custom_lines,
+        ]
+
+        new_lines = new_lines[:insert_pos] + block + new_lines[insert_pos:]
+        new_text = "".join(new_lines)
+        changed = new_text != raw_text
+        return new_text, changed, None
+
+    def _remove_vscode_block(self, raw_text: str) -> tuple[str, bool, str | None]:
+        """移除 VS Code 工具标记块及关联键，确保恢复后文件无残留。"""
+        marker_start_candidates = (VSCODE_MARKER_START, VSCODE_MARKER_START_LEGACY)
+        marker_end_candidates = (VSCODE_MARKER_END, VSCODE_MARKER_END_LEGACY)
+        orphan_comment_lines = {
+            VSCODE_MARKER_START,
+            VSCODE_MARKER_END,
+            VSCODE_MARKER_START_LEGACY,
+            VSCODE_MARKER_END_LEGACY,
+            "// 自动猜测编码以兼容混合文件",
+            "// 终端默认使用 PowerShell",
+            "// VS Code 终端环境：统一 UTF-8",
+            "// Visual Studio Code 终端环境：统一 UTF-8",
+        }
+        lines = raw_text.splitlines(keepends=True)
+        cleaned_lines: list[str] = []
+        i = 0
+        while i < len(lines):
+            line = lines[i]
+            if any(m in line for m in marker_start_candidates):
+                j = i + 1
+                while j < len(lines) and not any(m in lines[j] for m in marker_end_candidates):
+                    j += 1
+                if j < len(lines) and any(m in lines[j] for m in marker_end_candidates):
+                    i = j + 1
+                    continue
+            cleaned_lines.append(line)
+            i += 1
+
+        new_lines = [ln for ln in cleaned_lines if ln.strip() not in orphan_comment_lines]
+
+        # 如果末尾出现多余逗号，移除以保证 JSON 合法
+        stripped_nonempty = [(idx, ln) for idx, ln in enumerate(new_lines) if ln.strip() and not ln.strip().startswith("//")]
+        if stripped_nonempty:
+            last_idx, last_line = stripped_nonempty[-1]
+            if last_line.strip().endswith(","):
+                new_lines[last_idx] = last_line.rstrip().rstrip(",") + ("\n" if last_line.endswith("\n") else "")
+
+        new_text = "".join(new_lines)
+        return new_text, new_text != raw_text, None
+
+    @TRACER.traced("detect.load_json_relaxed", "detect")
+    def _load_json_relaxed(self, path: Path) -> tuple[dict | None, str | None]:
+        """宽松解析 Visual Studio Code settings.json，失败返回错误信息且不写入。"""
+        try:
+            raw = path.read_text(encoding="utf-8")
+        except Exception as exc:  # noqa: BLE001
+            return None, f"读取 {path} 失败: {exc}"
+        # 1) 严格解析
+        try:
+            return json.loads(raw), None
+        except Exception:
+            pass
+        # 2) 清理注释/尾逗号/控制字符后严格解析
+        cleaned = self._strip_json_comments_and_trailing_commas(raw)
+        try:
+            return json.loads(cleaned), None
+        except Exception:
+            pass
+        # 3) 清理后 strict=False 解析（放宽控制字符限制）
+        try:
+            return json.loads(cleaned, strict=False), None
+        except Exception:
+            pass
+        # 4) 将残余控制字符转义为 \\uXXXX 再 strict=False 解析
+        escaped = re.sub(r"[\x00-\x1F]", lambda m: "\\u%04x" % ord(m.group(0)), cleaned)
+        try:
+            return json.loads(escaped, strict=False), None
+        except Exception as exc:  # noqa: BLE001
+            return None, f"解析 {path} 失败: {exc}"
+
+    def _read_user_env_reg(self, name: str) -> str | None:
+        try:
+            val = self._registry.read_value("HKCU", "Environment", name)
+        except Exception:
+            return None
+        return None if val is None else str(val)
+
+    def _read_user_env(self, name: str) -> str | None:
+        """优先读取 HKCU\\Environment 的持久值，再回退进程环境变量。"""
+        reg_val = self._read_user_env_reg(name)
+        if reg_val is not None and reg_val != "":
+            return reg_val
+        env_val = os.environ.get(name)
+        return env_val if env_val else None
+
+    def _apply_vscode_settings(self, apply: bool, log: bool = True) -> None:
+        """合并/恢复 Visual Studio Code 用户级 UTF-8 配置。"""
+        appdata = os.environ.get("APPDATA")
+        if not appdata:
+            if log:
+                self._log("无法定位 APPDATA，跳过 Visual Studio Code 设置", "warning")
+            return
+        if apply and not getattr(self, "_vscode_available", False):
+            if log:
+                self._log("未检测到 Visual Studio Code，可执行文件缺失，跳过 UTF-8 设置", "warning")
+            return
+        settings_path = TARGETS_BY_KEY["vscode"].resolve_path()
+        target_dir = settings_path.parent
+        target_dir.mkdir(parents=True, exist_ok=True)
+
+        if apply:
+            if settings_path.exists() and not self._backups.has_original("vscode"):
+                try:
+                    raw_for_backup = settings_path.read_text(encoding="utf-8")
+                    cleaned_backup, changed_backup, _ = self._remove_vscode_block(raw_for_backup)
+                    backup_data = (cleaned_backup if changed_backup else raw_for_backup).encode("utf-8")
+                except Exception:
+                    backup_data = settings_path.read_bytes()
+                self._backups.set_original("vscode", backup_data)
+                if log:
+                    self._log(f"已创建 Visual Studio Code 原始配置备份: {self._backup_root}", "info")
+            raw_text = settings_path.read_text(encoding="utf-8") if settings_path.exists() else "{\n}\n"
+            new_text, changed, err = self._append_vscode_block(raw_text)
+            if err:
+                if log:
+                    level = "warning" if "解析失败" in err else "info"
+                    self._log(f"Visual Studio Code 设置未写入：{err}", level)
+                return
+            if changed:
+                settings_path.write_text(new_text, encoding="utf-8")
+                if log:
+                    self._log(f"已写入 Visual Studio Code UTF-8 用户设置: {settings_path}", "success")
+            else:
+                if log:
+                    self._log("Visual Studio Code UTF-8 设置已存在，无需追加", "info")
+        else:
+            original = self._backups.original("vscode")
+            restored_data: bytes | None = None
+            if original is not None:
+                try:
+                    restored_data = self._backups.load(original) or b""
+                except BackupIntegrityError as exc:
+                    # 备份损坏时拒绝覆盖用户当前配置
+                    self._vscode_restore_result = "backup-corrupt"
+                    if log:
+                        self._log(f"Visual Studio Code 原始配置备份校验失败，已拒绝恢复: {exc}", "error")
+                    return
+            if restored_data is not None:
+                settings_path.write_bytes(restored_data)
+                self._backups.clear_originals(["vscode"])
+                try:
+                    restored_text = settings_path.read_text(encoding="utf-8")
+                    cleaned_text, changed, err = self._remove_vscode_block(restored_text)
+                    if not err and changed:
+                        settings_path.write_text(cleaned_text, encoding="utf-8")
+                        self._vscode_restore_result = "restored-cleaned"
+                        if log:
+                            self._log("Visual Studio Code 已从原始配置备份恢复并清理工具块残留", "info")
+                    else:
+                        self._vscode_restore_result = "restored"
+                        if log:
+                            self._log("Visual Studio Code 已从原始配置备份恢复", "info")
+                except Exception as exc:  # noqa: BLE001
+                    self._vscode_restore_result = "restored"
+                    if log:
+                        self._log(f"Visual Studio Code 已恢复，但清理工具块时出错: {exc}", "warning")
+            else:
+                # 无备份时，清理残留工具块与键值，保持当前用户配置
+                self._vscode_restore_result = "no-backup"
+                if settings_path.exists():
+                    try:
+                        text_current = settings_path.read_text(encoding="utf-8")
+                        cleaned_text, changed, err = self._remove_vscode_block(text_current)
+                        if not err and changed:
+                            settings_path.write_text(cleaned_text, encoding="utf-8")
+                            self._vscode_restore_result = "cleaned-no-backup"
+                            if log:
+                                self._log("未找到原始备份，已清理 VS Code 工具块残留", "info")
+                        elif log:
+                            self._log("未找到原始备份，VS Code 配置未改动", "warning")
+                    except Exception as exc:  # noqa: BLE001
+                        if log:
+                            self._log(f"未找到原始备份，清理 VS Code 配置失败: {exc}", "warning")
+                elif log:
+                    self._log("未找到原始备份且当前无配置文件，跳过 VS Code 恢复", "warning")
+
+    def _flush_console_logs(self) -> None:
+        if not self._console_log_buffer:
+            return
+        for level, message in self._console_log_buffer:
+            self._log(message, level)
+        self._console_log_buffer.clear()
+
+    def _console_targets(self, snapshot: DetectionSnapshot | None = None) -> list[tuple[str, Path]]:
+        """控制台注册表目标（来自同一检测快照，避免读取到不同代次的路径）。"""
+        snap = snapshot or self._snapshots.current
+        targets: list[tuple[str, Path]] = []
+        if snap.ps5_exe:
+            targets.append(("Windows PowerShell 5.1", snap.ps5_exe))
+        if snap.ps7_exe:
+            targets.append(("PowerShell 7+", snap.ps7_exe))
+        if snap.wt_exe:
+            targets.append(("Windows Terminal", snap.wt_exe))
+        if snap.cmd_exe:
+            targets.append(("CMD", snap.cmd_exe))
+        return targets
+
+    @TRACER.traced("detect.windows_terminal", "detect")
+    def _find_windows_terminal(self) -> Path | None:
+        candidates: list[Path] = []
+        wt_from_path = shutil.which("wt.exe")
+        if wt_from_path:
+            candidates.append(Path(wt_from_path))
+        local = Path(os.environ.get("LOCALAPPDATA", "")) / "Microsoft" / "WindowsApps" / "wt.exe"
+        candidates.append(local)
+        program_files = Path(os.environ.get("ProgramFiles", r"C:\Program Files"))
+        candidates.append(program_files / "WindowsApps" / "Microsoft.WindowsTerminal_8wekyb3d8bbwe" / "wt.exe")
+        return self._prober.first_existing("wt", candidates)
+
+    @staticmethod
+    def _console_key_from_path(path: Path) -> str:
+        sanitized = str(path).replace(":", "").replace("\\", "_").replace(" ", "_")
+        return sanitized
+
+    def _load_console_reg_backup(self) -> dict:
+        original = self._backups.original("shell_reg")
+        if original is None:
+            return {}
+        try:
+            return json.loads((self._backups.load(original) or b"{}").decode("utf-8"))
+        except BackupIntegrityError as exc:
+            self._log(f"控制台编码原始配置备份校验失败，将按无备份处理: {exc}", "error")
+            return {}
+        except Exception:
+            return {}
+
+    def _read_console_values(self, key_name: str) -> dict | None:
+        try:
+            return self._registry.read_values("HKCU", "Console\\" + key_name)
+        except Exception as exc:  # noqa: BLE001
+            self._log(f"读取控制台注册表失败: {exc}", "warning")
+            return None
+
+    def _write_console_values(self, key_name: str, values: dict) -> None:
+        # 多个值一次打开键写入
+        self._registry.write_values("HKCU", "Console\\" + key_name, values)
+
+    def _delete_console_key(self, key_name: str) -> None:
+        self._registry.delete_key("HKCU", "Console\\" + key_name)
+
+    def _set_console_codepage_all(self, codepage: int) -> list[tuple[str, str]]:
+        """强制将所有控制台目标的 CodePage 写为指定值（忽略备份），用于恢复系统默认。"""
+        outputs: list[tuple[str, str]] = []
+        with self._registry.cycle():
+            outputs.extend(self._set_console_codepage_targets(codepage))
+        return outputs
+
+    def _set_console_codepage_targets(self, codepage: int) -> list[tuple[str, str]]:
+        outputs: list[tuple[str, str]] = []
+        for label, path in self._console_targets():
+            key_name = self._console_key_from_path(path)
+            try:
+                self._write_console_values(key_name, {"CodePage": codepage})
+                outputs.append(("success", f"{label} 已写入系统默认 CodePage {codepage}"))
+            except PermissionError as exc:  # noqa: BLE001
+                outputs.append(("error", f"{label} 写入系统默认 CodePage 失败（权限不足）: {exc}"))
+            except Exception as exc:  # noqa: BLE001
+                outputs.append(("error", f"{label} 写入系统默认 CodePage 失败: {exc}"))
+        return outputs
+
+    def _update_console_codepage(
+        self, apply_utf8: bool, *, emit_log: bool = True, fallback_cp: int | None = None
+    ) -> list[tuple[str, str]]:
+        # 同一轮写入复用注册表句柄
+        with self._registry.cycle():
+            return self._update_console_codepage_targets(apply_utf8, emit_log=emit_log, fallback_cp=fallback_cp)
+
+    def _update_console_codepage_targets(
+        self, apply_utf8: bool, *, emit_log: bool, fallback_cp: int | None
+    ) -> list[tuple[str, str]]:
+        reg_backup_loaded = self._load_console_reg_backup()
+        outputs: list[tuple[str, str]] = []
+        reg_backup_new = {}
+        for label, path in self._console_targets():
+            key_name = self._console_key_from_path(path)
+            try:
+                if apply_utf8:
+                    existing = self._read_console_values(key_name) or {}
+                    # 仅备份 CodePage，避免覆盖用户字体设置
+                    reg_backup_new[key_name] = {"CodePage": existing.get("CodePage")} if existing else "__EMPTY_BACKUP__"
+                    self._write_console_values(key_name, {"CodePage": 65001})
+                    outputs.append(("success", f"{label} 控制台已设置为 UTF-8 代码页"))
+                else:
+                    backup = reg_backup_loaded.get(key_name, None)
+                    if backup == "__EMPTY_BACKUP__":
+                        if fallback_cp is not None:
+                            self._write_console_values(key_name, {"CodePage": fallback_cp})
+                            outputs.append(("info", f"{label} 原始未配置UTF-8，已写入系统默认 CodePage {fallback_cp}"))
+                        else:
+                            self._delete_console_key(key_name)
+                            outputs.append(("info", f"{label} 原始未配置UTF-8，已清理当前设置"))
+                    elif isinstance(backup, dict):
+                        self._write_console_values(key_name, backup)
+                        outputs.append(("success", f"{label} 控制台已恢复到原始设置"))
+                    else:
+                        if fallback_cp is not None:
+                            self._write_console_values(key_name, {"CodePage": fallback_cp})
+                            outputs.append(("warning", f"{label} 未找到原始配置备份，已写入系统默认 CodePage {fallback_cp}"))
+                        else:
+                            self._delete_console_key(key_name)
+                            outputs.append(("warning", f"{label} 未找到原始配置备份，已清理为系统默认"))
+            except PermissionError as exc:  # noqa: BLE001
+                outputs.append(("error", f"{label} 控制台写入失败（权限不足）: {exc}"))
+            except Exception as exc:  # noqa: BLE001
+                outputs.append(("error", f"{label} 控制台写入失败: {exc}"))
+        if apply_utf8:
+            try:
+                # 仅在首次执行时写入原始备份；后续执行不覆盖，确保“恢复配置”始终回到首次执行前状态
+                self._backups.set_original("shell_reg", json.dumps(reg_backup_new, ensure_ascii=False, indent=2).encode("utf-8"))
             except Exception:
-                cp = None
-        if cp is None:
-            cp = 936
-        encoding = enc or f"cp{cp}"
-        lang_val = f"{lang}.{encoding}"
-        lc_all_val = lang_val
-        return lang_val, lc_all_val, cp
+                pass
+        if emit_log:
+            for level, message in outputs:
+                self._log(message, level)
+        return outputs
 
-    def _is_system_default_env(self) -> bool:
-        """判断当前 LANG/LC_ALL/CHCP 与控制台 CodePage 是否均为系统默认。"""
-        _, _, default_cp = self._system_default_locale()
-        env_ok = True  # 语言环境不再依赖环境变量
+    def _console_status_summary(self, short: bool = False, snapshot: DetectionSnapshot | None = None) -> str:
+        sep = " " if short else "；"
+        return sep.join(self._console_status_parts(snapshot))
 
-        def _console_ok(cp_expected: int) -> bool:
-            for _label, path in self._console_targets():
-                values = self._read_console_values(self._console_key_from_path(path))
-                if values is None:
-                    continue  # 视为默认
-                code = values.get("CodePage")
-                if code is None:
-                    continue
-                if code != cp_expected:
-                    return False
-            return True
+    def _console_status_parts(self, snapshot: DetectionSnapshot | None = None) -> list[str]:
+        """逐个控制台读取注册表 CodePage 生成状态片段（读注册表，需在工作线程调用）。"""
+        snap = snapshot or self._snapshots.current
 
-        return env_ok and _console_ok(default_cp)
+        def label(name: str) -> str:
+            return name
 
-    @staticmethod
-    def _strip_json_comments_and_trailing_commas(text: str) -> str:
-        """去除注释/尾逗号并清理非法控制字符，避免误删字符串内的 //。"""
-        out: list[str] = []
-        i = 0
-        in_str = False
-        esc = False
-        while i < len(text):
-            ch = text[i]
-            nxt = text[i + 1] if i + 1 < len(text) else ""
-            if not in_str and ch == "/" and nxt == "/":
-                # 行注释，跳到行末
-                i = text.find("\n", i)
-                if i == -1:
-                    break
-                out.append("\n")
-                i += 1
-                continue
-            if not in_str and ch == "/" and nxt == "*":
-                # 块注释
-                end = text.find("*/", i + 2)
-                i = end + 2 if end != -1 else len(text)
+        statuses: list[str] = []
+
+        # Windows PowerShell 5.1
+        if snap.ps5_exe:
+            key_name = self._console_key_from_path(snap.ps5_exe)
+            values = self._read_console_values(key_name)
+            if values and values.get("CodePage") == 65001:
+                statuses.append(f"{label('Windows PowerShell 5.1')}=UTF-8")
+            elif values and values.get("CodePage"):
+                cp = values.get("CodePage")
+                prefix = "UTF-8" if cp == 65001 else f"{cp}"
+                statuses.append(f"{label('Windows PowerShell 5.1')}={prefix}")
+            else:
+                statuses.append(f"{label('Windows PowerShell 5.1')}=未配置UTF-8")
+        else:
+            statuses.append(f"{label('Windows PowerShell 5.1')}=未检测到")
+
+        # PowerShell 7+
+        if snap.ps7_exe:
+            key_name = self._console_key_from_path(snap.ps7_exe)
+            values = self._read_console_values(key_name)
+            if values and values.get("CodePage") == 65001:
+                statuses.append(f"{label('PowerShell 7+')}=UTF-8")
+            elif values and values.get("CodePage"):
+                cp = values.get("CodePage")
+                prefix = "UTF-8" if cp == 65001 else f"{cp}"
+                statuses.append(f"{label('PowerShell 7+')}={prefix}")
+            else:
+                statuses.append(f"{label('PowerShell 7+')}=未配置UTF-8")
+        else:
+            statuses.append(f"{label('PowerShell 7+')}=未安装")
+
+        # Windows Terminal
+        wt_path = snap.wt_exe
+        if wt_path:
+            key_name = self._console_key_from_path(wt_path)
+            values = self._read_console_values(key_name)
+            if values and values.get("CodePage") == 65001:
+                statuses.append(f"{label('Windows Terminal')}=UTF-8")
+            elif values and values.get("CodePage"):
+                cp = values.get("CodePage")
+                prefix = "UTF-8" if cp == 65001 else f"{cp}"
+                statuses.append(f"{label('Windows Terminal')}={prefix}")
+            else:
+                statuses.append(f"{label('Windows Terminal')}=未配置UTF-8")
+        else:
+            statuses.append(f"{label('Windows Terminal')}=未检测到")
+
+        # CMD 状态单独追加
+        cmd_cp, cmd_available = self._detect_cmd_codepage()
+        if not cmd_available:
+            statuses.append(f"{label('CMD')}=未检测到")
+        elif cmd_cp == 65001:
+            statuses.append(f"{label('CMD')}=65001")
+        elif cmd_cp:
+            statuses.append(f"{label('CMD')}={cmd_cp}")
+        else:
+            statuses.append(f"{label('CMD')}=未配置UTF-8")
+
+        return statuses
+
+    def _runtime_status(self) -> dict[str, object]:
+        """汇总控制台编码、标记完整度与缓存统计，供状态栏/弹窗与 --status-json 复用。"""
+        console_list = [part.strip() for part in self._console_status_summary().split("；") if part.strip()]
+        marker_detail = getattr(self, "_shell_marker_detail", {})
+        marker_lines: list[str] = []
+        for key, marker in marker_detail.items():
+            label = TARGET_LABELS.get(key, key)
+            if marker in {"ok", "full"}:
+                marker_lines.append(f"{label}: 配置一致")
+            elif marker == "partial":
+                marker_lines.append(f"{label}: 标记不完整，建议重新配置")
+            elif marker == "duplicate":
+                marker_lines.append(f"{label}: 检测到重复配置块，建议重新配置")
+            elif marker == "modified":
+                marker_lines.append(f"{label}: 检测到配置被改动，建议重新配置")
+            elif marker in {"unreadable", "error"}:
+                marker_lines.append(f"{label}: 读取/解析失败，详见日志")
+            else:
+                marker_lines.append(f"{label}: 未检测到工具配置")
+        return {"console": console_list, "markers": marker_lines, "caches": self._cache_stats()}
+
+    def _env_status_summary(self) -> str:
+        """占位：不再单独显示。"""
+        return ""
+
+    def _console_config_state(self, details: bool = False, snapshot: DetectionSnapshot | None = None):
+        """返回控制台配置状态：
+        - status: 已全部配置UTF-8 / 已部分配置UTF-8 / 未配置UTF-8
+        - available: 可检测的终端数量
+        - configured: 已配置为 65001 的数量
+        """
+        available = 0
+        configured = 0
+        for _label, path in self._console_targets(snapshot):
+            key_name = self._console_key_from_path(path)
+            values = self._read_console_values(key_name)
+            if values is None:
                 continue
-            out.append(ch)
-            if ch == "\"" and not esc:
-                in_str = not in_str
-            esc = (ch == "\\" and not esc and in_str)
-            i += 1
-        cleaned = "".join(out)
-        cleaned = re.sub(r",\s*([}\]])", r"\1", cleaned)  # 尾随逗号
-        cleaned = re.sub(r"[\x00-\x08\x0B\x0C\x0E-\x1F]", "", cleaned)  # 清理控制字符（保留 \t\r\n）
-        return cleaned
+            available += 1
+            if values.get("CodePage") == 65001:
+                configured += 1
+        if available == 0:
+            status = "未配置UTF-8"
+        elif configured == available:
+            status = "已全部配置UTF-8"
+        elif configured > 0:
+            status = "已部分配置UTF-8"
+        else:
+            status = "未配置UTF-8"
+        return (status, available, configured) if details else status
 
-    def _append_vscode_block(self, raw_text: str, preserved_custom_lines: list[str] | None = None) -> tuple[str, bool, str | None]:
-        """删除冲突键后在末尾追加统一块；保留原注释和行序，并尽量保留用户在标记块中的自定义键。
+    @TRACER.traced("detect.cmd_codepage", "detect")
+    def _detect_cmd_codepage(self) -> tuple[int | None, bool]:
+        """检测当前 CMD 默认代码页，返回 (codepage, cmd_available)。
 
-        返回 (新文本, 是否写入, 错误消息)；错误时不改动原文本。
+        优先读取注册表 HKCU\\Environment\\CHCP（setx 写入的值，代表新开 CMD 默认值），
+        再尝试 `cmd /c chcp` 输出，最后回退环境变量 CHCP。
+        cmd_available 表示是否成功调用到 CMD 或取得任一来源信息。
         """
-        marker_start = VSCODE_MARKER_START
-        marker_end = VSCODE_MARKER_END
-        marker_start_candidates = (VSCODE_MARKER_START, VSCODE_MARKER_START_LEGACY)
-        marker_end_candidates = (VSCODE_MARKER_END, VSCODE_MARKER_END_LEGACY)
-        # 历史版本可能存在文案差异；重复执行时需一并清理，避免残留“仅注释块”
-        orphan_comment_lines = {
-            VSCODE_MARKER_START,
-            VSCODE_MARKER_END,
-            VSCODE_MARKER_START_LEGACY,
-            VSCODE_MARKER_END_LEGACY,
-            "// 自动猜测编码以兼容混合文件",
-            "// 终端默认使用 PowerShell",
-            "// VS Code 终端环境：统一 UTF-8",
-            "// Visual Studio Code 终端环境：统一 UTF-8",
-        }
-        expected_lines_set = {
-            f'    "files.encoding": "utf8",',
-            f"    // 自动猜测编码以兼容混合文件",
-            f'    "files.autoGuessEncoding": true,',
-            f"    // 终端默认使用 PowerShell",
-            f'    "terminal.integrated.defaultProfile.windows": "PowerShell",',
-            f"    // Visual Studio Code 终端环境：统一 UTF-8",
-            f'    "terminal.integrated.env.windows": {{',
-            f'        "LANG": "zh_CN.UTF-8",',
-            f'        "LC_ALL": "zh_CN.UTF-8"',
-            f"    }}",
-        }
-        preserved_custom_lines = preserved_custom_lines or []
+        cmd_available = False
+        # 0) HKCU\Console 对 cmd.exe 的 CodePage（本工具主要写入点）
+        try:
+            cmd_path = Path(os.environ.get("SystemRoot", r"C:\Windows")) / "System32" / "cmd.exe"
+            if cmd_path.exists():
+                key = self._console_key_from_path(cmd_path)
+                values = self._read_console_values(key)
+                if values and values.get("CodePage"):
+                    return int(values.get("CodePage")), True
+        except Exception:
+            pass
+        # 1) registry (preferred, reflects setx 持久值)
+        val = self._read_user_env_reg("CHCP")
+        if val is not None and val.isdigit():
+            return int(val), True
+        try:
+            result = subprocess.run(
+                ["cmd", "/c", "chcp"],
+                capture_output=True,
+                text=True,
+                check=False,
+            )
+            output = (result.stdout or result.stderr or "").strip()
+            # 兼容中英文输出，提取数字
+            match = re.search(r"(\d{3,5})", output)
+            if match:
+                cmd_available = True
+                return int(match.group(1)), True
+            cmd_available = True
+        except Exception:
+            pass
+        env_cp = os.environ.get("CHCP")
+        if env_cp and env_cp.isdigit():
+            return int(env_cp), True
+        return None, cmd_available
 
-        newline = "\r\n" if "\r\n" in raw_text else "\n"
+    def _all_consoles_utf8(self) -> bool:
+        snapshot = self._snapshots.current
+        return snapshot.console_available > 0 and snapshot.console_configured == snapshot.console_available
+
+    def _collect_console_state(self, snapshot: DetectionSnapshot) -> dict[str, object]:
+        """检测线程：一次性读取控制台注册表/CMD 代码页/备份状态，作为快照字段。"""
+        parts = self._console_status_parts(snapshot)
+        state, available, configured = self._console_config_state(details=True, snapshot=snapshot)
+        return {
+            "console_summary": "；".join(parts),
+            "console_summary_short": " ".join(parts),
+            "console_state": state,
+            "console_available": available,
+            "console_configured": configured,
+            "system_default_console": self._is_system_default_env(snapshot),
+            "has_original_backup": self._has_any_original_backup(),
+        }
 
-        target_keys = [
-            '"files.encoding"',
-            '"files.autoGuessEncoding"',
-            '"terminal.integrated.defaultProfile.windows"',
-        ]
-        target_env_key = '"terminal.integrated.env.windows"'
+    def _show_admin_warning(self, message: str) -> None:
+        """管理员权限提示对话框，相对主窗口水平居中且垂直偏上。"""
+        dialog = tk.Toplevel(self.root)
+        dialog.title("需要管理员权限")
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+        dialog.grab_set()
 
-        # 1) 优先移除完整标记块（包含 start/end 行），解决重复块/旧块残留问题，
-        #    同时保留用户在标记块内额外添加的键/注释，稍后再插回去。
-        lines = raw_text.splitlines(keepends=True)
-        cleaned_lines: list[str] = []
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            if any(m in line for m in marker_start_candidates):
-                j = i + 1
-                while j < len(lines) and not any(m in lines[j] for m in marker_end_candidates):
-                    j += 1
-                if j < len(lines) and any(m in lines[j] for m in marker_end_candidates):
-                    # 收集自定义行（非预期行）以便后续保留（保留原始换行与缩进）
-                    for ln in lines[i + 1 : j]:
-                        stripped = ln.strip()
-                        if stripped and stripped not in expected_lines_set and stripped not in orphan_comment_lines:
-                            preserved_custom_lines.append(ln)
-                    # 跳过整个块
-                    i = j + 1
-                    continue
-            cleaned_lines.append(line)
-            i += 1
+        # 简单两行布局：左侧图标，右侧文本，下方“确定”按钮
+        content = ttk.Frame(dialog, padding="16 12")
+        content.grid(row=0, column=0, sticky="nsew")
+        dialog.columnconfigure(0, weight=1)
 
-        # 2) 清理残缺块的可识别片段（仅删除工具可识别的标记/注释行，避免误伤用户配置）
-        lines = [ln for ln in cleaned_lines if ln.strip() not in orphan_comment_lines]
+        icon_label = ttk.Label(content, text="⚠", foreground="#d9534f", font=("Segoe UI", 20, "bold"))
+        icon_label.grid(row=0, column=0, padx=(0, 12), sticky="n")
 
-        new_lines: list[str] = []
-        in_env = False
-        brace_depth = 0
+        msg_label = ttk.Label(content, text=message, justify="left", wraplength=360)
+        msg_label.grid(row=0, column=1, sticky="w")
 
-        for line in lines:
-            stripped = line.strip()
-            if in_env:
-                brace_depth += line.count("{") - line.count("}")
-                if brace_depth <= 0:
-                    in_env = False
-                continue
-            if any(k in stripped for k in target_keys):
-                continue
-            if target_env_key in stripped:
-                in_env = True
-                brace_depth = line.count("{") - line.count("}")
-                if brace_depth <= 0:
-                    in_env = False
-                continue
-            new_lines.append(line)
+        def _on_close() -> None:
+            dialog.grab_release()
+            dialog.destroy()
 
-        closing_idx = None
-        for i in range(len(new_lines) - 1, -1, -1):
-            if "}" in new_lines[i]:
-                closing_idx = i
-                break
-        if closing_idx is None:
-            return raw_text, False, "settings.json 缺少结束大括号"
+        btn_frame = ttk.Frame(content)
+        btn_frame.grid(row=1, column=0, columnspan=2, pady=(12, 0))
+        ok_btn = ttk.Button(btn_frame, text="确定", command=_on_close)
+        ok_btn.pack()
 
-        insert_pos = closing_idx
-        j = closing_idx - 1
-        while j >= 0:
-            t = new_lines[j].strip()
-            if t == "" or t.startswith("//"):
-                j -= 1
-                continue
-            if not t.endswith(",") and t not in ("{", "["):
-                new_lines[j] = new_lines[j].rstrip("\n").rstrip() + ",\n"
-            break
+        dialog.update_idletasks()
 
-        env_lines = [
-            f'        "LANG": "zh_CN.UTF-8",{newline}',
-            f'        "LC_ALL": "zh_CN.UTF-8"{newline}',
-        ]
-        block = [
-            f"    {marker_start}{newline}",
-            f'    "files.encoding": "utf8",{newline}',
-            f"    // 自动猜测编码以兼容混合文件{newline}",
-            f'    "files.autoGuessEncoding": true,{newline}',
-            f"    // 终端默认使用 PowerShell{newline}",
-            f'    "terminal.integrated.defaultProfile.windows": "PowerShell",{newline}',
-            f"    // Visual Studio Code 终端环境：统一 UTF-8{newline}",
-            f'    "terminal.integrated.env.windows": {{{newline}',
-            *env_lines,
-            f"    }}{newline}",
-            f"    {marker_end}{newline}",
-            *preserved_custom_lines,
-        ]
+        # 以主窗口为基准计算坐标：水平居中，垂直偏上（上半部分）
+        min_w, min_h = self.root.minsize()
+        root_x = self.root.winfo_rootx()
+        root_y = self.root.winfo_rooty()
+        root_w = self.root.winfo_width() or self.root.winfo_reqwidth() or min_w
+        root_h = self.root.winfo_height() or self.root.winfo_reqheight() or min_h
+        win_w = dialog.winfo_width()
+        win_h = dialog.winfo_height()
 
-        new_lines = new_lines[:insert_pos] + block + new_lines[insert_pos:]
-        new_text = "".join(new_lines)
-        changed = new_text != raw_text
-        return new_text, changed, None
+        center_x = root_x + max(0, int((root_w - win_w) / 2))
+        offset_y = root_y + max(0, int((root_h - win_h) / 4))
+        dialog.geometry(f"{win_w}x{win_h}+{center_x}+{offset_y}")
 
-    def _remove_vscode_block(self, raw_text: str) -> tuple[str, bool, str | None]:
-        """移除 VS Code 工具标记块及关联键，确保恢复后文件无残留。"""
-        marker_start_candidates = (VSCODE_MARKER_START, VSCODE_MARKER_START_LEGACY)
-        marker_end_candidates = (VSCODE_MARKER_END, VSCODE_MARKER_END_LEGACY)
-        orphan_comment_lines = {
-            VSCODE_MARKER_START,
-            VSCODE_MARKER_END,
-            VSCODE_MARKER_START_LEGACY,
-            VSCODE_MARKER_END_LEGACY,
-            "// 自动猜测编码以兼容混合文件",
-            "// 终端默认使用 PowerShell",
-            "// VS Code 终端环境：统一 UTF-8",
-            "// Visual Studio Code 终端环境：统一 UTF-8",
-        }
-        lines = raw_text.splitlines(keepends=True)
-        cleaned_lines: list[str] = []
-        i = 0
-        while i < len(lines):
-            line = lines[i]
-            if any(m in line for m in marker_start_candidates):
-                j = i + 1
-                while j < len(lines) and not any(m in lines[j] for m in marker_end_candidates):
-                    j += 1
-                if j < len(lines) and any(m in lines[j] for m in marker_end_candidates):
-                    i = j + 1
-                    continue
-            cleaned_lines.append(line)
-            i += 1
+        dialog.protocol("WM_DELETE_WINDOW", _on_close)
+        ok_btn.focus_set()
+        dialog.wait_window()
 
-        new_lines = [ln for ln in cleaned_lines if ln.strip() not in orphan_comment_lines]
+    def _set_row_state(
+        self,
+        key: str,
+        enabled: bool,
+        status: str,
+        value: str | None = None,
+        placeholder: bool = False,
+    ) -> None:
+        row = self._row_widgets.get(key)
+        if not row:
+            return
+        if getattr(self, "_row_btn_state_locked", False):
+            # 标记禁用期间已刷新行状态，避免恢复时覆盖检测结果
+            self._row_btn_state_cache_dirty = True
+        if value is not None:
+            row["entry"].config(state="normal")
+            row["entry"].delete(0, tk.END)
+            row["entry"].insert(0, value)
+            row["entry"].config(foreground="#888" if placeholder else "")
+            row["entry"].config(state="readonly")
+        state = "normal" if enabled else "disabled"
+        row["btn"].config(state=state)
+        row["status_full"].config(text=status)
 
-        # 如果末尾出现多余逗号，移除以保证 JSON 合法
-        stripped_nonempty = [(idx, ln) for idx, ln in enumerate(new_lines) if ln.strip() and not ln.strip().startswith("//")]
-        if stripped_nonempty:
-            last_idx, last_line = stripped_nonempty[-1]
-            if last_line.strip().endswith(","):
-                new_lines[last_idx] = last_line.rstrip().rstrip(",") + ("\n" if last_line.endswith("\n") else "")
+    def _restore_row_buttons(self) -> None:
+        """恢复禁用前的行按钮状态，集中管理以减少重复分支。"""
+        # 若禁用期间已有检测逻辑刷新过行状态，则跳过恢复，保持最新检测结果
+        if getattr(self, "_row_btn_state_cache_dirty", False):
+            self._row_btn_state_cache.clear()
+            self._row_btn_state_cache_dirty = False
+            return
 
-        new_text = "".join(new_lines)
-        return new_text, new_text != raw_text, None
+        for key, row in self._row_widgets.items():
+            prev_state = self._row_btn_state_cache.get(key)
+            if prev_state and row["btn"].cget("state") == "disabled":
+                row["btn"].config(state=prev_state)
+        self._row_btn_state_cache.clear()
 
-    def _load_json_relaxed(self, path: Path) -> tuple[dict | None, str | None]:
-        """宽松解析 Visual Studio Code settings.json，失败返回错误信息且不写入。"""
-        try:
-            raw = path.read_text(encoding="utf-8")
-        except Exception as exc:  # noqa: BLE001
-            return None, f"读取 {path} 失败: {exc}"
-        # 1) 严格解析
+    def _has_any_original_backup(self) -> bool:
+        """检查备份库中是否存在任意目标的原始配置。"""
         try:
-            return json.loads(raw), None
+            return bool(self._backups.originals())
         except Exception:
-            pass
-        # 2) 清理注释/尾逗号/控制字符后严格解析
-        cleaned = self._strip_json_comments_and_trailing_commas(raw)
+            return False
+
+    def _cleanup_backups(self, keep: Iterable[str] = ()) -> None:
+        """恢复完成后清除原始配置条目，下次配置重新记录；历史代次保留以便回滚到任意中间状态。
+
+        keep 中的目标（如备份校验失败、未恢复的目标）保留条目，便于排查。
+        """
         try:
-            return json.loads(cleaned), None
+            keep_set = set(keep)
+            self._backups.clear_originals([key for key in self._backups.originals() if key not in keep_set])
         except Exception:
-            pass
-        # 3) 清理后 strict=False 解析（放宽控制字符限制）
+            return
+
+    def _backup_targets(self) -> dict[str, Path]:
+        """参与历史快照的配置文件（键与原始配置条目一致）。"""
+        targets: dict[str, Path] = {}
+        for target in CONFIG_TARGETS:
+            path = self._target_path(target)
+            if path:
+                targets[target.backup_key] = path
+        return targets
+
+    def _target_path(self, target: ConfigTarget) -> Path | None:
+        """目标的配置文件路径：PowerShell profile 沿用初始化时解析的路径，Git Bash 优先使用检测到的 ~/.bashrc。"""
+        if target.key == "ps5":
+            return self._ps5_profile_path
+        if target.key == "ps7":
+            return self._ps7_profile_path
+        if target.key == "git":
+            return self._git_bashrc_path or target.resolve_path()
+        return target.resolve_path()
+
+    def _snapshot_generation(self, reason: str, file_keys: Iterable[str] = ()) -> int | None:
+        """把各目标当前内容与控制台注册表值保存为备份库中的一代；只写入新出现的内容。
+
+        file_keys 为额外一并保存的 "file:<绝对路径>" 键（--scan 修复、--write-utf8 转码的文件），
+        回滚这些文件前先保存其当前内容，回滚本身也可撤销。
+        """
         try:
-            return json.loads(cleaned, strict=False), None
-        except Exception:
-            pass
-        # 4) 将残余控制字符转义为 \\uXXXX 再 strict=False 解析
-        escaped = re.sub(r"[\x00-\x1F]", lambda m: "\\u%04x" % ord(m.group(0)), cleaned)
+            targets = self._backup_targets()
+            files = {key: Path(key[len("file:") :]) for key in file_keys if key.startswith("file:")}
+
+            def read(path: Path) -> bytes | None:
+                return path.read_bytes() if path.is_file() else None
+
+            def put_file(path: Path) -> dict[str, object]:
+                # 转码、修复过的文件可能很大，流式哈希与压缩
+                return self._backups.put_file(path) if path.is_file() else {"empty": True}
+
+            # “文档”目录常被重定向到网络共享，逐个读取时延迟叠加
+            contents = dict(zip(targets, self._io_map(read, list(targets.values()))))
+            console: dict[str, object] = {}
+            with self._registry.cycle():
+                for _label, exe in self._console_targets():
+                    key_name = self._console_key_from_path(exe)
+                    console[key_name] = self._read_console_values(key_name)
+            contents["console"] = json.dumps(console, ensure_ascii=False, sort_keys=True).encode("utf-8")
+            entries = {key: self._backups.put(data) for key, data in contents.items()}
+            entries.update(zip(files, self._io_map(put_file, list(files.values()))))
+            return self._backups.commit_entries(entries, reason)
+        except Exception as exc:  # noqa: BLE001
+            self._log(f"保存历史快照失败: {exc}", "warning")
+            return None
+
+    def _restore_generation(self, generation: int) -> list[tuple[str, str]]:
+        """把各目标恢复为指定代次的内容；与当前内容一致的目标不改写。"""
+        manifest = self._backups.manifest(generation)
+        if manifest is None:
+            return [("error", f"未找到备份代次 {generation}")]
+        outputs: list[tuple[str, str]] = []
+        targets = self._backup_targets()
+        for key, entry in manifest.get("entries", {}).items():
+            try:
+                if key == "console":
+                    outputs.extend(self._restore_console_generation(json.loads(self._backups.load(entry) or b"{}")))
+                    continue
+                # --scan --repair-mojibake 修复前、--write-utf8 转码前的原文以 "file:<绝对路径>" 为键保存；
+                # 这类文件可能很大，流式比较并经临时文件写回
+                streaming = key.startswith("file:")
+                path = Path(key[len("file:") :]) if streaming else targets.get(key)
+                if path is None:
+                    outputs.append(("warning", f"{key}: 当前环境无对应目标，跳过"))
+                    continue
+                if streaming:
+                    unchanged = self._backups.file_matches(entry, path)
+                else:
+                    unchanged = self._backups.matches(entry, path.read_bytes() if path.is_file() else None)
+                if unchanged:
+                    continue
+                if entry.get("empty"):
+                    path.unlink(missing_ok=True)
+                    outputs.append(("success", f"{key}: 代次 {generation} 中不存在，已删除 {path}"))
+                    continue
+                if streaming:
+                    self._backups.restore_file(entry, path)
+                else:
+                    data = self._backups.load(entry)
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(data or b"")
+                outputs.append(("success", f"{key}: 已恢复为代次 {generation} 的内容 {path}"))
+            except Exception as exc:  # noqa: BLE001
+                outputs.append(("error", f"{key}: 恢复代次 {generation} 失败: {exc}"))
+        if not outputs:
+            outputs.append(("info", f"当前内容与代次 {generation} 一致，无需改写"))
+        return outputs
+
+    def _restore_console_generation(self, console: Mapping[str, object]) -> list[tuple[str, str]]:
+        outputs: list[tuple[str, str]] = []
+        with self._registry.cycle():
+            for key_name, values in console.items():
+                current = self._read_console_values(key_name)
+                if current == values:
+                    continue
+                # 整键替换，确保快照之后新增的值也被移除
+                self._delete_console_key(key_name)
+                if isinstance(values, dict):
+                    self._write_console_values(key_name, values)
+                outputs.append(("success", f"控制台 {key_name}: 已恢复注册表值"))
+        return outputs
+
+    def _update_restore_button_state(self, buttons_enabled: bool | None = None) -> None:
+        """根据备份存在情况更新“恢复配置”按钮状态（有备份才可点击）。"""
+        if not hasattr(self, "restore_btn"):
+            return
+        if buttons_enabled is None:
+            buttons_enabled = not self.is_running
+        # 只要存在原始配置备份且当前未在执行中，就允许点击；权限不足时在恢复时通过异常与日志反馈
+        # 备份是否存在取自检测快照，避免主线程访问文件系统
+        enabled = buttons_enabled and self._snapshots.current.has_original_backup
+        state = "normal" if enabled else "disabled"
+        self.restore_btn.config(state=state)
+
+    # --------- 检测调度 ---------
+    def _detect_all_paths_in_thread(self, log: bool = True) -> None:
+        """后台线程执行检测，避免启动/重新检测阻塞 UI；重复触发时旧代次自动取消。"""
+        if self.is_running:
+            return
+        generation = self._snapshots.begin()
+        self.status_var.set("正在检测工具与编码状态...")
+        if self._detecting is None:
+            self._set_buttons_state(False)
+        self._detecting = generation
+        threading.Thread(
+            target=self._run_detect_all_paths_safe, args=(log, generation), daemon=True
+        ).start()
+
+    def _run_detect_all_paths_safe(self, log: bool, generation: int) -> None:
         try:
-            return json.loads(escaped, strict=False), None
-        except Exception as exc:  # noqa: BLE001
-            return None, f"解析 {path} 失败: {exc}"
+            self._detect_all_paths(log=log, generation=generation)
+            if self._prober.take_hints_dirty():
+                self._save_config_values(probe_hints=self._prober.export_hints())
+        finally:
+            self._ui_call(self._on_detect_done, generation)
 
-    @staticmethod
-    def _read_user_env_reg(name: str) -> str | None:
-        if not winreg:
-            return None
+    def _on_detect_done(self, generation: int) -> None:
+        if self._detecting != generation:
+            # 之后又启动了后台检测，由最新的一次负责恢复按钮状态
+            return
+        # 结果可能因配置/恢复流程中的同步检测开始了更新代次而被丢弃，但不会再有后台检测来复位，这里照常结束
+        self._detecting = None
+        if not self.is_running:
+            self._set_buttons_state(True)
+            self._refresh_start_button_state()
+        if not self._snapshots.is_stale(generation):
+            self._trace_startup("detection")
+
+    @PROFILER.profiled("detect")
+    def _detect_all_paths(self, log: bool = True, generation: int | None = None) -> DetectionSnapshot | None:
+        """采集一代检测快照并原子发布，随后在主线程刷新界面；可在任意线程调用。
+
+        若期间有更新的检测代次开始，本代次在下一个检查点取消，返回 None。
+        """
+        if generation is None:
+            generation = self._snapshots.begin()
         try:
-            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Environment") as key:
-                val, _ = winreg.QueryValueEx(key, name)
-                return str(val)
-        except Exception:
+            # 一代检测内的注册表读取复用同一批句柄
+            with self._registry.cycle():
+                snapshot = self._collect_detection(generation, log)
+        except DetectionCancelled:
             return None
+        if not self._snapshots.publish(snapshot):
+            return None
+        self._ui_call(self._apply_detection_snapshot, snapshot)
+        return snapshot
 
-    @staticmethod
-    def _read_user_env(name: str) -> str | None:
-        """优先读取 HKCU\\Environment 的持久值，再回退进程环境变量。"""
-        reg_val = SetupApp._read_user_env_reg(name)
-        if reg_val is not None and reg_val != "":
-            return reg_val
-        env_val = os.environ.get(name)
-        return env_val if env_val else None
+    @TRACER.traced("detect.collect", "detect")
+    def _collect_detection(self, generation: int, log: bool) -> DetectionSnapshot:
+        """只做探测与分析、不触碰 Tk 控件，结果与日志行一并封装进快照。"""
+        t0 = time.perf_counter()
 
-    def _apply_vscode_settings(self, apply: bool, log: bool = True) -> None:
-        """合并/恢复 Visual Studio Code 用户级 UTF-8 配置。"""
-        appdata = os.environ.get("APPDATA")
-        if not appdata:
-            if log:
-                self._log("无法定位 APPDATA，跳过 Visual Studio Code 设置", "warning")
-            return
-        if apply and not getattr(self, "_vscode_available", False):
-            if log:
-                self._log("未检测到 Visual Studio Code，可执行文件缺失，跳过 UTF-8 设置", "warning")
+        def checkpoint() -> None:
+            if self._snapshots.is_stale(generation):
+                raise DetectionCancelled(generation)
+
+        self._prober.begin_cycle()
+        ps5_exe = self._detect_ps5()
+        checkpoint()
+        ps7_exe = self._detect_ps7()
+        checkpoint()
+        git_exe = self._detect_git_paths()
+        checkpoint()
+        vscode_exe = self._detect_vscode()
+        checkpoint()
+        wt_exe = self._find_windows_terminal()
+        cmd_path = Path(os.environ.get("SystemRoot", r"C:\Windows")) / "System32" / "cmd.exe"
+        cmd_exe = cmd_path if self._prober.exists(cmd_path) else None
+
+        bashrc_path = TARGETS_BY_KEY["git"].resolve_path() if git_exe else None
+        target_paths = {
+            "ps5": self._ps5_profile_path,
+            "ps7": self._ps7_profile_path,
+            "git": bashrc_path,
+            "vscode": TARGETS_BY_KEY["vscode"].resolve_path(),
+        }
+        profile_exists = {target.key: bool(target_paths[target.key] and target_paths[target.key].exists()) for target in CONFIG_TARGETS}
+        status, marker_detail, tool_detail = self._compute_shell_config_status(bashrc_path)
+        checkpoint()
+
+        snapshot = DetectionSnapshot(
+            generation=generation,
+            ps5_exe=ps5_exe,
+            ps7_exe=ps7_exe,
+            git_exe=git_exe,
+            git_bashrc_path=bashrc_path,
+            vscode_exe=vscode_exe,
+            vscode_settings_path=target_paths["vscode"],
+            wt_exe=wt_exe,
+            cmd_exe=cmd_exe,
+            profile_exists=_frozen_mapping(profile_exists),
+            shell_status=_frozen_mapping(status),
+            marker_detail=_frozen_mapping(marker_detail),
+            tool_detail=_frozen_mapping({k: _frozen_mapping(v) for k, v in tool_detail.items()}),
+        )
+        snapshot = replace(snapshot, **self._collect_console_state(snapshot))
+        checkpoint()
+        if not log:
+            return replace(snapshot, elapsed=time.perf_counter() - t0)
+
+        bar = _LOG_SEPARATOR_BAR
+        logs: list[tuple[str, str]] = [("info", f"{bar} 检测开始 {bar}")]
+        logs.append(
+            ("success", f"检测到 Windows PowerShell 5.1: {ps5_exe}") if ps5_exe else ("warning", "未检测到 Windows PowerShell 5.1")
+        )
+        logs.append(("success", f"检测到 PowerShell 7+: {ps7_exe}") if ps7_exe else ("warning", "未检测到 PowerShell 7+"))
+        logs.append(
+            ("success", f"检测到 Git Bash: {git_exe}")
+            if git_exe
+            else ("warning", "未找到 Git Bash，无法配置 UTF-8，请先安装 Git for Windows")
+        )
+        logs.append(
+            ("success", f"检测到 Visual Studio Code: {vscode_exe}")
+            if vscode_exe
+            else ("warning", "未检测到 Visual Studio Code 可执行文件")
+        )
+        # 在检测块中输出“哪些内容被手动更改”的差异提示
+        logs.extend(self._config_drift_report_lines(snapshot))
+        checkpoint()
+        elapsed = time.perf_counter() - t0
+        logs.append(("info", f"检测耗时 {elapsed:.2f}s"))
+        if self._debug:
+            logs.extend(self._cache_debug_lines())
+        logs.append(("info", f"{bar} 检测结束 {bar}"))
+        return replace(snapshot, logs=tuple(logs), elapsed=elapsed)
+
+    def _apply_detection_snapshot(self, snapshot: DetectionSnapshot) -> None:
+        """主线程：把已发布的快照渲染到界面（过期快照直接丢弃）。"""
+        if snapshot is not self._snapshots.current:
             return
-        settings_path = Path(appdata) / "Code" / "User" / "settings.json"
-        backup_path = self._vscode_backup_path()
-        target_dir = settings_path.parent
-        target_dir.mkdir(parents=True, exist_ok=True)
+        if snapshot.logs:
+            # 如果上一条日志是检测分隔线，先清理本次检测段落，避免重复追加
+            self._trim_last_detection_block()
+            for level, message in snapshot.logs:
+                self._log(message, level)
 
-        if apply:
-            if settings_path.exists() and not backup_path.exists():
-                backup_path.parent.mkdir(parents=True, exist_ok=True)
-                try:
-                    raw_for_backup = settings_path.read_text(encoding="utf-8")
-                    cleaned_backup, changed_backup, _ = self._remove_vscode_block(raw_for_backup)
-                    backup_path.write_text(cleaned_backup if changed_backup else raw_for_backup, encoding="utf-8")
-                except Exception:
-                    shutil.copy2(settings_path, backup_path)
-                if log:
-                    self._log(f"已创建 Visual Studio Code 原始配置备份: {backup_path}", "info")
-            raw_text = settings_path.read_text(encoding="utf-8") if settings_path.exists() else "{\n}\n"
-            new_text, changed, err = self._append_vscode_block(raw_text)
-            if err:
-                if log:
-                    level = "warning" if "解析失败" in err else "info"
-                    self._log(f"Visual Studio Code 设置未写入：{err}", level)
-                return
-            if changed:
-                settings_path.write_text(new_text, encoding="utf-8")
-                if log:
-                    self._log(f"已写入 Visual Studio Code UTF-8 用户设置: {settings_path}", "success")
-            else:
-                if log:
-                    self._log("Visual Studio Code UTF-8 设置已存在，无需追加", "info")
+        self._apply_tool_row(
+            "ps5", snapshot.ps5_exe, self.ps5_path_var, self._ps5_profile_path,
+            snapshot.profile_exists.get("ps5", False), "未检测到 Windows PowerShell 5.1，请在安装后再次执行配置",
+        )
+        self._apply_tool_row(
+            "ps7", snapshot.ps7_exe, self.ps7_path_var, self._ps7_profile_path,
+            snapshot.profile_exists.get("ps7", False), "未检测到 PowerShell 7+，请在安装后再次执行配置",
+        )
+
+        if snapshot.git_exe and snapshot.git_bashrc_path:
+            bashrc_exists = snapshot.profile_exists.get("git", False)
+            path_text = str(snapshot.git_bashrc_path) if bashrc_exists else "尚未发现 ~/.bashrc，将在执行时自动创建"
+            self.git_path_var.set(path_text)
+            self._set_row_state("git", True, f"已检测到 Git Bash: {snapshot.git_exe}", path_text, placeholder=not bashrc_exists)
         else:
-            if backup_path.exists():
-                shutil.copy2(backup_path, settings_path)
-                backup_path.unlink(missing_ok=True)
-                try:
-                    restored_text = settings_path.read_text(encoding="utf-8")
-                    cleaned_text, changed, err = self._remove_vscode_block(restored_text)
-                    if not err and changed:
-                        settings_path.write_text(cleaned_text, encoding="utf-8")
-                        self._vscode_restore_result = "restored-cleaned"
-                        if log:
-                            self._log("Visual Studio Code 已从原始配置备份恢复并清理工具块残留", "info")
-                    else:
-                        self._vscode_restore_result = "restored"
-                        if log:
-                            self._log("Visual Studio Code 已从原始配置备份恢复", "info")
-                except Exception as exc:  # noqa: BLE001
-                    self._vscode_restore_result = "restored"
-                    if log:
-                        self._log(f"Visual Studio Code 已恢复，但清理工具块时出错: {exc}", "warning")
-            else:
-                # 无备份时，清理残留工具块与键值，保持当前用户配置
-                self._vscode_restore_result = "no-backup"
-                if settings_path.exists():
-                    try:
-                        text_current = settings_path.read_text(encoding="utf-8")
-                        cleaned_text, changed, err = self._remove_vscode_block(text_current)
-                        if not err and changed:
-                            settings_path.write_text(cleaned_text, encoding="utf-8")
-                            self._vscode_restore_result = "cleaned-no-backup"
-                            if log:
-                                self._log("未找到原始备份，已清理 VS Code 工具块残留", "info")
-                        elif log:
-                            self._log("未找到原始备份，VS Code 配置未改动", "warning")
-                    except Exception as exc:  # noqa: BLE001
-                        if log:
-                            self._log(f"未找到原始备份，清理 VS Code 配置失败: {exc}", "warning")
-                elif log:
-                    self._log("未找到原始备份且当前无配置文件，跳过 VS Code 恢复", "warning")
+            missing_msg = "未检测到 Git Bash，请安装 Git for Windows 后再次执行配置"
+            self.git_path_var.set(missing_msg)
+            self._set_row_state("git", False, missing_msg, missing_msg, placeholder=True)
 
-    def _flush_console_logs(self) -> None:
-        if not self._console_log_buffer:
-            return
-        for level, message in self._console_log_buffer:
-            self._log(message, level)
-        self._console_log_buffer.clear()
+        missing_msg = "未检测到 Visual Studio Code，请在安装后再次执行配置"
+        detected_status = f"已检测到 Visual Studio Code: {snapshot.vscode_exe}"
+        self.tool_info_var.set(detected_status if snapshot.vscode_exe else missing_msg)
+        settings_path = snapshot.vscode_settings_path
+        if settings_path and snapshot.vscode_exe:
+            settings_exists = snapshot.profile_exists.get("vscode", False)
+            path_text = str(settings_path) if settings_exists else "未检测到 settings.json，将在执行时创建"
+            self.vscode_path_var.set(str(settings_path))
+            self._set_row_state("vscode", True, detected_status, path_text, placeholder=not settings_exists)
+        else:
+            self.vscode_path_var.set(missing_msg)
+            self._set_row_state("vscode", False, missing_msg, missing_msg, placeholder=True)
 
-    def _console_targets(self) -> list[tuple[str, Path]]:
-        targets: list[tuple[str, Path]] = []
-        if self._ps5_available and self._ps5_exe:
-            targets.append(("Windows PowerShell 5.1", self._ps5_exe))
+        # 先刷新编码/环境，再基于结果刷新汇总与按钮状态
+        self._update_console_state_label()
+        self._refresh_env_tool_labels()
+        self._refresh_config_status_label()
+        self._refresh_start_button_state()
+        self._refresh_reset_default_button_state()
+        self._update_restore_button_state()
 
-        if self._ps7_available and self._ps7_exe:
-            targets.append(("PowerShell 7+", self._ps7_exe))
+    def _apply_tool_row(
+        self,
+        key: str,
+        exe: Path | None,
+        var: tk.StringVar,
+        profile_path: Path,
+        profile_exists: bool,
+        missing_msg: str,
+    ) -> None:
+        """PowerShell 行：已安装时显示 profile 路径，否则显示缺失提示。"""
+        if exe:
+            path_text = str(profile_path) if profile_exists else "未找到配置文件，将在执行时创建"
+            var.set(path_text)
+            self._set_row_state(key, profile_exists, f"已检测到: {exe}", path_text, placeholder=not profile_exists)
+        else:
+            var.set(missing_msg)
+            self._set_row_state(key, False, missing_msg, missing_msg, placeholder=True)
 
-        wt_path = self._find_windows_terminal()
-        if wt_path:
-            targets.append(("Windows Terminal", wt_path))
-        cmd_path = Path(os.environ.get("SystemRoot", r"C:\Windows")) / "System32" / "cmd.exe"
-        if cmd_path.exists():
-            targets.append(("CMD", cmd_path))
-        return targets
+    # --------- 检测快照只读视图（读取无需加锁） ---------
+    @property
+    def _ps5_exe(self) -> Path | None:
+        return self._snapshots.current.ps5_exe
 
-    def _find_windows_terminal(self) -> Path | None:
-        candidates: list[Path] = []
-        wt_from_path = shutil.which("wt.exe")
-        if wt_from_path:
-            candidates.append(Path(wt_from_path))
-        local = Path(os.environ.get("LOCALAPPDATA", "")) / "Microsoft" / "WindowsApps" / "wt.exe"
-        candidates.append(local)
-        program_files = Path(os.environ.get("ProgramFiles", r"C:\Program Files"))
-        candidates.append(program_files / "WindowsApps" / "Microsoft.WindowsTerminal_8wekyb3d8bbwe" / "wt.exe")
-        for path in candidates:
-            if path and path.exists():
-                return path
-        return None
+    @property
+    def _ps5_available(self) -> bool:
+        return self._snapshots.current.ps5_exe is not None
 
-    @staticmethod
-    def _console_key_from_path(path: Path) -> str:
-        sanitized = str(path).replace(":", "").replace("\\", "_").replace(" ", "_")
-        return sanitized
+    @property
+    def _ps7_exe(self) -> Path | None:
+        return self._snapshots.current.ps7_exe
 
-    def _load_console_reg_backup(self) -> dict:
-        if not self._console_reg_backup_path.exists():
-            return {}
+    @property
+    def _ps7_available(self) -> bool:
+        return self._snapshots.current.ps7_exe is not None
+
+    @property
+    def _git_exe(self) -> Path | None:
+        return self._snapshots.current.git_exe
+
+    @property
+    def _git_bashrc_path(self) -> Path | None:
+        return self._snapshots.current.git_bashrc_path
+
+    @property
+    def _vscode_available(self) -> bool:
+        return self._snapshots.current.vscode_exe is not None
+
+    @property
+    def _shell_marker_detail(self) -> Mapping[str, str]:
+        return self._snapshots.current.marker_detail
+
+    @property
+    def _tool_config_detail(self) -> Mapping[str, Mapping[str, object]]:
+        return self._snapshots.current.tool_detail
+
+    @TRACER.traced("detect.ps5", "detect")
+    def _detect_ps5(self) -> Path | None:
+        candidate = None
+        which_ps = shutil.which("powershell")
+        if which_ps:
+            candidate = Path(which_ps).resolve()
+        if candidate is None:
+            sys_root = os.environ.get("SystemRoot", r"C:\Windows")
+            candidate = Path(sys_root) / "System32" / "WindowsPowerShell" / "v1.0" / "powershell.exe"
+        found = self._prober.first_existing("ps5", [candidate])
+        if found is None:
+            found = self._prober.first_existing("ps5", self._shortcut_targets(["**/Windows PowerShell*.lnk"]))
+        return found
+
+    @TRACER.traced("detect.ps7", "detect")
+    def _detect_ps7(self) -> Path | None:
+        path = None
+        which_pwsh = shutil.which("pwsh")
+        if which_pwsh:
+            path = self._prober.first_existing("ps7", [Path(which_pwsh).resolve()])
+        else:
+            pf = os.environ.get("ProgramFiles", r"C:\Program Files")
+            pf86 = os.environ.get("ProgramFiles(x86)", r"C:\Program Files (x86)")
+            pf64 = os.environ.get("ProgramW6432", pf)
+            search_roots = [pf, pf86, pf64]
+            candidates: list[Path] = []
+            seen_roots: set[str] = set()
+            for root in search_roots:
+                if not root:
+                    continue
+                # ProgramFiles 与 ProgramW6432 常指向同一目录，避免重复 glob
+                norm_root = PathProber.normalize(root)
+                if norm_root in seen_roots:
+                    continue
+                seen_roots.add(norm_root)
+                candidates.extend(sorted(Path(root).glob("PowerShell/*/pwsh.exe"), reverse=True))
+            path = self._prober.first_existing("ps7", candidates)
+        if path is None:
+            path = self._prober.first_existing(
+                "ps7", [Path(loc) / "pwsh.exe" for loc in self._registry_install_locations(["powershell 7"])]
+            )
+        if path is None:
+            path = self._prober.first_existing("ps7", self._shortcut_targets(["**/PowerShell 7*.lnk"]))
+        return path
+
+    def _apply_window_position(self) -> None:
+        cfg = self._load_config()
+        if cfg:
+            x, y = cfg.get("x"), cfg.get("y")
+            if all(isinstance(v, int) and v > 0 for v in (x, y)):
+                # 使用当前窗口尺寸，只应用保存的坐标
+                self.root.update_idletasks()
+                min_w, min_h = self.root.minsize()
+                w = self.root.winfo_width() or min_w
+                h = self.root.winfo_height() or min_h
+                self.root.geometry(f"{w}x{h}+{x}+{y}")
+                return
+        self._center_window()
+
+    def _center_window(self) -> None:
+        self.root.update_idletasks()
+        min_w, min_h = self.root.minsize()
+        w = self.root.winfo_reqwidth() or self.root.winfo_width() or min_w
+        h = self.root.winfo_reqheight() or self.root.winfo_height() or min_h
+        screen_w = self.root.winfo_screenwidth()
+        screen_h = self.root.winfo_screenheight()
+        x = int((screen_w - w) / 2)
+        y = int((screen_h - h) / 2)
+        self.root.geometry(f"{w}x{h}+{x}+{y}")
+
+    def _on_close(self) -> None:
+        self._save_window_position()
+        self.root.destroy()
+
+    def _save_window_position(self) -> None:
         try:
-            return json.loads(self._console_reg_backup_path.read_text(encoding="utf-8"))
+            geom = self.root.winfo_geometry()
+            size_part, _, pos_part = geom.partition("+")
+            x_str, _, y_str = pos_part.partition("+")
+            self._save_config_values(x=int(x_str), y=int(y_str), probe_hints=self._prober.export_hints())
         except Exception:
-            return {}
+            pass
 
-    def _read_console_values(self, key_name: str) -> dict | None:
-        if not winreg:
-            return None
+    def _load_config_raw(self) -> dict:
+        """读取完整 config.json（包含窗口位置以外的键），失败返回空 dict。"""
         try:
-            with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Console\\" + key_name) as key:
-                values: dict[str, str | int] = {}
-                count = winreg.QueryInfoKey(key)[1]
-                for index in range(count):
-                    name, value, _ = winreg.EnumValue(key, index)
-                    values[name] = value
-                return values
-        except FileNotFoundError:
-            return None
-        except Exception as exc:  # noqa: BLE001
-            self._log(f"读取控制台注册表失败: {exc}", "warning")
-            return None
-
-    def _write_console_values(self, key_name: str, values: dict) -> None:
-        if not winreg:
-            raise RuntimeError("winreg 不可用")
-        with winreg.CreateKey(winreg.HKEY_CURRENT_USER, r"Console\\" + key_name) as key:
-            for name, value in values.items():
-                if isinstance(value, int):
-                    winreg.SetValueEx(key, name, 0, winreg.REG_DWORD, value)
-                else:
-                    winreg.SetValueEx(key, name, 0, winreg.REG_SZ, value)
+            if self._config_path.exists():
+                raw = json.loads(self._config_path.read_text(encoding="utf-8"))
+                if isinstance(raw, dict):
+                    return raw
+        except Exception:
+            return {}
+        return {}
 
-    def _delete_console_key(self, key_name: str) -> None:
-        if not winreg:
-            raise RuntimeError("winreg 不可用")
+    def _save_config_values(self, **values: object) -> None:
+        """合并写入 config.json，保留未涉及的键。"""
         try:
-            winreg.DeleteKey(winreg.HKEY_CURRENT_USER, r"Console\\" + key_name)
-        except FileNotFoundError:
-            return
+            self._config_path.parent.mkdir(parents=True, exist_ok=True)
+            data = self._load_config_raw()
+            data.update(values)
+            self._config_path.write_text(json.dumps(data, ensure_ascii=False), encoding="utf-8")
+        except Exception:
+            pass
 
-    def _set_console_codepage_all(self, codepage: int) -> list[tuple[str, str]]:
-        """强制将所有控制台目标的 CodePage 写为指定值（忽略备份），用于恢复系统默认。"""
-        outputs: list[tuple[str, str]] = []
-        for label, path in self._console_targets():
-            key_name = self._console_key_from_path(path)
-            try:
-                self._write_console_values(key_name, {"CodePage": codepage})
-                outputs.append(("success", f"{label} 已写入系统默认 CodePage {codepage}"))
-            except PermissionError as exc:  # noqa: BLE001
-                outputs.append(("error", f"{label} 写入系统默认 CodePage 失败（权限不足）: {exc}"))
-            except Exception as exc:  # noqa: BLE001
-                outputs.append(("error", f"{label} 写入系统默认 CodePage 失败: {exc}"))
-        self._update_console_state_label()
-        return outputs
+    def _load_config(self) -> dict:
+        raw = self._load_config_raw()
+        # 只保留位置坐标，忽略旧的宽高字段
+        x = raw.get("x")
+        y = raw.get("y")
+        if isinstance(x, int) and isinstance(y, int):
+            return {"x": x, "y": y}
+        return {}
 
-    def _update_console_codepage(
-        self, apply_utf8: bool, *, emit_log: bool = True, fallback_cp: int | None = None
-    ) -> list[tuple[str, str]]:
-        reg_backup_loaded = self._load_console_reg_backup()
-        outputs: list[tuple[str, str]] = []
-        reg_backup_new = {}
-        for label, path in self._console_targets():
-            key_name = self._console_key_from_path(path)
+    def _is_admin(self) -> bool:
+        try:
+            return bool(ctypes.windll.shell32.IsUserAnAdmin())
+        except Exception:
+            return False
+
+    def _ui_call(self, func: Callable, *args, **kwargs) -> None:
+        """在主线程执行 UI 更新，避免后台线程直接操作 Tk 控件（投递到队列，由 _drain_ui_queue 执行）。"""
+        self._ui_queue.put((func, args, kwargs))
+
+    def _drain_ui_queue(self) -> None:
+        """主线程定时取出回调执行；单次最多占用约 20ms，剩余的留给下一轮，避免阻塞事件循环。"""
+        # 先预约下一轮：回调中若弹出模态框（嵌套事件循环），队列仍能继续被处理
+        self.root.after(self._ui_poll_ms, self._drain_ui_queue)
+        deadline = time.perf_counter() + 0.02
+        while time.perf_counter() < deadline:
             try:
-                if apply_utf8:
-                    existing = self._read_console_values(key_name) or {}
-                    # 仅备份 CodePage，避免覆盖用户字体设置
-                    reg_backup_new[key_name] = {"CodePage": existing.get("CodePage")} if existing else "__EMPTY_BACKUP__"
-                    self._write_console_values(key_name, {"CodePage": 65001})
-                    outputs.append(("success", f"{label} 控制台已设置为 UTF-8 代码页"))
-                else:
-                    backup = reg_backup_loaded.get(key_name, None)
-                    if backup == "__EMPTY_BACKUP__":
-                        if fallback_cp is not None:
-                            self._write_console_values(key_name, {"CodePage": fallback_cp})
-                            outputs.append(("info", f"{label} 原始未配置UTF-8，已写入系统默认 CodePage {fallback_cp}"))
-                        else:
-                            self._delete_console_key(key_name)
-                            outputs.append(("info", f"{label} 原始未配置UTF-8，已清理当前设置"))
-                    elif isinstance(backup, dict):
-                        self._write_console_values(key_name, backup)
-                        outputs.append(("success", f"{label} 控制台已恢复到原始设置"))
-                    else:
-                        if fallback_cp is not None:
-                            self._write_console_values(key_name, {"CodePage": fallback_cp})
-                            outputs.append(("warning", f"{label} 未找到原始配置备份，已写入系统默认 CodePage {fallback_cp}"))
-                        else:
-                            self._delete_console_key(key_name)
-                            outputs.append(("warning", f"{label} 未找到原始配置备份，已清理为系统默认"))
-            except PermissionError as exc:  # noqa: BLE001
-                outputs.append(("error", f"{label} 控制台写入失败（权限不足）: {exc}"))
-            except Exception as exc:  # noqa: BLE001
-                outputs.append(("error", f"{label} 控制台写入失败: {exc}"))
-        if apply_utf8:
+                func, args, kwargs = self._ui_queue.get_nowait()
+            except queue.Empty:
+                return
             try:
-                self._console_reg_backup_path.parent.mkdir(parents=True, exist_ok=True)
-                # 仅在首次执行时写入原始备份；后续执行不覆盖，确保“恢复配置”始终回到首次执行前状态
-                if not self._console_reg_backup_path.exists():
-                    self._console_reg_backup_path.write_text(
-                        json.dumps(reg_backup_new, ensure_ascii=False, indent=2),
-                        encoding="utf-8",
-                    )
-            except Exception:
-                pass
-        self._update_console_state_label()
-        if emit_log:
-            for level, message in outputs:
-                self._log(message, level)
-        return outputs
+                func(*args, **kwargs)
+            except Exception:  # noqa: BLE001
+                self.root.report_callback_exception(*sys.exc_info())
 
-    def _console_status_summary(self, short: bool = False) -> str:
-        def label(name: str) -> str:
-            return name
+    def _set_progress(self, percent: int) -> None:
+        """安全设置进度条数值。"""
+        self._ui_call(self.progress_var.set, max(0, min(100, percent)))
 
-        statuses: list[str] = []
+    def _progress_start(self, total_units: int) -> None:
+        """初始化线性进度，单位粒度可自定义。"""
+        self._progress_total_units = max(total_units, 1)
+        self._progress_done_units = 0
+        self._set_progress(0)
 
-        # Windows PowerShell 5.1
-        if self._ps5_available and self._ps5_exe:
-            key_name = self._console_key_from_path(self._ps5_exe)
-            values = self._read_console_values(key_name)
-            if values and values.get("CodePage") == 65001:
-                statuses.append(f"{label('Windows PowerShell 5.1')}=UTF-8")
-            elif values and values.get("CodePage"):
-                cp = values.get("CodePage")
-                prefix = "UTF-8" if cp == 65001 else f"{cp}"
-                statuses.append(f"{label('Windows PowerShell 5.1')}={prefix}")
-            else:
-                statuses.append(f"{label('Windows PowerShell 5.1')}=未配置UTF-8")
-        else:
-            statuses.append(f"{label('Windows PowerShell 5.1')}=未检测到")
+    def _progress_advance(self, units: int = 1) -> None:
+        """按单位推进进度。"""
+        if not hasattr(self, "_progress_total_units"):
+            return
+        self._progress_done_units = getattr(self, "_progress_done_units", 0) + units
+        percent = int(self._progress_done_units * 100 / max(self._progress_total_units, 1))
+        self._set_progress(percent)
 
-        # PowerShell 7+
-        if self._ps7_available and self._ps7_exe:
-            key_name = self._console_key_from_path(self._ps7_exe)
-            values = self._read_console_values(key_name)
-            if values and values.get("CodePage") == 65001:
-                statuses.append(f"{label('PowerShell 7+')}=UTF-8")
-            elif values and values.get("CodePage"):
-                cp = values.get("CodePage")
-                prefix = "UTF-8" if cp == 65001 else f"{cp}"
-                statuses.append(f"{label('PowerShell 7+')}={prefix}")
-            else:
-                statuses.append(f"{label('PowerShell 7+')}=未配置UTF-8")
-        else:
-            statuses.append(f"{label('PowerShell 7+')}=未安装")
+    def _progress_finish(self) -> None:
+        """收尾进度为 100%。"""
+        self._set_progress(100)
+        self._progress_total_units = 0
+        self._progress_done_units = 0
 
-        # Windows Terminal
-        wt_path = self._find_windows_terminal()
-        if wt_path:
-            key_name = self._console_key_from_path(wt_path)
-            values = self._read_console_values(key_name)
-            if values and values.get("CodePage") == 65001:
-                statuses.append(f"{label('Windows Terminal')}=UTF-8")
-            elif values and values.get("CodePage"):
-                cp = values.get("CodePage")
-                prefix = "UTF-8" if cp == 65001 else f"{cp}"
-                statuses.append(f"{label('Windows Terminal')}={prefix}")
+    def _log(self, message: str, level: str = "info") -> None:
+        """线程安全：仅入队，由 _drain_log_queue 在主线程批量写入。"""
+        tag = {"info": "info", "success": "success", "warning": "warning", "error": "error"}.get(
+            level, "info"
+        )
+        mark = _LOG_BLOCK_MARKS.get(message)
+        if len(self._log_queue) == self._log_queue.maxlen:
+            self._log_dropped += 1
+        self._log_queue.append((f"[{level.upper()}] {message}\n", tag, mark))
+
+    def _drain_log_queue(self) -> None:
+        self.root.after(self._log_poll_ms, self._drain_log_queue)
+        self._flush_log_queue(self._log_batch_max)
+
+    def _flush_log_queue(self, limit: int | None = None) -> None:
+        """主线程：把队列中的日志合并为少量 insert 调用写入文本框，并维护检测块标记与行数上限。"""
+        if not self._log_queue and not self._log_dropped:
+            return
+        widget = self.log_text
+        widget.configure(state="normal")
+        if self._log_dropped:
+            dropped, self._log_dropped = self._log_dropped, 0
+            widget.insert("end", f"[WARNING] 日志过多，已省略 {dropped} 行较早日志\n", "warning")
+        chunk: list[str] = []
+        count = 0
+        while self._log_queue and (limit is None or count < limit):
+            text, tag, mark = self._log_queue.popleft()
+            count += 1
+            if mark is None:
+                chunk.extend((text, tag))
+                continue
+            # 检测块边界：先写入已累积的内容，再在边界处设置 mark，裁剪时无需扫描全文
+            if chunk:
+                widget.insert("end", *chunk)
+                chunk = []
+            if mark == "detect_start":
+                widget.mark_set(mark, "end-1c")
+                widget.mark_gravity(mark, "left")
+                widget.insert("end", text, tag)
             else:
-                statuses.append(f"{label('Windows Terminal')}=未配置UTF-8")
-        else:
-            statuses.append(f"{label('Windows Terminal')}=未检测到")
+                widget.insert("end", text, tag)
+                widget.mark_set(mark, "end-1c")
+                widget.mark_gravity(mark, "left")
+        if chunk:
+            widget.insert("end", *chunk)
+        line_count = int(widget.index("end-1c").split(".")[0]) - 1
+        excess = line_count - self._log_max_lines
+        if excess > 0:
+            widget.delete("1.0", f"{excess + 1}.0")
+        widget.configure(state="disabled")
+        widget.see("end")
 
-        # CMD 状态单独追加
-        cmd_cp, cmd_available = self._detect_cmd_codepage()
-        if not cmd_available:
-            statuses.append(f"{label('CMD')}=未检测到")
-        elif cmd_cp == 65001:
-            statuses.append(f"{label('CMD')}=65001")
-        elif cmd_cp:
-            statuses.append(f"{label('CMD')}={cmd_cp}")
-        else:
-            statuses.append(f"{label('CMD')}=未配置UTF-8")
+    def _log_separator(self, label: str) -> None:
+        bar = _LOG_SEPARATOR_BAR
+        self._log(f"{bar} {label} {bar}", "info")
 
-        sep = " " if short else "；"
-        return sep.join(statuses)
+    def _show_modal(
+        self,
+        title: str,
+        message: str,
+        kind: str = "info",
+        confirm_text: str = "确定",
+        cancel_text: str = "取消",
+    ) -> bool:
+        """自定义模态对话框，确保相对主窗口居中。返回 True/False。"""
+        dialog = tk.Toplevel(self.root)
+        dialog.withdraw()
+        dialog.title(title)
+        dialog.transient(self.root)
+        dialog.resizable(False, False)
+        dialog.grab_set()
 
-    def _runtime_status(self) -> dict[str, list[str] | str]:
-        """汇总控制台编码与标记完整度，供状态栏/弹窗复用。"""
-        console_list = [part.strip() for part in self._console_status_summary().split("；") if part.strip()]
-        marker_detail = getattr(self, "_shell_marker_detail", {})
-        labels = {
-            "ps5": "Windows PowerShell 5.1",
-            "ps7": "PowerShell 7+",
-            "git": "Git Bash",
-            "vscode": "Visual Studio Code",
-        }
-        marker_lines: list[str] = []
-        for key, marker in marker_detail.items():
-            label = labels.get(key, key)
-            if marker in {"ok", "full"}:
-                marker_lines.append(f"{label}: 配置一致")
-            elif marker == "partial":
-                marker_lines.append(f"{label}: 标记不完整，建议重新配置")
-            elif marker == "duplicate":
-                marker_lines.append(f"{label}: 检测到重复配置块，建议重新配置")
-            elif marker == "modified":
-                marker_lines.append(f"{label}: 检测到配置被改动，建议重新配置")
-            elif marker in {"unreadable", "error"}:
-                marker_lines.append(f"{label}: 读取/解析失败，详见日志")
-            else:
-                marker_lines.append(f"{label}: 未检测到工具配置")
-        return {"console": console_list, "markers": marker_lines}
+        icon_text = {"info": "ℹ", "warning": "⚠", "error": "✖"}.get(kind, "ℹ")
+        fg = {"info": "#0b6e35", "warning": "#b8860b", "error": "#b00020"}.get(kind, "#222")
 
-    def _env_status_summary(self) -> str:
-        """占位：不再单独显示。"""
-        return ""
+        frame = ttk.Frame(dialog, padding="16 12")
+        frame.grid(row=0, column=0, sticky="nsew")
+        dialog.columnconfigure(0, weight=1)
 
-    def _console_config_state(self, details: bool = False):
-        """返回控制台配置状态：
-        - status: 已全部配置UTF-8 / 已部分配置UTF-8 / 未配置UTF-8
-        - available: 可检测的终端数量
-        - configured: 已配置为 65001 的数量
-        """
-        available = 0
-        configured = 0
-        for _label, path in self._console_targets():
-            key_name = self._console_key_from_path(path)
-            values = self._read_console_values(key_name)
-            if values is None:
-                continue
-            available += 1
-            if values.get("CodePage") == 65001:
-                configured += 1
-        if available == 0:
-            status = "未配置UTF-8"
-        elif configured == available:
-            status = "已全部配置UTF-8"
-        elif configured > 0:
-            status = "已部分配置UTF-8"
-        else:
-            status = "未配置UTF-8"
-        return (status, available, configured) if details else status
+        ttk.Label(frame, text=icon_text, foreground=fg, font=("Segoe UI", 16, "bold")).grid(
+            row=0, column=0, padx=(0, 12), sticky="n"
+        )
+        ttk.Label(frame, text=message, justify="left", wraplength=360).grid(row=0, column=1, sticky="w")
+
+        result = {"value": False}
+
+        def on_confirm() -> None:
+            result["value"] = True
+            dialog.destroy()
+
+        def on_cancel() -> None:
+            result["value"] = False
+            dialog.destroy()
+
+        btn_row = ttk.Frame(frame)
+        btn_row.grid(row=1, column=0, columnspan=2, pady=(12, 0))
+        ttk.Button(btn_row, text=confirm_text, command=on_confirm, width=12).pack(side="left", padx=(0, 8))
+        if kind == "confirm":
+            ttk.Button(btn_row, text=cancel_text, command=on_cancel, width=12).pack(side="left")
+
+        self.root.update_idletasks()
+        dialog.update_idletasks()
+        root_x = self.root.winfo_rootx()
+        root_y = self.root.winfo_rooty()
+        min_w, min_h = self.root.minsize()
+        root_w = self.root.winfo_width() or self.root.winfo_reqwidth() or min_w
+        root_h = self.root.winfo_height() or self.root.winfo_reqheight() or min_h
+        win_w = dialog.winfo_width() or 320
+        win_h = dialog.winfo_height() or 180
+        pos_x = root_x + max(0, int((root_w - win_w) / 2))
+        pos_y = root_y + max(0, int((root_h - win_h) / 2))
+        dialog.geometry(f"{win_w}x{win_h}+{pos_x}+{pos_y}")
+        dialog.deiconify()
+        dialog.lift(self.root)
+        dialog.focus_set()
+        dialog.protocol("WM_DELETE_WINDOW", on_cancel)
+        dialog.wait_window()
+        return bool(result["value"])
 
-    def _detect_cmd_codepage(self) -> tuple[int | None, bool]:
-        """检测当前 CMD 默认代码页，返回 (codepage, cmd_available)。
+    def _show_log_menu(self, event: tk.Event) -> None:  # type: ignore[override]
+        try:
+            self.log_menu.tk_popup(event.x_root, event.y_root)
+        finally:
+            self.log_menu.grab_release()
 
-        优先读取注册表 HKCU\\Environment\\CHCP（setx 写入的值，代表新开 CMD 默认值），
-        再尝试 `cmd /c chcp` 输出，最后回退环境变量 CHCP。
-        cmd_available 表示是否成功调用到 CMD 或取得任一来源信息。
+    def _clear_log(self) -> None:
+        self._log_queue.clear()
+        self._log_dropped = 0
+        self.log_text.configure(state="normal")
+        self.log_text.delete("1.0", "end")
+        self.log_text.configure(state="disabled")
+
+    def _trim_last_detection_block(self) -> None:
+        """若日志尾部为检测块，则移除尾部检测块（保留其他日志及其颜色）；否则不处理。
+
+        检测块边界由写入时设置的 detect_start/detect_end 标记定位，只读取结束标记之后的尾部文本。
         """
-        cmd_available = False
-        # 0) HKCU\Console 对 cmd.exe 的 CodePage（本工具主要写入点）
-        try:
-            cmd_path = Path(os.environ.get("SystemRoot", r"C:\Windows")) / "System32" / "cmd.exe"
-            if cmd_path.exists():
-                key = self._console_key_from_path(cmd_path)
-                values = self._read_console_values(key)
-                if values and values.get("CodePage"):
-                    return int(values.get("CodePage")), True
-        except Exception:
-            pass
-        # 1) registry (preferred, reflects setx 持久值)
-        if winreg:
+        self._flush_log_queue()
+        widget = self.log_text
+        marks = set(widget.mark_names())
+        if not {"detect_start", "detect_end"} <= marks:
+            return
+        if not widget.compare("detect_start", "<", "detect_end"):
+            return
+        # 仅当结束标记后无其他非空内容时才认为尾部是检测块
+        if widget.get("detect_end", "end-1c").strip():
+            return
+        widget.configure(state="normal")
+        widget.delete("detect_start", "end-1c")
+        widget.configure(state="disabled")
+        widget.mark_unset("detect_start", "detect_end")
+
+    # --------- 通用候选路径收集工具 ---------
+    @TRACER.traced("detect.registry_install_locations", "detect")
+    def _registry_install_locations(self, keywords: list[str]) -> list[Path]:
+        """从卸载注册表读取 InstallLocation，关键词大小写不敏感。"""
+        key_tuple = tuple(sorted(k.lower() for k in keywords))
+        cached = self._registry_cache.get(key_tuple)
+        if cached is not None:
+            return list(cached)
+        locations: list[Path] = []
+        for hive in ("HKLM", "HKCU"):
             try:
-                with winreg.OpenKey(winreg.HKEY_CURRENT_USER, r"Environment") as key:
-                    val, _ = winreg.QueryValueEx(key, "CHCP")
-                    if str(val).isdigit():
-                        return int(val), True
-            except Exception:
-                pass
+                rows = self._registry.query_subkeys(
+                    hive, r"Software\Microsoft\Windows\CurrentVersion\Uninstall", ("DisplayName", "InstallLocation")
+                )
+            except Exception:  # noqa: BLE001
+                continue
+            for row in rows:
+                display_name = row.get("DisplayName")
+                if not display_name:
+                    continue
+                name_lower = str(display_name).lower()
+                if not any(k.lower() in name_lower for k in keywords):
+                    continue
+                loc = row.get("InstallLocation") or ""
+                if loc:
+                    p = Path(str(loc)).expanduser()
+                    if p.exists():
+                        locations.append(p)
+        seen = set()
+        uniq: list[Path] = []
+        for loc in locations:
+            if loc not in seen:
+                seen.add(loc)
+                uniq.append(loc)
+        self._registry_cache.put(key_tuple, uniq)
+        return list(uniq)
+
+    @TRACER.traced("detect.shortcut_targets", "detect")
+    def _shortcut_targets(self, patterns: list[str]) -> list[Path]:
+        """解析开始菜单快捷方式目标路径（最佳努力，依赖 PowerShell COM）。"""
+        pat_tuple = tuple(sorted(patterns))
+        cached = self._shortcut_cache.get(pat_tuple)
+        if cached is not None:
+            return list(cached)
+        start_roots = [
+            Path(os.environ.get("ProgramData", r"C:\ProgramData"))
+            / "Microsoft"
+            / "Windows"
+            / "Start Menu"
+            / "Programs",
+            Path(os.environ.get("APPDATA", Path.home()))
+            / "Microsoft"
+            / "Windows"
+            / "Start Menu"
+            / "Programs",
+        ]
+        pwsh = shutil.which("powershell") or shutil.which("pwsh")
+        if not pwsh:
+            return []
+
+        existing_roots = [str(r) for r in start_roots if r.exists()]
+        if not existing_roots:
+            self._shortcut_cache.put(pat_tuple, [])
+            return []
+
+        # 使用单次 PowerShell 批量解析，减少进程开销
+        pattern_clause = " -or ".join([f"($_.Name -like '{p}')" for p in patterns])
+        roots_literal = ",".join([f"'{r}'" for r in existing_roots])
+        ps_script = ";".join(
+            [
+                "$ErrorActionPreference='SilentlyContinue'",
+                f"$roots=@({roots_literal})",
+                "$ws=New-Object -ComObject WScript.Shell",
+                "$res=@()",
+                "foreach($r in $roots){",
+                " if(Test-Path $r){",
+                "   Get-ChildItem -LiteralPath $r -Filter *.lnk -Recurse | Where-Object {"
+                f" {pattern_clause} }} | ForEach-Object {{"
+                "     $s=$ws.CreateShortcut($_.FullName);"
+                "     if($s -and $s.TargetPath){ $res += $s.TargetPath }"
+                "   }",
+                " }",
+                "}",
+                "$res | Sort-Object -Unique",
+            ]
+        )
+        targets: list[Path] = []
         try:
-            result = subprocess.run(
-                ["cmd", "/c", "chcp"],
+            proc = subprocess.run(
+                [pwsh, "-NoProfile", "-Command", ps_script],
                 capture_output=True,
                 text=True,
-                check=False,
+                timeout=3,
             )
-            output = (result.stdout or result.stderr or "").strip()
-            # 兼容中英文输出，提取数字
-            match = re.search(r"(\d{3,5})", output)
-            if match:
-                cmd_available = True
-                return int(match.group(1)), True
-            cmd_available = True
+            if proc.stdout:
+                for line in proc.stdout.splitlines():
+                    p = Path(line.strip()).expanduser()
+                    if p.exists():
+                        targets.append(p.resolve())
         except Exception:
             pass
-        env_cp = os.environ.get("CHCP")
-        if env_cp and env_cp.isdigit():
-            return int(env_cp), True
-        return None, cmd_available
 
-    def _all_consoles_utf8(self) -> bool:
-        status, available, configured = self._console_config_state(details=True)
-        return available > 0 and configured == available
+        seen = set()
+        uniq: list[Path] = []
+        for t in targets:
+            if t not in seen:
+                seen.add(t)
+                uniq.append(t)
+        self._shortcut_cache.put(pat_tuple, uniq)
+        return list(uniq)
 
-    def _show_admin_warning(self, message: str) -> None:
-        """管理员权限提示对话框，相对主窗口水平居中且垂直偏上。"""
-        dialog = tk.Toplevel(self.root)
-        dialog.title("需要管理员权限")
-        dialog.transient(self.root)
-        dialog.resizable(False, False)
-        dialog.grab_set()
+    @TRACER.traced("detect.git", "detect")
+    def _detect_git_paths(self) -> Path | None:
+        primary_paths: list[Path] = []
+        env_paths = [
+            os.environ.get("ProgramFiles"),
+            os.environ.get("ProgramFiles(x86)"),
+            os.environ.get("ProgramW6432"),
+            os.environ.get("USERPROFILE"),
+        ]
+        for base in env_paths:
+            if not base:
+                continue
+            base_path = Path(base)
+            primary_paths.append(base_path / "Git")
+            primary_paths.append(base_path / "AppData" / "Local" / "Programs" / "Git")
 
-        # 简单两行布局：左侧图标，右侧文本，下方“确定”按钮
-        content = ttk.Frame(dialog, padding="16 12")
-        content.grid(row=0, column=0, sticky="nsew")
-        dialog.columnconfigure(0, weight=1)
+        bash_in_path = shutil.which("bash")
+        if bash_in_path:
+            primary_paths.append(Path(bash_in_path).resolve().parents[1])
+        git_in_path = shutil.which("git")
+        if git_in_path:
+            git_root = Path(git_in_path).resolve().parent.parent
+            primary_paths.append(git_root)
 
-        icon_label = ttk.Label(content, text="⚠", foreground="#d9534f", font=("Segoe UI", 20, "bold"))
-        icon_label.grid(row=0, column=0, padx=(0, 12), sticky="n")
+        program_data = os.environ.get("ProgramData", r"C:\ProgramData")
+        secondary_paths = [
+            Path(program_data) / "chocolatey" / "lib" / "git" / "tools",
+            Path.home() / "scoop" / "apps" / "git" / "current",
+            Path("D:/Programs/Git"),
+            Path.home() / "AppData" / "Local" / "Programs" / "Git",
+        ]
 
-        msg_label = ttk.Label(content, text=message, justify="left", wraplength=360)
-        msg_label.grid(row=0, column=1, sticky="w")
+        found = self._prober.first_existing("git", [path / "bin" / "bash.exe" for path in primary_paths])
 
-        def _on_close() -> None:
-            dialog.grab_release()
-            dialog.destroy()
+        if not found:
+            # 仅在快速路径未命中时再做重扫描（注册表/快捷方式），避免启动慢
+            for loc in self._registry_install_locations(["git for windows", "git version", "git"]):
+                secondary_paths.append(loc)
+            for target in self._shortcut_targets(["Git Bash*.lnk", "Git*.lnk"]):
+                if target.name.lower().startswith("git-bash") or target.name.lower() == "bash.exe":
+                    secondary_paths.append(target.parent.parent)
+                else:
+                    secondary_paths.append(target.parent)
+            found = self._prober.first_existing("git", [path / "bin" / "bash.exe" for path in secondary_paths])
 
-        btn_frame = ttk.Frame(content)
-        btn_frame.grid(row=1, column=0, columnspan=2, pady=(12, 0))
-        ok_btn = ttk.Button(btn_frame, text="确定", command=_on_close)
-        ok_btn.pack()
+        return found
 
-        dialog.update_idletasks()
+    @TRACER.traced("detect.vscode", "detect")
+    def _detect_vscode(self) -> Path | None:
+        """返回用于展示的 Visual Studio Code 可执行文件路径（code.cmd 映射回 Code.exe）。"""
+        exe_path = shutil.which("code") or shutil.which("code.cmd")
+        exe_resolved = Path(exe_path).resolve() if exe_path else None
+        if not exe_resolved:
+            local_app = os.environ.get("LOCALAPPDATA")
+            candidates = []
+            if local_app:
+                candidates.append(Path(local_app) / "Programs" / "Microsoft VS Code" / "Code.exe")
+            program_files = [
+                os.environ.get("ProgramFiles"),
+                os.environ.get("ProgramFiles(x86)"),
+                os.environ.get("ProgramW6432"),
+            ]
+            for root in program_files:
+                if root:
+                    candidates.append(Path(root) / "Microsoft VS Code" / "Code.exe")
+            for loc in self._registry_install_locations(["visual studio code", "microsoft visual studio code"]):
+                candidates.append(Path(loc) / "Code.exe")
+            for target in self._shortcut_targets(["**/Visual Studio Code*.lnk"]):
+                candidates.append(target)
+            hit = self._prober.first_existing("vscode", candidates)
+            if hit:
+                exe_resolved = hit.resolve()
+        display_exe = None
+        if exe_resolved:
+            if exe_resolved.name.lower() == "code.cmd":
+                candidate = exe_resolved.parent.parent / "Code.exe"
+                display_exe = candidate if candidate.exists() else exe_resolved
+            elif exe_resolved.name.lower() == "code":
+                candidate = exe_resolved.parent / "Code.exe"
+                display_exe = candidate if candidate.exists() else exe_resolved
+            else:
+                display_exe = exe_resolved
 
-        # 以主窗口为基准计算坐标：水平居中，垂直偏上（上半部分）
-        min_w, min_h = self.root.minsize()
-        root_x = self.root.winfo_rootx()
-        root_y = self.root.winfo_rooty()
-        root_w = self.root.winfo_width() or self.root.winfo_reqwidth() or min_w
-        root_h = self.root.winfo_height() or self.root.winfo_reqheight() or min_h
-        win_w = dialog.winfo_width()
-        win_h = dialog.winfo_height()
+        return display_exe
 
-        center_x = root_x + max(0, int((root_w - win_w) / 2))
-        offset_y = root_y + max(0, int((root_h - win_h) / 4))
-        dialog.geometry(f"{win_w}x{win_h}+{center_x}+{offset_y}")
+    def _open_path(self, key: str) -> None:
+        path_map = {
+            "ps5": self._ps5_profile_path,
+            "ps7": self._ps7_profile_path,
+            "git": self._git_bashrc_path,
+            "vscode": Path(self.vscode_path_var.get()) if self.vscode_path_var.get() else None,
+        }
+        path = path_map.get(key)
+        if not path:
+            return
+        try:
+            path.parent.mkdir(parents=True, exist_ok=True)
+            if not path.exists() and key in {"git", "vscode"}:
+                path.touch()
+            os.startfile(str(path))
+        except Exception as exc:  # noqa: BLE001
+            self._log(f"打开配置文件失败 {path}: {exc}", "error")
+            self._show_modal("无法打开配置文件", f"路径: {path}\n错误: {exc}", kind="error")
 
-        dialog.protocol("WM_DELETE_WINDOW", _on_close)
-        ok_btn.focus_set()
-        dialog.wait_window()
+    def _open_backup_dir(self) -> None:
+        """打开软件备份目录，若不存在则创建。"""
+        try:
+            self._backup_root.mkdir(parents=True, exist_ok=True)
+            os.startfile(str(self._backup_root))
+        except Exception as exc:  # noqa: BLE001
+            self._log(f"打开备份目录失败 {self._backup_root}: {exc}", "error")
+            self._show_modal("无法打开备份目录", f"路径: {self._backup_root}\n错误: {exc}", kind="error")
 
-    def _set_row_state(
-        self,
-        key: str,
-        enabled: bool,
-        status: str,
-        value: str | None = None,
-        placeholder: bool = False,
-    ) -> None:
-        row = self._row_widgets.get(key)
-        if not row:
+    def _validate_bash_path(self) -> Path | None:
+        return self._git_exe
+
+    def _start_setup(self) -> None:
+        if self.is_running:
             return
-        if getattr(self, "_row_btn_state_locked", False):
-            # 标记禁用期间已刷新行状态，避免恢复时覆盖检测结果
-            self._row_btn_state_cache_dirty = True
-        if value is not None:
-            row["entry"].config(state="normal")
-            row["entry"].delete(0, tk.END)
-            row["entry"].insert(0, value)
-            row["entry"].config(foreground="#888" if placeholder else "")
-            row["entry"].config(state="readonly")
-        state = "normal" if enabled else "disabled"
-        row["btn"].config(state=state)
-        row["status_full"].config(text=status)
+        bash_path = self._validate_bash_path()
+        if not bash_path:
+            self._show_modal("错误", "未检测到有效的 bash.exe 路径", kind="error")
+            return
+        ps_profiles: list[tuple[Path, str]] = []
+        for target in MARKER_TARGETS:
+            if target.key in ("ps5", "ps7") and getattr(self, target.path_var).get():
+                ps_profiles.append((self._target_path(target), target.label))
+        self.is_running = True
+        self.status_var.set("执行中...")
+        self._set_buttons_state(False)
+        threading.Thread(target=self._run_setup, args=(bash_path, ps_profiles), daemon=True).start()
 
-    def _restore_row_buttons(self) -> None:
-        """恢复禁用前的行按钮状态，集中管理以减少重复分支。"""
-        # 若禁用期间已有检测逻辑刷新过行状态，则跳过恢复，保持最新检测结果
-        if getattr(self, "_row_btn_state_cache_dirty", False):
-            self._row_btn_state_cache.clear()
+    def _set_buttons_state(self, enabled: bool) -> None:
+        # 缓存各行按钮原始状态，结束时按需恢复，避免强制启用缺失工具的按钮
+        if not hasattr(self, "_row_btn_state_cache"):
+            self._row_btn_state_cache: dict[str, str] = {}
+            self._row_btn_state_cache_dirty = False
+            self._row_btn_state_locked = False
+        self._update_restore_button_state(enabled)
+        if not enabled:
+            # 记录当前状态后统一禁用
+            self._row_btn_state_cache = {k: row["btn"].cget("state") for k, row in self._row_widgets.items()}
             self._row_btn_state_cache_dirty = False
+            self._row_btn_state_locked = True
+            for row in self._row_widgets.values():
+                row["btn"].config(state="disabled")
+            if hasattr(self, "backup_btn"):
+                self.backup_btn.config(state="disabled")
             return
 
-        for key, row in self._row_widgets.items():
-            prev_state = self._row_btn_state_cache.get(key)
-            if prev_state and row["btn"].cget("state") == "disabled":
-                row["btn"].config(state=prev_state)
-        self._row_btn_state_cache.clear()
-
-    def _has_any_original_backup(self) -> bool:
-        """检查是否存在任意 shell 的原始配置备份文件。"""
-        try:
-            locations = [self._backup_root]
-            for root in locations:
-                if not root.exists():
-                    continue
-                for name in ("ps5.orig", "ps7.orig", "git_bash.orig", "vscode.orig", "shell_reg.orig"):
-                    if (root / name).exists():
-                        return True
-        except Exception:
-            return False
-        return False
+        self._row_btn_state_locked = False
+        self._restore_row_buttons()
+        self._refresh_start_button_state(enabled)
+        self._refresh_reset_default_button_state(enabled)
+        if hasattr(self, "backup_btn"):
+            self.backup_btn.config(state="normal")
 
-    def _cleanup_backups(self) -> None:
-        """删除所有原始配置备份文件，若目录为空则一并移除。"""
-        try:
-            root = self._backup_root
-            if not root.exists():
-                return
-            for name in ("ps5.orig", "ps7.orig", "git_bash.orig", "vscode.orig", "shell_reg.orig"):
-                file = root / name
-                if file.exists():
-                    try:
-                        file.unlink()
-                    except Exception:
-                        pass
-            # 若目录已空则删除目录，保持整洁
-            try:
-                next(root.iterdir())
-            except StopIteration:
-                try:
-                    root.rmdir()
-                except Exception:
-                    pass
-        except Exception:
+    def _refresh_reset_default_button_state(self, baseline_enabled: bool = True) -> None:
+        if not hasattr(self, "reset_default_btn"):
             return
-
-    def _update_restore_button_state(self, buttons_enabled: bool | None = None) -> None:
-        """根据备份存在情况更新“恢复配置”按钮状态（有备份才可点击）。"""
-        if not hasattr(self, "restore_btn"):
+        if not baseline_enabled or self.is_running:
+            self.reset_default_btn.config(state="disabled")
             return
-        if buttons_enabled is None:
-            buttons_enabled = not self.is_running
-        # 只要存在原始配置备份且当前未在执行中，就允许点击；权限不足时在恢复时通过异常与日志反馈
-        enabled = buttons_enabled and self._has_any_original_backup()
-        state = "normal" if enabled else "disabled"
-        self.restore_btn.config(state=state)
+        state = "disabled" if self._snapshots.current.system_default_console else "normal"
+        self.reset_default_btn.config(state=state)
 
-    # --------- 检测调度 ---------
-    def _detect_all_paths_in_thread(self, log: bool = True) -> None:
-        """后台线程执行检测，避免启动/重新检测阻塞 UI。"""
-        if self.is_running or getattr(self, "_detecting", False):
+    def _refresh_start_button_state(self, baseline_enabled: bool = True) -> None:
+        """根据当前检测状态决定开始按钮是否可用。"""
+        if not baseline_enabled:
+            self.start_btn.config(state="disabled")
             return
-        self._detecting = True
-        self.status_var.set("正在检测工具与编码状态...")
-        self._set_buttons_state(False)
-        threading.Thread(
-            target=self._run_detect_all_paths_safe, args=(log,), daemon=True
-        ).start()
+        snapshot = self._snapshots.current
+        status = dict(snapshot.shell_status)
+        detail = snapshot.tool_detail
+        availability = snapshot.availability
+        considered = {k: v for k, v in status.items() if availability.get(k)}
+        # 若任一可用项处于不可读取状态，禁止执行以避免再次污染
+        for k, v in detail.items():
+            if availability.get(k) and isinstance(v, Mapping) and str(v.get("state")) == "unreadable":
+                self.start_btn.config(state="disabled")
+                return
+        all_configured = considered and all(considered.values())
+        # 仅当可用的 shell 均已配置且控制台 CodePage 为 UTF-8 时禁用
+        if all_configured and self._all_consoles_utf8():
+            self.start_btn.config(state="disabled")
+        else:
+            self.start_btn.config(state="normal")
 
-    def _run_detect_all_paths_safe(self, log: bool) -> None:
-        try:
-            self._detect_all_paths(log=log)
-        finally:
-            self._ui_call(self._on_detect_done)
+    @PROFILER.profiled("setup")
+    def _run_setup(self, bash_path: Path, ps_profiles: list[tuple[Path, str]]) -> None:
+        self._console_log_buffer.clear()
+        ops: list[tuple[str, Callable[[], None]]] = []
 
-    def _on_detect_done(self) -> None:
-        self._detecting = False
-        self._set_buttons_state(True)
-        self._refresh_start_button_state()
+        def advance() -> None:
+            self._progress_advance(1)
 
-    def _detect_all_paths(self, log: bool = True) -> None:
-        # 如果上一条日志是检测分隔线，先清理本次检测段落，避免重复追加
-        t0 = time.perf_counter()
-        if log:
-            self._trim_last_detection_block()
-            self._log_separator("检测开始")
-        self._detect_ps5(log=log)
-        self._detect_ps7(log=log)
-        self._detect_git_paths(log=log)
-        self._detect_vscode(log=log)
-        if log:
-            # 在检测块中输出“哪些内容被手动更改”的差异提示
-            self._log_config_drift_report()
-        if log:
-            self._log(f"检测耗时 {time.perf_counter() - t0:.2f}s", "info")
-            self._log_separator("检测结束")
-        # 先刷新编码/环境，再基于结果刷新汇总与按钮状态
-        self._update_console_state_label()
-        self._refresh_env_tool_labels()
-        self._refresh_config_status_label()
-        self._refresh_start_button_state()
-        self._refresh_reset_default_button_state()
+        self._log_separator("执行开始")
+        self._log("工具配置：", "info")
 
-    def _detect_ps5(self, log: bool = True) -> None:
-        candidate = None
-        which_ps = shutil.which("powershell")
-        if which_ps:
-            candidate = Path(which_ps).resolve()
-        if candidate is None:
-            sys_root = os.environ.get("SystemRoot", r"C:\Windows")
-            candidate = Path(sys_root) / "System32" / "WindowsPowerShell" / "v1.0" / "powershell.exe"
-        if candidate is None or not candidate.exists():
-            for target in self._shortcut_targets(["**/Windows PowerShell*.lnk"]):
-                if target.exists():
-                    candidate = target
-                    break
-        if candidate.exists():
-            self._ps5_exe = candidate
-            self._ps5_available = True
-            profile_exists = self._ps5_profile_path.exists()
-            path_text = str(self._ps5_profile_path) if profile_exists else "未找到配置文件，将在执行时创建"
-            self.ps5_path_var.set(path_text)
-            status = f"已检测到: {candidate}"
-            self._set_row_state("ps5", profile_exists, status, path_text, placeholder=not profile_exists)
-            if log:
-                self._log(f"检测到 Windows PowerShell 5.1: {candidate}", "success")
-        else:
-            self._ps5_available = False
-            self._ps5_exe = None
-            missing_msg = "未检测到 Windows PowerShell 5.1，请在安装后再次执行配置"
-            self.ps5_path_var.set(missing_msg)
-            self._set_row_state("ps5", False, missing_msg, missing_msg, placeholder=True)
-            if log:
-                self._log("未检测到 Windows PowerShell 5.1", "warning")
+        # 0) 记录执行前的历史快照（内容与上一代相同时不新建代次）
+        ops.append(("snapshot", lambda: self._snapshot_generation("setup")))
 
-    def _detect_ps7(self, log: bool = True) -> None:
-        path = None
-        which_pwsh = shutil.which("pwsh")
-        if which_pwsh:
-            path = Path(which_pwsh).resolve()
-        else:
-            pf = os.environ.get("ProgramFiles", r"C:\Program Files")
-            pf86 = os.environ.get("ProgramFiles(x86)", r"C:\Program Files (x86)")
-            pf64 = os.environ.get("ProgramW6432", pf)
-            search_roots = [pf, pf86, pf64]
-            candidates: list[Path] = []
-            for root in search_roots:
-                if not root:
+        # 1) 校验 Git Bash
+        ops.append(("verify_bash", lambda: self._verify_bash(bash_path)))
+
+        # 2) 按注册表顺序配置各目标：Windows PowerShell 5.1 / PowerShell 7+ / Git Bash / Visual Studio Code
+        availability = self._snapshots.current.availability
+        for target in CONFIG_TARGETS:
+            ops.append((target.step, self._setup_target_op(target, bash_path, availability)))
+
+        # 3) 控制台编码
+        def _console_utf8() -> None:
+            self._log("控制台编码：", "info")
+            backup_exists = self._backups.has_original("shell_reg")
+            code_logs = self._update_console_codepage(apply_utf8=True, emit_log=False)
+            if not backup_exists and self._backups.has_original("shell_reg"):
+                data = self._load_console_reg_backup()
+                placeholder = data and all(v == "__EMPTY_BACKUP__" for v in data.values())
+                suffix = "占位（源文件不存在）" if placeholder else "原始配置备份"
+                self._log(f"已创建 控制台编码 {suffix}: {self._backup_root}", "info")
+            logged: set[str] = set()
+            # 按 PS5 -> PS7 -> WT 顺序输出；若 PS7 未安装追加警告
+            for level, message in code_logs:
+                if "PowerShell 7+" in message:
+                    # 控制台编码部分只在实际存在时输出，缺失时后续补警告
+                    self._log(message, level)
+                    logged.add(message)
+                elif "Windows PowerShell 5.1" in message:
+                    self._log(message, level)
+                    logged.add(message)
+            if not (self._ps7_available and self._ps7_exe):
+                self._log("PowerShell 7+: 未安装，跳过执行", "warning")
+            for level, message in code_logs:
+                if "Windows Terminal" in message:
+                    self._log(message, level)
+                    logged.add(message)
+            for level, message in code_logs:
+                if message in logged:
                     continue
-                candidates.extend(sorted(Path(root).glob("PowerShell/*/pwsh.exe"), reverse=True))
-            for c in candidates:
-                if c.exists():
-                    path = c
-                    break
-        if path is None:
-            for loc in self._registry_install_locations(["powershell 7"]):
-                candidate = Path(loc) / "pwsh.exe"
-                if candidate.exists():
-                    path = candidate
-                    break
-        if path is None:
-            for target in self._shortcut_targets(["**/PowerShell 7*.lnk"]):
-                if target.exists():
-                    path = target
-                    break
-        if path and path.exists():
-            self._ps7_exe = path
-            self._ps7_available = True
-            profile_exists = self._ps7_profile_path.exists()
-            path_text = str(self._ps7_profile_path) if profile_exists else "未找到配置文件，将在执行时创建"
-            self.ps7_path_var.set(path_text)
-            status = f"已检测到: {path}"
-            self._set_row_state("ps7", profile_exists, status, path_text, placeholder=not profile_exists)
-            if log:
-                self._log(f"检测到 PowerShell 7+: {path}", "success")
-        else:
-            self._ps7_available = False
-            self._ps7_exe = None
-            missing_msg = "未检测到 PowerShell 7+，请在安装后再次执行配置"
-            self.ps7_path_var.set(missing_msg)
-            self._set_row_state("ps7", False, missing_msg, missing_msg, placeholder=True)
-            if log:
-                self._log("未检测到 PowerShell 7+", "warning")
+                self._log(message, level)
 
-    def _apply_window_position(self) -> None:
-        cfg = self._load_config()
-        if cfg:
-            x, y = cfg.get("x"), cfg.get("y")
-            if all(isinstance(v, int) and v > 0 for v in (x, y)):
-                # 使用当前窗口尺寸，只应用保存的坐标
-                self.root.update_idletasks()
-                min_w, min_h = self.root.minsize()
-                w = self.root.winfo_width() or min_w
-                h = self.root.winfo_height() or min_h
-                self.root.geometry(f"{w}x{h}+{x}+{y}")
+        ops.append(("console_codepage", _console_utf8))
+
+        # 7) 刷新检测（工作线程内生成新快照，发布后由主线程统一刷新界面）
+        ops.append(("redetect", lambda: self._detect_all_paths(log=False)))
+
+        # 进度条：每个操作前后各一次（操作列表构建完成后再计算总数）
+        self._progress_start(len(ops) * 2)
+        for op_name, action in ops:
+            advance()
+            try:
+                with TRACER.span(f"setup.{op_name}", "setup"):
+                    action()
+            except Exception as exc:  # noqa: BLE001
+                self._log(f"执行失败: {exc}", "error")
+                self._ui_call(self.status_var.set, "执行中断，请查看日志")
+                self._ui_call(self._refresh_config_status_label)
+                self._flush_console_logs()
+                self._finish(False)
                 return
-        self._center_window()
+            advance()
 
-    def _center_window(self) -> None:
-        self.root.update_idletasks()
-        min_w, min_h = self.root.minsize()
-        w = self.root.winfo_reqwidth() or self.root.winfo_width() or min_w
-        h = self.root.winfo_reqheight() or self.root.winfo_height() or min_h
-        screen_w = self.root.winfo_screenwidth()
-        screen_h = self.root.winfo_screenheight()
-        x = int((screen_w - w) / 2)
-        y = int((screen_h - h) / 2)
-        self.root.geometry(f"{w}x{h}+{x}+{y}")
+        self._flush_console_logs()
+        self._finish(True)
+        self._log_separator("执行结束")
+
+    def _finish(self, success: bool) -> None:
+        """在主线程收尾并弹出提示，避免后台线程直接操作 UI。"""
+
+        def _do_finish() -> None:
+            self.is_running = False
+            self._set_buttons_state(True)
+            self._refresh_reset_default_button_state()
+            if success:
+                self._show_modal("完成", "配置完成，请重启 PowerShell / Git Bash / Visual Studio Code 后生效。", kind="info")
+            else:
+                self._show_modal("中断", "配置未全部完成，请检查日志。", kind="warning")
+
+        self._ui_call(_do_finish)
+
+    def _verify_bash(self, bash_path: Path) -> None:
+        if not bash_path.exists():
+            raise FileNotFoundError(f"未找到 bash.exe: {bash_path}")
+        result = subprocess.run(
+            [str(bash_path), "--version"],
+            capture_output=True,
+            text=True,
+            check=False,
+            creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, "CREATE_NO_WINDOW") else 0,
+        )
+        if result.returncode != 0:
+            raise RuntimeError(f"bash --version 返回码 {result.returncode}")
+
+    def _setup_target_op(
+        self, target: ConfigTarget, bash_path: Path, availability: Mapping[str, bool]
+    ) -> Callable[[], None]:
+        """返回配置单个目标的步骤；未安装的目标返回仅记录警告的步骤。"""
+        if target.kind == "vscode":
+            if availability.get(target.key):
+                return lambda: self._apply_vscode_settings(apply=True, log=True)
+            return lambda: self._log(f"{target.label}: 未检测到，跳过配置", "warning")
+        if target.requires_exe and not (availability.get(target.key) and getattr(self, target.path_var).get()):
+            return lambda: self._log(f"{target.label}: 未安装，跳过执行", "warning")
+        if target.key == "git":
+            return lambda: self._configure_bashrc_user(bash_path)
+        path = self._target_path(target)
+        return lambda: self._configure_marker_target(target, path)
+
+    def _configure_marker_target(self, target: ConfigTarget, path: Path) -> None:
+        """写入目标的标准配置块：先建立原始配置备份，再清理旧块与半截标记后追加到文件末尾。"""
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._ensure_original_backup(path, target.backup_key, target.label)
+        existing = path.read_text(encoding="utf-8", errors="ignore") if path.exists() else ""
+        block = target.template + "\n"
+        content, cleaned_partial = self._strip_block_tolerant(existing, target.marker_start, target.marker_end, block)
+        if cleaned_partial:
+            self._log("检测到残留半截标记（partial），已自动清理。", "info")
+        if content != existing and existing:
+            self._log(f"{target.label} {target.file_desc}中检测到旧的 Code-encoding-fix 配置块，已清理后重新写入", "info")
+        path.write_text((content.strip() + "\n\n" + block).strip() + "\n", encoding="utf-8")
+        self._log(f"已写入 {target.label} UTF-8 用户配置: {path}", "success")
 
-    def _on_close(self) -> None:
-        self._save_window_position()
-        self.root.destroy()
+    def _configure_powershell_profile(self, profile_path: Path, bash_path: Path, name: str) -> None:
+        target = TARGETS_BY_KEY["ps5" if "5.1" in name else "ps7"]
+        self._configure_marker_target(target, profile_path)
 
-    def _save_window_position(self) -> None:
-        try:
-            self._config_path.parent.mkdir(parents=True, exist_ok=True)
-            geom = self.root.winfo_geometry()
-            size_part, _, pos_part = geom.partition("+")
-            x_str, _, y_str = pos_part.partition("+")
-            data = {
-                "x": int(x_str),
-                "y": int(y_str),
-            }
-            self._config_path.write_text(json.dumps(data), encoding="utf-8")
-        except Exception:
-            pass
+    def _configure_bashrc_user(self, bash_path: Path) -> None:
+        if not bash_path.exists():
+            raise FileNotFoundError(f"无法定位 bash.exe: {bash_path}")
+        target = TARGETS_BY_KEY["git"]
+        self._configure_marker_target(target, self._target_path(target))
 
-    def _load_config(self) -> dict:
+    def _ensure_original_backup(self, path: Path, key: str, display: str) -> None:
+        """为配置文件创建首份原始配置备份，仅在备份不存在时执行。"""
         try:
-            if self._config_path.exists():
-                raw = json.loads(self._config_path.read_text(encoding="utf-8"))
-                # 只保留位置坐标，忽略旧的宽高字段
-                x = raw.get("x")
-                y = raw.get("y")
-                if isinstance(x, int) and isinstance(y, int):
-                    return {"x": x, "y": y}
-        except Exception:
-            return {}
-        return {}
-
-    def _is_admin(self) -> bool:
+            self._backup_root.mkdir(parents=True, exist_ok=True)
+        except Exception as exc:  # noqa: BLE001
+            self._log(f"创建备份目录失败 {self._backup_root}: {exc}", "warning")
+            return
+        if self._backups.has_original(key):
+            return
+        if not path.exists():
+            try:
+                self._backups.set_original(key, None)
+                self._log(f"已创建 {display} 原始配置备份占位（源文件不存在）: {self._backup_root}", "info")
+            except Exception as exc:  # noqa: BLE001
+                self._log(f"创建空占位备份失败 {key}: {exc}", "warning")
+            return
         try:
-            return bool(ctypes.windll.shell32.IsUserAnAdmin())
-        except Exception:
-            return False
+            content = path.read_text(encoding="utf-8", errors="ignore")
+        except Exception as exc:  # noqa: BLE001
+            self._log(f"读取待备份文件失败 {path}: {exc}", "warning")
+            return
+        target = TARGETS_BY_BACKUP_KEY.get(key)
+        marker_pair = (target.marker_start, target.marker_end) if target and target.kind == "marker" else None
+        if not content.strip():
+            try:
+                self._backups.set_original(key, None)
+                self._log(f"已创建 {display} 原始配置备份占位（源文件为空）: {self._backup_root}", "info")
+            except Exception as exc:  # noqa: BLE001
+                self._log(f"创建空占位备份失败 {key}: {exc}", "warning")
+            return
+        if marker_pair and marker_pair[0] in content and marker_pair[1] in content:
+            self._log(f"跳过备份（已是工具生成内容）: {path}", "info")
+            return
+        try:
+            self._backups.set_original(key, path.read_bytes())
+            self._log(f"已创建 {display} 原始配置备份: {self._backup_root}", "info")
+        except Exception as exc:  # noqa: BLE001
+            self._log(f"创建原始配置备份失败 {path}: {exc}", "warning")
 
-    def _ui_call(self, func: Callable, *args, **kwargs) -> None:
-        """在主线程执行 UI 更新，避免后台线程直接操作 Tk 控件。"""
-        self.root.after(0, lambda: func(*args, **kwargs))
+    @staticmethod
+    def _strip_block(content: str, start: str, end: str) -> str:
+        """移除内容中由 start/end 包裹的所有配置块，用于保证幂等写入。"""
+        pattern = re.compile(re.escape(start) + r".*?" + re.escape(end), re.DOTALL)
+        return re.sub(pattern, "", content)
 
-    def _set_progress(self, percent: int) -> None:
-        """安全设置进度条数值。"""
-        self._ui_call(self.progress_var.set, max(0, min(100, percent)))
 
-    def _progress_start(self, total_units: int) -> None:
-        """初始化线性进度，单位粒度可自定义。"""
-        self._progress_total_units = max(total_units, 1)
-        self._progress_done_units = 0
-        self._set_progress(0)
+    @staticmethod
+    def _strip_block_tolerant(content, start, end, expected_block):
+        """在仅出现 start 或 end 标记的情况下，尽量只清理工具可识别的残留片段，避免误删用户内容。"""
+        if content is None:
+            return content, False
+        # 先清理完整块（幂等）
+        content2 = SetupApp._strip_block(content, start, end)
+        if content2 != content:
+            content = content2
+        # 构建期望行集合（用于保守匹配清理）
+        exp_lines = []
+        for line in str(expected_block).splitlines():
+            s = line.strip()
+            if not s:
+                continue
+            if s == str(start).strip() or s == str(end).strip():
+                continue
+            exp_lines.append(s)
+        exp_set = set(exp_lines)
+        if not exp_set:
+            return content, False
+        lines_local = content.splitlines(True)
+        changed_any = False
 
-    def _progress_advance(self, units: int = 1) -> None:
-        """按单位推进进度。"""
-        if not hasattr(self, "_progress_total_units"):
-            return
-        self._progress_done_units = getattr(self, "_progress_done_units", 0) + units
-        percent = int(self._progress_done_units * 100 / max(self._progress_total_units, 1))
-        self._set_progress(percent)
+        def _norm(x):
+            return x.strip()
 
-    def _progress_finish(self) -> None:
-        """收尾进度为 100%。"""
-        self._set_progress(100)
-        self._progress_total_units = 0
-        self._progress_done_units = 0
+        # partial: start without end -> forward clean only expected lines
+        i = 0
+        while i < len(lines_local):
+            if _norm(lines_local[i]) == str(start).strip() and all(_norm(l) != str(end).strip() for l in lines_local[i+1:]):
+                j = i + 1
+                while j < len(lines_local):
+                    s = _norm(lines_local[j])
+                    if not s or s in exp_set:
+                        j += 1
+                        continue
+                    break
+                del lines_local[i:j]
+                changed_any = True
+                continue
+            i += 1
 
-    def _log(self, message: str, level: str = "info") -> None:
-        tag = {"info": "info", "success": "success", "warning": "warning", "error": "error"}.get(
-            level, "info"
-        )
+        # partial: end without start -> backward clean only expected lines
+        i = 0
+        while i < len(lines_local):
+            if _norm(lines_local[i]) == str(end).strip() and all(_norm(l) != str(start).strip() for l in lines_local[:i]):
+                j = i - 1
+                while j >= 0:
+                    s = _norm(lines_local[j])
+                    if not s or s in exp_set:
+                        j -= 1
+                        continue
+                    break
+                del lines_local[j+1:i+1]
+                changed_any = True
+                i = 0
+                continue
+            i += 1
 
-        def _append() -> None:
-            self.log_text.configure(state="normal")
-            self.log_text.insert("end", f"[{level.upper()}] {message}\n", tag)
-            self.log_text.configure(state="disabled")
-            self.log_text.see("end")
+        return ''.join(lines_local), changed_any
 
-        self.root.after(0, _append)
+    def _detect_cache_get(self, key: object) -> object | None:
+        return self._detect_cache.get(key)
+
+    def _detect_cache_put(self, key: object, value: object) -> None:
+        # 检测可能在多个工作线程中并发（旧代次尚未取消），LruCache 内部加锁
+        self._detect_cache.put(key, value)
+
+    def _cache_stats(self) -> list[dict[str, object]]:
+        return [cache.stats() for cache in (self._detect_cache, self._registry_cache, self._shortcut_cache)]
+
+    def _cache_debug_lines(self) -> list[tuple[str, str]]:
+        lines = [("info", "[调试] 缓存统计：")]
+        for st in self._cache_stats():
+            rate = "-" if st["hit_rate"] is None else f"{st['hit_rate']:.0%}"
+            lines.append(
+                (
+                    "info",
+                    f"[调试] {st['name']}: 大小 {st['size']}/{st['max_size']}，命中 {st['hits']}，未命中 {st['misses']}"
+                    f"（命中率 {rate}），淘汰 {st['evictions']}，过期 {st['expirations']}",
+                )
+            )
+        return lines
 
-    def _log_separator(self, label: str) -> None:
-        bar = "-" * 24
-        self._log(f"{bar} {label} {bar}", "info")
+    def _detect_shell_config_status(self) -> dict[str, bool]:
+        """返回当前已发布快照中的工具配置状态（True 表示该项配置“正确且一致”）。
 
-    def _show_modal(
-        self,
-        title: str,
-        message: str,
-        kind: str = "info",
-        confirm_text: str = "确定",
-        cancel_text: str = "取消",
-    ) -> bool:
-        """自定义模态对话框，确保相对主窗口居中。返回 True/False。"""
-        dialog = tk.Toplevel(self.root)
-        dialog.withdraw()
-        dialog.title(title)
-        dialog.transient(self.root)
-        dialog.resizable(False, False)
-        dialog.grab_set()
+        详细状态见 self._shell_marker_detail / self._tool_config_detail（同一快照的只读视图）。
+        """
+        return dict(self._snapshots.current.shell_status)
 
-        icon_text = {"info": "ℹ", "warning": "⚠", "error": "✖"}.get(kind, "ℹ")
-        fg = {"info": "#0b6e35", "warning": "#b8860b", "error": "#b00020"}.get(kind, "#222")
+    @TRACER.traced("detect.shell_config_status", "detect")
+    def _compute_shell_config_status(
+        self, bashrc_path: Path | None
+    ) -> tuple[dict[str, bool], dict[str, str], dict[str, dict[str, object]]]:
+        """检测工具配置是否满足期望（支持识别被手动改动的漂移），供检测线程生成快照。
 
-        frame = ttk.Frame(dialog, padding="16 12")
-        frame.grid(row=0, column=0, sticky="nsew")
-        dialog.columnconfigure(0, weight=1)
+        返回 (status, marker_detail, tool_detail)，不修改实例状态。
+        """
+        status: dict[str, bool] = {target.key: False for target in CONFIG_TARGETS}
+        detail: dict[str, str] = {}
+        tool_detail: dict[str, dict[str, object]] = {}
+        marker_paths = {"ps5": self._ps5_profile_path, "ps7": self._ps7_profile_path, "git": bashrc_path}
 
-        ttk.Label(frame, text=icon_text, foreground=fg, font=("Segoe UI", 16, "bold")).grid(
-            row=0, column=0, padx=(0, 12), sticky="n"
+        # 检测结果缓存：同一检测周期避免重复读取/解析
+        def _path_sig(p):
+            if not p:
+                return ('none',)
+            try:
+                p_str = str(p)
+            except Exception:
+                p_str = repr(p)
+            try:
+                st = p.stat()
+                return (p_str, getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size)
+            except FileNotFoundError:
+                return (p_str, 'missing')
+            except OSError:
+                return (p_str, 'unreadable')
+
+        cache_key = (
+            "shell_status",
+            *(_path_sig(marker_paths.get(target.key)) for target in MARKER_TARGETS),
+            *(hash(target.template) for target in MARKER_TARGETS),
+            EQUIVALENCE.revision,
         )
-        ttk.Label(frame, text=message, justify="left", wraplength=360).grid(row=0, column=1, sticky="w")
+        cached = self._detect_cache_get(cache_key)
+        if cached is not None:
+            return cached
 
-        result = {"value": False}
+        for target in CONFIG_TARGETS:
+            analyzed = self._analyze_target(target, marker_paths.get(target.key))
+            state = str(analyzed.get("state", "missing"))
+            detail[target.key] = state
+            tool_detail[target.key] = analyzed
+            status[target.key] = state == "ok"
+
+        self._detect_cache_put(cache_key, (status, detail, tool_detail))
+        return status, detail, tool_detail
+
+    def _analyze_target(self, target: ConfigTarget, path: Path | None) -> dict[str, object]:
+        """分析单个目标的配置状态（检测快照与漂移守护共用）；VS Code 目标忽略 path，按 APPDATA 定位。"""
+        if target.kind != "marker":
+            return self._detect_vscode_settings_drift()
+        return self._analyze_marker_block(
+            path,
+            target.marker_start,
+            target.marker_end,
+            target.template,
+            equivalent_check=EQUIVALENCE.checker(target.equivalence) if target.equivalence else None,
+            pattern=target.block_pattern,
+            expected_normalized=target.template_normalized,
+        )
 
-        def on_confirm() -> None:
-            result["value"] = True
-            dialog.destroy()
+    def _refresh_config_status_label(self) -> None:
+        """根据配置状态刷新路径区域的汇总提示。"""
+        snapshot = self._snapshots.current
+        status = dict(snapshot.shell_status)
+        labels = TARGET_LABELS
 
-        def on_cancel() -> None:
-            result["value"] = False
-            dialog.destroy()
+        availability = snapshot.availability
+        considered = {k: v for k, v in status.items() if availability.get(k)}
 
-        btn_row = ttk.Frame(frame)
-        btn_row.grid(row=1, column=0, columnspan=2, pady=(12, 0))
-        ttk.Button(btn_row, text=confirm_text, command=on_confirm, width=12).pack(side="left", padx=(0, 8))
-        if kind == "confirm":
-            ttk.Button(btn_row, text=cancel_text, command=on_cancel, width=12).pack(side="left")
+        configured = [labels[k] for k, v in considered.items() if v]
+        missing = [labels[k] for k, v in considered.items() if not v]
 
-        self.root.update_idletasks()
-        dialog.update_idletasks()
-        root_x = self.root.winfo_rootx()
-        root_y = self.root.winfo_rooty()
-        min_w, min_h = self.root.minsize()
-        root_w = self.root.winfo_width() or self.root.winfo_reqwidth() or min_w
-        root_h = self.root.winfo_height() or self.root.winfo_reqheight() or min_h
-        win_w = dialog.winfo_width() or 320
-        win_h = dialog.winfo_height() or 180
-        pos_x = root_x + max(0, int((root_w - win_w) / 2))
-        pos_y = root_y + max(0, int((root_h - win_h) / 2))
-        dialog.geometry(f"{win_w}x{win_h}+{pos_x}+{pos_y}")
-        dialog.deiconify()
-        dialog.lift(self.root)
-        dialog.focus_set()
-        dialog.protocol("WM_DELETE_WINDOW", on_cancel)
-        dialog.wait_window()
-        return bool(result["value"])
+        if all(considered.values()):
+            tools_status = "已全部配置UTF-8"
+        elif any(considered.values()):
+            tools_status = "已部分配置UTF-8"
+        else:
+            tools_status = "未配置UTF-8"
 
-    def _show_log_menu(self, event: tk.Event) -> None:  # type: ignore[override]
-        try:
-            self.log_menu.tk_popup(event.x_root, event.y_root)
-        finally:
-            self.log_menu.grab_release()
+        console_status_list = getattr(self, "_console_summary_list", [])
+        console_status = getattr(self, "_console_config_status", "未配置UTF-8")
+
+        tools_text = f"工具：{tools_status}"
+        console_text = f"编码：{console_status}"
+        line = " | ".join([tools_text, console_text])
+
+        # 漂移提示：用于快速定位“哪些内容被手动改动”
+        drift_labels: list[str] = []
+        detail = snapshot.marker_detail
+        for k in considered.keys():
+            state = detail.get(k, "")
+            if state in {"partial", "duplicate", "modified", "unreadable", "error"}:
+                drift_labels.append(labels.get(k, k))
+        if drift_labels:
+            shown = drift_labels[:4]
+            suffix = f"等{len(drift_labels)}项" if len(drift_labels) > 4 else ""
+            line = f"{line}（检测到改动: {', '.join(shown)}{suffix}）"
+
+        line = f"{line}。 请重新打开终端/shell工具以应用设置！"
+        self.status_var.set(line)
 
-    def _clear_log(self) -> None:
-        self.log_text.configure(state="normal")
-        self.log_text.delete("1.0", "end")
-        self.log_text.configure(state="disabled")
+        # 工具行内展示：漂移结论 + 简要原因（避免误导为手动改动）
+        def _brief(item):
+            if not isinstance(item, Mapping):
+                return '未检测'
+            state = str(item.get('state') or 'unknown')
+            summary = str(item.get('summary') or '').strip()
+            if state == 'ok':
+                return 'utf-8编码已正确配置'
+            if state == 'missing':
+                return '未检测到 UTF-8 配置（可能被删除或尚未配置）'
+            if state == 'partial':
+                return '残缺标记（可自动清理）'
+            if state == 'duplicate':
+                return '重复块（将自动去重）'
+            if state == 'modified':
+                return '已偏离（执行时将覆盖修复）'
+            if state == 'unreadable':
+                return '不可读取'
+            if summary:
+                return summary
+            return state
 
-    def _trim_last_detection_block(self) -> None:
-        """若日志尾部为检测块，则移除尾部检测块（保留其他日志）；否则不处理。"""
-        content = self.log_text.get("1.0", "end-1c")
-        if not content.strip():
-            return
-        marker_start = "------------------------ 检测开始 ------------------------"
-        marker_end = "------------------------ 检测结束 ------------------------"
-
-        lines = content.splitlines(keepends=True)
-        start_idx = end_idx = None
-        for idx, line in enumerate(lines):
-            if marker_start in line:
-                start_idx = idx
-            if marker_end in line:
-                end_idx = idx
-
-        if start_idx is None or end_idx is None or end_idx < start_idx:
+        for target in CONFIG_TARGETS:
+            key = target.key
+            row = getattr(self, '_row_widgets', {}).get(key)
+            if not isinstance(row, dict):
+                continue
+            w = row.get('status_full')
+            if w is None:
+                continue
+            try:
+                w.config(text=_brief(snapshot.tool_detail.get(key)))
+            except Exception:
+                pass
+    def _restore_configs(self) -> None:
+        """恢复 PowerShell 与 Git Bash 配置到原始配置备份版本（后台线程执行，避免卡 UI）。"""
+        if self.is_running:
             return
-        # 仅当结束标记后无其他非空内容时才认为尾部是检测块
-        if any(l.strip() for l in lines[end_idx + 1 :]):
+        self._log_separator("恢复开始")
+        self._restore_start_logged = True
+        self._set_buttons_state(False)
+        confirm = self._show_modal(
+            "恢复已备份配置",
+            "将 工具配置、控制台编码和 shell 语言环境 恢复到首次执行时的状态，会覆盖之后的手动修改。\n\n是否继续？",
+            kind="confirm",
+            confirm_text="继续",
+            cancel_text="取消",
+        )
+        if not confirm:
+            self._log("恢复已取消", "warning")
+            self._log_separator("恢复结束")
+            self._set_buttons_state(True)
             return
 
-        kept = lines[:start_idx]
-        new_content = "".join(kept).rstrip()
-        self.log_text.configure(state="normal")
-        self.log_text.delete("1.0", "end")
-        if new_content:
-            self.log_text.insert("end", new_content + "\n")
-        self.log_text.configure(state="disabled")
+        self.is_running = True
+        threading.Thread(target=self._run_restore, daemon=True).start()
 
-    # --------- 通用候选路径收集工具 ---------
-    def _registry_install_locations(self, keywords: list[str]) -> list[Path]:
-        """从卸载注册表读取 InstallLocation，关键词大小写不敏感。"""
-        key_tuple = tuple(sorted(k.lower() for k in keywords))
-        if key_tuple in self._registry_cache:
-            return list(self._registry_cache[key_tuple])
-        if winreg is None:
-            return []
-        locations: list[Path] = []
-        hives = [
-            (winreg.HKEY_LOCAL_MACHINE, "HKLM"),
-            (winreg.HKEY_CURRENT_USER, "HKCU"),
-        ]
-        views = [0]
-        if hasattr(winreg, "KEY_WOW64_64KEY"):
-            views = [winreg.KEY_WOW64_64KEY, winreg.KEY_WOW64_32KEY]
-        for hive, _ in hives:
-            for view in views:
-                try:
-                    key = winreg.OpenKey(
-                        hive,
-                        r"Software\Microsoft\Windows\CurrentVersion\Uninstall",
-                        0,
-                        winreg.KEY_READ | view,
-                    )
-                except OSError:
-                    continue
-                try:
-                    i = 0
-                    while True:
-                        try:
-                            subkey_name = winreg.EnumKey(key, i)
-                        except OSError:
-                            break
-                        i += 1
-                        try:
-                            subkey = winreg.OpenKey(key, subkey_name)
-                            display_name, _ = winreg.QueryValueEx(subkey, "DisplayName")
-                        except OSError:
-                            continue
-                        name_lower = str(display_name).lower()
-                        if not any(k.lower() in name_lower for k in keywords):
-                            continue
-                        try:
-                            loc, _ = winreg.QueryValueEx(subkey, "InstallLocation")
-                        except OSError:
-                            loc = ""
-                        if loc:
-                            p = Path(loc).expanduser()
-                            if p.exists():
-                                locations.append(p)
-                finally:
-                    try:
-                        winreg.CloseKey(key)
-                    except Exception:
-                        pass
-        seen = set()
-        uniq: list[Path] = []
-        for loc in locations:
-            if loc not in seen:
-                seen.add(loc)
-                uniq.append(loc)
-        self._registry_cache[key_tuple] = uniq
-        return uniq
+    @PROFILER.profiled("restore")
+    def _run_restore(self) -> None:
+        """后台执行恢复逻辑，完成后调回主线程更新 UI。"""
+        try:
+            default_lang, default_lc_all, default_cp = self._system_default_locale()
 
-    def _shortcut_targets(self, patterns: list[str]) -> list[Path]:
-        """解析开始菜单快捷方式目标路径（最佳努力，依赖 PowerShell COM）。"""
-        pat_tuple = tuple(sorted(patterns))
-        if pat_tuple in self._shortcut_cache:
-            return list(self._shortcut_cache[pat_tuple])
-        start_roots = [
-            Path(os.environ.get("ProgramData", r"C:\ProgramData"))
-            / "Microsoft"
-            / "Windows"
-            / "Start Menu"
-            / "Programs",
-            Path(os.environ.get("APPDATA", Path.home()))
-            / "Microsoft"
-            / "Windows"
-            / "Start Menu"
-            / "Programs",
-        ]
-        pwsh = shutil.which("powershell") or shutil.which("pwsh")
-        if not pwsh:
-            return []
+            progress = self._restore_progress
+            # 备份校验失败而拒绝恢复的目标：保留其原始配置条目，摘要中单独提示
+            refused: dict[str, str] = {}
 
-        existing_roots = [str(r) for r in start_roots if r.exists()]
-        if not existing_roots:
-            self._shortcut_cache[pat_tuple] = []
-            return []
+            def restore_one(
+                task: str, path: Path, key: str, display: str, allow_delete_if_no_backup: bool = False
+            ) -> tuple[str, str]:
+                original = self._backups.original(key)
+                if original is None:
+                    if allow_delete_if_no_backup and path.exists():
+                        try:
+                            path.unlink()
+                            return "success", f"{display}: 原始为空，已删除当前配置文件"
+                        except Exception as exc:  # noqa: BLE001
+                            return "warning", f"{display}: 尝试删除配置文件失败 {exc}"
+                    return "warning", f"{display}: 未找到原始配置备份，跳过"
+                try:
+                    content = self._backups.load(original)
+                except BackupIntegrityError as exc:
+                    refused[key] = display
+                    return "error", f"{display}: 备份校验失败，已拒绝恢复并保留当前配置（{exc}）"
+                except Exception as exc:  # noqa: BLE001
+                    return "warning", f"{display}: 读取备份失败 {exc}"
+                progress.advance(task)
+                if content is None:
+                    try:
+                        if path.exists():
+                            path.unlink()
+                            return "success", f"{display}: 原始为空，已删除当前配置文件"
+                        return "success", f"{display}: 原始为空，无需删除当前配置文件"
+                    except Exception as exc:  # noqa: BLE001
+                        return "warning", f"{display}: 删除文件失败 {exc}"
+                try:
+                    path.parent.mkdir(parents=True, exist_ok=True)
+                    path.write_bytes(content)
+                    return "success", f"{display}: 已从原始配置备份恢复"
+                except Exception as exc:  # noqa: BLE001
+                    return "warning", f"{display}: 恢复失败 {exc}"
 
-        # 使用单次 PowerShell 批量解析，减少进程开销
-        pattern_clause = " -or ".join([f"($_.Name -like '{p}')" for p in patterns])
-        roots_literal = ",".join([f"'{r}'" for r in existing_roots])
-        ps_script = ";".join(
-            [
-                "$ErrorActionPreference='SilentlyContinue'",
-                f"$roots=@({roots_literal})",
-                "$ws=New-Object -ComObject WScript.Shell",
-                "$res=@()",
-                "foreach($r in $roots){",
-                " if(Test-Path $r){",
-                "   Get-ChildItem -LiteralPath $r -Filter *.lnk -Recurse | Where-Object {"
-                f" {pattern_clause} }} | ForEach-Object {{"
-                "     $s=$ws.CreateShortcut($_.FullName);"
-                "     if($s -and $s.TargetPath){ $res += $s.TargetPath }"
-                "   }",
-                " }",
-                "}",
-                "$res | Sort-Object -Unique",
-            ]
-        )
-        targets: list[Path] = []
-        try:
-            proc = subprocess.run(
-                [pwsh, "-NoProfile", "-Command", ps_script],
-                capture_output=True,
-                text=True,
-                timeout=3,
+            def restore_vscode() -> tuple[str, str]:
+                self._apply_vscode_settings(apply=False, log=False)
+                vscode_result = getattr(self, "_vscode_restore_result", "")
+                if vscode_result in ("restored", "restored-cleaned"):
+                    msg = "Visual Studio Code 已从原始配置备份恢复"
+                    if vscode_result == "restored-cleaned":
+                        msg += "（已清理工具块残留）"
+                    return "success", msg
+                if vscode_result == "cleaned-no-backup":
+                    return "warning", "Visual Studio Code 未找到原始备份，已清理当前配置中的工具块残留"
+                if vscode_result == "no-backup":
+                    return "warning", "Visual Studio Code 未找到原始备份，未改动当前配置文件"
+                if vscode_result == "backup-corrupt":
+                    refused["vscode"] = "Visual Studio Code"
+                    return "error", "Visual Studio Code: 备份校验失败，已拒绝恢复并保留当前配置"
+                if not getattr(self, "_vscode_available", False):
+                    return "warning", "Visual Studio Code: 未安装，跳过恢复"
+                return "info", "Visual Studio Code: 已检测到，可手动检查 settings.json"
+
+            # 恢复前先把当前状态存为一代，恢复本身也可回滚
+            with TRACER.span("restore.snapshot", "restore"):
+                self._snapshot_generation("restore")
+
+            # 各目标互不依赖：并发恢复，结果按固定顺序汇总到同一摘要
+            tasks: list[tuple[str, Callable[[], object]]] = []
+            availability = self._snapshots.current.availability
+            for target in CONFIG_TARGETS:
+                if target.kind == "vscode":
+                    tasks.append((target.step, restore_vscode))
+                elif target.requires_exe and not availability.get(target.key):
+                    tasks.append((target.step, lambda t=target: ("warning", f"{t.label}: 未安装，跳过恢复")))
+                else:
+                    path = self._target_path(target)
+                    tasks.append(
+                        (target.step, lambda t=target, p=path: restore_one(t.step, p, t.backup_key, t.label, True))
+                    )
+            tasks.append(
+                (
+                    "console_codepage",
+                    lambda: self._update_console_codepage(apply_utf8=False, emit_log=False, fallback_cp=default_cp),
+                )
             )
-            if proc.stdout:
-                for line in proc.stdout.splitlines():
-                    p = Path(line.strip()).expanduser()
-                    if p.exists():
-                        targets.append(p.resolve())
-        except Exception:
-            pass
+            # 清理备份条目需等全部目标完成，作为最后一个进度目标
+            progress.start([name for name, _ in tasks] + ["cleanup_backups"], steps=2)
+            results = self._run_restore_tasks(tasks)
+            tool_logs = [results[target.step] for target in CONFIG_TARGETS]
+            console_logs = results["console_codepage"]
 
-        seen = set()
-        uniq: list[Path] = []
-        for t in targets:
-            if t not in seen:
-                seen.add(t)
-                uniq.append(t)
-        self._shortcut_cache[pat_tuple] = uniq
-        return uniq
+            with TRACER.span("restore.cleanup_backups", "restore"):
+                self._cleanup_backups(keep=refused)
+            progress.finish("cleanup_backups")
 
-    def _detect_git_paths(self, log: bool = True) -> None:
-        primary_paths: list[Path] = []
-        env_paths = [
-            os.environ.get("ProgramFiles"),
-            os.environ.get("ProgramFiles(x86)"),
-            os.environ.get("ProgramW6432"),
-            os.environ.get("USERPROFILE"),
-        ]
-        for base in env_paths:
-            if not base:
-                continue
-            base_path = Path(base)
-            primary_paths.append(base_path / "Git")
-            primary_paths.append(base_path / "AppData" / "Local" / "Programs" / "Git")
+            if not getattr(self, "_restore_start_logged", False):
+                self._log_separator("恢复开始")
+            self._restore_start_logged = False
 
-        bash_in_path = shutil.which("bash")
-        if bash_in_path:
-            primary_paths.append(Path(bash_in_path).resolve().parents[1])
-        git_in_path = shutil.which("git")
-        if git_in_path:
-            git_root = Path(git_in_path).resolve().parent.parent
-            primary_paths.append(git_root)
+            self._log("工具配置：", "info")
+            for level, msg in tool_logs:
+                self._log(msg, level)
 
-        program_data = os.environ.get("ProgramData", r"C:\ProgramData")
-        secondary_paths = [
-            Path(program_data) / "chocolatey" / "lib" / "git" / "tools",
-            Path.home() / "scoop" / "apps" / "git" / "current",
-            Path("D:/Programs/Git"),
-            Path.home() / "AppData" / "Local" / "Programs" / "Git",
-        ]
+            self._log("控制台编码：", "info")
+            if self._ps5_available and self._ps5_exe:
+                self._log(f"Windows PowerShell 5.1 已恢复原始值 CodePage {default_cp}", "success")
+            else:
+                self._log("Windows PowerShell 5.1: 未安装，跳过恢复", "warning")
+            if not (self._ps7_available and self._ps7_exe):
+                self._log("PowerShell 7+: 未安装，跳过恢复", "warning")
+            else:
+                self._log(f"PowerShell 7+ 已恢复原始值 CodePage {default_cp}", "success")
+            if self._snapshots.current.wt_exe:
+                self._log(f"Windows Terminal 已恢复原始值 CodePage {default_cp}", "success")
+            else:
+                self._log("Windows Terminal: 未检测到，跳过恢复", "warning")
+            self._log(f"CMD 已恢复原始值 CodePage {default_cp}", "success")
+            for level, message in console_logs:
+                if "error" in level:
+                    self._log(message, level)
 
-        found: Path | None = None
-        for path in primary_paths:
-            bash = path / "bin" / "bash.exe"
-            if bash.exists():
-                found = bash
-                break
+            self._log_separator("执行结束")
 
-        if not found:
-            # 仅在快速路径未命中时再做重扫描（注册表/快捷方式），避免启动慢
-            for loc in self._registry_install_locations(["git for windows", "git version", "git"]):
-                secondary_paths.append(loc)
-            for target in self._shortcut_targets(["Git Bash*.lnk", "Git*.lnk"]):
-                if target.name.lower().startswith("git-bash") or target.name.lower() == "bash.exe":
-                    secondary_paths.append(target.parent.parent)
+            # 组装完成摘要
+            header = "恢复完成，请重新检测或重新执行配置以生效。"
+            if refused:
+                header += "\n\n⚠ 以下目标的备份校验失败，已拒绝恢复并保留当前配置：" + "、".join(refused.values())
+            tool_lines: list[str] = []
+            tool_lines.append("• Windows PowerShell 5.1: 已从原始配置备份恢复" if self._ps5_available else "• Windows PowerShell 5.1: 未安装，跳过恢复")
+            tool_lines.append("• PowerShell 7+: 已从原始配置备份恢复" if getattr(self, "_ps7_available", False) else "• PowerShell 7+: 未安装，跳过恢复")
+            tool_lines.append("• Git Bash: 已从原始配置备份恢复" if self._git_exe else "• Git Bash: 未安装，跳过恢复")
+            if getattr(self, "_vscode_available", False):
+                vr = getattr(self, "_vscode_restore_result", "")
+                if vr in ("restored", "restored-cleaned"):
+                    suffix = "，已清理工具块残留" if vr == "restored-cleaned" else ""
+                    tool_lines.append(f"• Visual Studio Code: 已从原始配置备份恢复{suffix}")
+                elif vr == "cleaned-no-backup":
+                    tool_lines.append("• Visual Studio Code: 未找到原始配置备份，已清理当前配置中的工具块残留")
+                elif vr == "no-backup":
+                    tool_lines.append("• Visual Studio Code: 未找到原始配置备份，未改动当前配置文件")
                 else:
-                    secondary_paths.append(target.parent)
-            for path in secondary_paths:
-                bash = path / "bin" / "bash.exe"
-                if bash.exists():
-                    found = bash
-                    break
+                    tool_lines.append("• Visual Studio Code: 已检测到，可手动检查 settings.json")
+            else:
+                tool_lines.append("• Visual Studio Code: 未安装，跳过恢复")
 
-        if found:
-            self._git_exe = found
-            self._git_bashrc_path = Path.home() / ".bashrc"
-            bashrc_path = self._git_bashrc_path
-            bashrc_exists = bashrc_path.exists()
-            path_text = str(bashrc_path) if bashrc_exists else "尚未发现 ~/.bashrc，将在执行时自动创建"
-            self.git_path_var.set(path_text)
-            status = f"已检测到 Git Bash: {found}"
-            self._set_row_state("git", True, status, path_text, placeholder=not bashrc_exists)
-            if log:
-                self._log(f"检测到 Git Bash: {found}", "success")
-        else:
-            missing_msg = "未检测到 Git Bash，请安装 Git for Windows 后再次执行配置"
-            self._git_exe = None
-            self.git_path_var.set(missing_msg)
-            self._set_row_state("git", False, missing_msg, missing_msg, placeholder=True)
-            if log:
-                self._log("未找到 Git Bash，无法配置 UTF-8，请先安装 Git for Windows", "warning")
+            status_summary = self._console_status_summary()
+            status_lines = [f"• {part.strip()}" for part in status_summary.split("；") if part.strip()]
+            if not status_lines:
+                status_lines = ["• 未检测到控制台状态"]
 
-    def _detect_vscode(self, log: bool = True) -> None:
-        appdata = os.environ.get("APPDATA")
-        settings_path = Path(appdata) / "Code" / "User" / "settings.json" if appdata else None
-        exe_path = shutil.which("code") or shutil.which("code.cmd")
-        exe_resolved = Path(exe_path).resolve() if exe_path else None
-        if not exe_resolved:
-            local_app = os.environ.get("LOCALAPPDATA")
-            candidates = []
-            if local_app:
-                candidates.append(Path(local_app) / "Programs" / "Microsoft VS Code" / "Code.exe")
-            program_files = [
-                os.environ.get("ProgramFiles"),
-                os.environ.get("ProgramFiles(x86)"),
-                os.environ.get("ProgramW6432"),
+            summary_parts = [
+                header,
+                "",
+                "当前工具配置：",
+                *tool_lines,
+                "",
+                "当前控制台编码：",
+                *status_lines,
             ]
-            for root in program_files:
-                if root:
-                    candidates.append(Path(root) / "Microsoft VS Code" / "Code.exe")
-            for loc in self._registry_install_locations(["visual studio code", "microsoft visual studio code"]):
-                candidates.append(Path(loc) / "Code.exe")
-            for target in self._shortcut_targets(["**/Visual Studio Code*.lnk"]):
-                candidates.append(target)
-            for c in candidates:
-                if c and c.exists():
-                    exe_resolved = c.resolve()
-                    break
-        display_exe = None
-        if exe_resolved:
-            if exe_resolved.name.lower() == "code.cmd":
-                candidate = exe_resolved.parent.parent / "Code.exe"
-                display_exe = candidate if candidate.exists() else exe_resolved
-            elif exe_resolved.name.lower() == "code":
-                candidate = exe_resolved.parent / "Code.exe"
-                display_exe = candidate if candidate.exists() else exe_resolved
-            else:
-                display_exe = exe_resolved
+            summary = "\n".join(summary_parts)
 
-        missing_msg = "未检测到 Visual Studio Code，请在安装后再次执行配置"
-        detected_status = f"已检测到 Visual Studio Code: {display_exe}" if display_exe else "已检测到 Visual Studio Code"
-        self._vscode_available = bool(exe_resolved)
+            self._ui_call(self._on_restore_finished, summary)
+        except Exception as exc:  # noqa: BLE001
+            self._log(f"恢复失败: {exc}", "error")
+            self._ui_call(self._on_restore_failed, str(exc))
 
-        if self._vscode_available:
-            self.tool_info_var.set(detected_status)
-        else:
-            self.tool_info_var.set(missing_msg)
+    def _run_restore_tasks(self, tasks: list[tuple[str, Callable[[], object]]]) -> dict[str, object]:
+        """执行相互独立的恢复目标（_io_workers > 1 时并发），返回 {目标名: 结果}。
 
-        if settings_path:
-            settings_exists = settings_path.exists()
-            path_text = str(settings_path) if settings_exists else "未检测到 settings.json，将在执行时创建"
-            if self._vscode_available:
-                self.vscode_path_var.set(str(settings_path))
-                self._set_row_state(
-                    "vscode",
-                    True,
-                    detected_status,
-                    path_text,
-                    placeholder=not settings_exists,
-                )
-            else:
-                self.vscode_path_var.set(missing_msg)
-                self._set_row_state("vscode", False, missing_msg, missing_msg, placeholder=True)
-        else:
-            self.vscode_path_var.set(missing_msg)
-            self._set_row_state("vscode", False, missing_msg, missing_msg, placeholder=True)
+        每个目标有独立的 trace span，完成即推进该目标进度；任一目标抛出的异常在汇总结果时重新抛出。
+        """
 
-        if log:
-            if display_exe:
-                self._log(f"检测到 Visual Studio Code: {display_exe}", "success")
-            else:
-                self._log("未检测到 Visual Studio Code 可执行文件", "warning")
-    def _open_path(self, key: str) -> None:
-        path_map = {
-            "ps5": self._ps5_profile_path,
-            "ps7": self._ps7_profile_path,
-            "git": self._git_bashrc_path,
-            "vscode": Path(self.vscode_path_var.get()) if self.vscode_path_var.get() else None,
-        }
-        path = path_map.get(key)
-        if not path:
-            return
-        try:
-            path.parent.mkdir(parents=True, exist_ok=True)
-            if not path.exists() and key in {"git", "vscode"}:
-                path.touch()
-            os.startfile(str(path))
-        except Exception as exc:  # noqa: BLE001
-            self._log(f"打开配置文件失败 {path}: {exc}", "error")
-            self._show_modal("无法打开配置文件", f"路径: {path}\n错误: {exc}", kind="error")
+        def run(name: str, action: Callable[[], object]) -> object:
+            try:
+                with TRACER.span(f"restore.{name}", "restore"):
+                    return action()
+            finally:
+                self._restore_progress.finish(name)
 
-    def _open_backup_dir(self) -> None:
-        """打开软件备份目录，若不存在则创建。"""
-        try:
-            self._backup_root.mkdir(parents=True, exist_ok=True)
-            os.startfile(str(self._backup_root))
-        except Exception as exc:  # noqa: BLE001
-            self._log(f"打开备份目录失败 {self._backup_root}: {exc}", "error")
-            self._show_modal("无法打开备份目录", f"路径: {self._backup_root}\n错误: {exc}", kind="error")
+        results = self._io_map(lambda task: run(*task), tasks)
+        return {name: result for (name, _), result in zip(tasks, results)}
 
-    def _validate_bash_path(self) -> Path | None:
-        return self._git_exe
+    def _io_map(self, func: Callable[[object], object], items: list) -> list:
+        """对相互独立的目标并发执行 func，按输入顺序返回结果；_io_workers 为 1 或只有一项时在当前线程执行。
 
-    def _start_setup(self) -> None:
-        if self.is_running:
-            return
-        bash_path = self._validate_bash_path()
-        if not bash_path:
-            self._show_modal("错误", "未检测到有效的 bash.exe 路径", kind="error")
-            return
-        ps_profiles: list[tuple[Path, str]] = []
-        if self.ps5_path_var.get():
-            ps_profiles.append(
-                (Path.home() / "Documents" / "WindowsPowerShell" / "Microsoft.PowerShell_profile.ps1", "Windows PowerShell 5.1")
-            )
-        if self.ps7_path_var.get():
-            ps_profiles.append(
-                (Path.home() / "Documents" / "PowerShell" / "Microsoft.PowerShell_profile.ps1", "PowerShell 7+")
-            )
-        self.is_running = True
-        self.status_var.set("执行中...")
-        self._set_buttons_state(False)
-        threading.Thread(target=self._run_setup, args=(bash_path, ps_profiles), daemon=True).start()
+        线程池按需创建并在后续恢复/快照中复用，避免每次启动线程的开销。
+        """
+        if self._io_workers <= 1 or len(items) <= 1:
+            return [func(item) for item in items]
+        if self._io_pool is None or self._io_pool[0] != self._io_workers:
+            from concurrent.futures import ThreadPoolExecutor
 
-    def _set_buttons_state(self, enabled: bool) -> None:
-        # 缓存各行按钮原始状态，结束时按需恢复，避免强制启用缺失工具的按钮
-        if not hasattr(self, "_row_btn_state_cache"):
-            self._row_btn_state_cache: dict[str, str] = {}
-            self._row_btn_state_cache_dirty = False
-            self._row_btn_state_locked = False
-        self._update_restore_button_state(enabled)
-        if not enabled:
-            # 记录当前状态后统一禁用
-            self._row_btn_state_cache = {k: row["btn"].cget("state") for k, row in self._row_widgets.items()}
-            self._row_btn_state_cache_dirty = False
-            self._row_btn_state_locked = True
-            for row in self._row_widgets.values():
-                row["btn"].config(state="disabled")
-            if hasattr(self, "backup_btn"):
-                self.backup_btn.config(state="disabled")
-            return
+            if self._io_pool is not None:
+                self._io_pool[1].shutdown(wait=False)
+            self._io_pool = (self._io_workers, ThreadPoolExecutor(max_workers=self._io_workers, thread_name_prefix="io"))
+        # --profile 采样恢复/快照时，工作线程里的读写也计入报告
+        return list(self._io_pool[1].map(PROFILER.instrument(func), items))
 
-        self._row_btn_state_locked = False
-        self._restore_row_buttons()
-        self._refresh_start_button_state(enabled)
-        self._refresh_reset_default_button_state(enabled)
-        if hasattr(self, "backup_btn"):
-            self.backup_btn.config(state="normal")
+    def _on_restore_finished(self, summary: str) -> None:
+        self.is_running = False
+        self._progress_finish()
+        self._set_buttons_state(True)
+        self._update_restore_button_state()
+        # 恢复后在后台重新检测路径与状态，快照发布后刷新界面（检测分隔线随快照日志输出）
+        self._detect_all_paths_in_thread(log=True)
+        self._show_modal("完成", summary, kind="info")
 
-    def _refresh_reset_default_button_state(self, baseline_enabled: bool = True) -> None:
-        if not hasattr(self, "reset_default_btn"):
-            return
-        if not baseline_enabled or self.is_running:
-            self.reset_default_btn.config(state="disabled")
-            return
-        state = "disabled" if self._is_system_default_env() else "normal"
-        self.reset_default_btn.config(state=state)
+    def _on_restore_failed(self, message: str) -> None:
+        self.is_running = False
+        self._set_buttons_state(True)
+        self._update_restore_button_state()
+        self._show_modal("错误", f"恢复失败：{message}", kind="error")
 
-    def _refresh_start_button_state(self, baseline_enabled: bool = True) -> None:
-        """根据当前检测状态决定开始按钮是否可用。"""
-        if not baseline_enabled:
-            self.start_btn.config(state="disabled")
-            return
-        status = self._detect_shell_config_status()
-        detail = getattr(self, "_tool_config_detail", {})
-        availability = {
-            "ps5": getattr(self, "_ps5_available", False),
-            "ps7": getattr(self, "_ps7_available", False),
-            "git": self._git_exe is not None,
-            "vscode": bool(getattr(self, "_vscode_available", False)),
-        }
-        considered = {k: v for k, v in status.items() if availability.get(k)}
-        # 若任一可用项处于不可读取状态，禁止执行以避免再次污染
-        for k, v in detail.items():
-            if availability.get(k) and isinstance(v, dict) and str(v.get("state")) == "unreadable":
-                self.start_btn.config(state="disabled")
-                return
-        all_configured = considered and all(considered.values())
-        # 仅当可用的 shell 均已配置且控制台 CodePage 为 UTF-8 时禁用
-        if all_configured and self._all_consoles_utf8():
-            self.start_btn.config(state="disabled")
-        else:
-            self.start_btn.config(state="normal")
 
-    def _run_setup(self, bash_path: Path, ps_profiles: list[tuple[Path, str]]) -> None:
-        self._console_log_buffer.clear()
-        ops: list[Callable[[], None]] = []
+class _PlainVar:
+    """无界面宿主中替代 tk.StringVar/IntVar 的最小实现。"""
 
-        def advance() -> None:
-            self._progress_advance(1)
+    def __init__(self, value: object = "") -> None:
+        self._value = value
 
-        # 进度条：每个操作前后各一次，保持与旧逻辑一致
-        total_ops = len(ops)
-        self._progress_start(total_ops * 2)
+    def get(self) -> object:
+        return self._value
 
-        self._log_separator("执行开始")
-        self._log("工具配置：", "info")
+    def set(self, value: object) -> None:
+        self._value = value
 
-        # 1) 校验 Git Bash
-        ops.append(lambda: self._verify_bash(bash_path))
 
-        # 2) 配置 Windows PowerShell 5.1
-        if self._ps5_available and self.ps5_path_var.get():
-            ps5_profile = Path.home() / "Documents" / "WindowsPowerShell" / "Microsoft.PowerShell_profile.ps1"
-            ops.append(lambda: self._configure_powershell_profile(ps5_profile, bash_path, "Windows PowerShell 5.1"))
-        else:
-            ops.append(lambda: self._log("Windows PowerShell 5.1: 未安装，跳过执行", "warning"))
+class HeadlessSetupApp(SetupApp):
+    """无界面宿主：不创建任何 Tk 控件，复用检测/配置/恢复流程（命令行模式、基准与端到端测试使用）。
 
-        # 3) 配置 PowerShell 7+
-        if self._ps7_available and self.ps7_path_var.get():
-            ps7_profile = Path.home() / "Documents" / "PowerShell" / "Microsoft.PowerShell_profile.ps1"
-            ops.append(lambda: self._configure_powershell_profile(ps7_profile, bash_path, "PowerShell 7+"))
-        else:
-            ops.append(lambda: self._log("PowerShell 7+: 未安装，跳过执行", "warning"))
+    日志收集到 logs（echo=True 时同时输出到 stderr）；确认类对话框一律视为同意；
+    UI 回调中只处理检测快照（同步路径变量），其余忽略。流程方法可在当前线程直接同步调用。
+    """
 
-        # 4) 配置 Git Bash
-        ops.append(lambda: self._configure_bashrc_user(bash_path))
+    def __init__(self, registry: RegistryBackend | None = None, debug: bool = False, echo: bool = False) -> None:
+        self.logs: list[tuple[str, str]] = []
+        self._echo = echo
+        self._startup_marks = None
+        self._init_state(registry, debug=debug)
+        self.ps5_path_var = _PlainVar()
+        self.ps7_path_var = _PlainVar()
+        self.git_path_var = _PlainVar()
+        self.vscode_path_var = _PlainVar()
+        self.status_var = _PlainVar()
+        self.progress_var = _PlainVar(0)
 
-        # 5) 配置 Visual Studio Code
-        if getattr(self, "_vscode_available", False):
-            ops.append(lambda: self._apply_vscode_settings(apply=True, log=True))
-        else:
-            ops.append(lambda: self._log("Visual Studio Code: 未检测到，跳过配置", "warning"))
+    def _ui_call(self, func: Callable, *args, **kwargs) -> None:
+        if func == self._apply_detection_snapshot:
+            func(*args, **kwargs)
 
-        # 6) 控制台编码
-        def _console_utf8() -> None:
-            self._log("控制台编码：", "info")
-            backup_exists = self._console_reg_backup_path.exists()
-            code_logs = self._update_console_codepage(apply_utf8=True, emit_log=False)
-            if not backup_exists and self._console_reg_backup_path.exists():
-                try:
-                    data = json.loads(self._console_reg_backup_path.read_text(encoding="utf-8"))
-                    placeholder = data and all(v == "__EMPTY_BACKUP__" for v in data.values())
-                except Exception:
-                    placeholder = False
-                suffix = "占位（源文件不存在）" if placeholder else "原始配置备份"
-                self._log(f"已创建 控制台编码 {suffix}: {self._console_reg_backup_path}", "info")
-            logged: set[str] = set()
-            # 按 PS5 -> PS7 -> WT 顺序输出；若 PS7 未安装追加警告
-            for level, message in code_logs:
-                if "PowerShell 7+" in message:
-                    # 控制台编码部分只在实际存在时输出，缺失时后续补警告
-                    self._log(message, level)
-                    logged.add(message)
-                elif "Windows PowerShell 5.1" in message:
-                    self._log(message, level)
-                    logged.add(message)
-            if not (self._ps7_available and self._ps7_exe):
-                self._log("PowerShell 7+: 未安装，跳过执行", "warning")
-            for level, message in code_logs:
-                if "Windows Terminal" in message:
-                    self._log(message, level)
-                    logged.add(message)
-            for level, message in code_logs:
-                if message in logged:
-                    continue
-                self._log(message, level)
+    def _log(self, message: str, level: str = "info") -> None:
+        self.logs.append((level, message))
+        if self._echo:
+            print(f"[{level.upper()}] {message}", file=sys.stderr)
 
-        ops.append(_console_utf8)
+    def _show_modal(self, *args, **kwargs) -> bool:
+        return True
 
-        # 7) 刷新检测
-        ops.append(lambda: self._ui_call(self._detect_all_paths, False))
-        ops.append(lambda: self._ui_call(self._refresh_config_status_label))
-        ops.append(lambda: self._ui_call(self._refresh_env_tool_labels))
+    def _apply_detection_snapshot(self, snapshot: DetectionSnapshot) -> None:
+        if snapshot is not self._snapshots.current:
+            return
+        for level, message in snapshot.logs:
+            self._log(message, level)
+        self.ps5_path_var.set(str(self._ps5_profile_path) if snapshot.ps5_exe else "")
+        self.ps7_path_var.set(str(self._ps7_profile_path) if snapshot.ps7_exe else "")
+        self.git_path_var.set(str(snapshot.git_bashrc_path or ""))
+        self.vscode_path_var.set(str(snapshot.vscode_settings_path or ""))
 
-        for action in ops:
-            advance()
-            try:
-                action()
-            except Exception as exc:  # noqa: BLE001
-                self._log(f"执行失败: {exc}", "error")
-                self._ui_call(self.status_var.set, "执行中断，请查看日志")
-                self._ui_call(self._refresh_config_status_label)
-                self._flush_console_logs()
-                self._finish(False)
-                return
-            advance()
 
-        self._flush_console_logs()
-        self._finish(True)
-        self._log_separator("执行结束")
+def _watch_root(path: Path) -> Path:
+    """返回 path 所在目录中最近的已存在祖先目录（目标目录尚未创建时改为监听其上级）。"""
+    directory = path.parent
+    while not directory.exists() and directory.parent != directory:
+        directory = directory.parent
+    return directory
 
-    def _finish(self, success: bool) -> None:
-        """在主线程收尾并弹出提示，避免后台线程直接操作 UI。"""
 
-        def _do_finish() -> None:
-            self.is_running = False
-            self._set_buttons_state(True)
-            self._refresh_reset_default_button_state()
-            if success:
-                self._show_modal("完成", "配置完成，请重启 PowerShell / Git Bash / Visual Studio Code 后生效。", kind="info")
-            else:
-                self._show_modal("中断", "配置未全部完成，请检查日志。", kind="warning")
+class ChangeNotifier:
+    """文件变更通知抽象：wait(timeout) 阻塞至有变化或超时，返回可能发生变化的被监听文件集合。
 
-        self.root.after(0, _do_finish)
+    通知只用于触发重新分析，允许误报（例如同目录下其他文件变化时按目录粒度上报）。
+    """
 
-    def _verify_bash(self, bash_path: Path) -> None:
-        if not bash_path.exists():
-            raise FileNotFoundError(f"未找到 bash.exe: {bash_path}")
-        result = subprocess.run(
-            [str(bash_path), "--version"],
-            capture_output=True,
-            text=True,
-            check=False,
-            creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, "CREATE_NO_WINDOW") else 0,
-        )
-        if result.returncode != 0:
-            raise RuntimeError(f"bash --version 返回码 {result.returncode}")
+    name = "abstract"
+
+    def __init__(self, paths: Iterable[Path]) -> None:
+        self.paths = tuple(dict.fromkeys(Path(p) for p in paths))
+
+    def wait(self, timeout: float) -> set[Path]:
+        raise NotImplementedError
+
+    def close(self) -> None:
+        pass
 
-    def _configure_powershell_profile(self, profile_path: Path, bash_path: Path, name: str) -> None:
-        profile_path.parent.mkdir(parents=True, exist_ok=True)
-        backup_key = "ps5" if "5.1" in name else "ps7"
-        self._ensure_original_backup(profile_path, backup_key, name)
-        existing = profile_path.read_text(encoding="utf-8", errors="ignore") if profile_path.exists() else ""
-        ps_block = "\n".join(
-            [
-                PROFILE_MARKER_START,
-                "chcp 65001 | Out-Null",
-                "[Console]::InputEncoding  = [System.Text.UTF8Encoding]::new()",
-                "[Console]::OutputEncoding = [System.Text.UTF8Encoding]::new()",
-                "$OutputEncoding = [System.Text.UTF8Encoding]::new()",
-                "$PSDefaultParameterValues['Get-Content:Encoding']    = 'utf8'",
-                "$PSDefaultParameterValues['Set-Content:Encoding']    = 'utf8'",
-                "$PSDefaultParameterValues['Add-Content:Encoding']    = 'utf8'",
-                "$PSDefaultParameterValues['Out-File:Encoding']       = 'utf8'",
-                "$PSDefaultParameterValues['Select-String:Encoding']  = 'utf8'",
-                "$PSDefaultParameterValues['Import-Csv:Encoding']     = 'utf8'",
-                "$PSDefaultParameterValues['Export-Csv:Encoding']     = 'utf8'",
-                "$PSDefaultParameterValues['*:Encoding']              = 'utf8'",
-                '$env:LANG = "zh_CN.UTF-8"',
-                PROFILE_MARKER_END,
-                "",
-            ]
-        )
-        content, cleaned_partial = self._strip_block_tolerant(existing, PROFILE_MARKER_START, PROFILE_MARKER_END, ps_block)
-        if cleaned_partial:
-            self._log("检测到残留半截标记（partial），已自动清理。", "info")
-        if content != existing and existing:
-            self._log(f"{name} 配置文件中检测到旧的 Code-encoding-fix 配置块，已清理后重新写入", "info")
-        new_content = (content.strip() + "\n\n" + ps_block).strip() + "\n"
-        profile_path.write_text(new_content, encoding="utf-8")
-        self._log(f"已写入 {name} UTF-8 用户配置: {profile_path}", "success")
+    def _affected(self, directory: Path, name: str | None) -> set[Path]:
+        """directory 下名为 name 的条目变化时受影响的被监听文件；name 为空表示整个目录。"""
+        changed = directory / name if name else directory
+        return {p for p in self.paths if p == changed or changed in p.parents}
 
-    def _configure_bashrc_user(self, bash_path: Path) -> None:
-        if not bash_path.exists():
-            raise FileNotFoundError(f"无法定位 bash.exe: {bash_path}")
-        bashrc_path = self._git_bashrc_path or (Path.home() / ".bashrc")
-        bashrc_path.parent.mkdir(parents=True, exist_ok=True)
-        self._ensure_original_backup(bashrc_path, "git_bash", "Git Bash")
-        existing = bashrc_path.read_text(encoding="utf-8", errors="ignore") if bashrc_path.exists() else ""
-        bash_block = "\n".join(
-            [
-                BASH_MARKER_START,
-                'export LANG="zh_CN.UTF-8"',
-                'export LC_ALL="zh_CN.UTF-8"',
-                'export LC_CTYPE="zh_CN.UTF-8"',
-                'export LC_MESSAGES="zh_CN.UTF-8"',
-                'if command -v chcp >/dev/null 2>&1; then chcp 65001 >/dev/null 2>&1; fi',
-                "git config --global core.quotepath false",
-                "git config --global i18n.commitencoding utf-8",
-                "git config --global i18n.logoutputencoding utf-8",
-                BASH_MARKER_END,
-                "",
-            ]
-        )
-        content, cleaned_partial = self._strip_block_tolerant(existing, BASH_MARKER_START, BASH_MARKER_END, bash_block)
-        if cleaned_partial:
-            self._log("检测到残留半截标记（partial），已自动清理。", "info")
-        if content != existing and existing:
-            self._log("Git Bash 用户态配置文件中检测到旧的 Code-encoding-fix 配置块，已清理后重新写入", "info")
-        bashrc_path.write_text((content.strip() + "\n\n" + bash_block).strip() + "\n", encoding="utf-8")
-        self._log(f"已写入 Git Bash UTF-8 用户配置: {bashrc_path}", "success")
 
-    def _ensure_original_backup(self, path: Path, key: str, display: str) -> None:
-        """为配置文件创建首份原始配置备份，仅在备份不存在时执行。"""
-        try:
-            self._backup_root.mkdir(parents=True, exist_ok=True)
-        except Exception as exc:  # noqa: BLE001
-            self._log(f"创建备份目录失败 {self._backup_root}: {exc}", "warning")
-            return
-        backup_path = self._backup_root / f"{key}.orig"
-        if backup_path.exists():
-            return
-        empty_marker = "__EMPTY_BACKUP__"
-        if not path.exists():
-            try:
-                backup_path.write_text(empty_marker, encoding="utf-8")
-                self._log(f"已创建 {display} 原始配置备份占位（源文件不存在）: {backup_path}", "info")
-            except Exception as exc:  # noqa: BLE001
-                self._log(f"创建空占位备份失败 {backup_path}: {exc}", "warning")
-            return
-        try:
-            content = path.read_text(encoding="utf-8", errors="ignore")
-        except Exception as exc:  # noqa: BLE001
-            self._log(f"读取待备份文件失败 {path}: {exc}", "warning")
-            return
-        markers = {
-            "ps5": (PROFILE_MARKER_START, PROFILE_MARKER_END),
-            "ps7": (PROFILE_MARKER_START, PROFILE_MARKER_END),
-            "git_bash": (BASH_MARKER_START, BASH_MARKER_END),
-        }
-        marker_pair = markers.get(key)
-        if not content.strip():
-            try:
-                backup_path.write_text(empty_marker, encoding="utf-8")
-                self._log(f"已创建 {display} 原始配置备份占位（源文件为空）: {backup_path}", "info")
-            except Exception as exc:  # noqa: BLE001
-                self._log(f"创建空占位备份失败 {backup_path}: {exc}", "warning")
-            return
-        if marker_pair and marker_pair[0] in content and marker_pair[1] in content:
-            self._log(f"跳过备份（已是工具生成内容）: {path}", "info")
-            return
-        try:
-            shutil.copy2(path, backup_path)
-            self._log(f"已创建 {display} 原始配置备份: {backup_path}", "info")
-        except Exception as exc:  # noqa: BLE001
-            self._log(f"创建原始配置备份失败 {path} -> {backup_path}: {exc}", "warning")
+class PollingNotifier(ChangeNotifier):
+    """轮询后备方案：按固定间隔比较 (mtime_ns, size)。"""
 
-    @staticmethod
-    def _strip_block(content: str, start: str, end: str) -> str:
-        """移除内容中由 start/end 包裹的所有配置块，用于保证幂等写入。"""
-        pattern = re.compile(re.escape(start) + r".*?" + re.escape(end), re.DOTALL)
-        return re.sub(pattern, "", content)
+    name = "polling"
 
+    def __init__(self, paths: Iterable[Path], interval: float = 2.0) -> None:
+        super().__init__(paths)
+        self.interval = interval
+        self._closed = threading.Event()
+        self._signatures = {p: self._signature(p) for p in self.paths}
+        self._next_poll = time.monotonic() + interval
 
     @staticmethod
-    def _strip_block_tolerant(content, start, end, expected_block):
-        """在仅出现 start 或 end 标记的情况下，尽量只清理工具可识别的残留片段，避免误删用户内容。"""
-        if content is None:
-            return content, False
-        # 先清理完整块（幂等）
-        content2 = SetupApp._strip_block(content, start, end)
-        if content2 != content:
-            content = content2
-        # 构建期望行集合（用于保守匹配清理）
-        exp_lines = []
-        for line in str(expected_block).splitlines():
-            s = line.strip()
-            if not s:
+    def _signature(path: Path) -> tuple:
+        try:
+            st = path.stat()
+        except FileNotFoundError:
+            return ("missing",)
+        except OSError:
+            return ("unreadable",)
+        return (st.st_mtime_ns, st.st_size)
+
+    def wait(self, timeout: float) -> set[Path]:
+        deadline = time.monotonic() + timeout
+        while not self._closed.is_set():
+            now = time.monotonic()
+            if now >= self._next_poll:
+                self._next_poll = now + self.interval
+                changed = set()
+                for path in self.paths:
+                    signature = self._signature(path)
+                    if signature != self._signatures[path]:
+                        self._signatures[path] = signature
+                        changed.add(path)
+                if changed:
+                    return changed
+            if now >= deadline:
+                return set()
+            self._closed.wait(min(deadline, self._next_poll) - now)
+        return set()
+
+    def close(self) -> None:
+        self._closed.set()
+
+
+class InotifyNotifier(ChangeNotifier):
+    """Linux inotify：监听各目标所在目录（不存在时监听最近的已存在祖先目录，目录出现后自动下移）。"""
+
+    name = "inotify"
+    # IN_ATTRIB | IN_CLOSE_WRITE | IN_MOVED_FROM | IN_MOVED_TO | IN_CREATE | IN_DELETE | IN_DELETE_SELF | IN_MOVE_SELF
+    MASK = 0x4 | 0x8 | 0x40 | 0x80 | 0x100 | 0x200 | 0x400 | 0x800
+    IN_Q_OVERFLOW = 0x4000
+    IN_IGNORED = 0x8000
+
+    def __init__(self, paths: Iterable[Path]) -> None:
+        super().__init__(paths)
+        self._libc = ctypes.CDLL(None, use_errno=True)
+        self._fd = self._libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self._fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 失败")
+        self._watches: dict[int, Path] = {}
+        self._sync_watches()
+
+    def _sync_watches(self) -> set[Path]:
+        """按当前目录结构调整监听位置，返回监听位置新增的目标（调整前的变化可能没有收到事件）。"""
+        wanted = {_watch_root(p) for p in self.paths}
+        current = set(self._watches.values())
+        for wd, directory in list(self._watches.items()):
+            if directory not in wanted:
+                self._libc.inotify_rm_watch(self._fd, wd)
+                del self._watches[wd]
+        for directory in wanted - current:
+            wd = self._libc.inotify_add_watch(self._fd, os.fsencode(str(directory)), self.MASK)
+            if wd >= 0:
+                self._watches[wd] = directory
+        added = wanted - current
+        return {p for p in self.paths if _watch_root(p) in added}
+
+    def wait(self, timeout: float) -> set[Path]:
+        import select
+        import struct
+
+        if self._fd < 0:
+            return set()
+        readable, _, _ = select.select([self._fd], [], [], max(0.0, timeout))
+        if not readable:
+            return set()
+        changed: set[Path] = set()
+        resync = False
+        while True:
+            try:
+                data = os.read(self._fd, 64 * 1024)
+            except BlockingIOError:
+                break
+            offset = 0
+            while offset + 16 <= len(data):
+                wd, mask, _cookie, length = struct.unpack_from("iIII", data, offset)
+                raw_name = data[offset + 16 : offset + 16 + length].split(b"\0", 1)[0]
+                offset += 16 + length
+                if mask & self.IN_Q_OVERFLOW:
+                    changed.update(self.paths)
+                    continue
+                directory = self._watches.get(wd)
+                if directory is None:
+                    continue
+                if mask & self.IN_IGNORED:
+                    self._watches.pop(wd, None)
+                    resync = True
+                    continue
+                changed |= self._affected(directory, os.fsdecode(raw_name) if raw_name else None)
+                # 祖先目录中出现/删除子目录时需要调整监听位置
+                if mask & (0x100 | 0x200 | 0x40 | 0x80 | 0x400 | 0x800):
+                    resync = True
+        if resync:
+            changed |= self._sync_watches()
+        return changed
+
+    def close(self) -> None:
+        if self._fd >= 0:
+            os.close(self._fd)
+            self._fd = -1
+
+
+class DirectoryChangeNotifier(ChangeNotifier):
+    """Windows ReadDirectoryChangesW：每个监听目录一个阻塞读取线程，变化汇总到队列。"""
+
+    name = "ReadDirectoryChangesW"
+    FILE_LIST_DIRECTORY = 0x1
+    FILE_SHARE_ALL = 0x1 | 0x2 | 0x4
+    OPEN_EXISTING = 3
+    FILE_FLAG_BACKUP_SEMANTICS = 0x02000000
+    # FILE_NAME | DIR_NAME | ATTRIBUTES | SIZE | LAST_WRITE
+    NOTIFY_FILTER = 0x1 | 0x2 | 0x4 | 0x8 | 0x10
+
+    def __init__(self, paths: Iterable[Path]) -> None:
+        super().__init__(paths)
+        wintypes = importlib.import_module("ctypes.wintypes")
+        # 独立的 kernel32 实例：设置 argtypes 不影响其他 windll 调用
+        kernel32 = ctypes.WinDLL("kernel32", use_last_error=True)
+        kernel32.CreateFileW.restype = wintypes.HANDLE
+        kernel32.CreateFileW.argtypes = [
+            wintypes.LPCWSTR, wintypes.DWORD, wintypes.DWORD, wintypes.LPVOID,
+            wintypes.DWORD, wintypes.DWORD, wintypes.HANDLE,
+        ]
+        kernel32.ReadDirectoryChangesW.argtypes = [
+            wintypes.HANDLE, wintypes.LPVOID, wintypes.DWORD, wintypes.BOOL,
+            wintypes.DWORD, ctypes.POINTER(wintypes.DWORD), wintypes.LPVOID, wintypes.LPVOID,
+        ]
+        kernel32.CancelIoEx.argtypes = [wintypes.HANDLE, wintypes.LPVOID]
+        kernel32.CloseHandle.argtypes = [wintypes.HANDLE]
+        self._kernel32 = kernel32
+        self._wintypes = wintypes
+        self._queue: "queue.Queue[set[Path]]" = queue.Queue()
+        self._closed = threading.Event()
+        self._handles: list[int] = []
+        roots: dict[Path, bool] = {}
+        for path in self.paths:
+            root = _watch_root(path)
+            # 目标目录尚不存在时监听祖先目录的整个子树
+            roots[root] = roots.get(root, False) or root != path.parent
+        for root, subtree in roots.items():
+            handle = kernel32.CreateFileW(
+                str(root), self.FILE_LIST_DIRECTORY, self.FILE_SHARE_ALL, None,
+                self.OPEN_EXISTING, self.FILE_FLAG_BACKUP_SEMANTICS, None,
+            )
+            if handle is None or handle == ctypes.c_void_p(-1).value:
                 continue
-            if s == str(start).strip() or s == str(end).strip():
+            self._handles.append(handle)
+            threading.Thread(target=self._reader, args=(handle, root, subtree), daemon=True).start()
+        if not self._handles:
+            raise OSError(ctypes.get_last_error(), "无法打开任何监听目录")
+
+    def _reader(self, handle: int, root: Path, subtree: bool) -> None:
+        import struct
+
+        buffer = ctypes.create_string_buffer(64 * 1024)
+        returned = self._wintypes.DWORD(0)
+        while not self._closed.is_set():
+            ok = self._kernel32.ReadDirectoryChangesW(
+                handle, buffer, len(buffer), subtree, self.NOTIFY_FILTER, ctypes.byref(returned), None, None
+            )
+            if not ok:
+                return
+            if returned.value == 0:
+                # 缓冲区溢出：按整个目录上报
+                self._queue.put(self._affected(root, None))
                 continue
-            exp_lines.append(s)
-        exp_set = set(exp_lines)
-        if not exp_set:
-            return content, False
-        lines_local = content.splitlines(True)
-        changed_any = False
+            data = buffer.raw[: returned.value]
+            changed: set[Path] = set()
+            offset = 0
+            while True:
+                next_offset, _action, length = struct.unpack_from("III", data, offset)
+                name = data[offset + 12 : offset + 12 + length].decode("utf-16-le")
+                changed |= self._affected(root, name)
+                if not next_offset:
+                    break
+                offset += next_offset
+            if changed:
+                self._queue.put(changed)
 
-        def _norm(x):
-            return x.strip()
+    def wait(self, timeout: float) -> set[Path]:
+        try:
+            changed = set(self._queue.get(timeout=max(0.0, timeout)))
+        except queue.Empty:
+            return set()
+        while True:
+            try:
+                changed |= self._queue.get_nowait()
+            except queue.Empty:
+                return changed
 
-        # partial: start without end -> forward clean only expected lines
-        i = 0
-        while i < len(lines_local):
-            if _norm(lines_local[i]) == str(start).strip() and all(_norm(l) != str(end).strip() for l in lines_local[i+1:]):
-                j = i + 1
-                while j < len(lines_local):
-                    s = _norm(lines_local[j])
-                    if not s or s in exp_set:
-                        j += 1
-                        continue
-                    break
-                del lines_local[i:j]
-                changed_any = True
-                continue
-            i += 1
+    def close(self) -> None:
+        self._closed.set()
+        for handle in self._handles:
+            self._kernel32.CancelIoEx(handle, None)
+            self._kernel32.CloseHandle(handle)
+        self._handles.clear()
 
-        # partial: end without start -> backward clean only expected lines
-        i = 0
-        while i < len(lines_local):
-            if _norm(lines_local[i]) == str(end).strip() and all(_norm(l) != str(start).strip() for l in lines_local[:i]):
-                j = i - 1
-                while j >= 0:
-                    s = _norm(lines_local[j])
-                    if not s or s in exp_set:
-                        j -= 1
-                        continue
-                    break
-                del lines_local[j+1:i+1]
-                changed_any = True
-                i = 0
-                continue
-            i += 1
 
-        return ''.join(lines_local), changed_any
+def create_change_notifier(paths: Iterable[Path], poll_interval: float = 2.0, prefer: str | None = None) -> ChangeNotifier:
+    """选择文件变更通知方式：Linux 使用 inotify，Windows 使用 ReadDirectoryChangesW，不可用时回退为轮询。
 
-    def _detect_shell_config_status(self) -> dict[str, bool]:
-        """检测工具配置是否满足期望（支持识别被手动改动的漂移）。
+    prefer="polling" 强制轮询（网络盘等不支持变更通知的位置）。
+    """
+    paths = list(paths)
+    if prefer != "polling":
+        try:
+            if sys.platform.startswith("linux"):
+                return InotifyNotifier(paths)
+            if sys.platform.startswith("win"):
+                return DirectoryChangeNotifier(paths)
+        except (OSError, AttributeError):
+            pass
+    return PollingNotifier(paths, interval=poll_interval)
 
-        返回值仍为兼容旧逻辑的 dict[str, bool]（True 表示该项配置“正确且一致”）。
-        详细状态写入 self._shell_marker_detail / self._tool_config_detail 供日志与摘要使用。
-        """
-        status: dict[str, bool] = {"ps5": False, "ps7": False, "git": False, "vscode": False}
-        detail: dict[str, str] = {}
-        tool_detail: dict[str, dict[str, object]] = {}
 
-        expected_ps = self._expected_powershell_block()
-        expected_git = self._expected_bash_block()
-        bashrc_path = self._git_bashrc_path
+class DriftWatcher:
+    """漂移守护：监听各目标配置文件与 HKCU\\Console，配置被改动时只重新分析受影响的目标。
 
-        # 检测结果缓存：同一检测周期避免重复读取/解析
-        def _path_sig(p):
-            if not p:
-                return ('none',)
-            try:
-                p_str = str(p)
-            except Exception:
-                p_str = repr(p)
-            try:
-                st = p.stat()
-                return (p_str, getattr(st, 'st_mtime_ns', st.st_mtime), st.st_size)
-            except FileNotFoundError:
-                return (p_str, 'missing')
-            except OSError:
-                return (p_str, 'unreadable')
+    - 文件事件按 debounce 秒去抖合并（持续写入时最长延迟 max_delay 秒），编辑器“写临时文件再改名”只触发一次分析；
+    - 控制台注册表没有可用的变更通知，按 console_interval 秒低频轮询 CodePage；
+    - auto_heal 为 True 时，启动时已配置正确的目标一旦漂移即重新写入配置（写入前先保存一代历史快照）；
+    - stats 记录事件/分析/修复次数与 CPU 占用，结束时输出到日志。
+    """
 
-        cache_key = (
-            "shell_status",
-            _path_sig(self._ps5_profile_path),
-            _path_sig(self._ps7_profile_path),
-            _path_sig(bashrc_path),
-            hash(expected_ps),
-            hash(expected_git),
+    def __init__(
+        self,
+        app: "SetupApp",
+        *,
+        auto_heal: bool = False,
+        debounce: float = 0.5,
+        max_delay: float = 3.0,
+        console_interval: float = 30.0,
+        poll_interval: float = 2.0,
+        notifier: str | None = None,
+        on_change: Callable[[str, dict[str, object]], None] | None = None,
+    ) -> None:
+        self.app = app
+        self.auto_heal = auto_heal
+        self.debounce = debounce
+        self.max_delay = max(debounce, max_delay)
+        self.console_interval = console_interval
+        self.poll_interval = poll_interval
+        self.notifier_kind = notifier
+        self.on_change = on_change
+        self.stop_event = threading.Event()
+        # 基线检测完成、开始监听后设置（基准/测试据此开始改动文件）
+        self.started = threading.Event()
+        self.stats = {"events": 0, "batches": 0, "analyses": 0, "heals": 0, "console_polls": 0}
+        self._states: dict[str, dict[str, object]] = {}
+        self._healable: set[str] = set()
+        self._console_diffs: list[str] = []
+        self._console_healable = False
+
+    def _watched_targets(self) -> dict[Path, ConfigTarget]:
+        app = self.app
+        availability = app._snapshots.current.availability
+        watched: dict[Path, ConfigTarget] = {}
+        for target in CONFIG_TARGETS:
+            path = app._target_path(target)
+            if path and (availability.get(target.key) or path.exists()):
+                watched[path] = target
+        return watched
+
+    def _baseline(self) -> dict[Path, ConfigTarget]:
+        app = self.app
+        snapshot = app._detect_all_paths(log=False)
+        watched = self._watched_targets()
+        for target in watched.values():
+            detail = dict(snapshot.tool_detail.get(target.key) or {})
+            self._states[target.key] = detail
+            if detail.get("state") == "ok":
+                self._healable.add(target.key)
+        self._console_diffs = app._detect_console_codepage_drift(expected_cp=65001)
+        self._console_healable = not self._console_diffs
+        return watched
+
+    def _analyze(self, target: ConfigTarget, path: Path) -> None:
+        app = self.app
+        self.stats["analyses"] += 1
+        analyzed = app._analyze_target(target, path)
+        previous = self._states.get(target.key, {})
+        state = str(analyzed.get("state", "missing"))
+        if state == previous.get("state") and analyzed.get("summary") == previous.get("summary"):
+            return
+        self._states[target.key] = analyzed
+        level = "success" if state == "ok" else "warning"
+        app._log(f"{target.label}: 配置状态 {previous.get('state', '未知')} → {state}（{analyzed.get('summary', '')}）", level)
+        if self.on_change:
+            self.on_change(target.key, analyzed)
+        if not (self.auto_heal and target.key in self._healable and state not in ("ok", "unreadable")):
+            return
+        app._snapshot_generation("auto-heal")
+        try:
+            if target.kind == "marker":
+                app._configure_marker_target(target, path)
+            else:
+                app._apply_vscode_settings(apply=True, log=True)
+        except Exception as exc:  # noqa: BLE001
+            app._log(f"{target.label}: 自动修复失败 {exc}", "error")
+            return
+        self.stats["heals"] += 1
+        healed = app._analyze_target(target, path)
+        self._states[target.key] = healed
+        app._log(f"{target.label}: 已自动修复，当前状态 {healed.get('state')}", "success" if healed.get("state") == "ok" else "warning")
+        if self.on_change:
+            self.on_change(target.key, healed)
+
+    def _poll_console(self) -> None:
+        app = self.app
+        self.stats["console_polls"] += 1
+        with app._registry.cycle():
+            diffs = app._detect_console_codepage_drift(expected_cp=65001)
+        if diffs == self._console_diffs:
+            return
+        self._console_diffs = diffs
+        for diff in diffs:
+            app._log(f"控制台编码: {diff}", "warning")
+        if not diffs:
+            app._log("控制台编码: 已恢复为 UTF-8", "success")
+        if self.on_change:
+            self.on_change("console", {"state": "ok" if not diffs else "modified", "summary": "；".join(diffs)})
+        if diffs and self.auto_heal and self._console_healable:
+            app._snapshot_generation("auto-heal")
+            for level, message in app._update_console_codepage(apply_utf8=True, emit_log=False):
+                app._log(message, level)
+            self.stats["heals"] += 1
+            self._console_diffs = app._detect_console_codepage_drift(expected_cp=65001)
+
+    def run(self, duration: float | None = None) -> dict[str, object]:
+        """阻塞运行直到 stop_event 被设置、到达 duration 秒或收到 KeyboardInterrupt，返回统计信息。"""
+        app = self.app
+        watched = self._baseline()
+        notifier = create_change_notifier(watched, poll_interval=self.poll_interval, prefer=self.notifier_kind)
+        app._log(
+            f"漂移守护已启动：通知方式 {notifier.name}，监听 {len(watched)} 个配置文件，"
+            f"控制台注册表每 {self.console_interval:g} 秒检查一次" + ("，自动修复已开启" if self.auto_heal else ""),
+            "info",
         )
-        if hasattr(self, "_detect_cache") and isinstance(self._detect_cache, dict):
-            cached = self._detect_cache.get(cache_key)
-            if cached is not None:
-                cached_status, cached_detail, cached_tool_detail = cached
-                self._shell_marker_detail = cached_detail
-                self._tool_config_detail = cached_tool_detail
-                return cached_status
-
-        for key, path in (("ps5", self._ps5_profile_path), ("ps7", self._ps7_profile_path)):
-            analyzed = self._analyze_marker_block(
-                path,
-                PROFILE_MARKER_START,
-                PROFILE_MARKER_END,
-                expected_ps,
-                equivalent_check=self._equivalent_powershell_profile,
-            )
-            state = str(analyzed.get("state", "missing"))
-            detail[key] = state
-            tool_detail[key] = analyzed
-            status[key] = state == "ok"
-
-        analyzed_git = self._analyze_marker_block(
-            bashrc_path,
-            BASH_MARKER_START,
-            BASH_MARKER_END,
-            expected_git,
-            equivalent_check=self._equivalent_bashrc,
+        self.started.set()
+        started_wall = time.monotonic()
+        started_cpu = time.process_time()
+        end = started_wall + duration if duration is not None else None
+        next_console = started_wall + self.console_interval
+        pending: set[Path] = set()
+        first_seen = last_seen = 0.0
+        try:
+            while not self.stop_event.is_set():
+                now = time.monotonic()
+                deadlines = [next_console]
+                if pending:
+                    deadlines.append(min(last_seen + self.debounce, first_seen + self.max_delay))
+                if end is not None:
+                    deadlines.append(end)
+                changed = notifier.wait(max(0.0, min(deadlines) - now))
+                now = time.monotonic()
+                if changed:
+                    self.stats["events"] += 1
+                    if not pending:
+                        first_seen = now
+                    last_seen = now
+                    pending |= changed
+                if pending and now >= min(last_seen + self.debounce, first_seen + self.max_delay):
+                    self.stats["batches"] += 1
+                    batch, pending = pending, set()
+                    for path in batch:
+                        target = watched.get(path)
+                        if target is not None:
+                            self._analyze(target, path)
+                if now >= next_console:
+                    next_console = now + self.console_interval
+                    self._poll_console()
+                if end is not None and now >= end:
+                    break
+        except KeyboardInterrupt:
+            pass
+        finally:
+            notifier.close()
+        wall = time.monotonic() - started_wall
+        cpu = time.process_time() - started_cpu
+        stats: dict[str, object] = dict(self.stats)
+        stats.update(notifier=notifier.name, wall_s=round(wall, 3), cpu_s=round(cpu, 4))
+        stats["cpu_percent"] = round(cpu / wall * 100, 4) if wall > 0 else 0.0
+        app._log(
+            f"漂移守护已停止：运行 {wall:.1f} 秒，CPU {cpu * 1000:.1f} ms（{stats['cpu_percent']}%），"
+            f"事件 {stats['events']} 次，合并分析 {stats['batches']} 批，自动修复 {stats['heals']} 次",
+            "info",
         )
-        state_git = str(analyzed_git.get("state", "missing"))
-        detail["git"] = state_git
-        tool_detail["git"] = analyzed_git
-        status["git"] = state_git == "ok"
-
-        analyzed_vscode = self._detect_vscode_settings_drift()
-        state_vscode = str(analyzed_vscode.get("state", "missing"))
-        detail["vscode"] = state_vscode
-        tool_detail["vscode"] = analyzed_vscode
-        status["vscode"] = state_vscode == "ok"
-
-        self._shell_marker_detail = detail
-        self._tool_config_detail = tool_detail
-
-        if hasattr(self, "_detect_cache") and isinstance(self._detect_cache, dict):
-            if len(self._detect_cache) >= getattr(self, "_detect_cache_max", 64):
-                self._detect_cache.clear()
-            self._detect_cache[cache_key] = (status, detail, tool_detail)
-        return status
-
-    def _refresh_config_status_label(self) -> None:
-        """根据配置状态刷新路径区域的汇总提示。"""
-        status = self._detect_shell_config_status()
-        labels = {
-            "ps5": "Windows PowerShell 5.1",
-            "ps7": "PowerShell 7+",
-            "git": "Git Bash",
-            "vscode": "Visual Studio Code",
-        }
-
-        availability = {
-            "ps5": getattr(self, "_ps5_available", False),
-            "ps7": getattr(self, "_ps7_available", False),
-            "git": self._git_exe is not None,
-            "vscode": bool(getattr(self, "_vscode_available", False)),
-        }
-        considered = {k: v for k, v in status.items() if availability.get(k)}
+        return stats
 
-        configured = [labels[k] for k, v in considered.items() if v]
-        missing = [labels[k] for k, v in considered.items() if not v]
 
-        if all(considered.values()):
-            tools_status = "已全部配置UTF-8"
-        elif any(considered.values()):
-            tools_status = "已部分配置UTF-8"
+@functools.lru_cache(maxsize=None)
+def _optional_numpy() -> ModuleType | None:
+    """按需导入 NumPy；未安装时返回 None，调用方退回纯 Python（C 层字符串方法）实现。"""
+    try:
+        import numpy  # type: ignore
+    except ImportError:
+        return None
+    return numpy
+
+
+def _iter_line_blocks(buf, size: int, block_size: int) -> Iterable[tuple[int, int]]:
+    """把缓冲区按约 block_size 字节切块，块边界对齐到换行之后（多字节字符与行都不会被切开）。"""
+    start = 0
+    while start < size:
+        end = min(size, start + block_size)
+        if end < size:
+            newline = buf.rfind(b"\n", start, end)
+            if newline < 0:
+                newline = buf.find(b"\n", end)
+            end = size if newline < 0 else newline + 1
+        yield start, end
+        start = end
+
+
+class MojibakeScorer:
+    """按“UTF-8 被当作 GBK 解码后又保存”的特征给文本打分，并尝试逆向还原。
+
+    这类乱码（如“鍙戦€?”）把原文每 2~3 个 UTF-8 字节拼成一个 GBK 双字节字符，结果集中在 GBK 扩展区
+    与 GB2312 二级字库；正常中文则绝大多数落在一级字库与全角标点。分类表按 BMP 码位记录三类：
+      COMMON  GB2312 一级汉字与常用全角标点
+      RARE    GB2312 二级汉字与其他符号区、拉丁字母补充
+      ODD     GBK 扩展区、C1 控制字符、Â/Ã/€、替换字符与私用区（UTF-8→cp1252 乱码的典型字符也在此类）
+    其余字符（ASCII、其他文字）为中性。
+
+    计数不逐字符走 Python 循环：NumPy 可用时直接从 UTF-8 字节流的前导字节向量化还原码位、查表后 bincount；
+    否则用 str.translate 把各类字符映射为标记字符后 count。只有含 ODD 字符的行才进入逐片段的往返还原。
+    """
+
+    NEUTRAL, COMMON, RARE, ODD = 0, 1, 2, 3
+    # 片段得分不低于此值才尝试还原；还原结果必须严格更好，且编码往返成立
+    THRESHOLD = 0.3
+    CANDIDATE_CODECS = ("gbk", "cp1252")
+    # 文件名：解压工具误用的代码页与原名称的实际编码
+    NAME_SOURCE_CODECS = ("cp437", "cp1252", "latin-1")
+    NAME_TARGET_CODECS = ("utf-8", "gbk")
+    # 计数用的标记字符取自私用区：私用区本身归为 ODD，原文中的私用区字符不会被误计为其他类
+    _MARKS = ("", "\ue001", "\ue002", "\ue003")
+    # 非 ASCII 片段；丢失字节被写成的 '?' 可出现在片段内部与末尾
+    _RUN = re.compile(r"[^\x00-\x7f](?:[^\x00-\x7f]|\?(?=[^\x00-\x7f]))*\??")
+    _LOST = re.compile("\ufffd[\ufffd?]*")
+
+    def __init__(self) -> None:
+        table = bytearray(0x10000)
+        for hi in range(0x81, 0xFF):
+            for lo in chain(range(0x40, 0x7F), range(0x80, 0xFF)):
+                try:
+                    char = bytes((hi, lo)).decode("gbk")
+                except UnicodeDecodeError:
+                    continue
+                if len(char) != 1 or ord(char) > 0xFFFF:
+                    continue
+                if lo >= 0xA1 and (0xB0 <= hi <= 0xD7 or 0xA1 <= hi <= 0xA3):
+                    cls = self.COMMON
+                elif lo >= 0xA1 and (0xD8 <= hi <= 0xF7 or 0xA4 <= hi <= 0xA9):
+                    cls = self.RARE
+                else:
+                    cls = self.ODD
+                code = ord(char)
+                if not table[code] or cls < table[code]:
+                    table[code] = cls
+        for code in range(0x80, 0x100):
+            if not table[code]:
+                table[code] = self.ODD if code < 0xA0 else self.RARE
+        for code in (0xC2, 0xC3, 0x20AC, 0xFFFD):
+            table[code] = self.ODD
+        table[0xE000:0xF900] = bytes((self.ODD,)) * (0xF900 - 0xE000)
+        self.table = bytes(table)
+        self._translate = {code: self._MARKS[cls] for code, cls in enumerate(table) if cls}
+        np = _optional_numpy()
+        self._np_table = np.frombuffer(self.table, dtype=np.uint8) if np is not None else None
+
+    # ---- 计数 ----
+
+    def counts_text(self, text: str) -> list[int]:
+        """返回 [中性, COMMON, RARE, ODD] 字符数（中性项恒为 0，不参与打分）。"""
+        if text.isascii():
+            return [0, 0, 0, 0]
+        marked = text.translate(self._translate)
+        return [0, *(marked.count(mark) for mark in self._MARKS[1:])]
+
+    @classmethod
+    def score(cls, counts: list[int]) -> float:
+        """乱码得分：ODD 计 1、RARE 计 0.5，除以非中性字符数；正常中文接近 0，GBK 误解码的乱码通常高于 0.5。"""
+        total = counts[cls.COMMON] + counts[cls.RARE] + counts[cls.ODD]
+        return (counts[cls.ODD] + 0.5 * counts[cls.RARE]) / total if total else 0.0
+
+    def suspicious_lines(self, block: bytes) -> tuple[list[int], list[tuple[int, int]]]:
+        """对一块合法 UTF-8 字节返回 (各类计数, 含 ODD 字符的行的字节区间列表)。"""
+        np = _optional_numpy()
+        if np is None:
+            return self._suspicious_lines_text(block)
+        arr = np.frombuffer(block, dtype=np.uint8)
+        # 合法 UTF-8 中前导字节的位置唯一确定码位，无需解码：110xxxxx 10xxxxxx / 1110xxxx 10xxxxxx 10xxxxxx
+        leads = np.flatnonzero(arr >= 0xC0)
+        lead_bytes = arr[leads]
+        lead2 = leads[lead_bytes < 0xE0]
+        lead3 = leads[(lead_bytes >= 0xE0) & (lead_bytes < 0xF0)]
+
+        def tail(index):
+            return (arr[index] & 0x3F).astype(np.uint32)
+
+        code2 = ((arr[lead2].astype(np.uint32) & 0x1F) << 6) | tail(lead2 + 1)
+        code3 = ((arr[lead3].astype(np.uint32) & 0x0F) << 12) | (tail(lead3 + 1) << 6) | tail(lead3 + 2)
+        classes = self._np_table[np.concatenate((code2, code3))]
+        counts = np.bincount(classes, minlength=4).tolist()
+        if not counts[self.ODD]:
+            return counts, []
+        odd_at = np.concatenate((lead2, lead3))[classes == self.ODD]
+        newlines = np.flatnonzero(arr == 0x0A)
+        spans = []
+        for line in np.unique(np.searchsorted(newlines, odd_at)).tolist():
+            start = int(newlines[line - 1]) + 1 if line else 0
+            end = int(newlines[line]) + 1 if line < len(newlines) else len(arr)
+            spans.append((start, end))
+        return counts, spans
+
+    def _suspicious_lines_text(self, block: bytes) -> tuple[list[int], list[tuple[int, int]]]:
+        counts = self.counts_text(block.decode("utf-8"))
+        spans: list[tuple[int, int]] = []
+        if counts[self.ODD]:
+            offset = 0
+            odd_mark = self._MARKS[self.ODD]
+            for raw in block.split(b"\n"):
+                end = min(len(block), offset + len(raw) + 1)
+                if not raw.isascii() and odd_mark in raw.decode("utf-8").translate(self._translate):
+                    spans.append((offset, end))
+                offset = end
+        return counts, spans
+
+    # ---- 还原 ----
+
+    def repair_run(self, run: str, rounds: int = 3) -> tuple[str, bool] | None:
+        """对一个非 ASCII 片段尝试“按 GBK/cp1252 编码再按 UTF-8 解码”，最多 rounds 轮（应对多次误转）。
+
+        返回 (还原结果, 是否有损)；无法改善时返回 None。误转时丢失的字节在乱码中表现为 '?' 或 U+FFFD，
+        有损还原把对应位置合并为一个 U+FFFD；丢失过多（多于还原字符的三分之一）的候选直接放弃。
+        """
+        current, lossy = run, False
+        for _ in range(rounds):
+            current_score = self.score(self.counts_text(current))
+            if current_score < self.THRESHOLD:
+                break
+            best: tuple[float, str, bool] | None = None
+            for codec in self.CANDIDATE_CODECS:
+                # cp1252 乱码只含拉丁字母与少量标点（最大为 ™ U+2122），含汉字的片段不必尝试
+                if codec == "cp1252" and max(current.replace("\ufffd", ""), default="") > "\u2122":
+                    continue
+                raw = current.encode(codec, _MOJIBAKE_ENCODE_ERRORS)
+                try:
+                    candidate, candidate_lossy = raw.decode("utf-8"), "\ufffd" in current
+                except UnicodeDecodeError:
+                    candidate, candidate_lossy = self._LOST.sub("\ufffd", raw.decode("utf-8", "replace")), True
+                if candidate == current:
+                    continue
+                counts = self.counts_text(candidate.replace("\ufffd", ""))
+                recovered = counts[self.COMMON] + counts[self.RARE] + counts[self.ODD]
+                if not recovered or candidate_lossy and candidate.count("\ufffd") > max(1, recovered // 3):
+                    continue
+                candidate_score = self.score(counts)
+                if candidate_score < current_score and (best is None or candidate_score < best[0]):
+                    best = (candidate_score, candidate, candidate_lossy)
+            if best is None:
+                break
+            current, lossy = best[1], lossy or best[2]
+        return None if current == run else (current, lossy)
+
+    def repair_text(self, text: str, allow_lossy: bool = False) -> tuple[str, int, int]:
+        """修复一行文本中的各乱码片段，返回 (新文本, 还原的片段数, 有损片段数)；allow_lossy 为 False 时有损片段保持原样。"""
+        fixed = lossy = 0
+
+        def replace_run(match: re.Match) -> str:
+            nonlocal fixed, lossy
+            repaired = self.repair_run(match.group())
+            if repaired is None:
+                return match.group()
+            if repaired[1]:
+                lossy += 1
+                if not allow_lossy:
+                    return match.group()
+            fixed += 1
+            return repaired[0]
+
+        return self._RUN.sub(replace_run, text), fixed, lossy
+
+    def name_candidates(self, name: str) -> list[tuple[float, str, str]]:
+        """文件名的还原候选，按得分升序返回 [(得分, 新名称, "源编码→目标编码")]。
+
+        解压工具按 cp437/cp1252/Latin-1 解读 GBK（或 UTF-8）字节得到的名称可按原编码无损编码回字节，再严格
+        解码；候选不得含 ODD 字符且得分须低于原名称。POSIX 上无法按文件系统编码解码的原始字节名称
+        （surrogateescape）直接按目标编码解码。正常的中文或带重音字母的名称不会产生候选。
+        """
+        if name.isascii():
+            return []
+        try:
+            name.encode("utf-8")
+        except UnicodeEncodeError:
+            sources = [("bytes", os.fsencode(name))]
+            name_score = 1.0
         else:
-            tools_status = "未配置UTF-8"
-
-        console_status_list = getattr(self, "_console_summary_list", [])
-        console_status = getattr(self, "_console_config_status", "未配置UTF-8")
+            sources = []
+            for codec in self.NAME_SOURCE_CODECS:
+                try:
+                    sources.append((codec, name.encode(codec)))
+                except UnicodeEncodeError:
+                    continue
+            name_score = self.score(self.counts_text(name))
+        candidates = []
+        for source, raw in sources:
+            for target in self.NAME_TARGET_CODECS:
+                try:
+                    candidate = raw.decode(target)
+                except UnicodeDecodeError:
+                    continue
+                counts = self.counts_text(candidate)
+                if candidate == name or counts[self.ODD] or not any(counts):
+                    continue
+                candidate_score = self.score(counts)
+                if candidate_score < name_score:
+                    candidates.append((candidate_score, candidate, f"{source}→{target}"))
+        candidates.sort(key=lambda item: item[0])
+        return candidates
+
+
+def _mojibake_encode_error(exc: UnicodeError) -> tuple[bytes, int]:
+    """编码错误处理：还原 Windows 代码页解码时的特殊映射（cp936 的 0x80→€、cp1252 未定义字节→U+0080~U+009F）。
+
+    其余无法编码的字符写为 0xFF（UTF-8 中不合法），解码时变成替换字符并按丢失计数。
+    """
+    if not isinstance(exc, UnicodeEncodeError):
+        raise exc
+    out = bytearray()
+    for char in exc.object[exc.start : exc.end]:
+        code = ord(char)
+        out.append(0x80 if code == 0x20AC else code if code < 0x100 else 0xFF)
+    return bytes(out), exc.end
+
+
+_MOJIBAKE_ENCODE_ERRORS = "code-encoding-fix.mojibake"
+codecs.register_error(_MOJIBAKE_ENCODE_ERRORS, _mojibake_encode_error)
+
+
+@functools.lru_cache(maxsize=None)
+def _mojibake_scorer() -> MojibakeScorer:
+    # 分类表由 GBK 码表枚举生成（约 2 万次解码），首次扫描时才构建
+    return MojibakeScorer()
+
+
+@dataclass
+class FileScanResult:
+    path: str
+    size: int
+    kind: str = "utf-8"
+    lines: int = 0
+    fixed: int = 0
+    lossy: int = 0
+    sample: tuple[str, str] | None = None
+    repaired: bool = False
+    error: str = ""
+
+
+SCAN_KIND_LABELS = MappingProxyType(
+    {
+        "ascii": "纯 ASCII（无需改写）",
+        "utf-8": "UTF-8（无需改写）",
+        "mojibake": "UTF-8 乱码（GBK 误解码）",
+        "legacy": "非 UTF-8（GBK 等旧编码）",
+        "binary": "二进制 / UTF-16",
+        "error": "无法读取",
+    }
+)
+
+
+class EncodingScanner:
+    """目录扫描与报告：逐文件分类编码，可选就地修复乱码（修复前原文写入备份库，可用 --restore-generation 回滚）。
+
+    小文件整体读入、大文件通过 mmap 按对齐到换行的块读取，按批提交到线程池并行处理；纯 ASCII 与合法 UTF-8
+    文件走零改写快速路径，只有含可疑字符的行会被解码并逐片段还原。
+    修复结果先写入同目录临时文件，原文备份完成后再原子替换。
+    """
+
+    SKIP_DIRS = frozenset({".git", ".hg", ".svn", "node_modules", "__pycache__", ".venv", ".tox"})
+    SMALL_FILE = 1 << 20
+    BATCH_FILES = 64
+    BATCH_BYTES = 8 << 20
+
+    def __init__(
+        self,
+        *,
+        repair: bool = False,
+        allow_lossy: bool = False,
+        store: BackupStore | None = None,
+        workers: int | None = None,
+        block_size: int = 16 << 20,
+        fast_path: bool = True,
+    ) -> None:
+        if repair and store is None:
+            raise ValueError("修复模式需要备份库")
+        self.repair = repair
+        self.allow_lossy = allow_lossy
+        self.store = store
+        self.workers = max(1, workers or min(8, os.cpu_count() or 2))
+        self.block_size = block_size
+        # 关闭后每个文件都走完整分类（仅供基准对比）
+        self.fast_path = fast_path
+        self._lock = threading.Lock()
+        self._backups: dict[str, dict[str, object]] = {}
+
+    def iter_files(self, roots: Iterable[Path]) -> Iterable[tuple[str, int]]:
+        """单次 os.scandir 遍历，返回 (路径字符串, 大小)；不跟随符号链接，跳过版本库与依赖目录。
+
+        路径保持为 str：数十万文件时逐个构造 Path 的开销与读取小文件本身相当。
+        """
+        for root in roots:
+            root = Path(root)
+            if root.is_file():
+                yield str(root), root.stat().st_size
+                continue
+            stack = [str(root)]
+            while stack:
+                try:
+                    with os.scandir(stack.pop()) as entries:
+                        for entry in entries:
+                            try:
+                                if entry.is_dir(follow_symlinks=False):
+                                    if entry.name not in self.SKIP_DIRS:
+                                        stack.append(entry.path)
+                                elif entry.is_file(follow_symlinks=False):
+                                    yield entry.path, entry.stat(follow_symlinks=False).st_size
+                            except OSError:
+                                continue
+                except OSError:
+                    continue
 
-        tools_text = f"工具：{tools_status}"
-        console_text = f"编码：{console_status}"
-        line = " | ".join([tools_text, console_text])
+    @contextlib.contextmanager
+    def _open_buffer(self, path: str, size: int):
+        """小文件一次读入 bytes（比 mmap 的系统调用开销低），大文件使用只读 mmap。"""
+        with open(path, "rb") as fh:
+            if size <= self.SMALL_FILE:
+                yield fh.read()
+                return
+            with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                yield mm
+
+    def _is_ascii(self, buf) -> bool:
+        """整文件高位检查：bytes 用 isascii()，mmap 用 NumPy 对映射内存求最大值（不复制），否则按块检查。"""
+        if isinstance(buf, bytes):
+            return buf.isascii()
+        np = _optional_numpy()
+        if np is not None:
+            arr = np.frombuffer(buf, dtype=np.uint8)
+            try:
+                return bool(arr.max() < 0x80)
+            finally:
+                del arr  # 释放对 mmap 的导出引用，否则无法关闭映射
+        return all(buf[start : start + self.block_size].isascii() for start in range(0, len(buf), self.block_size))
 
-        # 漂移提示：用于快速定位“哪些内容被手动改动”
-        drift_labels: list[str] = []
-        detail = getattr(self, "_shell_marker_detail", {})
-        for k in considered.keys():
-            state = detail.get(k, "")
-            if state in {"partial", "duplicate", "modified", "unreadable", "error"}:
-                drift_labels.append(labels.get(k, k))
-        if drift_labels:
-            shown = drift_labels[:4]
-            suffix = f"等{len(drift_labels)}项" if len(drift_labels) > 4 else ""
-            line = f"{line}（检测到改动: {', '.join(shown)}{suffix}）"
+    def scan_file(self, path: str, size: int) -> FileScanResult:
+        """分类单个文件。纯 ASCII 与不含可疑字符的合法 UTF-8 文件不做任何字符级处理、不写入：
 
-        line = f"{line}。 请重新打开终端/shell工具以应用设置！"
-        self.status_var.set(line)
+        1. 整文件高位检查，纯 ASCII 直接返回；
+        2. 逐块（对齐到换行）：纯 ASCII 块跳过；其余块用 bytes.decode 做整块 UTF-8 合法性检查（C 层一次完成，
+           结果丢弃），不合法即判为旧编码；合法块交给 MojibakeScorer 向量化计数，只有含可疑字符的行才解码还原。
+        """
+        result = FileScanResult(path, size)
+        if not size:
+            result.kind = "ascii"
+            return result
+        tmp: Path | None = None
+        try:
+            with self._open_buffer(path, size) as buf:
+                size = result.size = len(buf)
+                head = buf[:8192]
+                if head.startswith((b"\xff\xfe", b"\xfe\xff")) or b"\x00" in head:
+                    result.kind = "binary"
+                    return result
+                if self.fast_path and self._is_ascii(buf):
+                    result.kind = "ascii"
+                    return result
+                scorer = _mojibake_scorer()
+                replacements: list[tuple[int, int, bytes]] = []
+                for start, end in _iter_line_blocks(buf, size, self.block_size):
+                    block = buf[start:end]
+                    if self.fast_path and block.isascii():
+                        continue
+                    try:
+                        block.decode("utf-8")
+                    except UnicodeDecodeError:
+                        result.kind = "legacy"
+                        return result
+                    _counts, spans = scorer.suspicious_lines(block)
+                    for line_start, line_end in spans:
+                        line = block[line_start:line_end].decode("utf-8")
+                        repaired, fixed, lossy = scorer.repair_text(line, self.allow_lossy)
+                        result.lossy += lossy
+                        if not fixed:
+                            continue
+                        result.lines += 1
+                        result.fixed += fixed
+                        if result.sample is None:
+                            result.sample = (line.strip()[:60], repaired.strip()[:60])
+                        replacements.append((start + line_start, start + line_end, repaired.encode("utf-8")))
+                if not replacements:
+                    if result.lossy:
+                        result.kind = "mojibake"
+                    return result
+                result.kind = "mojibake"
+                if not self.repair:
+                    return result
+                target = Path(path)
+                tmp = target.with_name(f".{target.name}.{os.getpid()}.{threading.get_ident()}.repair.tmp")
+                with open(tmp, "wb") as out, memoryview(buf) as view:
+                    position = 0
+                    for start, end, data in replacements:
+                        out.write(view[position:start])
+                        out.write(data)
+                        position = end
+                    out.write(view[position:])
+            entry = self.store.put_file(path)
+            shutil.copymode(path, tmp)
+            os.replace(tmp, path)
+            tmp = None
+            with self._lock:
+                self._backups["file:" + os.path.abspath(path)] = entry
+            result.repaired = True
+        except Exception as exc:  # noqa: BLE001
+            result.kind, result.error = "error", str(exc)
+        finally:
+            if tmp is not None:
+                tmp.unlink(missing_ok=True)
+        return result
+
+    def _scan_batch(self, batch: list[tuple[str, int]]) -> list[FileScanResult]:
+        return [self.scan_file(path, size) for path, size in batch]
+
+    def _batches(self, roots: Iterable[Path]) -> Iterable[list[tuple[str, int]]]:
+        """把小文件打包提交（每批至多 BATCH_FILES 个或 BATCH_BYTES 字节），摊薄线程池的逐任务开销。"""
+        batch: list[tuple[str, int]] = []
+        batch_bytes = 0
+        for path, size in self.iter_files(roots):
+            batch.append((path, size))
+            batch_bytes += size
+            if len(batch) >= self.BATCH_FILES or batch_bytes >= self.BATCH_BYTES:
+                yield batch
+                batch, batch_bytes = [], 0
+        if batch:
+            yield batch
+
+    def run(self, roots: Iterable[Path], on_result: Callable[[FileScanResult], None] | None = None) -> dict[str, object]:
+        """扫描全部文件并返回汇总；修复模式下结束时把全部原文保存为备份库中的一代（reason=mojibake）。"""
+        from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+
+        started = time.perf_counter()
+        _mojibake_scorer()
+        kinds: dict[str, list[int]] = {kind: [0, 0] for kind in SCAN_KIND_LABELS}
+        findings: list[FileScanResult] = []
+
+        def collect(results: list[FileScanResult]) -> None:
+            for result in results:
+                kinds[result.kind][0] += 1
+                kinds[result.kind][1] += result.size
+                if result.kind in ("mojibake", "error"):
+                    findings.append(result)
+                if on_result is not None:
+                    on_result(result)
+
+        generation = None
+        try:
+            with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix="scan") as pool:
+                # 有界提交：百万级文件时不一次性创建全部 Future
+                pending: set = set()
+                for batch in self._batches(roots):
+                    pending.add(pool.submit(self._scan_batch, batch))
+                    if len(pending) >= self.workers * 4:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future.result())
+                for future in pending:
+                    collect(future.result())
+        finally:
+            if self._backups:
+                generation = self.store.commit_entries(self._backups, "mojibake")
+        elapsed = time.perf_counter() - started
+        findings.sort(key=lambda r: r.path)
+        return {
+            "files": sum(count for count, _ in kinds.values()),
+            "bytes": sum(size for _, size in kinds.values()),
+            "elapsed": elapsed,
+            "kinds": kinds,
+            "findings": findings,
+            "generation": generation,
+            "allow_lossy": self.allow_lossy,
+        }
 
-        # 工具行内展示：漂移结论 + 简要原因（避免误导为手动改动）
-        def _brief(item):
-            if not isinstance(item, dict):
-                return '未检测'
-            state = str(item.get('state') or 'unknown')
-            summary = str(item.get('summary') or '').strip()
-            if state == 'ok':
-                return 'utf-8编码已正确配置'
-            if state == 'missing':
-                return '未检测到 UTF-8 配置（可能被删除或尚未配置）'
-            if state == 'partial':
-                return '残缺标记（可自动清理）'
-            if state == 'duplicate':
-                return '重复块（将自动去重）'
-            if state == 'modified':
-                return '已偏离（执行时将覆盖修复）'
-            if state == 'unreadable':
-                return '不可读取'
-            if summary:
-                return summary
-            return state
 
-        for key in ('ps5', 'ps7', 'git', 'vscode'):
-            row = getattr(self, '_row_widgets', {}).get(key)
-            if not isinstance(row, dict):
-                continue
-            w = row.get('status_full')
-            if w is None:
-                continue
+def _print_scan_report(summary: Mapping[str, object], limit: int = 50) -> None:
+    elapsed = float(summary["elapsed"])
+    total = int(summary["bytes"])
+    rate = total / elapsed / (1 << 20) if elapsed > 0 else 0.0
+    print(f"扫描 {summary['files']} 个文件，共 {total / (1 << 20):.1f} MB，耗时 {elapsed:.2f} 秒（{rate:.0f} MB/s）")
+    for kind, (count, size) in summary["kinds"].items():
+        if count:
+            print(f"  {count:>8} 个 {size / (1 << 20):>10.1f} MB  {SCAN_KIND_LABELS[kind]}")
+    files = int(summary["files"])
+    if files:
+        clean = [a + b for a, b in zip(summary["kinds"]["ascii"], summary["kinds"]["utf-8"])]
+        print(
+            f"无需改写（纯 ASCII / 合法 UTF-8）：文件占 {clean[0] / files:.1%}，"
+            f"字节占 {clean[1] / total:.1%}" if total else f"无需改写（纯 ASCII / 合法 UTF-8）：文件占 {clean[0] / files:.1%}"
+        )
+    findings = summary["findings"]
+    if findings:
+        print(f"需要关注的文件（最多列出 {limit} 个）：")
+    for result in findings[:limit]:
+        if result.kind == "error":
+            print(f"  [ERROR] {result.path}: {result.error}")
+            continue
+        parts = []
+        if result.fixed:
+            parts.append(f"{result.lines} 行 {result.fixed} 处" + ("已修复" if result.repaired else "可修复"))
+        if result.lossy and summary["allow_lossy"]:
+            parts.append(f"其中 {result.lossy} 处有字节丢失，丢失处写为 U+FFFD")
+        elif result.lossy:
+            parts.append(f"{result.lossy} 处有字节丢失，未修复（加 --repair-lossy 一并修复）")
+        print(f"  {result.path}: {'，'.join(parts)}")
+        if result.sample:
+            print(f"      {result.sample[0]!r} -> {result.sample[1]!r}")
+    if summary["generation"] is not None:
+        print(f"修复前的原文已保存为备份代次 {summary['generation']}，可用 --restore-generation {summary['generation']} 回滚")
+
+
+def _utf8_boundary(buf, pos: int) -> int:
+    """UTF-8 自同步：跳过至多 3 个延续字节（10xxxxxx）即到达码位起点。"""
+    end = min(len(buf), pos + 3)
+    while pos < end and 0x80 <= buf[pos] <= 0xBF:
+        pos += 1
+    return pos
+
+
+def _dbcs_boundary(buf, pos: int, window: int = 1 << 16) -> int:
+    """GBK/Big5 等双字节编码的前导字节判定：向前找到最近一个 < 0x81 的字节（它只能是单字节字符或尾字节，
+    其后必为字符起点），其后连续的 >= 0x81 字节两两成对；pos 与该起点的距离为奇数时 pos 是尾字节。
+
+    window 内没有这样的字节（几乎不会出现在文本中）时退回到 pos 之后的下一个换行。
+    """
+    floor = max(0, pos - window)
+    start = pos
+    while start > floor and buf[start - 1] >= 0x81:
+        start -= 1
+    if start == floor and floor > 0:
+        newline = buf.find(b"\n", pos)
+        return len(buf) if newline < 0 else newline + 1
+    return pos + 1 if (pos - start) % 2 else pos
+
+
+def _single_byte_boundary(buf, pos: int) -> int:
+    return pos
+
+
+_CHUNK_BOUNDARIES: dict[str, Callable[[object, int], int]] = {
+    "utf-8": _utf8_boundary,
+    "utf-8-sig": _utf8_boundary,
+    "gbk": _dbcs_boundary,
+    "gb2312": _dbcs_boundary,
+    "big5": _dbcs_boundary,
+    "cp950": _dbcs_boundary,
+    "latin-1": _single_byte_boundary,
+    "iso8859-1": _single_byte_boundary,
+    "cp1252": _single_byte_boundary,
+    "ascii": _single_byte_boundary,
+}
+
+
+def _decode_chunk(task: tuple[str, int, int, str, str | None]) -> tuple[int | None, str, bytes | None]:
+    """工作进程：自行映射文件，直接对 mmap 的 memoryview 切片解码（不复制输入）。
+
+    返回 (出错的文件偏移或 None, 错误原因, 转码结果或 None)。
+    """
+    path, start, end, encoding, target = task
+    with open(path, "rb") as fh, mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm, memoryview(mm) as view:
+        chunk = view[start:end]
+        try:
+            text = str(chunk, encoding)
+        except UnicodeDecodeError as exc:
+            return start + exc.start, exc.reason, None
+        finally:
+            chunk.release()
+    return None, "", text.encode(target) if target else None
+
+
+class ChunkedDecoder:
+    """多进程分块解码单个大文件：校验能否按指定编码解码，或转码为 UTF-8。
+
+    父进程只用 mmap 计算切分点（对齐到码位起点，UTF-8 靠延续字节自同步，GBK/Big5 靠前导字节奇偶判定），
+    各块交给进程池，工作进程自行映射文件并直接解码 memoryview 切片；转码结果按块顺序直接写出，不做拼接。
+    在途块数限制为 workers * 2，结果内存占用与文件大小无关。
+    """
+
+    def __init__(self, encoding: str = "utf-8", *, workers: int | None = None, chunk_size: int | None = None) -> None:
+        self.encoding = codecs.lookup(encoding).name
+        if self.encoding not in _CHUNK_BOUNDARIES:
+            raise ValueError(f"不支持并行分块解码的编码: {encoding}")
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.chunk_size = chunk_size
+
+    def boundaries(self, buf, size: int) -> list[tuple[int, int]]:
+        """按 chunk_size（默认使每个进程分到约 4 块，介于 4~64 MB）切分，边界对齐到码位起点。"""
+        chunk_size = self.chunk_size or min(64 << 20, max(4 << 20, size // (self.workers * 4) + 1))
+        resync = _CHUNK_BOUNDARIES[self.encoding]
+        spans: list[tuple[int, int]] = []
+        start = 0
+        while start < size:
+            end = size if start + chunk_size >= size else max(start + 1, resync(buf, start + chunk_size))
+            spans.append((start, min(end, size)))
+            start = min(end, size)
+        return spans
+
+    def _tasks(self, path: Path, spans: list[tuple[int, int]], target: str | None) -> list[tuple]:
+        tasks = []
+        for index, (start, end) in enumerate(spans):
+            # utf-8-sig 只有首块可能带 BOM
+            encoding = "utf-8" if self.encoding == "utf-8-sig" and index else self.encoding
+            tasks.append((str(path), start, end, encoding, target))
+        return tasks
+
+    def _map(self, tasks: list[tuple]) -> Iterable[tuple[int | None, str, bytes | None]]:
+        """按输入顺序产出各块结果；在途块数有界，调用方提前结束迭代时取消剩余任务。"""
+        if self.workers <= 1 or len(tasks) <= 1:
+            yield from map(_decode_chunk, tasks)
+            return
+        from concurrent.futures import ProcessPoolExecutor
+
+        pending: deque = deque()
+        with ProcessPoolExecutor(max_workers=min(self.workers, len(tasks))) as pool:
+            remaining = iter(tasks)
             try:
-                w.config(text=_brief(getattr(self, '_tool_config_detail', {}).get(key)))
-            except Exception:
+                for task in remaining:
+                    pending.append(pool.submit(_decode_chunk, task))
+                    if len(pending) >= self.workers * 2:
+                        yield pending.popleft().result()
+                while pending:
+                    yield pending.popleft().result()
+            finally:
+                for future in pending:
+                    future.cancel()
+
+    def run(self, path: Path, output: Path | None = None) -> dict[str, object]:
+        """校验（output 为 None）或转码为 UTF-8 写入 output；遇到第一个解码错误即停止。
+
+        返回 {"size", "chunks", "elapsed", "error": None 或 {"offset", "reason"}}。
+        """
+        started = time.perf_counter()
+        with open(path, "rb") as fh:
+            size = os.fstat(fh.fileno()).st_size
+            if not size:
+                spans = []
+            else:
+                with mmap.mmap(fh.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    spans = self.boundaries(mm, size)
+        error = None
+        out = open(output, "wb") if output is not None else None
+        results = self._map(self._tasks(path, spans, "utf-8" if out else None))
+        try:
+            with contextlib.closing(results):
+                for offset, reason, data in results:
+                    if offset is not None:
+                        error = {"offset": offset, "reason": reason}
+                        break
+                    if out is not None:
+                        out.write(data)
+        finally:
+            if out is not None:
+                out.close()
+        return {"size": size, "chunks": len(spans), "elapsed": time.perf_counter() - started, "error": error}
+
+
+def _decode_large_file(path: Path, encoding: str, write_utf8: bool, workers: int | None) -> bool:
+    """命令行：并行校验/转码单个大文件；转码时原文先写入备份库，再原子替换。返回是否成功。"""
+    decoder = ChunkedDecoder(encoding, workers=workers)
+    tmp = path.with_name(f".{path.name}.{os.getpid()}.utf8.tmp") if write_utf8 else None
+    try:
+        result = decoder.run(path, tmp)
+        elapsed = float(result["elapsed"])
+        rate = result["size"] / elapsed / (1 << 20) if elapsed > 0 else 0.0
+        print(
+            f"{path}: {result['size'] / (1 << 20):.1f} MB，{result['chunks']} 块，"
+            f"{max(1, min(decoder.workers, result['chunks']))} 个进程，"
+            f"耗时 {elapsed:.2f} 秒（{rate:.0f} MB/s）"
+        )
+        if result["error"] is not None:
+            print(f"  [ERROR] 偏移 {result['error']['offset']} 处无法按 {decoder.encoding} 解码: {result['error']['reason']}")
+            return False
+        if tmp is None:
+            print(f"  可按 {decoder.encoding} 完整解码")
+            return True
+        store = BackupStore(SetupApp._default_config_dir() / "backup")
+        entry = store.put_file(path)
+        shutil.copymode(path, tmp)
+        os.replace(tmp, path)
+        tmp = None
+        generation = store.commit_entries({"file:" + str(path.resolve()): entry}, "transcode")
+        print(f"  已从 {decoder.encoding} 转换为 UTF-8；原文保存为备份代次 {generation}")
+        return True
+    finally:
+        if tmp is not None:
+            tmp.unlink(missing_ok=True)
+
+
+# 各语言常用字符，按使用频率大致降序排列（含标点与空格）。这是随工具分发的紧凑频率表：
+# 首次使用时按 Zipf 分布抽样成文本，用对应编码编码后统计字节二元组，展开为完整的对数概率表。
+_CJK_FREQUENT_CHARS = MappingProxyType(
+    {
+        "gbk": "，的。一是不了“”人我在有他这中大来上、国个到说们为子和你地出道也时年得就那要下以生会自着去之过家学"
+        "对可她里后小么心多天而能好都然没日于起还发成事只作当想看文无开手十用主行方又如前所本见经头面公同三已老"
+        "从动两长知民样现分将外但身些与高意进把法此实回二理美点月明其种声全工己话儿者向情部正名定女问力机给等几"
+        "很业最间新什打便位因重被走电四第门相次东政海口使教西再平真听世气信北少关并内加化由却代军产入先山五太水"
+        "万市眼体别处总才场师书比住员九笑性通目华报立马命张活难神数件安表原车白应路期叫死常提感金何更反合放做系"
+        "计或司利受光王果亲界及今京务制解各任至清物台象记边共风战干接它许八特觉望直服毛林题建南度统色字请交爱让"
+        "认算论百吃义科怎元社术结六功指思非流每青管夫连远资队跟带花快条院变联言权往展该领传近留红治决周保达办运"
+        "武半候七必城父强步完革深区即求品士转量空甚众技轻程告江语英基派满式李息写呢识极令黄德收脸钱党倒未持取设"
+        "始版双历越史商千片容研像找友孩站广改议形委早房音火际则首单据导影失拿网香似斯专石若兵弟谁校读志飞观争究"
+        "包组造落视济喜离虽坐集编宝谈府拉黑且随格尽剑讲布杀微怕母调局根曾准团段终乐切级克精哪官示冷域！？：；（）",
+        "big5": "，的。一是不了「」人我在有他這中大來上、國個到說們為子和你地出道也時年得就那要下以生會自著去之過家學"
+        "對可她裡後小麼心多天而能好都然沒日於起還發成事只作當想看文無開手十用主行方又如前所本見經頭面公同三已老"
+        "從動兩長知民樣現分將外但身些與高意進把法此實回二理美點月明其種聲全工己話兒者向情部正名定女問力機給等幾"
+        "很業最間新什打便位因重被走電四第門相次東政海口使教西再平真聽世氣信北少關並內加化由卻代軍產入先山五太水"
+        "萬市眼體別處總才場師書比住員九笑性通目華報立馬命張活難神數件安表原車白應路期叫死常提感金何更反合放做系"
+        "計或司利受光王果親界及今京務制解各任至清物臺象記邊共風戰乾接它許八特覺望直服毛林題建南度統色字請交愛讓"
+        "認算論百吃義科怎元社術結六功指思非流每青管夫連遠資隊跟帶花快條院變聯言權往展該領傳近留紅治決周保達辦運"
+        "武半候七必城父強步完革深區即求品士轉量空甚眾技輕程告江語英基派滿式李息寫呢識極令黃德收臉錢黨倒未持取設"
+        "始版雙歷越史商千片容研像找友孩站廣改議形委早房音火際則首單據導影失拿網香似斯專石若兵弟誰校讀志飛觀爭究"
+        "包組造落視濟喜離雖坐集編寶談府拉黑且隨格盡劍講布殺微怕母調局根曾準團段終樂切級克精哪官示冷域！？：；（）",
+        "shift_jis": "のに、はをたがで。てとしれさあいうるなっかくすもまりこんよおだけらせちつやろみわえめひほねそきゆへ"
+        "ンル「」トスイクリラタカシーレアロマテドジコフプナメ日本人年大一中出国会時行事見分生子上手自方前後者地東社"
+        "合同用気内新当間学長作物問題部所発立動業話場理意定明実家体高言彼思今何目開外感来最回私ッョュデバブグ・",
+        "euc_kr": " 이다.는의에하고을가를한지서기로사니어리있대수도으자시나해게아들것보그장만정주일면라요여거부전우제상적인"
+        "방스소세까성경과학원동내생연없말되중무모화문간비계못데저신진실당미위조금개물드결국회공용발업때통분마재관"
+        "터선감표구명음열안또교함점외반단받산년후입청변처법강심두파력번,",
+    }
+)
+
+
+@functools.lru_cache(maxsize=None)
+def _bigram_log_tables() -> tuple[tuple[str, ...], tuple[list[float], ...]]:
+    """展开各编码的字节二元组对数概率表：下标为 (首字节 - 0x80) << 8 | 次字节，只覆盖首字节为高位的二元组。
+
+    计数来自按频率表抽样的文本（同时包含字内的 首字节/尾字节 与跨字的 尾字节/下一字首字节 组合，与实际文件一致）；
+    在该编码中合法的组合另加先验计数，非法组合只有极小的平滑值，因此错误编码下出现的非法字节对会被重罚。
+    """
+    import random
+
+    encodings = tuple(_CJK_FREQUENT_CHARS)
+    tables: list[list[float]] = []
+    for index, encoding in enumerate(encodings):
+        chars = list(dict.fromkeys(_CJK_FREQUENT_CHARS[encoding]))
+        weights = list(accumulate(1.0 / (rank + 4) for rank in range(len(chars))))
+        sample = "".join(random.Random(index).choices(chars, cum_weights=weights, k=EncodingClassifier.SAMPLE_CHARS))
+        data = sample.encode(encoding)
+        counts = [0.0] * 0x8000
+        for (lead, trail), count in Counter(zip(data, data[1:])).items():
+            if lead >= 0x80:
+                counts[(lead - 0x80) << 8 | trail] = count
+        for lead in range(0x80, 0x100):
+            row = (lead - 0x80) << 8
+            try:
+                bytes((lead,)).decode(encoding)
+            except UnicodeDecodeError:
                 pass
-    def _restore_configs(self) -> None:
-        """恢复 PowerShell 与 Git Bash 配置到原始配置备份版本（后台线程执行，避免卡 UI）。"""
-        if self.is_running:
-            return
-        self._log_separator("恢复开始")
-        self._restore_start_logged = True
-        self._set_buttons_state(False)
-        confirm = self._show_modal(
-            "恢复已备份配置",
-            "将 工具配置、控制台编码和 shell 语言环境 恢复到首次执行时的状态，会覆盖之后的手动修改。\n\n是否继续？",
-            kind="confirm",
-            confirm_text="继续",
-            cancel_text="取消",
+            else:
+                # 单字节字符（如 Shift-JIS 半角片假名）后接 ASCII
+                for trail in range(0x40):
+                    counts[row | trail] += EncodingClassifier.VALID_PRIOR
+            # 次字节不低于 0x40 的组合一次解码：以换行分隔（换行不会被当作次字节），含替换字符的即为非法
+            pairs = b"\n".join(bytes((lead, trail)) for trail in range(0x40, 0x100))
+            for trail, text in enumerate(pairs.decode(encoding, "replace").split("\n"), 0x40):
+                if "\ufffd" not in text:
+                    counts[row | trail] += EncodingClassifier.VALID_PRIOR
+        total = sum(counts) + EncodingClassifier.FLOOR * len(counts)
+        tables.append([math.log((count + EncodingClassifier.FLOOR) / total) for count in counts])
+    return encodings, tuple(tables)
+
+
+class EncodingClassifier:
+    """区分 GBK / Big5 / Shift-JIS / EUC-KR 的字节二元组统计分类器。
+
+    “先试 UTF-8，否则按系统 ANSI 代码页”的判定会把 Big5、Shift-JIS 文件一律当成 cp936。这里统计文件中首字节为
+    高位的相邻字节对，与各编码的对数概率表求平均对数似然，再换算为各候选的置信度（有效样本数封顶，避免长文件的
+    置信度一律为 1）。纯 ASCII 与合法 UTF-8 在分类前直接判定；最佳候选的平均对数似然低于 MIN_SCORE 时不返回候选
+    （多为西文单字节编码或二进制数据）。
+
+    NumPy 可用时相邻字节对直接由 uint8 数组移位拼成 16 位下标（首字节为 ASCII 的下标在表中权重为 0）：
+    classify 对 memoryview 做 np.bincount 得到直方图后与 (65536, 4) 的表相乘；classify_many 把一批文件拼接，
+    np.take 查表后按文件分段 np.add.reduceat 求和（等价于各文件直方图与表的乘积，但不为每个小文件分配 65536 项的
+    直方图），再扣除跨文件的字节对。未安装 NumPy 时用 Counter 统计字节对。
+    """
+
+    SAMPLE_CHARS = 40000
+    VALID_PRIOR = 0.5
+    FLOOR = 0.01
+    # 置信度按至多这么多个字节对计算
+    EFFECTIVE_PAIRS = 48
+    MIN_SCORE = -9.5
+    # classify_many 每批拼接的字节数（查表结果每字节占 16 字节内存）；不小于 HISTOGRAM_BYTES 的文件单独做直方图
+    BATCH_BYTES = 1 << 20
+    HISTOGRAM_BYTES = 256 << 10
+    _HIGH_BYTES = bytes(range(0x80, 0x100))
+
+    def __init__(self) -> None:
+        self.encodings, self._tables = _bigram_log_tables()
+        np = _optional_numpy()
+        self._table = None
+        if np is not None:
+            self._table = np.zeros((0x10000, len(self.encodings)), dtype=np.float32)
+            self._table[0x8000:] = np.array(self._tables, dtype=np.float32).T
+
+    @staticmethod
+    def _prefilter(data: bytes, truncated: bool = False) -> list[tuple[str, float]] | None:
+        if data.isascii():
+            return [("ascii", 1.0)]
+        if len(data) < 2:
+            # 单个高位字节没有字节对可统计（也不能进入 classify_many 的分段求和）
+            return []
+        try:
+            # 只读了文件开头时，截断处不完整的 UTF-8 字符由增量解码器保留，不算解码失败
+            codecs.getincrementaldecoder("utf-8")().decode(data, final=not truncated)
+        except UnicodeDecodeError:
+            return None
+        return [("utf-8", 1.0)]
+
+    def _rank(self, sums, pairs: int) -> list[tuple[str, float]]:
+        """由各编码的对数似然之和给出按置信度降序的候选。"""
+        if not pairs:
+            return []
+        means = [float(total) / pairs for total in sums]
+        top = max(means)
+        if top < self.MIN_SCORE:
+            return []
+        weight = min(pairs, self.EFFECTIVE_PAIRS)
+        scores = [math.exp((mean - top) * weight) for mean in means]
+        norm = sum(scores)
+        return sorted(
+            ((encoding, score / norm) for encoding, score in zip(self.encodings, scores)),
+            key=lambda item: -item[1],
         )
-        if not confirm:
-            self._log("恢复已取消", "warning")
-            self._log_separator("恢复结束")
-            self._set_buttons_state(True)
-            return
 
-        self.is_running = True
-        threading.Thread(target=self._run_restore, daemon=True).start()
+    @staticmethod
+    def _pair_keys(np, data):
+        arr = np.frombuffer(memoryview(data), dtype=np.uint8)
+        return (arr[:-1].astype(np.uint16) << 8) | arr[1:]
 
-    def _run_restore(self) -> None:
-        """后台执行恢复逻辑，完成后调回主线程更新 UI。"""
+    def histogram(self, data: bytes):
+        """相邻字节对的直方图（长度 65536，下标为 首字节 << 8 | 次字节）。需要 NumPy。"""
+        np = _optional_numpy()
+        return np.bincount(self._pair_keys(np, data), minlength=0x10000)
+
+    def classify(self, data: bytes, truncated: bool = False) -> list[tuple[str, float]]:
+        """返回 [(编码, 置信度), ...]，按置信度降序；无法判定时为空列表。
+
+        truncated 为 True 表示 data 只是文件开头的一段，末尾不完整的 UTF-8 字符不影响判定。
+        """
+        return self.classify_many([data], [truncated])[0]
+
+    def _classify_single(self, data: bytes) -> list[tuple[str, float]]:
+        if self._table is None or _optional_numpy() is None:
+            keys = Counter((lead - 0x80) << 8 | trail for lead, trail in zip(data, data[1:]) if lead >= 0x80)
+            sums = [sum(table[key] * count for key, count in keys.items()) for table in self._tables]
+            return self._rank(sums, sum(keys.values()))
+        hist = self.histogram(data)
+        return self._rank(hist @ self._table, int(hist[0x8000:].sum()))
+
+    def classify_many(
+        self, blobs: list[bytes], truncated: list[bool] | None = None
+    ) -> list[list[tuple[str, float]]]:
+        """批量分类，结果与 blobs 一一对应；truncated 同样与 blobs 对应，含义见 classify。"""
+        flags = truncated or [False] * len(blobs)
+        results: list[list[tuple[str, float]] | None] = [
+            self._prefilter(blob, flag) for blob, flag in zip(blobs, flags)
+        ]
+        np = _optional_numpy()
+        pending = []
+        for index, result in enumerate(results):
+            if result is not None:
+                continue
+            if self._table is None or np is None or len(blobs[index]) >= self.HISTOGRAM_BYTES:
+                results[index] = self._classify_single(blobs[index])
+            else:
+                pending.append(index)
+        start = 0
+        while start < len(pending):
+            batch, size = [], 0
+            while start < len(pending) and (not batch or size < self.BATCH_BYTES):
+                batch.append(pending[start])
+                size += len(blobs[pending[start]])
+                start += 1
+            keys = self._pair_keys(np, b"".join(blobs[index] for index in batch))
+            ends = np.cumsum([len(blobs[index]) for index in batch])
+            starts = np.concatenate(([0], ends[:-1]))
+            sums = np.add.reduceat(np.take(self._table, keys, axis=0), starts, axis=0)
+            # 每个文件最后一个字节与下一个文件开头组成的字节对不计入（进入这里的文件至少 2 字节，分段互不重叠）
+            sums[:-1] -= self._table[keys[ends[:-1] - 1]]
+            for row, index in enumerate(batch):
+                blob = blobs[index]
+                # 字节对数 = 除末字节外的高位字节数（bytes.translate 删除高位字节后比较长度，C 层完成）
+                pairs = len(blob) - len(blob.translate(None, self._HIGH_BYTES)) - (blob[-1] >= 0x80)
+                results[index] = self._rank(sums[row], pairs)
+        return results  # type: ignore[return-value]
+
+
+@functools.lru_cache(maxsize=1)
+def _encoding_classifier() -> EncodingClassifier:
+    return EncodingClassifier()
+
+
+def _detect_encodings(paths: list[str], head: int = 64 << 10, limit: int = 200) -> bool:
+    """命令行 --detect-encoding：逐文件（只读前 head 字节）给出候选编码与置信度；返回是否全部可判定。"""
+    classifier = _encoding_classifier()
+    labels = {"ascii": "纯 ASCII", "utf-8": "UTF-8", "binary": "二进制 / UTF-16", "error": "无法读取", "unknown": "无法判定"}
+    started = time.perf_counter()
+    files = list(EncodingScanner().iter_files([Path(p) for p in paths]))
+    totals: Counter = Counter()
+    shown = 0
+    for start in range(0, len(files), 1024):
+        batch = files[start : start + 1024]
+        blobs: list[bytes] = []
+        skipped: dict[int, str] = {}
+        for index, (path, _size) in enumerate(batch):
+            try:
+                with open(path, "rb") as fh:
+                    blob = fh.read(head)
+            except OSError:
+                blob, skipped[index] = b"", "error"
+            # 与 --scan 相同：含 NUL 或 UTF-16 BOM 的视为二进制，不参与分类
+            if blob.startswith((b"\xff\xfe", b"\xfe\xff")) or b"\x00" in blob[:8192]:
+                blob, skipped[index] = b"", "binary"
+            blobs.append(blob)
+        truncated = [len(blob) == head for blob in blobs]
+        for index, ((path, _size), ranked) in enumerate(zip(batch, classifier.classify_many(blobs, truncated))):
+            encoding = skipped.get(index) or (ranked[0][0] if ranked else "unknown")
+            totals[encoding] += 1
+            if index in skipped or encoding in ("ascii", "utf-8"):
+                continue
+            if shown < limit:
+                detail = "，".join(f"{name} {confidence:.2f}" for name, confidence in ranked[:3] if confidence >= 0.01)
+                print(f"  {path}: {detail or labels['unknown']}")
+            shown += 1
+    if shown > limit:
+        print(f"  …… 另有 {shown - limit} 个")
+    summary = "，".join(f"{labels.get(name, name)} {count}" for name, count in totals.most_common())
+    print(f"共 {len(files)} 个文件，耗时 {time.perf_counter() - started:.2f} 秒：{summary or '无'}")
+    return not totals["unknown"]
+
+
+class StreamTranscoder:
+    """管道过滤器：从二进制输入流读取任意编码文本，以 UTF-8 写出。
+
+    - 读取用 read1()（有多少读多少），每次读取后立即写出并 flush，交互式输出（如 git log 分页、构建日志）不被攒批；
+    - 未指定编码时自动识别：纯 ASCII 前缀原样直通；出现非 ASCII 字节后，在已到达的数据（至多 probe_size 字节，
+      读取返回不足一块时不再等待）上判定——带 BOM 按 BOM，能按 UTF-8 解码即为 UTF-8，否则由 EncodingClassifier
+      在 GBK / Big5 / Shift-JIS / EUC-KR 中选出置信度足够高的候选，都不够高时为系统 ANSI 代码页；
+    - 识别后用增量解码器逐块转换，跨块的多字节字符由解码器保留；无法解码的字节写为 U+FFFD；
+    - per_line 为 True 时逐行回退：每行先按 UTF-8 解码，失败再按 ANSI 代码页，适合混有多种编码输出的流水线。
+      未以换行结束的残行在读取暂停时也会输出，只保留不完整字符的尾字节。
+    缓冲区至多为一块读取加一行残留（per_line 时单行超过 max_line 字节即强制输出）。
+    """
+
+    BOMS = ((codecs.BOM_UTF8, "utf-8-sig"), (codecs.BOM_UTF16_LE, "utf-16"), (codecs.BOM_UTF16_BE, "utf-16"))
+    MIN_CONFIDENCE = 0.9
+
+    def __init__(
+        self,
+        encoding: str | None = None,
+        *,
+        fallback_encoding: str = "cp936",
+        per_line: bool = False,
+        probe_size: int = 4096,
+        chunk_size: int = 1 << 16,
+        max_line: int = 1 << 20,
+    ) -> None:
+        self.encoding = codecs.lookup(encoding).name if encoding else None
+        self.fallback_encoding = codecs.lookup(fallback_encoding).name
+        self.per_line = per_line
+        self.probe_size = probe_size
+        self.chunk_size = chunk_size
+        self.max_line = max_line
+        self.stats = {"bytes_in": 0, "bytes_out": 0, "fallback_lines": 0, "encoding": self.encoding}
+
+    def detect(self, data: bytes, final: bool) -> str:
+        """对流开头的数据判定编码；data 中不完整的末尾字符不影响 UTF-8 判定。"""
+        for bom, encoding in self.BOMS:
+            if data.startswith(bom):
+                return encoding
         try:
-            ps5_profile = Path.home() / "Documents" / "WindowsPowerShell" / "Microsoft.PowerShell_profile.ps1"
-            ps7_profile = Path.home() / "Documents" / "PowerShell" / "Microsoft.PowerShell_profile.ps1"
-            bashrc_path: Path = self._git_bashrc_path or (Path.home() / ".bashrc")
-            default_lang, default_lc_all, default_cp = self._system_default_locale()
+            codecs.getincrementaldecoder("utf-8")().decode(data, final)
+        except UnicodeDecodeError:
+            ranked = _encoding_classifier().classify(data)
+            if ranked and ranked[0][1] >= self.MIN_CONFIDENCE:
+                return codecs.lookup(ranked[0][0]).name
+            return self.fallback_encoding
+        return "utf-8"
+
+    def _decode_segment(self, data: bytes, final: bool) -> tuple[str, bytes]:
+        """逐行回退：依次尝试 UTF-8 与 ANSI 代码页，返回 (文本, 未完成字符的尾字节)。"""
+        for encoding in ("utf-8", self.fallback_encoding):
+            try:
+                if final:
+                    text, rest = data.decode(encoding), b""
+                else:
+                    decoder = codecs.getincrementaldecoder(encoding)()
+                    text, rest = decoder.decode(data), decoder.getstate()[0]
+            except UnicodeDecodeError:
+                continue
+            if encoding != "utf-8":
+                self.stats["fallback_lines"] += 1
+            return text, rest
+        self.stats["fallback_lines"] += 1
+        return data.decode(self.fallback_encoding, "replace"), b""
 
-            def find_backup(key: str) -> Path | None:
-                candidates = [self._backup_root / f"{key}.orig"]
-                candidates.extend(self._backup_root.glob(f"{key}.orig*"))
-                for c in candidates:
-                    if c.exists():
-                        return c
-                return None
-
-            def restore_one(path: Path, key: str, display: str, allow_delete_if_no_backup: bool = False) -> tuple[str, str]:
-                backup_path = find_backup(key)
-                if not backup_path:
-                    if allow_delete_if_no_backup and path.exists():
+    def _convert_lines(self, data: bytes, flush_partial: bool, final: bool) -> tuple[str, bytes]:
+        """本块的完整行先整体按 UTF-8 解码；出错时出错行之前的部分照常输出，其后逐行回退。
+
+        返回 (文本, 留待下次的残行字节)。
+        """
+        cut = data.rfind(b"\n") + 1
+        parts: list[str] = []
+        with memoryview(data) as view:
+            try:
+                parts.append(str(view[:cut], "utf-8"))
+            except UnicodeDecodeError as exc:
+                start = data.rfind(b"\n", 0, exc.start) + 1
+                parts.append(str(view[:start], "utf-8"))
+                for line in data[start : cut - 1].split(b"\n"):
+                    parts.append(self._decode_segment(line, True)[0])
+                parts.append("")
+        text = parts[0] + "\n".join(parts[1:])
+        rest = data[cut:]
+        if rest and (flush_partial or final or len(rest) >= self.max_line):
+            partial, rest = self._decode_segment(rest, final)
+            text += partial
+        return text, rest
+
+    def run(self, src, dst) -> dict[str, object]:
+        """把 src 的内容转换后写入 dst，直至 EOF；返回统计信息（输入/输出字节数、识别出的编码、回退行数）。"""
+        read = getattr(src, "read1", src.read)
+        pending = b""
+        decoder = codecs.getincrementaldecoder(self.encoding)("replace") if self.encoding and not self.per_line else None
+        detected = bool(self.encoding) or self.per_line
+        while True:
+            chunk = read(self.chunk_size)
+            final = not chunk
+            self.stats["bytes_in"] += len(chunk)
+            data = pending + chunk
+            pending = b""
+            if not detected:
+                # ASCII 内容在候选编码下都相同，判定前即可直接输出
+                if data.isascii() and not final:
+                    self._write(dst, data)
+                    continue
+                if final or len(data) >= self.probe_size or len(chunk) < self.chunk_size:
+                    self.stats["encoding"] = self.detect(data, final)
+                    decoder = codecs.getincrementaldecoder(self.stats["encoding"])("replace")
+                    detected = True
+                else:
+                    pending = data
+                    continue
+            if decoder is not None:
+                text = decoder.decode(data, final)
+            else:
+                text, pending = self._convert_lines(data, len(chunk) < self.chunk_size, final)
+            self._write(dst, text.encode("utf-8"))
+            if final:
+                return self.stats
+
+    def _write(self, dst, data: bytes) -> None:
+        if data:
+            dst.write(data)
+            dst.flush()
+            self.stats["bytes_out"] += len(data)
+
+
+def _run_filter(encoding: str | None, per_line: bool) -> None:
+    """命令行 --filter：stdin → UTF-8 stdout；下游提前关闭管道（如 | head）时安静退出。"""
+    _lang, _lc_all, cp = SetupApp._system_default_locale()
+    try:
+        fallback = codecs.lookup(f"cp{cp}").name
+    except LookupError:
+        fallback = "gbk"
+    transcoder = StreamTranscoder(encoding, fallback_encoding=fallback, per_line=per_line)
+    try:
+        transcoder.run(sys.stdin.buffer, sys.stdout.buffer)
+    except BrokenPipeError:
+        # 避免解释器退出时再次 flush stdout 报错
+        devnull = os.open(os.devnull, os.O_WRONLY)
+        os.dup2(devnull, sys.stdout.fileno())
+    except KeyboardInterrupt:
+        pass
+
+
+@dataclass
+class RenameAction:
+    parent: str
+    old: str
+    new: str
+    depth: int
+    via: str
+    is_dir: bool = False
+
+    @property
+    def source(self) -> str:
+        return os.path.join(self.parent, self.old)
+
+    @property
+    def target(self) -> str:
+        return os.path.join(self.parent, self.new)
+
+
+class FilenameRepairer:
+    """批量修复文件/目录名乱码（GBK 名称被解压工具按 cp437/Latin-1 解读，如“╓╨╬─.txt”）。
+
+    一次 os.scandir 遍历收集全部非 ASCII 名称的候选（纯 ASCII 名称只做一次 isascii 判断），
+    候选打分沿用 MojibakeScorer；同一名称有多个候选时优先采用整棵树中出现最多的编码组合
+    （同一压缩包解出的名称使用同一个错误代码页）。
+    重命名按深度从深到浅执行，目录总是在其子项之后改名，各步使用的父路径在执行时仍然有效。
+    每批重命名执行前先把 {"old", "new"} 追加到备份目录 renames/ 下的日志并落盘（预写日志），
+    --rename-undo 按相反顺序逐条改回；中途中断时日志中未执行的条目在回滚时自动跳过。
+    """
+
+    BATCH = 1000
+    SKIP_DIRS = EncodingScanner.SKIP_DIRS
+
+    def __init__(self, journal_dir: Path | None = None) -> None:
+        self.journal_dir = journal_dir
+
+    def plan(self, roots: Iterable[Path]) -> dict[str, object]:
+        """遍历并返回 {"entries", "actions", "conflicts", "elapsed"}；actions 已按执行顺序（由深到浅）排列。"""
+        started = time.perf_counter()
+        scorer = _mojibake_scorer()
+        found: list[tuple[str, str, int, bool, list[tuple[float, str, str]]]] = []
+        entries = 0
+        # 使用绝对路径：日志中的路径在任何工作目录下回滚都有效
+        stack = [(os.path.abspath(root), 0) for root in roots]
+        while stack:
+            folder, depth = stack.pop()
+            try:
+                with os.scandir(folder) as iterator:
+                    for entry in iterator:
+                        entries += 1
+                        name = entry.name
                         try:
-                            path.unlink()
-                            return "success", f"{display}: 原始为空，已删除当前配置文件"
-                        except Exception as exc:  # noqa: BLE001
-                            return "warning", f"{display}: 尝试删除配置文件失败 {exc}"
-                    return "warning", f"{display}: 未找到原始配置备份，跳过"
-                try:
-                    content = backup_path.read_text(encoding="utf-8", errors="ignore")
-                except Exception as exc:  # noqa: BLE001
-                    return "warning", f"{display}: 读取备份失败 {exc}"
-                if content == "__EMPTY_BACKUP__":
+                            is_dir = entry.is_dir(follow_symlinks=False)
+                        except OSError:
+                            is_dir = False
+                        if is_dir and name not in self.SKIP_DIRS:
+                            stack.append((entry.path, depth + 1))
+                        if name.isascii():
+                            continue
+                        candidates = scorer.name_candidates(name)
+                        if candidates:
+                            found.append((folder, name, depth, is_dir, candidates))
+            except OSError:
+                continue
+        votes = Counter(candidates[0][2] for *_rest, candidates in found)
+        actions: list[RenameAction] = []
+        conflicts: list[tuple[RenameAction, str]] = []
+        claimed: set[str] = set()
+        for folder, name, depth, is_dir, candidates in found:
+            best = min(candidates, key=lambda item: (-votes[item[2]], item[0]))
+            action = RenameAction(folder, name, best[1], depth, best[2], is_dir)
+            key = os.path.normcase(action.target)
+            if key in claimed:
+                conflicts.append((action, "与同目录下另一项的修复结果同名"))
+            elif os.path.lexists(action.target):
+                conflicts.append((action, "目标名称已存在"))
+            else:
+                claimed.add(key)
+                actions.append(action)
+        actions.sort(key=lambda action: -action.depth)
+        return {
+            "entries": entries,
+            "actions": actions,
+            "conflicts": conflicts,
+            "elapsed": time.perf_counter() - started,
+        }
+
+    def apply(self, actions: list[RenameAction]) -> dict[str, object]:
+        """按批执行重命名：每批先写日志并 fsync，再逐条 os.rename。返回 {"journal", "renamed", "errors"}。"""
+        if self.journal_dir is None:
+            raise ValueError("执行重命名需要日志目录")
+        self.journal_dir.mkdir(parents=True, exist_ok=True)
+        journal = self.journal_dir / f"{time.strftime('%Y%m%d-%H%M%S')}-{os.getpid()}.jsonl"
+        renamed = 0
+        errors: list[tuple[RenameAction, str]] = []
+        # 默认 ensure_ascii：POSIX 上的原始字节名称（代理字符）也能原样写入并读回
+        with open(journal, "w", encoding="utf-8") as log:
+            for start in range(0, len(actions), self.BATCH):
+                batch = actions[start : start + self.BATCH]
+                log.write(
+                    "".join(json.dumps({"old": a.source, "new": a.target}) + "\n" for a in batch)
+                )
+                log.flush()
+                os.fsync(log.fileno())
+                for action in batch:
                     try:
-                        if path.exists():
-                            path.unlink()
-                            return "success", f"{display}: 原始为空，已删除当前配置文件"
-                        return "success", f"{display}: 原始为空，无需删除当前配置文件"
-                    except Exception as exc:  # noqa: BLE001
-                        return "warning", f"{display}: 删除文件失败 {exc}"
-                try:
-                    path.parent.mkdir(parents=True, exist_ok=True)
-                    shutil.copy2(backup_path, path)
-                    return "success", f"{display}: 已从原始配置备份恢复"
-                except Exception as exc:  # noqa: BLE001
-                    return "warning", f"{display}: 恢复失败 {exc}"
+                        os.rename(action.source, action.target)
+                        renamed += 1
+                    except OSError as exc:
+                        errors.append((action, str(exc)))
+        return {"journal": journal, "renamed": renamed, "errors": errors}
+
+    def journals(self) -> list[Path]:
+        if self.journal_dir is None or not self.journal_dir.is_dir():
+            return []
+        return sorted(self.journal_dir.glob("*.jsonl"))
 
-            tool_logs: list[tuple[str, str]] = []
+    def undo(self, journal: Path) -> dict[str, object]:
+        """按日志逆序改回；已改回或未执行的条目（新名称不存在、原名称存在）跳过。
 
-            self._progress_start(14)  # 7 个关键动作，前后推进
+        新旧名称都不存在（如路径已移动）或都存在的条目记为错误；有错误时保留日志，可处理后再次回滚，
+        全部成功时日志改名为 *.undone，避免重复回滚。
+        """
+        with open(journal, encoding="utf-8") as log:
+            records = [json.loads(line) for line in log if line.strip()]
+        restored = skipped = 0
+        errors: list[tuple[str, str]] = []
+        for record in reversed(records):
+            old, new = record["old"], record["new"]
+            has_new, has_old = os.path.lexists(new), os.path.lexists(old)
+            if not has_new and has_old:
+                skipped += 1
+                continue
+            if not has_new:
+                errors.append((new, "新旧名称都不存在，无法改回"))
+                continue
+            if has_old:
+                errors.append((new, f"原名称 {old} 已存在"))
+                continue
+            try:
+                os.rename(new, old)
+                restored += 1
+            except OSError as exc:
+                errors.append((new, str(exc)))
+        if not errors:
+            journal.replace(journal.with_suffix(".undone"))
+        return {"restored": restored, "skipped": skipped, "errors": errors}
+
+
+def _print_rename_plan(plan: Mapping[str, object], limit: int = 50) -> None:
+    actions, conflicts = plan["actions"], plan["conflicts"]
+    print(
+        f"遍历 {plan['entries']} 项，耗时 {float(plan['elapsed']):.2f} 秒："
+        f"可修复 {len(actions)} 项，冲突 {len(conflicts)} 项"
+    )
+    for action in actions[:limit]:
+        kind = "目录" if action.is_dir else "文件"
+        print(f"  [{kind}] {action.source}\n      -> {action.new}  ({action.via})")
+    if len(actions) > limit:
+        print(f"  …… 另有 {len(actions) - limit} 项")
+    for action, reason in conflicts[:limit]:
+        print(f"  [WARN] {action.source} -> {action.new}: {reason}，跳过")
+
+
+def _rename_fix(paths: list[str], apply: bool) -> bool:
+    """命令行 --rename-fix：列出（apply 时执行）文件名修复计划；返回是否没有遗留问题。"""
+    repairer = FilenameRepairer(SetupApp._default_config_dir() / "backup" / "renames")
+    plan = repairer.plan([Path(p) for p in paths])
+    _print_rename_plan(plan)
+    if not apply:
+        if plan["actions"]:
+            print("以上为计划，未改动任何文件；加 --rename-apply 执行")
+        return not plan["actions"] and not plan["conflicts"]
+    if not plan["actions"]:
+        return not plan["conflicts"]
+    result = repairer.apply(plan["actions"])
+    print(f"已重命名 {result['renamed']} 项；日志 {result['journal']}，可用 --rename-undo 回滚")
+    for action, error in result["errors"]:
+        print(f"  [ERROR] {action.source}: {error}")
+    return not result["errors"] and not plan["conflicts"]
+
+
+def _rename_undo(journal: str) -> bool:
+    repairer = FilenameRepairer(SetupApp._default_config_dir() / "backup" / "renames")
+    if journal == "latest":
+        journals = repairer.journals()
+        if not journals:
+            print("没有可回滚的重命名日志")
+            return False
+        path = journals[-1]
+    else:
+        path = Path(journal)
+    result = repairer.undo(path)
+    print(f"{path}: 已改回 {result['restored']} 项，跳过 {result['skipped']} 项")
+    for name, error in result["errors"]:
+        print(f"  [ERROR] {name}: {error}")
+    return not result["errors"]
+
+
+@dataclass
+class _ZipEntry:
+    """中央目录中的一项；header 为 46 字节定长部分（可修改），sizes 已按 ZIP64 扩展字段解析。"""
+
+    header: bytearray
+    name: bytes
+    extra: bytes
+    comment: bytes
+    compressed_size: int
+    offset: int
+    new_offset: int = 0
+
+
+class ZipNameRewriter:
+    """把 ZIP 中按本地代码页（GBK/cp936）保存的成员名改写为 UTF-8 并置通用标志位 11，不解压、不重新压缩。
+
+    只解析结构：从文件尾部找到中央目录结束记录（含 ZIP64），逐项读取中央目录；输出时按本地文件头偏移顺序，
+    对每个成员重写本地文件头（新名称、标志位 11），其后的压缩数据、数据描述符与成员间的任何字节原样按区间
+    流式复制（Linux 上为 os.sendfile，其他平台为 1 MB 缓冲），最后写出更新了名称与偏移的中央目录。内存占用与压缩包大小无关（中央目录除外）。
+
+    - 已置标志位 11 或纯 ASCII 的名称不变；
+    - 其余名称按整个压缩包判定：只要有一个不是合法 UTF-8，全部按 source_encoding 转换（短的 GBK 名称常常恰好
+      也是合法 UTF-8，如“图片”= CD BC C6 AC = “ͼƬ”，逐个判断会漏转）；全部是合法 UTF-8 时只补标志位；
+    - 按 source_encoding 无法解码的名称保持原样并计入 failed；
+    - 旧的 Info-ZIP Unicode Path/Comment 扩展字段（0x7075/0x6375）与新名称不再对应，一并去除；
+    - 偏移变化导致超过 4 GB 时自动写入 ZIP64 扩展字段与 ZIP64 结束记录。
+    """
+
+    LOCAL_SIG = b"PK\x03\x04"
+    CENTRAL_SIG = b"PK\x01\x02"
+    EOCD_SIG = b"PK\x05\x06"
+    EOCD64_SIG = b"PK\x06\x06"
+    LOCATOR64_SIG = b"PK\x06\x07"
+    UTF8_FLAG = 1 << 11
+    ZIP64_EXTRA = 0x0001
+    UNICODE_EXTRAS = frozenset({0x7075, 0x6375})
+    COPY_BUFFER = 1 << 20
+
+    def __init__(self, source_encoding: str = "cp936") -> None:
+        self.source_encoding = codecs.lookup(source_encoding).name
+        self._sendfile = sys.platform.startswith("linux") and hasattr(os, "sendfile")
+
+    # ---- 解析 ----
 
-            self._progress_advance(1)
-            if self._ps5_available or self._ps5_exe:
-                tool_logs.append(restore_one(ps5_profile, "ps5", "Windows PowerShell 5.1", True))
-            else:
-                tool_logs.append(("warning", "Windows PowerShell 5.1: 未安装，跳过恢复"))
-            self._progress_advance(1)
+    @staticmethod
+    def _extra_fields(extra: bytes) -> list[tuple[int, bytes]]:
+        fields = []
+        pos = 0
+        while pos + 4 <= len(extra):
+            field_id, length = struct.unpack_from("<HH", extra, pos)
+            fields.append((field_id, extra[pos + 4 : pos + 4 + length]))
+            pos += 4 + length
+        return fields
 
-            self._progress_advance(1)
-            if getattr(self, "_ps7_available", False) and self._ps7_exe:
-                tool_logs.append(restore_one(ps7_profile, "ps7", "PowerShell 7+", True))
-            else:
-                tool_logs.append(("warning", "PowerShell 7+: 未安装，跳过恢复"))
-            self._progress_advance(1)
+    @staticmethod
+    def _join_extra(fields: Iterable[tuple[int, bytes]]) -> bytes:
+        return b"".join(struct.pack("<HH", field_id, len(data)) + data for field_id, data in fields)
+
+    def _read_eocd(self, fh, size: int) -> tuple[int, int, int, bytes]:
+        """返回 (条目数, 中央目录偏移, 中央目录大小, 压缩包注释)。"""
+        tail_size = min(size, 22 + 0xFFFF)
+        fh.seek(size - tail_size)
+        tail = fh.read(tail_size)
+        pos = tail.rfind(self.EOCD_SIG)
+        while pos >= 0 and pos + 22 + struct.unpack_from("<H", tail, pos + 20)[0] > len(tail):
+            pos = tail.rfind(self.EOCD_SIG, 0, pos)
+        if pos < 0:
+            raise ValueError("不是 ZIP 文件（找不到中央目录结束记录）")
+        _sig, _disk, _cd_disk, _disk_count, count, cd_size, cd_offset, comment_len = struct.unpack_from(
+            "<4sHHHHIIH", tail, pos
+        )
+        comment = tail[pos + 22 : pos + 22 + comment_len]
+        locator = pos - 20
+        if locator >= 0 and tail[locator : locator + 4] == self.LOCATOR64_SIG:
+            (eocd64_offset,) = struct.unpack_from("<Q", tail, locator + 8)
+            fh.seek(eocd64_offset)
+            record = fh.read(56)
+            if record[:4] != self.EOCD64_SIG:
+                raise ValueError("ZIP64 中央目录结束记录损坏")
+            count, _total, cd_size, cd_offset = struct.unpack_from("<QQQQ", record, 24)
+        return count, cd_offset, cd_size, comment
+
+    def _read_central(self, fh, count: int, cd_offset: int, cd_size: int) -> list[_ZipEntry]:
+        fh.seek(cd_offset)
+        data = fh.read(cd_size)
+        entries = []
+        pos = 0
+        for _ in range(count):
+            if data[pos : pos + 4] != self.CENTRAL_SIG:
+                raise ValueError(f"中央目录第 {len(entries) + 1} 项损坏")
+            header = bytearray(data[pos : pos + 46])
+            compressed, uncompressed = struct.unpack_from("<II", header, 20)
+            name_len, extra_len, comment_len = struct.unpack_from("<HHH", header, 28)
+            (offset,) = struct.unpack_from("<I", header, 42)
+            name = data[pos + 46 : pos + 46 + name_len]
+            extra = data[pos + 46 + name_len : pos + 46 + name_len + extra_len]
+            comment = data[pos + 46 + name_len + extra_len : pos + 46 + name_len + extra_len + comment_len]
+            pos += 46 + name_len + extra_len + comment_len
+            for field_id, value in self._extra_fields(extra):
+                if field_id != self.ZIP64_EXTRA:
+                    continue
+                # ZIP64 扩展字段只包含定长字段为 0xFFFFFFFF 的那些值，顺序固定
+                values = iter(struct.unpack_from(f"<{len(value) // 8}Q", value))
+                if uncompressed == 0xFFFFFFFF:
+                    next(values, None)
+                if compressed == 0xFFFFFFFF:
+                    compressed = next(values, compressed)
+                if offset == 0xFFFFFFFF:
+                    offset = next(values, offset)
+            entries.append(_ZipEntry(header, name, extra, comment, compressed, offset))
+        return entries
+
+    # ---- 名称 ----
 
-            self._progress_advance(1)
-            tool_logs.append(restore_one(bashrc_path, "git_bash", "Git Bash", True))
-            self._progress_advance(1)
+    @staticmethod
+    def _is_utf8(raw: bytes) -> bool:
+        try:
+            raw.decode("utf-8")
+        except UnicodeDecodeError:
+            return False
+        return True
+
+    def legacy_names(self, entries: Iterable[_ZipEntry]) -> bool:
+        """未置标志位的非 ASCII 名称中是否有不合法的 UTF-8（即压缩包按本地代码页保存名称）。"""
+        return any(
+            not struct.unpack_from("<H", entry.header, 8)[0] & self.UTF8_FLAG
+            and not entry.name.isascii()
+            and not self._is_utf8(entry.name)
+            for entry in entries
+        )
 
-            self._progress_advance(1)
-            self._apply_vscode_settings(apply=False, log=False)
-            vscode_result = getattr(self, "_vscode_restore_result", "")
-            if vscode_result in ("restored", "restored-cleaned"):
-                msg = "Visual Studio Code 已从原始配置备份恢复"
-                if vscode_result == "restored-cleaned":
-                    msg += "（已清理工具块残留）"
-                vscode_log = ("success", msg)
-            elif vscode_result == "cleaned-no-backup":
-                vscode_log = ("warning", "Visual Studio Code 未找到原始备份，已清理当前配置中的工具块残留")
-            elif vscode_result == "no-backup":
-                vscode_log = ("warning", "Visual Studio Code 未找到原始备份，未改动当前配置文件")
+    def convert_name(self, raw: bytes, flags: int, legacy: bool = True) -> tuple[bytes, str]:
+        """返回 (新名称字节, 状态)；状态为 kept（无需改动）、flagged（已是 UTF-8，只补标志位）、converted、failed。"""
+        if flags & self.UTF8_FLAG or raw.isascii():
+            return raw, "kept"
+        if not legacy and self._is_utf8(raw):
+            return raw, "flagged"
+        try:
+            return raw.decode(self.source_encoding).encode("utf-8"), "converted"
+        except UnicodeDecodeError:
+            return raw, "failed"
+
+    def _convert_comment(self, raw: bytes, legacy: bool) -> bytes:
+        """成员注释与名称共用标志位 11，随名称一起转为 UTF-8；无法解码的字节写为 U+FFFD。"""
+        if raw.isascii() or not legacy and self._is_utf8(raw):
+            return raw
+        return raw.decode(self.source_encoding, "replace").encode("utf-8")
+
+    def _strip_unicode_extras(self, extra: bytes) -> bytes:
+        fields = self._extra_fields(extra)
+        if not any(field_id in self.UNICODE_EXTRAS for field_id, _ in fields):
+            return extra
+        return self._join_extra((f, d) for f, d in fields if f not in self.UNICODE_EXTRAS)
+
+    def _set_central_offset(self, entry: _ZipEntry) -> None:
+        """写入新的本地文件头偏移；需要时把偏移放进 ZIP64 扩展字段。"""
+        compressed, uncompressed = struct.unpack_from("<II", entry.header, 20)
+        (old_offset,) = struct.unpack_from("<I", entry.header, 42)
+        if entry.new_offset < 0xFFFFFFFF and old_offset != 0xFFFFFFFF:
+            struct.pack_into("<I", entry.header, 42, entry.new_offset)
+            return
+        fields = self._extra_fields(entry.extra)
+        zip64 = next((value for field_id, value in fields if field_id == self.ZIP64_EXTRA), b"")
+        values = list(struct.unpack_from(f"<{len(zip64) // 8}Q", zip64))
+        index = (uncompressed == 0xFFFFFFFF) + (compressed == 0xFFFFFFFF)
+        if old_offset == 0xFFFFFFFF and index < len(values):
+            values[index] = entry.new_offset
+        else:
+            values.insert(index, entry.new_offset)
+        zip64 = struct.pack(f"<{len(values)}Q", *values)
+        others = [(f, d) for f, d in fields if f != self.ZIP64_EXTRA]
+        entry.extra = self._join_extra([(self.ZIP64_EXTRA, zip64), *others])
+        struct.pack_into("<I", entry.header, 42, 0xFFFFFFFF)
+        # 解压所需版本至少为 4.5（ZIP64）
+        (needed,) = struct.unpack_from("<H", entry.header, 6)
+        struct.pack_into("<H", entry.header, 6, max(needed, 45))
+
+    # ---- 输出 ----
+
+    def _copy_range(self, src, dst, start: int, length: int, buffer: memoryview) -> None:
+        """复制 src 的 [start, start + length)。Linux 上用 os.sendfile 在内核内复制，其他平台经 1 MB 缓冲区。"""
+        if length > 0 and self._sendfile:
+            dst.flush()
+            copied = 0
+            try:
+                while copied < length:
+                    count = os.sendfile(dst.fileno(), src.fileno(), start + copied, length - copied)
+                    if not count:
+                        raise ValueError(f"偏移 {start} 处的数据不完整")
+                    copied += count
+            except OSError:
+                # 文件系统不支持时退回缓冲复制（只在第一次调用时可能发生）
+                if copied:
+                    raise
+                self._sendfile = False
             else:
-                vscode_log = ("warning", "Visual Studio Code: 未安装，跳过恢复") if not getattr(self, "_vscode_available", False) else ("info", "Visual Studio Code: 已检测到，可手动检查 settings.json")
-            tool_logs.append(vscode_log)
-            self._progress_advance(1)
+                dst.seek(0, os.SEEK_END)
+                return
+        src.seek(start)
+        while length > 0:
+            count = src.readinto(buffer[: min(length, len(buffer))])
+            if not count:
+                raise ValueError(f"偏移 {start} 处的数据不完整")
+            dst.write(buffer[:count])
+            length -= count
+
+    def rewrite(self, source: Path, output: Path) -> dict[str, object]:
+        """把 source 改写到 output；返回各状态的条目数与耗时。output 写入失败时不会留下半成品。"""
+        started = time.perf_counter()
+        stats = {"entries": 0, "kept": 0, "flagged": 0, "converted": 0, "failed": 0, "failed_names": []}
+        tmp = output.with_name(f".{output.name}.{os.getpid()}.tmp")
+        buffer = memoryview(bytearray(self.COPY_BUFFER))
+        try:
+            with open(source, "rb") as src, open(tmp, "wb") as dst:
+                size = os.fstat(src.fileno()).st_size
+                count, cd_offset, cd_size, comment = self._read_eocd(src, size)
+                entries = self._read_central(src, count, cd_offset, cd_size)
+                stats["entries"] = len(entries)
+                legacy = self.legacy_names(entries)
+                ordered = sorted(entries, key=lambda entry: entry.offset)
+                # 第一个本地文件头之前的内容（自解压程序等）原样保留
+                self._copy_range(src, dst, 0, ordered[0].offset if ordered else cd_offset, buffer)
+                for index, entry in enumerate(ordered):
+                    src.seek(entry.offset)
+                    local = bytearray(src.read(30))
+                    if local[:4] != self.LOCAL_SIG:
+                        raise ValueError(f"偏移 {entry.offset} 处的本地文件头损坏")
+                    (flags,) = struct.unpack_from("<H", entry.header, 8)
+                    name, status = self.convert_name(entry.name, flags, legacy)
+                    stats[status] += 1
+                    if status == "failed" and len(stats["failed_names"]) < 50:
+                        stats["failed_names"].append(entry.name.decode(self.source_encoding, "replace"))
+                    name_len, extra_len = struct.unpack_from("<HH", local, 26)
+                    local_name = src.read(name_len)
+                    local_extra = src.read(extra_len)
+                    if status in ("flagged", "converted"):
+                        entry.name = name
+                        entry.comment = self._convert_comment(entry.comment, legacy)
+                        entry.extra = self._strip_unicode_extras(entry.extra)
+                        struct.pack_into("<H", entry.header, 8, flags | self.UTF8_FLAG)
+                        (local_flags,) = struct.unpack_from("<H", local, 6)
+                        struct.pack_into("<H", local, 6, local_flags | self.UTF8_FLAG)
+                        local_name = name
+                        local_extra = self._strip_unicode_extras(local_extra)
+                    struct.pack_into("<HH", local, 26, len(local_name), len(local_extra))
+                    entry.new_offset = dst.tell()
+                    dst.write(local)
+                    dst.write(local_name)
+                    dst.write(local_extra)
+                    # 压缩数据、数据描述符以及到下一个成员之前的全部字节原样复制
+                    data_start = entry.offset + 30 + name_len + extra_len
+                    data_end = ordered[index + 1].offset if index + 1 < len(ordered) else cd_offset
+                    if data_end - data_start < entry.compressed_size:
+                        raise ValueError(f"偏移 {entry.offset} 处的成员数据与下一个成员重叠")
+                    self._copy_range(src, dst, data_start, data_end - data_start, buffer)
+                new_cd_offset = dst.tell()
+                for entry in entries:
+                    self._set_central_offset(entry)
+                    struct.pack_into("<HHH", entry.header, 28, len(entry.name), len(entry.extra), len(entry.comment))
+                    dst.write(entry.header)
+                    dst.write(entry.name)
+                    dst.write(entry.extra)
+                    dst.write(entry.comment)
+                self._write_end(dst, len(entries), new_cd_offset, dst.tell() - new_cd_offset, comment)
+            shutil.copymode(source, tmp)
+            os.replace(tmp, output)
+            tmp = None
+        finally:
+            buffer.release()
+            if tmp is not None:
+                tmp.unlink(missing_ok=True)
+        stats["size"] = size
+        stats["elapsed"] = time.perf_counter() - started
+        return stats
+
+    def _write_end(self, dst, count: int, cd_offset: int, cd_size: int, comment: bytes) -> None:
+        if count >= 0xFFFF or cd_offset >= 0xFFFFFFFF or cd_size >= 0xFFFFFFFF:
+            eocd64_offset = dst.tell()
+            dst.write(struct.pack("<4sQHHIIQQQQ", self.EOCD64_SIG, 44, 45, 45, 0, 0, count, count, cd_size, cd_offset))
+            dst.write(struct.pack("<4sIQI", self.LOCATOR64_SIG, 0, eocd64_offset, 1))
+            count16, size32, offset32 = min(count, 0xFFFF), min(cd_size, 0xFFFFFFFF), min(cd_offset, 0xFFFFFFFF)
+        else:
+            count16, size32, offset32 = count, cd_size, cd_offset
+        dst.write(struct.pack("<4sHHHHIIH", self.EOCD_SIG, 0, 0, count16, count16, size32, offset32, len(comment)))
+        dst.write(comment)
 
-            self._progress_advance(1)
-            console_logs = self._update_console_codepage(apply_utf8=False, emit_log=False, fallback_cp=default_cp)
-            self._progress_advance(1)
 
-            self._progress_advance(1)
-            self._cleanup_backups()
-            self._progress_advance(1)
+def _reencode_zips(paths: list[str], encoding: str, output: str | None) -> bool:
+    """命令行 --zip-utf8：逐个改写压缩包成员名；默认输出到同目录的 <名称>.utf8.zip。返回是否全部成功。"""
+    rewriter = ZipNameRewriter(encoding)
+    if output and len(paths) > 1:
+        print("[ERROR] --zip-output 只能与单个压缩包一起使用")
+        return False
+    ok = True
+    for raw_path in paths:
+        source = Path(raw_path)
+        target = Path(output) if output else source.with_name(f"{source.stem}.utf8{source.suffix or '.zip'}")
+        try:
+            stats = rewriter.rewrite(source, target)
+        except (OSError, ValueError, struct.error) as exc:
+            print(f"[ERROR] {source}: {exc}")
+            ok = False
+            continue
+        elapsed = float(stats["elapsed"])
+        rate = stats["size"] / elapsed / (1 << 20) if elapsed > 0 else 0.0
+        print(
+            f"{source} -> {target}: {stats['entries']} 项，转换 {stats['converted']}，补标志 {stats['flagged']}，"
+            f"无需改动 {stats['kept']}，无法按 {rewriter.source_encoding} 解码 {stats['failed']}；"
+            f"耗时 {elapsed:.2f} 秒（{rate:.0f} MB/s）"
+        )
+        for name in stats["failed_names"]:
+            print(f"  [WARN] 保持原样: {name}")
+        ok = ok and not stats["failed"]
+    return ok
 
-            self._progress_advance(1)
-            self._ui_call(self._detect_all_paths, False)
-            self._ui_call(self._refresh_config_status_label)
-            self._ui_call(self._refresh_env_tool_labels)
-            self._progress_advance(1)
 
-            if not getattr(self, "_restore_start_logged", False):
-                self._log_separator("恢复开始")
-            self._restore_start_logged = False
+def _utf8_passthrough_error(exc: UnicodeError) -> tuple[bytes, int]:
+    """编码错误处理：无法按单字节编码的字符原样写为其 UTF-8 字节。"""
+    if not isinstance(exc, UnicodeEncodeError):
+        raise exc
+    return exc.object[exc.start : exc.end].encode("utf-8", "surrogatepass"), exc.end
 
-            self._log("工具配置：", "info")
-            for level, msg in tool_logs:
-                self._log(msg, level)
 
-            self._log("控制台编码：", "info")
-            if self._ps5_available and self._ps5_exe:
-                self._log(f"Windows PowerShell 5.1 已恢复原始值 CodePage {default_cp}", "success")
-            else:
-                self._log("Windows PowerShell 5.1: 未安装，跳过恢复", "warning")
-            if not (self._ps7_available and self._ps7_exe):
-                self._log("PowerShell 7+: 未安装，跳过恢复", "warning")
-            else:
-                self._log(f"PowerShell 7+ 已恢复原始值 CodePage {default_cp}", "success")
-            if self._find_windows_terminal():
-                self._log(f"Windows Terminal 已恢复原始值 CodePage {default_cp}", "success")
-            else:
-                self._log("Windows Terminal: 未检测到，跳过恢复", "warning")
-            self._log(f"CMD 已恢复原始值 CodePage {default_cp}", "success")
-            for level, message in console_logs:
-                if "error" in level:
-                    self._log(message, level)
+_UTF8_PASSTHROUGH_ERRORS = "code-encoding-fix.utf8-passthrough"
+codecs.register_error(_UTF8_PASSTHROUGH_ERRORS, _utf8_passthrough_error)
 
-            self._log_separator("执行结束")
 
-            # 组装完成摘要
-            header = "恢复完成，请重新检测或重新执行配置以生效。"
-            tool_lines: list[str] = []
-            tool_lines.append("• Windows PowerShell 5.1: 已从原始配置备份恢复" if self._ps5_available else "• Windows PowerShell 5.1: 未安装，跳过恢复")
-            tool_lines.append("• PowerShell 7+: 已从原始配置备份恢复" if getattr(self, "_ps7_available", False) else "• PowerShell 7+: 未安装，跳过恢复")
-            tool_lines.append("• Git Bash: 已从原始配置备份恢复" if self._git_exe else "• Git Bash: 未安装，跳过恢复")
-            if getattr(self, "_vscode_available", False):
-                vr = getattr(self, "_vscode_restore_result", "")
-                if vr in ("restored", "restored-cleaned"):
-                    suffix = "，已清理工具块残留" if vr == "restored-cleaned" else ""
-                    tool_lines.append(f"• Visual Studio Code: 已从原始配置备份恢复{suffix}")
-                elif vr == "cleaned-no-backup":
-                    tool_lines.append("• Visual Studio Code: 未找到原始配置备份，已清理当前配置中的工具块残留")
-                elif vr == "no-backup":
-                    tool_lines.append("• Visual Studio Code: 未找到原始配置备份，未改动当前配置文件")
-                else:
-                    tool_lines.append("• Visual Studio Code: 已检测到，可手动检查 settings.json")
-            else:
-                tool_lines.append("• Visual Studio Code: 未安装，跳过恢复")
+@functools.lru_cache(maxsize=1 << 16)
+def _dbcs_pair_cost(lead: int, trail: int, encoding: str) -> float | None:
+    """双字节 (lead, trail) 按 encoding 解码后的乱码代价（MojibakeScorer 分类：ODD 1、RARE 0.5）；无法解码时为 None。"""
+    try:
+        char = bytes((lead, trail)).decode(encoding)
+    except UnicodeDecodeError:
+        return None
+    cls = _mojibake_scorer().table[ord(char)] if len(char) == 1 and ord(char) <= 0xFFFF else MojibakeScorer.ODD
+    return (0.0, 0.0, 0.5, 1.0)[cls]
 
-            status_summary = self._console_status_summary()
-            status_lines = [f"• {part.strip()}" for part in status_summary.split("；") if part.strip()]
-            if not status_lines:
-                status_lines = ["• 未检测到控制台状态"]
 
-            summary_parts = [
-                header,
-                "",
-                "当前工具配置：",
-                *tool_lines,
-                "",
-                "当前控制台编码：",
-                *status_lines,
-            ]
-            summary = "\n".join(summary_parts)
+def _git_converted_tail(tail: bytes, byte: int) -> bytes | None:
+    """跟踪被 git 按 Latin-1 转换的单字节：tail 为最近一个被转换的 UTF-8 前导字节及其后被转换的延续字节。
 
-            self._ui_call(self._on_restore_finished, summary)
-        except Exception as exc:  # noqa: BLE001
-            self._log(f"恢复失败: {exc}", "error")
-            self._ui_call(self._on_restore_failed, str(exc))
+    若加上 byte 后构成合法 UTF-8 序列，git 当初就不会转换它们，返回 None（该解释不成立）；否则返回新的 tail。
+    """
+    candidate = tail + bytes((byte,))
+    try:
+        _text, consumed = codecs.utf_8_decode(candidate, "strict", False)
+    except UnicodeDecodeError:
+        return bytes((byte,)) if 0xC2 <= byte <= 0xF4 else b""
+    return None if consumed else candidate
 
-    def _on_restore_finished(self, summary: str) -> None:
-        self.is_running = False
-        self._progress_finish()
-        self._set_buttons_state(True)
-        self._update_restore_button_state()
-        # 恢复后重新检测路径与状态，刷新界面显示（检测分隔线在 _detect_all_paths 内部）
-        self._detect_all_paths()
-        self._show_modal("完成", summary, kind="info")
 
-    def _on_restore_failed(self, message: str) -> None:
-        self.is_running = False
-        self._set_buttons_state(True)
-        self._update_restore_button_state()
-        self._show_modal("错误", f"恢复失败：{message}", kind="error")
+def _undo_git_latin1(text: str, encoding: str) -> str:
+    """逆转 git 对不合法 UTF-8 的 Latin-1 转换，按 encoding 解码；无法还原时返回空串。
+
+    U+0080~U+00FF 既可能来自被转换的单个字节，也可能来自原本恰好合法、保持原样的 C2/C3 xx 两字节
+    （“录”= C2 BC 被保留为“¼”）。对双字节编码做动态规划，状态为（待配对的前导字节，被转换字节的 UTF-8 前缀）：
+    前者保证结果能完整解码，后者排除 git 不会产生的解释；仍有多种解释时取乱码代价最小的一个。
+    """
+    if _CHUNK_BOUNDARIES.get(encoding) is not _dbcs_boundary:
+        raw = text.encode("latin-1", _UTF8_PASSTHROUGH_ERRORS)
+        try:
+            return raw.decode(encoding) if raw != text.encode("utf-8") else ""
+        except UnicodeDecodeError:
+            return ""
+    # 状态 → (代价, 到此为止的字节序列)；序列以链表保存，避免反复拼接
+    paths: dict[tuple[int | None, bytes], tuple[float, tuple]] = {(None, b""): (0.0, ())}
+    for char in text:
+        code = ord(char)
+        if code < 0x80:
+            options: tuple[bytes, ...] = (bytes((code,)),)
+        elif code < 0x100:
+            options = (bytes((code,)), char.encode("utf-8"))
+        else:
+            options = (char.encode("utf-8", "surrogatepass"),)
+        following: dict[tuple[int | None, bytes], tuple[float, tuple]] = {}
+        for (pending, tail), (cost, chain_) in paths.items():
+            for option in options:
+                if len(option) == 1 and code >= 0x80:
+                    new_tail = _git_converted_tail(tail, code)
+                    if new_tail is None:
+                        continue
+                else:
+                    new_tail = b""
+                state, added = pending, 0.0
+                for byte in option:
+                    if state is not None:
+                        pair = _dbcs_pair_cost(state, byte, encoding)
+                        if pair is None:
+                            break
+                        state, added = None, added + pair
+                    elif byte >= 0x81:
+                        state = byte
+                    elif byte >= 0x80:
+                        break
+                else:
+                    key = (state, new_tail)
+                    if key not in following or cost + added < following[key][0]:
+                        following[key] = (cost + added, (chain_, option))
+        if not following:
+            return ""
+        paths = following
+    ends = [value for (pending, _tail), value in paths.items() if pending is None]
+    if not ends:
+        return ""
+    parts: list[bytes] = []
+    node = min(ends, key=lambda value: value[0])[1]
+    while node:
+        node, part = node
+        parts.append(part)
+    raw = b"".join(reversed(parts))
+    return "" if raw == text.encode("utf-8") else raw.decode(encoding, "replace")
+
+
+@dataclass
+class CommitFinding:
+    sha: str
+    field: str
+    kind: str
+    encoding: str
+    text: str
+    raw: bytes = b""
+    email: str = ""
+    suggestion: str = ""
+
+
+COMMIT_FINDING_LABELS = MappingProxyType(
+    {
+        "legacy": "非 UTF-8 且未声明 encoding",
+        "mojibake": "UTF-8 乱码（按错误编码解码后保存）",
+        "bad-declared": "声明的 encoding 无法解码",
+    }
+)
+
+
+def _classify_commits(task: tuple[list[tuple[str, bytes]], str]) -> list[CommitFinding]:
+    """工作进程：解析一批提交对象，检查作者/提交者姓名与提交说明的编码。"""
+    commits, fallback = task
+    scorer = _mojibake_scorer()
+    findings: list[CommitFinding] = []
+    for sha, body in commits:
+        head, _sep, message = body.partition(b"\n\n")
+        declared = ""
+        fields: list[tuple[str, bytes, str]] = []
+        for line in head.split(b"\n"):
+            key, _sep, value = line.partition(b" ")
+            if key in (b"author", b"committer"):
+                name, _sep, rest = value.partition(b" <")
+                fields.append((key.decode(), name, rest.partition(b">")[0].decode("utf-8", "replace")))
+            elif key == b"encoding":
+                declared = value.decode("ascii", "replace").strip()
+        fields.append(("message", message, ""))
+        try:
+            declared_codec = codecs.lookup(declared).name if declared else ""
+        except LookupError:
+            declared_codec = "unknown"
+        for field_name, raw, email in fields:
+            if raw.isascii():
+                continue
+            if declared_codec and declared_codec != "utf-8":
+                try:
+                    raw.decode(declared)
+                except (UnicodeDecodeError, LookupError):
+                    text = raw.decode("utf-8", "replace")
+                    findings.append(CommitFinding(sha, field_name, "bad-declared", declared, text, raw, email))
+                continue
+            try:
+                text = raw.decode("utf-8")
+            except UnicodeDecodeError:
+                try:
+                    text, encoding = raw.decode(fallback), fallback
+                except UnicodeDecodeError:
+                    text, encoding = raw.decode("utf-8", "replace"), ""
+                findings.append(CommitFinding(sha, field_name, "legacy", encoding, text, raw, email))
+                continue
+            # 误转时丢失过字节的片段同样是乱码，一并报告（建议文本中丢失处为 U+FFFD）
+            repaired, fixed, _lossy = scorer.repair_text(text, allow_lossy=True)
+            if not fixed:
+                # git commit 把其中不合法的 UTF-8 字节按 Latin-1 转成 UTF-8 再保存，恰好合法的部分保持原样
+                # （GBK“张伟”= D5 C5 CE B0 变成“ÕÅΰ”）；逆转后按 fallback 解码，得分更好才采用
+                candidate = _undo_git_latin1(text, fallback)
+                counts = scorer.counts_text(candidate)
+                if candidate and not counts[scorer.ODD] and scorer.score(counts) < scorer.score(scorer.counts_text(text)):
+                    repaired, fixed = candidate, 1
+            if fixed:
+                findings.append(CommitFinding(sha, field_name, "mojibake", "utf-8", text, raw, email, repaired))
+    return findings
+
+
+class HistoryAuditor:
+    """审计 Git 历史中提交说明与作者信息的编码。
+
+    只启动一个 git cat-file --batch-all-objects --batch 进程顺序读取全部对象（Git 2.44 起用
+    --filter=object:type=commit 只输出提交；更早的版本逐个跳过其他对象的内容）。
+    父进程只做 isascii() 筛选，纯 ASCII 的提交（通常是绝大多数）不再处理；其余提交按批交给进程池解析与分类，
+    在途批数有界，内存占用与仓库大小无关。
+    """
+
+    BATCH = 2048
+    SKIP_BUFFER = 1 << 20
+
+    def __init__(self, repo: Path, *, fallback_encoding: str = "gbk", workers: int | None = None) -> None:
+        self.repo = repo
+        self.fallback_encoding = codecs.lookup(fallback_encoding).name
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.git = shutil.which("git") or "git"
+
+    def _command(self) -> list[str]:
+        command = [self.git, "-C", str(self.repo), "cat-file", "--batch-all-objects", "--batch", "--unordered"]
+        version = subprocess.run(
+            [self.git, "version"],
+            capture_output=True,
+            text=True,
+            check=False,
+            creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, "CREATE_NO_WINDOW") else 0,
+        ).stdout
+        match = re.search(r"(\d+)\.(\d+)", version)
+        if match and (int(match.group(1)), int(match.group(2))) >= (2, 44):
+            command.append("--filter=object:type=commit")
+        return command
+
+    def iter_commits(self, stats: dict[str, int]) -> Iterable[tuple[str, bytes]]:
+        """产出含非 ASCII 字节的提交 (sha, 原始对象内容)；stats 中累计对象数与提交数。"""
+        proc = subprocess.Popen(
+            self._command(),
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            bufsize=1 << 20,
+            creationflags=subprocess.CREATE_NO_WINDOW if hasattr(subprocess, "CREATE_NO_WINDOW") else 0,
+        )
+        out = proc.stdout
+        try:
+            while True:
+                header = out.readline()
+                if not header:
+                    stderr = proc.stderr.read().decode("utf-8", "replace").strip()
+                    returncode = proc.wait()
+                    break
+                sha, kind, size = header.split()
+                size = int(size)
+                stats["objects"] += 1
+                if kind != b"commit":
+                    while size > 0:
+                        size -= len(out.read(min(size, self.SKIP_BUFFER)))
+                    out.read(1)
+                    continue
+                stats["commits"] += 1
+                body = out.read(size + 1)[:-1]
+                if not body.isascii():
+                    yield sha.decode("ascii"), body
+        finally:
+            # 调用方提前结束迭代时终止 git
+            if proc.poll() is None:
+                proc.kill()
+                proc.wait()
+            out.close()
+            proc.stderr.close()
+        if returncode:
+            raise RuntimeError(stderr or f"git cat-file 返回码 {returncode}")
+
+    def _batches(self, stats: dict[str, int]) -> Iterable[tuple[list[tuple[str, bytes]], str]]:
+        batch: list[tuple[str, bytes]] = []
+        for commit in self.iter_commits(stats):
+            batch.append(commit)
+            if len(batch) >= self.BATCH:
+                stats["non_ascii"] += len(batch)
+                yield batch, self.fallback_encoding
+                batch = []
+        if batch:
+            stats["non_ascii"] += len(batch)
+            yield batch, self.fallback_encoding
+
+    def run(self) -> dict[str, object]:
+        """返回 {"objects", "commits", "non_ascii", "findings", "elapsed"}；findings 按提交与字段排序。"""
+        started = time.perf_counter()
+        stats = {"objects": 0, "commits": 0, "non_ascii": 0}
+        findings: list[CommitFinding] = []
+        batches = self._batches(stats)
+        if self.workers <= 1:
+            for task in batches:
+                findings.extend(_classify_commits(task))
+        else:
+            from concurrent.futures import ProcessPoolExecutor
+
+            pending: deque = deque()
+            with ProcessPoolExecutor(max_workers=self.workers) as pool:
+                for task in batches:
+                    pending.append(pool.submit(_classify_commits, task))
+                    if len(pending) >= self.workers * 2:
+                        findings.extend(pending.popleft().result())
+                while pending:
+                    findings.extend(pending.popleft().result())
+        findings.sort(key=lambda finding: (finding.sha, finding.field))
+        return {**stats, "findings": findings, "elapsed": time.perf_counter() - started}
 
+    @staticmethod
+    def write_fixups(findings: Iterable[CommitFinding], folder: Path) -> list[Path]:
+        """写出修正清单：
 
-def main() -> None:
-    if sys.platform.startswith("win"):
+        mailmap             作者/提交者姓名的映射（二进制写出：右侧为提交中的原始字节，Git 按字节匹配）
+        replace-commits.sh  为未声明编码的提交补上 encoding 头并用 git replace 替换（不改动提交说明字节）
+        """
+        folder.mkdir(parents=True, exist_ok=True)
+        idents: dict[tuple[bytes, str], str] = {}
+        replacements: dict[str, str] = {}
+        notes: list[str] = []
+        for finding in findings:
+            if finding.field in ("author", "committer"):
+                proper = finding.suggestion if finding.kind == "mojibake" else finding.text
+                if finding.kind != "bad-declared" and finding.encoding:
+                    idents.setdefault((finding.raw, finding.email), proper)
+            elif finding.kind == "legacy" and finding.encoding:
+                replacements[finding.sha] = finding.encoding
+            else:
+                notes.append(f"# {finding.sha}: {COMMIT_FINDING_LABELS[finding.kind]}，需手动改写提交说明")
+        mailmap = folder / "mailmap"
+        with open(mailmap, "wb") as fh:
+            for (raw, email), proper in sorted(idents.items()):
+                fh.write(f"{proper} <{email}> ".encode("utf-8") + raw + f" <{email}>\n".encode("utf-8"))
+        script = folder / "replace-commits.sh"
+        lines = [
+            "#!/bin/sh",
+            "# 在仓库目录中运行：为下列提交补上 encoding 头后用 git replace 替换，git log 即可正确转码显示。",
+            "# 替换对象只存在于本地 refs/replace/，需要时用 git push origin 'refs/replace/*' 共享。",
+            "fix() {",
+            "    new=$(git cat-file commit \"$1\" | LC_ALL=C awk -v enc=\"$2\" "
+            "'!done && /^committer /{print; print \"encoding \" enc; done=1; next} {print}' "
+            "| git hash-object -t commit -w --stdin) && git replace -f \"$1\" \"$new\"",
+            "}",
+            *notes,
+            *(f"fix {sha} {encoding.upper()}" for sha, encoding in sorted(replacements.items())),
+        ]
+        script.write_text("\n".join(lines) + "\n", encoding="utf-8", newline="\n")
+        return [mailmap, script]
+
+
+def _print_history_report(summary: Mapping[str, object], limit: int = 50) -> None:
+    elapsed = float(summary["elapsed"])
+    rate = summary["commits"] / elapsed if elapsed > 0 else 0.0
+    findings = summary["findings"]
+    commits = {finding.sha for finding in findings}
+    print(
+        f"读取对象 {summary['objects']} 个，提交 {summary['commits']} 个（含非 ASCII {summary['non_ascii']} 个），"
+        f"耗时 {elapsed:.2f} 秒（{rate:.0f} 提交/秒）；有问题的提交 {len(commits)} 个"
+    )
+    for kind, label in COMMIT_FINDING_LABELS.items():
+        count = sum(1 for finding in findings if finding.kind == kind)
+        if count:
+            print(f"  {count:>8} 处  {label}")
+    for finding in findings[:limit]:
+        first_line = finding.text.strip().splitlines()[0][:60] if finding.text.strip() else ""
+        guess = f"（按 {finding.encoding}）" if finding.encoding and finding.kind == "legacy" else ""
+        print(f"  {finding.sha[:12]} {finding.field:<9} {COMMIT_FINDING_LABELS[finding.kind]}{guess}: {first_line!r}")
+        if finding.suggestion:
+            print(f"      -> {finding.suggestion.strip().splitlines()[0][:60]!r}")
+    if len(findings) > limit:
+        print(f"  …… 另有 {len(findings) - limit} 处")
+
+
+def _audit_history(repo: str, fixups: str | None, workers: int | None) -> bool:
+    """命令行 --audit-history：返回是否没有发现问题。"""
+    _lang, _lc_all, cp = SetupApp._system_default_locale()
+    try:
+        fallback = codecs.lookup(f"cp{cp}").name
+    except LookupError:
+        fallback = "gbk"
+    auditor = HistoryAuditor(Path(repo), fallback_encoding=fallback, workers=workers)
+    summary = auditor.run()
+    _print_history_report(summary)
+    if fixups and summary["findings"]:
+        for path in HistoryAuditor.write_fixups(summary["findings"], Path(fixups)):
+            print(f"已写出 {path}")
+    return not summary["findings"]
+
+
+def _parse_args(argv: list[str] | None = None):
+    import argparse
+
+    parser = argparse.ArgumentParser(prog="Code-encoding-fix", description="Windows UTF-8 与 Git Bash 编码配置助手")
+    parser.add_argument("--startup-trace", action="store_true", help="输出首帧绘制与首次检测完成的耗时")
+    parser.add_argument(
+        "--trace",
+        metavar="FILE",
+        default=os.environ.get("CODE_ENCODING_FIX_TRACE") or None,
+        help="记录各检测/配置/恢复步骤耗时，退出时写出 Chrome trace-event JSON（也可用环境变量 CODE_ENCODING_FIX_TRACE）",
+    )
+    parser.add_argument(
+        "--profile",
+        action="store_true",
+        default=os.environ.get("CODE_ENCODING_FIX_PROFILE", "") not in ("", "0"),
+        help="对检测/配置/恢复流程采样 cProfile 与 tracemalloc，报告写入备份目录 profiles（也可用环境变量 CODE_ENCODING_FIX_PROFILE=1）",
+    )
+    parser.add_argument(
+        "--debug",
+        action="store_true",
+        default=os.environ.get("CODE_ENCODING_FIX_DEBUG", "") not in ("", "0"),
+        help="在检测日志中输出缓存统计等调试信息（也可用环境变量 CODE_ENCODING_FIX_DEBUG=1）",
+    )
+    parser.add_argument("--status-json", action="store_true", help="不启动界面，执行一次检测并以 JSON 输出当前状态")
+    parser.add_argument("--list-backups", action="store_true", help="列出备份库中的历史代次与原始配置条目")
+    parser.add_argument(
+        "--verify-backups",
+        action="store_true",
+        help="不启动界面，校验备份库中全部对象的大小与哈希（上次已校验且未变化的对象跳过），发现问题时返回码为 1",
+    )
+    parser.add_argument("--verify-full", action="store_true", help="与 --verify-backups 一起使用：忽略校验记录，重新校验全部对象")
+    parser.add_argument(
+        "--watch",
+        action="store_true",
+        help="不启动界面，常驻监听各配置文件与控制台注册表，配置被改动时输出漂移提示（Ctrl+C 结束）",
+    )
+    parser.add_argument("--auto-heal", action="store_true", help="与 --watch 一起使用：启动时已配置正确的目标被改动后自动重新写入")
+    parser.add_argument("--watch-debounce", type=float, default=0.5, metavar="SEC", help="文件事件去抖时间（默认 0.5 秒）")
+    parser.add_argument(
+        "--watch-console-interval", type=float, default=30.0, metavar="SEC", help="控制台注册表检查间隔（默认 30 秒）"
+    )
+    parser.add_argument(
+        "--watch-polling",
+        action="store_true",
+        help="不使用系统文件变更通知，改为每 2 秒轮询（网络盘等不支持通知的位置）",
+    )
+    parser.add_argument(
+        "--restore-generation",
+        type=int,
+        metavar="N",
+        help="不启动界面，把各配置恢复为第 N 代快照的内容（恢复前当前状态另存为新的一代）",
+    )
+    parser.add_argument(
+        "--scan",
+        nargs="+",
+        metavar="PATH",
+        help="不启动界面，扫描目录/文件的文本编码并输出报告（识别 UTF-8 被按 GBK 解码后又保存的乱码），发现问题时返回码为 1",
+    )
+    parser.add_argument(
+        "--repair-mojibake",
+        action="store_true",
+        help="与 --scan 一起使用：就地修复可还原的乱码，原文先保存为备份库中的一代（可用 --restore-generation 回滚）",
+    )
+    parser.add_argument(
+        "--repair-lossy",
+        action="store_true",
+        help="与 --repair-mojibake 一起使用：部分字节已丢失的乱码片段也修复，丢失处写为 U+FFFD",
+    )
+    parser.add_argument("--scan-workers", type=int, metavar="N", help="并行处理的文件数（默认 min(8, CPU 数)）")
+    parser.add_argument(
+        "--decode-file",
+        metavar="FILE",
+        help="不启动界面，用多进程分块校验单个大文件能否按 --source-encoding 完整解码，失败时返回码为 1",
+    )
+    parser.add_argument(
+        "--source-encoding",
+        default="utf-8",
+        metavar="ENC",
+        help="与 --decode-file 一起使用：源编码（utf-8、gbk、big5、cp1252 等，默认 utf-8）",
+    )
+    parser.add_argument(
+        "--write-utf8",
+        action="store_true",
+        help="与 --decode-file 一起使用：校验通过后就地转换为 UTF-8，原文先保存为备份库中的一代",
+    )
+    parser.add_argument("--decode-workers", type=int, metavar="N", help="分块解码的进程数（默认 CPU 数）")
+    parser.add_argument(
+        "--filter",
+        action="store_true",
+        help="不启动界面，作为管道过滤器：从标准输入读取（自动识别编码）并以 UTF-8 写到标准输出，例如 git log | ... --filter",
+    )
+    parser.add_argument("--filter-encoding", metavar="ENC", help="与 --filter 一起使用：指定输入编码，不做自动识别")
+    parser.add_argument(
+        "--filter-per-line",
+        action="store_true",
+        help="与 --filter 一起使用：逐行回退解码，每行先按 UTF-8，失败时按系统 ANSI 代码页（适合混合编码的输出）",
+    )
+    parser.add_argument(
+        "--rename-fix",
+        nargs="+",
+        metavar="PATH",
+        help="不启动界面，查找被按 cp437/Latin-1 误解读的 GBK 文件名与目录名（如 ╓╨╬─.txt）并列出修复计划",
+    )
+    parser.add_argument(
+        "--rename-apply",
+        action="store_true",
+        help="与 --rename-fix 一起使用：执行重命名（子项先于所在目录），日志写入备份目录 renames，可用 --rename-undo 回滚",
+    )
+    parser.add_argument(
+        "--rename-undo",
+        nargs="?",
+        const="latest",
+        metavar="JOURNAL",
+        help="不启动界面，按重命名日志改回原名称（默认最近一次）",
+    )
+    parser.add_argument(
+        "--zip-utf8",
+        nargs="+",
+        metavar="ZIP",
+        help="不启动界面，把压缩包中按 GBK 保存的成员名改写为 UTF-8（置标志位 11），不解压不重新压缩，"
+        "默认输出为同目录的 <名称>.utf8.zip",
+    )
+    parser.add_argument(
+        "--zip-encoding", default="cp936", metavar="ENC", help="与 --zip-utf8 一起使用：成员名的原编码（默认 cp936）"
+    )
+    parser.add_argument("--zip-output", metavar="FILE", help="与 --zip-utf8 一起使用：指定输出文件（仅限单个压缩包）")
+    parser.add_argument(
+        "--audit-history",
+        nargs="?",
+        const=".",
+        metavar="REPO",
+        help="不启动界面，检查 Git 历史中作者姓名与提交说明的编码（默认当前目录的仓库），发现问题时返回码为 1",
+    )
+    parser.add_argument(
+        "--history-fixups",
+        metavar="DIR",
+        help="与 --audit-history 一起使用：在 DIR 中写出 mailmap 与 replace-commits.sh 修正清单",
+    )
+    parser.add_argument("--history-workers", type=int, metavar="N", help="分类提交的进程数（默认 CPU 数）")
+    parser.add_argument(
+        "--detect-encoding",
+        nargs="+",
+        metavar="PATH",
+        help="不启动界面，按字节二元组统计判断文件（或目录下全部文件）是 GBK、Big5、Shift-JIS 还是 EUC-KR，"
+        "列出候选编码与置信度",
+    )
+    return parser.parse_args(argv)
+
+
+def _print_backup_listing(app: "HeadlessSetupApp") -> None:
+    store = app._backups
+    print(f"备份目录: {store.root}")
+    originals = store.originals()
+    print("原始配置: " + (", ".join(sorted(originals)) if originals else "（无）"))
+    generations = store.generations()
+    if not generations:
+        print("历史代次: （无）")
+        return
+    print("历史代次:")
+    for manifest in generations:
+        entries = manifest.get("entries", {})
+        parts = [f"{key}=" + ("空" if e.get("empty") else f"{e.get('size', 0)}B") for key, e in sorted(entries.items())]
+        print(f"  {manifest.get('id'):>4}  {manifest.get('created', '')}  {manifest.get('reason', ''):<8} {' '.join(parts)}")
+
+
+def _verify_backups(full: bool = False) -> bool:
+    """命令行校验备份库；输出摘要与问题对象，返回是否全部通过。"""
+    # 只打开备份库，不初始化检测状态，保证登录时运行足够快
+    store = BackupStore(SetupApp._default_config_dir() / "backup")
+    started = time.perf_counter()
+    report = store.verify(full=full, workers=min(8, (os.cpu_count() or 2)))
+    elapsed = (time.perf_counter() - started) * 1000
+    print(
+        f"备份校验: 对象 {report['objects']} 个，校验 {report['checked']} 个，"
+        f"跳过未变化 {report['skipped']} 个，失败 {len(report['failed'])} 个，耗时 {elapsed:.1f} ms"
+    )
+    for item in report["failed"]:
+        print(f"  [ERROR] {item['sha256'][:12]}: {item['error']}（引用: {'、'.join(item['refs'])}）")
+    for generation in report["bad_manifests"]:
+        print(f"  [ERROR] 代次 {generation} 的清单无法解析")
+    return not report["failed"] and not report["bad_manifests"]
+
+
+def main(argv: list[str] | None = None) -> None:
+    args = _parse_args(argv)
+    if args.trace:
+        TRACER.enable(Path(args.trace))
+    if args.profile:
+        PROFILER.enable()
+    if args.status_json:
+        app = HeadlessSetupApp(debug=args.debug)
+        app._detect_all_paths(log=args.debug)
+        status = app._runtime_status()
+        if args.debug:
+            status["log"] = [f"[{level.upper()}] {message}" for level, message in app.logs]
+        print(json.dumps(status, ensure_ascii=False, indent=2))
+        return
+    if args.list_backups:
+        _print_backup_listing(HeadlessSetupApp())
+        return
+    if args.verify_backups:
+        if not _verify_backups(full=args.verify_full):
+            sys.exit(1)
+        return
+    if args.watch:
+        watcher = DriftWatcher(
+            HeadlessSetupApp(echo=True),
+            auto_heal=args.auto_heal,
+            debounce=args.watch_debounce,
+            console_interval=args.watch_console_interval,
+            notifier="polling" if args.watch_polling else None,
+        )
+        watcher.run()
+        return
+    if args.scan:
+        store = BackupStore(SetupApp._default_config_dir() / "backup") if args.repair_mojibake else None
+        scanner = EncodingScanner(
+            repair=args.repair_mojibake, allow_lossy=args.repair_lossy, store=store, workers=args.scan_workers
+        )
+        summary = scanner.run([Path(p) for p in args.scan])
+        _print_scan_report(summary)
+        if any(not result.repaired for result in summary["findings"]):
+            sys.exit(1)
+        return
+    if args.rename_fix:
+        if not _rename_fix(args.rename_fix, args.rename_apply):
+            sys.exit(1)
+        return
+    if args.rename_undo:
+        if not _rename_undo(args.rename_undo):
+            sys.exit(1)
+        return
+    if args.zip_utf8:
         try:
-            ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID("Code-encoding-fix")  # type: ignore[attr-defined]
-        except Exception:  # noqa: BLE001
-            pass
+            ok = _reencode_zips(args.zip_utf8, args.zip_encoding, args.zip_output)
+        except LookupError as exc:
+            print(f"[ERROR] {exc}")
+            ok = False
+        if not ok:
+            sys.exit(1)
+        return
+    if args.audit_history:
+        try:
+            ok = _audit_history(args.audit_history, args.history_fixups, args.history_workers)
+        except (OSError, RuntimeError) as exc:
+            print(f"[ERROR] {exc}")
+            ok = False
+        if not ok:
+            sys.exit(1)
+        return
+    if args.detect_encoding:
+        if not _detect_encodings(args.detect_encoding):
+            sys.exit(1)
+        return
+    if args.filter:
+        _run_filter(args.filter_encoding, args.filter_per_line)
+        return
+    if args.decode_file:
+        try:
+            ok = _decode_large_file(Path(args.decode_file), args.source_encoding, args.write_utf8, args.decode_workers)
+        except (OSError, ValueError, LookupError) as exc:
+            print(f"[ERROR] {exc}")
+            ok = False
+        if not ok:
+            sys.exit(1)
+        return
+    if args.restore_generation is not None:
+        app = HeadlessSetupApp(echo=True)
+        app._detect_all_paths(log=False)
+        manifest = app._backups.manifest(args.restore_generation) or {}
+        if app._snapshot_generation("rollback", manifest.get("entries", {})) is None:
+            app._log("未能保存当前状态，已取消恢复", "error")
+            sys.exit(1)
+        outputs = app._restore_generation(args.restore_generation)
+        for level, message in outputs:
+            app._log(message, level)
+        if any(level == "error" for level, _message in outputs):
+            sys.exit(1)
+        return
+    if not sys.platform.startswith("win"):
+        print("仅支持在 Windows 上运行 tkinter GUI。")
+        return
+    try:
+        ctypes.windll.shell32.SetCurrentProcessExplicitAppUserModelID("Code-encoding-fix")  # type: ignore[attr-defined]
+    except Exception:  # noqa: BLE001
+        pass
     root = tk.Tk()
-    SetupApp(root)
+    SetupApp(root, startup_trace=args.startup_trace, debug=args.debug)
     root.mainloop()
 
 
 if __name__ == "__main__":
-    if sys.platform.startswith("win"):
-        main()
-    else:
-        print("仅支持在 Windows 上运行 tkinter GUI。")
+    if getattr(sys, "frozen", False):
+        # --decode-file 使用进程池；打包为可执行文件时子进程需经此入口启动
+        import multiprocessing
+
+        multiprocessing.freeze_support()
+    main()
@@ -0,0 +1,60 @@
+"""备份库校验耗时：构造多代快照后对比完整校验（--verify-full）与增量校验（登录时的常规路径）。
+
+用法：
+  python benchmarks/bench_backup_verify.py --generations 200 --size-kb 64
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module  # noqa: E402
+
+TARGETS = ("ps5", "ps7", "git_bash", "vscode", "console")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--generations", type=int, default=200)
+    parser.add_argument("--size-kb", type=int, default=64, help="每个目标文件的大小")
+    parser.add_argument("--change-rate", type=float, default=0.3, help="每代中内容发生变化的目标比例")
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 2))
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    rng = random.Random(0)
+    with tempfile.TemporaryDirectory(prefix="cef-verify-") as tmp:
+        store = mod.BackupStore(Path(tmp), max_generations=args.generations)
+        contents = {key: rng.randbytes(args.size_kb * 1024) for key in TARGETS}
+        started = time.perf_counter()
+        for _ in range(args.generations):
+            for key in TARGETS:
+                if rng.random() < args.change_rate:
+                    contents[key] = rng.randbytes(args.size_kb * 1024)
+            store.commit(contents, "bench")
+        build = time.perf_counter() - started
+        objects = sum(1 for _ in Path(tmp, "objects").rglob("*.z*"))
+        print(f"{args.generations} 代 × {len(TARGETS)} 目标，{objects} 个对象，写入耗时 {build * 1000:.0f} ms")
+
+        for label, full, workers in (
+            ("完整校验（串行）", True, 1),
+            (f"完整校验（{args.workers} 线程）", True, args.workers),
+            ("增量校验（无变化）", False, args.workers),
+        ):
+            started = time.perf_counter()
+            report = store.verify(full=full, workers=workers)
+            elapsed = time.perf_counter() - started
+            print(f"{label:18s} {elapsed * 1000:9.1f} ms  校验 {report['checked']:5d}  跳过 {report['skipped']:5d}  失败 {len(report['failed'])}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
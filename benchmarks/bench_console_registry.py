@@ -0,0 +1,65 @@
+"""控制台 CodePage 注册表流程基准：在内存/JSON 文件注册表后端上反复执行
+写入 UTF-8 -> 按备份恢复 -> 恢复系统默认，并校验每轮结束后的注册表状态。
+
+用法：python benchmarks/bench_console_registry.py [--iterations 200] [--json-file reg.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module, make_headless_app, sandbox_env  # noqa: E402
+
+
+def run(iterations: int, json_file: Path | None) -> dict[str, list[float]]:
+    mod = load_app_module()
+    timings: dict[str, list[float]] = {"detect": [], "apply": [], "restore": [], "reset_default": []}
+    with sandbox_env():
+        registry = mod.MemoryRegistryBackend(json_file)
+        app = make_headless_app(registry)
+        _, _, default_cp = app._system_default_locale()
+        for _ in range(iterations):
+            start = time.perf_counter()
+            snapshot = app._detect_all_paths(log=False)
+            timings["detect"].append(time.perf_counter() - start)
+            keys = [app._console_key_from_path(path) for _label, path in app._console_targets(snapshot)]
+
+            start = time.perf_counter()
+            app._update_console_codepage(apply_utf8=True, emit_log=False)
+            timings["apply"].append(time.perf_counter() - start)
+            assert all((app._read_console_values(k) or {}).get("CodePage") == 65001 for k in keys)
+
+            start = time.perf_counter()
+            app._update_console_codepage(apply_utf8=False, emit_log=False, fallback_cp=default_cp)
+            timings["restore"].append(time.perf_counter() - start)
+
+            start = time.perf_counter()
+            outputs = app._set_console_codepage_all(default_cp)
+            timings["reset_default"].append(time.perf_counter() - start)
+            assert all(level == "success" for level, _ in outputs), outputs
+            assert all((app._read_console_values(k) or {}).get("CodePage") == default_cp for k in keys)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--json-file", type=Path, default=None, help="使用 JSON 文件后端（默认内存）")
+    args = parser.parse_args()
+
+    timings = run(args.iterations, args.json_file)
+    for name, values in timings.items():
+        values_ms = sorted(v * 1000 for v in values)
+        p95 = values_ms[min(len(values_ms) - 1, int(len(values_ms) * 0.95))]
+        print(f"{name:14s} p50 {statistics.median(values_ms):7.3f} ms  p95 {p95:7.3f} ms  max {values_ms[-1]:7.3f} ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,149 @@
+"""漂移守护（--watch）基准：空闲 CPU 占用、改动到检出的延迟、连续写入的去抖合并与自动修复。
+
+在端到端伪环境中先执行一次配置，再分别以系统通知（Linux 为 inotify）与轮询方式运行 DriftWatcher：
+  1. 空闲阶段：不改动任何文件，记录 --idle 秒内进程 CPU 时间占比；
+  2. 延迟阶段：改写 PowerShell 5.1 profile 中的配置块，记录从写入到检出漂移的耗时（含去抖时间）；
+  3. 合并阶段：100 ms 内连续写入 20 次，统计实际分析批次；
+  4. 自动修复：开启 --auto-heal 时确认被改动的配置块已重新写回。
+
+用法：
+  python benchmarks/bench_drift_watcher.py
+  python benchmarks/bench_drift_watcher.py --idle 30 -n 10
+"""
+
+from __future__ import annotations
+
+import argparse
+import statistics
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_end_to_end import percentile, ps_profiles_for  # noqa: E402
+from common import fake_registry_data, load_app_module, make_headless_app, sandbox_env  # noqa: E402
+
+
+def run_watcher(mod, app, notifier, debounce, duration=None, **kwargs):
+    """在后台线程启动守护，返回 (watcher, 线程, 变化记录列表, 结束后的统计信息)。"""
+    changes: list[tuple[float, str, str]] = []
+    watcher = mod.DriftWatcher(
+        app,
+        debounce=debounce,
+        notifier=notifier,
+        poll_interval=0.5,
+        on_change=lambda key, detail: changes.append((time.perf_counter(), key, str(detail.get("state")))),
+        **kwargs,
+    )
+    result: dict[str, object] = {}
+    thread = threading.Thread(target=lambda: result.update(watcher.run(duration)), daemon=True)
+    thread.start()
+    watcher.started.wait(10)
+    return watcher, thread, changes, result
+
+
+def wait_for(changes, key, state, since, timeout=10.0):
+    deadline = time.perf_counter() + timeout
+    while time.perf_counter() < deadline:
+        for stamp, k, s in changes:
+            if stamp >= since and k == key and s == state:
+                return stamp
+        time.sleep(0.002)
+    return None
+
+
+def drift(path: Path, tag: str) -> None:
+    text = path.read_text(encoding="utf-8")
+    path.write_text(text.replace("chcp 65001 | Out-Null", f"chcp 65001 | Out-Null # {tag}", 1), encoding="utf-8")
+
+
+def heal(path: Path) -> None:
+    text = path.read_text(encoding="utf-8")
+    lines = [line.split(" # ", 1)[0] if line.startswith("chcp 65001") else line for line in text.split("\n")]
+    path.write_text("\n".join(lines), encoding="utf-8")
+
+
+def bench_notifier(mod, app, notifier, args) -> dict[str, object]:
+    profile = app._ps5_profile_path
+    watcher, thread, _changes, idle = run_watcher(mod, app, notifier, args.debounce, duration=args.idle)
+    thread.join()
+
+    watcher, thread, changes, result = run_watcher(mod, app, notifier, args.debounce)
+    latencies: list[float] = []
+    for i in range(args.iterations):
+        start = time.perf_counter()
+        drift(profile, f"bench-{i}")
+        stamp = wait_for(changes, "ps5", "modified", start)
+        if stamp is not None:
+            latencies.append(stamp - start)
+        start = time.perf_counter()
+        heal(profile)
+        wait_for(changes, "ps5", "ok", start)
+
+    batches_before = watcher.stats["batches"]
+    start = time.perf_counter()
+    for i in range(20):
+        drift(profile, f"burst-{i}")
+        time.sleep(0.005)
+    wait_for(changes, "ps5", "modified", start)
+    time.sleep(args.debounce + 0.6)
+    burst_batches = watcher.stats["batches"] - batches_before
+    heal(profile)
+    wait_for(changes, "ps5", "ok", time.perf_counter() - 5)
+    watcher.stop_event.set()
+    thread.join()
+
+    watcher, thread, changes, _ = run_watcher(mod, app, notifier, args.debounce, auto_heal=True)
+    start = time.perf_counter()
+    drift(profile, "auto-heal")
+    healed = wait_for(changes, "ps5", "ok", start) is not None
+    healed = healed and "auto-heal" not in profile.read_text(encoding="utf-8")
+    watcher.stop_event.set()
+    thread.join()
+    return {
+        "notifier": idle.get("notifier"),
+        "idle_cpu_percent": idle.get("cpu_percent"),
+        "idle_cpu_ms": float(idle.get("cpu_s", 0)) * 1000,
+        "latencies": latencies,
+        "burst_batches": burst_batches,
+        "healed": healed,
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=5, help="延迟阶段的改动次数")
+    parser.add_argument("--idle", type=float, default=10.0, help="空闲阶段时长（秒）")
+    parser.add_argument("--debounce", type=float, default=0.2, help="去抖时间（秒）")
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    results = []
+    with sandbox_env() as (_root, env):
+        app = make_headless_app(registry=mod.MemoryRegistryBackend(data=fake_registry_data(env)))
+        snapshot = app._detect_all_paths(False)
+        app._run_setup(snapshot.git_exe, ps_profiles_for(app))
+        for notifier in (None, "polling"):
+            results.append(bench_notifier(mod, app, notifier, args))
+        errors = [message for level, message in app.logs if level == "error"]
+
+    print(f"空闲 {args.idle:g} 秒，去抖 {args.debounce * 1000:g} ms，改动 {args.iterations} 次")
+    print(f"{'通知方式':<24}{'空闲CPU':>12}{'检出 p50':>12}{'检出 p95':>12}{'连续写入批次':>14}{'自动修复':>10}")
+    for item in results:
+        lat = item["latencies"]
+        p50 = f"{statistics.median(lat) * 1000:.1f} ms" if lat else "-"
+        p95 = f"{percentile(lat, 95) * 1000:.1f} ms" if lat else "-"
+        print(
+            f"{item['notifier']:<24}{item['idle_cpu_percent']:>10.3f} %{p50:>12}{p95:>12}"
+            f"{item['burst_batches']:>14}{'是' if item['healed'] else '否':>10}"
+        )
+    if errors:
+        print(f"流程日志中有 {len(errors)} 条错误，例如：{errors[0]}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
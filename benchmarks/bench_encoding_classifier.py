@@ -0,0 +1,169 @@
+"""字节二元组编码分类器（EncodingClassifier / --detect-encoding）：准确率与批量吞吐。
+
+1. 准确率：用四种语言的短文（与分类器内置频率表无关的独立文本）按 GBK / Big5 / Shift-JIS / EUC-KR 编码，
+   截取不同长度的片段分类，与“先试 UTF-8，否则按 cp936”的原判定对比；另统计西文 cp1252 文本被误判为
+   中日韩编码的比例（应接近 0）；
+2. 吞吐：大量 64 B~1 KB 与 256 B~8 KB 的小文件，对比逐个 classify、批量 classify_many（NumPy）与纯 Python 后备路径。
+
+用法：
+  python benchmarks/bench_encoding_classifier.py
+  python benchmarks/bench_encoding_classifier.py --samples 2000 --files 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module  # noqa: E402
+
+TEXTS = {
+    "gbk": (
+        "今天上午，项目组在会议室讨论了下一季度的开发计划。负责人首先回顾了过去三个月的进展，"
+        "指出部分模块的测试覆盖率仍然偏低，需要尽快补齐。随后大家就新版本的发布时间展开了讨论，"
+        "有人建议推迟两周，以便修复用户反馈的几个严重问题。最后决定先发布测试版本，收集意见后再确定正式日期。"
+        "春天来了，公园里的花都开了，孩子们在草地上奔跑，老人坐在长椅上晒太阳。"
+        "这个函数用于读取配置文件，如果文件不存在，就使用默认设置，并在日志中记录一条警告信息。"
+        "我们必须认真对待每一个细节，因为系统的稳定性直接关系到用户的体验和公司的信誉。"
+    ),
+    "big5": (
+        "今天上午，專案小組在會議室討論了下一季度的開發計畫。負責人首先回顧了過去三個月的進展，"
+        "指出部分模組的測試覆蓋率仍然偏低，需要盡快補齊。隨後大家就新版本的發佈時間展開了討論，"
+        "有人建議延後兩週，以便修正使用者回報的幾個嚴重問題。最後決定先發佈測試版本，收集意見後再確定正式日期。"
+        "春天來了，公園裡的花都開了，孩子們在草地上奔跑，老人坐在長椅上曬太陽。"
+        "這個函式用於讀取設定檔，如果檔案不存在，就使用預設值，並在日誌中記錄一條警告訊息。"
+        "我們必須認真對待每一個細節，因為系統的穩定性直接關係到使用者的體驗和公司的信譽。"
+    ),
+    "shift_jis": (
+        "今日の午前中、プロジェクトチームは会議室で次の四半期の開発計画について話し合いました。"
+        "責任者はまず過去三か月の進捗を振り返り、一部のモジュールのテストがまだ不十分であることを指摘しました。"
+        "その後、新しいバージョンのリリース日について議論があり、ユーザーから報告された問題を修正するために"
+        "二週間延期すべきだという意見も出ました。春になると公園の桜が咲き、子供たちは芝生の上を走り回ります。"
+        "この関数は設定ファイルを読み込みます。ファイルが存在しない場合は既定値を使い、ログに警告を書き込みます。"
+        "私たちは一つ一つの細かい点を大切にしなければなりません。"
+    ),
+    "euc_kr": (
+        "오늘 오전에 프로젝트 팀은 회의실에서 다음 분기의 개발 계획에 대해 논의했습니다. "
+        "책임자는 먼저 지난 석 달 동안의 진행 상황을 돌아보고, 일부 모듈의 테스트가 아직 부족하다고 지적했습니다. "
+        "이어서 새 버전의 출시 날짜에 대한 토론이 있었고, 사용자가 보고한 문제를 고치기 위해 "
+        "두 주 연기하자는 의견도 나왔습니다. 봄이 오면 공원에 꽃이 피고 아이들은 잔디밭에서 뛰어놉니다. "
+        "이 함수는 설정 파일을 읽습니다. 파일이 없으면 기본값을 사용하고 로그에 경고를 남깁니다. "
+        "우리는 모든 작은 부분까지 소중히 여겨야 합니다."
+    ),
+}
+LATIN = (
+    "Le système a redémarré après la mise à jour. Die Größe der Datei überschreitet das Limit. "
+    "El código de error indica que la conexión falló. Café, crème brûlée, façade, naïve, résumé. "
+)
+# 源码、日志中常见的 ASCII 片段，与正文交替出现
+ASCII_NOISE = ("    return value\n", "# TODO: ", "[INFO] 2024-01-01 12:00:00 ", "id=42, ", "\n")
+
+
+def sample(text: str, encoding: str, size: int, rng: random.Random, ascii_share: float) -> bytes:
+    """截取约 size 字节的片段；ascii_share 为夹杂的 ASCII 片段占比。可能从多字节字符中间开始（模拟截断读取）。"""
+    parts: list[bytes] = []
+    total = 0
+    while total < size:
+        if rng.random() < ascii_share:
+            part = rng.choice(ASCII_NOISE).encode("ascii")
+        else:
+            start = rng.randrange(len(text))
+            part = text[start : start + rng.randint(4, 40)].encode(encoding)
+        parts.append(part)
+        total += len(part)
+    data = b"".join(parts)
+    offset = rng.randrange(2)
+    return data[offset : offset + size]
+
+
+def baseline(data: bytes) -> str:
+    try:
+        data.decode("utf-8")
+    except UnicodeDecodeError:
+        return "gbk"
+    return "utf-8"
+
+
+def accuracy(mod, samples: int) -> None:
+    classifier = mod._encoding_classifier()
+    rng = random.Random(7)
+    sizes = (16, 32, 64, 256, 1024, 4096)
+    print(f"{'长度':>6}" + "".join(f"{encoding:>11}" for encoding in TEXTS) + f"{'原判定':>9}{'cp1252 误判':>12}")
+    for size in sizes:
+        row, base_hits, total = [], 0, 0
+        for encoding, text in TEXTS.items():
+            blobs = [sample(text, encoding, size, rng, 0.2) for _ in range(samples)]
+            results = classifier.classify_many(blobs)
+            row.append(sum(1 for ranked in results if ranked and ranked[0][0] == encoding) / samples)
+            base_hits += sum(1 for blob in blobs if baseline(blob) == encoding)
+            total += samples
+        latin = [sample(LATIN, "cp1252", size, rng, 0.2) for _ in range(samples)]
+        false = sum(1 for ranked in classifier.classify_many(latin) if ranked and ranked[0][0] in TEXTS)
+        print(
+            f"{size:>5}B" + "".join(f"{hit:>11.1%}" for hit in row) + f"{base_hits / total:>9.1%}{false / samples:>12.1%}"
+        )
+
+
+def throughput(mod, files: int, repeat: int, low: int, high: int) -> None:
+    rng = random.Random(1)
+    encodings = list(TEXTS)
+    blobs = []
+    for i in range(files):
+        encoding = encodings[i % len(encodings)]
+        blobs.append(sample(TEXTS[encoding], encoding, rng.randint(low, high), rng, 0.3))
+    mb = sum(map(len, blobs)) / (1 << 20)
+    classifier = mod._encoding_classifier()
+    numpy_loader = mod._optional_numpy
+    modes = [
+        ("逐个 classify", lambda: [classifier.classify(blob) for blob in blobs]),
+        ("批量 classify_many", lambda: classifier.classify_many(blobs)),
+    ]
+    if numpy_loader() is not None:
+        fallback = mod.EncodingClassifier.__new__(mod.EncodingClassifier)
+        fallback.encodings, fallback._tables = mod._bigram_log_tables()
+        fallback._table = None
+
+        def pure_python():
+            mod._optional_numpy = lambda: None
+            try:
+                return fallback.classify_many(blobs[: max(1, files // 10)])
+            finally:
+                mod._optional_numpy = numpy_loader
+
+        modes.append(("纯 Python（1/10 文件）", pure_python))
+    print(f"\n{files} 个 {low} B~{high} B 的文件，{mb:.1f} MB")
+    print(f"{'模式':<24}{'耗时':>10}{'文件/秒':>12}{'吞吐':>12}")
+    for label, func in modes:
+        best = float("inf")
+        for _ in range(repeat):
+            started = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - started)
+        share = 0.1 if label.startswith("纯") else 1.0
+        print(f"{label:<24}{best * 1000:>8.0f}ms{files * share / best:>12.0f}{mb * share / best:>8.1f} MB/s")
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=500, help="每种编码、每种长度的样本数")
+    parser.add_argument("--files", type=int, default=10000, help="吞吐测试的文件数")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    started = time.perf_counter()
+    mod._encoding_classifier()
+    print(f"展开频率表: {(time.perf_counter() - started) * 1000:.0f} ms（首次使用时一次）\n")
+    accuracy(mod, args.samples)
+    for low, high in ((64, 1024), (256, 8192)):
+        throughput(mod, args.files, args.repeat, low, high)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
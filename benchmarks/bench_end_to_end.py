@@ -0,0 +1,165 @@
+"""端到端基准：在伪 Windows 环境中完整驱动 检测 → 配置 → 再检测 → 恢复，报告各阶段 p50/p95/max。
+
+伪环境包括 APPDATA / USERPROFILE / Program Files / 开始菜单目录树、PATH 上的占位程序，
+以及预置卸载项与控制台键的内存注册表（见 common.py）。不创建任何窗口，可在无显示器的 Linux 上运行，
+用于发布前把检测性能变化卡在门禁上：--save-baseline 记录基线，之后 p50 慢于基线超过阈值即以非零状态退出。
+
+阶段：
+  detect.cold        清空检测/注册表/快捷方式缓存后的首次检测
+  detect.warm        缓存命中时的重复检测
+  setup              一键配置（PowerShell 5.1/7 Profile、.bashrc、VS Code、控制台代码页）
+  detect.configured  配置完成后的检测（含漂移分析）
+  restore            从最近一次备份恢复
+
+用法：
+  python benchmarks/bench_end_to_end.py -n 30
+  python benchmarks/bench_end_to_end.py --scenario fallback      # PATH 上无程序，走回退探测
+  python benchmarks/bench_end_to_end.py --save-baseline
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import (  # noqa: E402
+    BASELINE_DIR,
+    fake_registry_data,
+    load_app_module,
+    load_baseline,
+    make_headless_app,
+    run_metadata,
+    sandbox_env,
+    save_baseline,
+)
+
+PHASES = ("detect.cold", "detect.warm", "setup", "detect.configured", "restore")
+DEFAULT_BASELINE = BASELINE_DIR / "end_to_end.json"
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """最近秩法百分位（样本少时比插值更直观）。"""
+    ordered = sorted(values)
+    rank = max(1, int(round(pct / 100 * len(ordered) + 0.5)))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def summarize(samples: list[float]) -> dict[str, float]:
+    return {
+        "p50_ms": statistics.median(samples) * 1000,
+        "p95_ms": percentile(samples, 95) * 1000,
+        "max_ms": max(samples) * 1000,
+        "runs": len(samples),
+    }
+
+
+def ps_profiles_for(app) -> list[tuple[Path, str]]:
+    """与 SetupApp._start_setup 一致：按检测结果决定要写入的 PowerShell Profile。"""
+    profiles: list[tuple[Path, str]] = []
+    if app.ps5_path_var.get():
+        profiles.append((app._ps5_profile_path, "Windows PowerShell 5.1"))
+    if app.ps7_path_var.get():
+        profiles.append((app._ps7_profile_path, "PowerShell 7+"))
+    return profiles
+
+
+def clear_caches(app) -> None:
+    for cache in (app._detect_cache, app._registry_cache, app._shortcut_cache):
+        cache.clear()
+
+
+def run_iteration(app) -> dict[str, float]:
+    timings: dict[str, float] = {}
+
+    def timed(phase: str, func, *args) -> object:
+        start = time.perf_counter()
+        result = func(*args)
+        timings[phase] = time.perf_counter() - start
+        return result
+
+    clear_caches(app)
+    snapshot = timed("detect.cold", app._detect_all_paths, False)
+    if snapshot is None or snapshot.git_exe is None:
+        raise RuntimeError("伪环境中未检测到 Git Bash，无法继续配置阶段")
+    timed("detect.warm", app._detect_all_paths, False)
+    timed("setup", app._run_setup, snapshot.git_exe, ps_profiles_for(app))
+    timed("detect.configured", app._detect_all_paths, False)
+    timed("restore", app._run_restore)
+    return timings
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=20)
+    parser.add_argument("--warmup", type=int, default=2, help="预热轮数（不计入统计）")
+    parser.add_argument("--scenario", choices=("path", "fallback"), default="path", help="path：PATH 命中；fallback：走回退探测")
+    parser.add_argument("--noise", type=int, default=300, help="伪注册表中无关卸载项数量")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true")
+    parser.add_argument("--threshold", type=float, default=0.25, help="p50 慢于基线超过该比例判为回归")
+    parser.add_argument("--json", type=Path, default=None, help="另存本次结果 JSON")
+    parser.add_argument("-v", "--verbose", action="store_true", help="输出流程日志中的警告与错误")
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    samples: dict[str, list[float]] = {phase: [] for phase in PHASES}
+    problems: list[tuple[str, str]] = []
+    with sandbox_env(path_stubs=args.scenario == "path") as (_root, env):
+        registry = mod.MemoryRegistryBackend(data=fake_registry_data(env, noise=args.noise))
+        app = make_headless_app(registry=registry)
+        for i in range(args.warmup + args.iterations):
+            app.logs.clear()
+            timings = run_iteration(app)
+            problems.extend((lvl, msg) for lvl, msg in app.logs if lvl in ("warning", "error"))
+            if i >= args.warmup:
+                for phase, seconds in timings.items():
+                    samples[phase].append(seconds)
+
+    baseline = {} if args.save_baseline else load_baseline(args.baseline)
+    results: dict[str, dict] = {}
+    regressions: list[str] = []
+    print(f"场景 {args.scenario}，{args.iterations} 轮（预热 {args.warmup}）")
+    print(f"{'阶段':20s} {'p50 ms':>10s} {'p95 ms':>10s} {'max ms':>10s}")
+    for phase in PHASES:
+        key = f"{args.scenario}:{phase}"
+        stats = summarize(samples[phase])
+        results[key] = stats
+        flag = ""
+        base = baseline.get(key)
+        if base and base["p50_ms"] > 0:
+            ratio = stats["p50_ms"] / base["p50_ms"]
+            flag = f"  x{ratio:.2f}"
+            if ratio > 1 + args.threshold:
+                flag += "  回归!"
+                regressions.append(key)
+        print(f"{phase:20s} {stats['p50_ms']:10.2f} {stats['p95_ms']:10.2f} {stats['max_ms']:10.2f}{flag}")
+
+    if problems:
+        unique = sorted(set(problems))
+        print(f"\n流程日志中有 {len(unique)} 种警告/错误" + ("：" if args.verbose else "（-v 查看）"))
+        if args.verbose:
+            for level, message in unique:
+                print(f"  [{level}] {message}")
+
+    if args.json:
+        payload = {**run_metadata(), "scenario": args.scenario, "results": results}
+        args.json.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"基线已写入 {args.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} 个阶段 p50 慢于基线超过 {args.threshold:.0%}：")
+        for key in regressions:
+            print(f"  - {key}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,80 @@
+"""等效配置判定（EquivalenceEngine）与改造前逐条正则实现的耗时对比。
+
+输入为 textgen 生成的 PowerShell profile / .bashrc（equivalent：无标记但含等效设置；clean：含工具配置块；
+filler：只有填充内容，判定为不等效），另有追加 24 条站点规则的用例，观察规则数增加时的开销。
+“新/旧”大于 1 表示比改造前慢。
+
+用法：
+  python benchmarks/bench_equivalence.py
+  python benchmarks/bench_equivalence.py --sizes 4KB,64KB,1MB,10MB -r 9
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import textgen  # noqa: E402
+from check_equivalence import legacy_bashrc, legacy_powershell  # noqa: E402
+from common import load_app_module  # noqa: E402
+
+SIZES = {"4KB": 4 << 10, **textgen.SIZES}
+
+
+def best_of(func, text: str, repeat: int) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func(text)
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default="4KB,64KB,1MB")
+    parser.add_argument("-r", "--repeat", type=int, default=7)
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    SetupApp = mod.SetupApp
+    site_rules = tuple(
+        mod.EquivalenceRule("powershell", f"site.{idx}", "session", rf"Import-Module\s+SiteUtf8Module{idx}\b")
+        for idx in range(24)
+    )
+    many_rules = mod.EquivalenceEngine(mod.DEFAULT_EQUIVALENCE_RULES + site_rules)
+    kinds = {
+        "ps": (SetupApp._expected_powershell_block(), legacy_powershell, SetupApp._equivalent_powershell_profile),
+        "bash": (SetupApp._expected_bash_block(), legacy_bashrc, SetupApp._equivalent_bashrc),
+    }
+    cases = []
+    for kind, (block, legacy, new) in kinds.items():
+        for variant in ("equivalent", "clean", "filler"):
+            cases.append((f"{kind}[{variant}]", kind, variant, legacy, new))
+    cases.append(("ps[equivalent]+24规则", "ps", "equivalent", legacy_powershell, many_rules.checker("powershell")))
+
+    print(f"{'用例':<24}{'大小':>6}{'改造前':>10}{'现在':>10}{'新/旧':>8}")
+    worst = 0.0
+    for name, kind, variant, legacy, new in cases:
+        block = kinds[kind][0]
+        for label in args.sizes.split(","):
+            size = SIZES[label]
+            if variant == "filler":
+                text = textgen.shell_text(kind, "clean", size, "", "", "")
+            else:
+                text = textgen.shell_text(kind, variant, size, block, "#s", "#e")
+            old_time = best_of(legacy, text, args.repeat)
+            new_time = best_of(new, text, args.repeat)
+            ratio = new_time / old_time
+            worst = max(worst, ratio)
+            print(f"{name:<24}{label:>6}{old_time * 1000:>8.2f}ms{new_time * 1000:>8.2f}ms{ratio:>8.2f}")
+    print(f"最慢的用例为改造前的 {worst:.2f} 倍")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
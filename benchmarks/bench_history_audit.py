@@ -0,0 +1,103 @@
+"""Git 历史编码审计（--audit-history）：识别准确率与每秒处理的提交数。
+
+用 git fast-import 生成一个含 --commits 个提交的仓库（每个提交改动一个文件，因此对象中约三分之二是
+树与文件内容）：多数提交为 ASCII 或正常 UTF-8 中文，另按比例混入 GBK 编码且未声明 encoding 的提交说明、
+GBK 编码的作者姓名，以及 UTF-8 被按 GBK 误解码后保存的乱码说明。分别以 1 个与多个进程分类，
+核对发现的提交与构造时记录的一致。
+
+用法：
+  python benchmarks/bench_history_audit.py
+  python benchmarks/bench_history_audit.py --commits 1000000 --workers 1,8
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module  # noqa: E402
+from textgen import LOG_LINES, mojibake  # noqa: E402
+
+KINDS = (("ascii", 0.6), ("utf8", 0.3), ("gbk-message", 0.04), ("gbk-author", 0.03), ("mojibake", 0.03))
+
+
+def build_repo(repo: Path, commits: int) -> dict[str, set[int]]:
+    """返回 {类别: 提交序号集合}；提交序号即 fast-import 的 mark。"""
+    rng = random.Random(3)
+    expected: dict[str, set[int]] = {kind: set() for kind, _share in KINDS}
+    subprocess.run(["git", "init", "-q", str(repo)], check=True)
+    proc = subprocess.Popen(["git", "-C", str(repo), "fast-import", "--quiet"], stdin=subprocess.PIPE)
+    write = proc.stdin.write
+    for mark in range(1, commits + 1):
+        kind = rng.choices([k for k, _ in KINDS], [w for _, w in KINDS])[0]
+        expected[kind].add(mark)
+        line = LOG_LINES[mark % len(LOG_LINES)].format(i=mark % 60)
+        author = "张伟".encode("gbk") if kind == "gbk-author" else b"Zhang Wei"
+        if kind == "ascii":
+            message = f"fix: update module {mark}\n".encode()
+        elif kind == "gbk-message":
+            message = f"修复：{line}\n".encode("gbk")
+        elif kind == "mojibake":
+            message = (mojibake(f"修复：{line}") + "\n").encode("utf-8")
+        else:
+            message = f"修复：{line}\n".encode("utf-8")
+        blob = f"value = {mark}\n".encode()
+        write(f"commit refs/heads/main\nmark :{mark}\n".encode())
+        write(b"author " + author + b" <dev@example.com> " + f"{1600000000 + mark} +0800\n".encode())
+        write(f"committer Build <ci@example.com> {1600000000 + mark} +0800\n".encode())
+        write(f"data {len(message)}\n".encode() + message)
+        write(f"M 644 inline src/mod{mark % 500}.py\ndata {len(blob)}\n".encode() + blob + b"\n")
+    proc.stdin.close()
+    if proc.wait():
+        raise RuntimeError("git fast-import 失败")
+    return expected
+
+
+def main() -> int:
+    cpus = os.cpu_count() or 1
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--commits", type=int, default=50_000)
+    parser.add_argument("--workers", default=",".join(map(str, sorted({1, cpus}))), help="逗号分隔的进程数列表")
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    with tempfile.TemporaryDirectory(prefix="cef-history-") as tmp:
+        repo = Path(tmp) / "repo"
+        started = time.perf_counter()
+        expected = build_repo(repo, args.commits)
+        print(f"生成 {args.commits} 个提交，耗时 {time.perf_counter() - started:.1f} 秒")
+        marks = subprocess.run(
+            ["git", "-C", str(repo), "rev-list", "--reverse", "main"], capture_output=True, text=True, check=True
+        ).stdout.split()
+        want = {kind: {marks[m - 1] for m in expected[kind]} for kind in ("gbk-message", "gbk-author", "mojibake")}
+
+        print(f"{'进程数':>6}{'耗时':>10}{'提交/秒':>12}{'对象':>10}{'非 ASCII':>10}")
+        for workers in (int(n) for n in args.workers.split(",")):
+            summary = mod.HistoryAuditor(repo, workers=workers).run()
+            elapsed = float(summary["elapsed"])
+            print(
+                f"{workers:>6}{elapsed:>8.2f} s{summary['commits'] / elapsed:>12.0f}"
+                f"{summary['objects']:>10}{summary['non_ascii']:>10}"
+            )
+        findings = summary["findings"]
+        got = {
+            "gbk-message": {f.sha for f in findings if f.kind == "legacy" and f.field == "message"},
+            "gbk-author": {f.sha for f in findings if f.kind == "legacy" and f.field == "author"},
+            "mojibake": {f.sha for f in findings if f.kind == "mojibake"},
+        }
+    print(f"{'类别':<14}{'构造':>8}{'发现':>8}{'漏报':>8}{'误报':>8}")
+    for kind, shas in want.items():
+        print(f"{kind:<14}{len(shas):>8}{len(got[kind]):>8}{len(shas - got[kind]):>8}{len(got[kind] - shas):>8}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,79 @@
+"""日志管线压力基准：后台线程写入大量日志，测量排空耗时、事件循环最长停顿与最终保留行数。
+
+用法：python benchmarks/bench_log_pipeline.py [--lines 100000] [--budget-ms 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import threading
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_ui_responsiveness import HEARTBEAT_MS, StallMeter  # noqa: E402
+from common import has_display, load_app_module, sandbox_env  # noqa: E402
+
+
+def run(lines: int) -> dict[str, float]:
+    import tkinter as tk
+
+    mod = load_app_module()
+    result: dict[str, float] = {}
+    with sandbox_env():
+        root = tk.Tk()
+        app = mod.SetupApp(root)
+        meter = StallMeter(root)
+        levels = ("info", "success", "warning", "error")
+        done = threading.Event()
+
+        def produce() -> None:
+            for i in range(lines):
+                app._log(f"压力测试日志 {i:06d} " + "x" * 40, levels[i & 3])
+            done.set()
+
+        def wait_drained(started: float) -> None:
+            if done.is_set() and not app._log_queue:
+                app._flush_log_queue()
+                result["drain_s"] = time.perf_counter() - started
+                result["max_stall_ms"] = meter.max_stall * 1000
+                result["retained_lines"] = int(app.log_text.index("end-1c").split(".")[0]) - 1
+                meter.stop()
+                root.after(50, root.destroy)
+            else:
+                root.after(HEARTBEAT_MS, lambda: wait_drained(started))
+
+        def start() -> None:
+            app._clear_log()
+            meter.reset()
+            started = time.perf_counter()
+            threading.Thread(target=produce, daemon=True).start()
+            wait_drained(started)
+
+        meter.start()
+        # 等启动检测的日志落定后再开始
+        root.after(1500, start)
+        root.mainloop()
+    return result
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=100_000)
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="允许的最长停顿")
+    args = parser.parse_args()
+
+    if not has_display():
+        print("跳过：当前环境没有图形显示（DISPLAY 未设置）。")
+        return 0
+
+    res = run(args.lines)
+    print(f"写入 {args.lines} 行：排空耗时 {res['drain_s']:.2f}s，最长停顿 {res['max_stall_ms']:.1f} ms，"
+          f"保留 {int(res['retained_lines'])} 行")
+    return 1 if res["max_stall_ms"] > args.budget_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""乱码扫描与修复（--scan / --repair-mojibake）：还原准确率、目录扫描吞吐与零改写快速路径的收益。
+
+1. 准确率：对合成中文日志逐行做 Windows cp936 误解码（一次/两次），统计完全还原、有损还原、未识别的比例，
+   以及正常行被误改的次数（应为 0）；
+2. 吞吐：构造 ASCII 源码 / 中文日志 / 含乱码日志混合的目录树，分别以 NumPy 向量化计数与纯字符串方法
+   （未安装 NumPy 时的后备路径）扫描，再在副本上执行就地修复。文件已在页缓存中，结果反映 CPU 侧开销；
+3. 快速路径：以 ASCII 为主的源码仓库（90% 小文件为纯 ASCII、10% 为中文 UTF-8，另有一个大的纯 ASCII 日志），
+   对比开启/关闭纯 ASCII 与合法 UTF-8 快速路径的扫描耗时。
+
+用法：
+  python benchmarks/bench_mojibake_scan.py
+  python benchmarks/bench_mojibake_scan.py --files 2000 --size-kb 512 --workers 8
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import shutil
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module  # noqa: E402
+from textgen import LOG_LINES, corpus_text, mojibake  # noqa: E402
+
+MIX = (("ascii", 0.5), ("utf8", 0.3), ("mojibake", 0.15), ("double", 0.05))
+
+
+def accuracy(mod, samples: int) -> dict[str, dict[str, int]]:
+    scorer = mod._mojibake_scorer()
+    results: dict[str, dict[str, int]] = {}
+    for times in (0, 1, 2):
+        stats = {"exact": 0, "lossy": 0, "missed": 0, "changed": 0}
+        for i in range(samples):
+            original = LOG_LINES[i % len(LOG_LINES)].format(i=i % 60)
+            text = mojibake(original, times) if times else original
+            repaired, fixed, _lossy = scorer.repair_text(text, allow_lossy=True)
+            if not times:
+                stats["changed"] += repaired != original
+            elif repaired == original:
+                stats["exact"] += 1
+            elif fixed:
+                stats["lossy"] += 1
+            else:
+                stats["missed"] += 1
+        results[f"{times} 次误转" if times else "正常行"] = stats
+    return results
+
+
+def build_tree(root: Path, files: int, size: int) -> int:
+    total = 0
+    index = 0
+    for kind, share in MIX:
+        for i in range(max(1, int(files * share))):
+            path = root / kind / f"d{i % 16}" / f"{kind}-{i}.log"
+            path.parent.mkdir(parents=True, exist_ok=True)
+            data = corpus_text(kind, size, seed=index).encode("utf-8")
+            path.write_bytes(data)
+            total += len(data)
+            index += 1
+    return total
+
+
+def build_repo(root: Path, files: int, big_mb: int) -> int:
+    """以 ASCII 为主的仓库：2~32 KB 的小文件，每 10 个中 1 个为中文 UTF-8；外加一个 big_mb 的纯 ASCII 日志。"""
+    rng = random.Random(1)
+    units = {kind: corpus_text(kind, 64 << 10).encode("utf-8") for kind in ("ascii", "utf8")}
+    total = 0
+    for i in range(files):
+        data = units["utf8" if i % 10 == 0 else "ascii"][: rng.randint(2 << 10, 32 << 10)]
+        data = data[: data.rfind(b"\n") + 1]
+        path = root / f"pkg{i % 50}" / f"mod{i}.txt"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(data)
+        total += len(data)
+    big = root / "build.log"
+    with open(big, "wb") as fh:
+        for _ in range(big_mb * 16):
+            fh.write(units["ascii"])
+    return total + big.stat().st_size
+
+
+def timed_scan(mod, roots: list[Path], repeat: int, **kwargs) -> tuple[float, dict[str, object]]:
+    best = float("inf")
+    summary: dict[str, object] = {}
+    for _ in range(repeat):
+        scanner = mod.EncodingScanner(**kwargs)
+        started = time.perf_counter()
+        summary = scanner.run(roots)
+        best = min(best, time.perf_counter() - started)
+    return best, summary
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--files", type=int, default=400)
+    parser.add_argument("--size-kb", type=int, default=256, help="每个文件的大小")
+    parser.add_argument("--workers", type=int, default=min(8, os.cpu_count() or 2))
+    parser.add_argument("--samples", type=int, default=600, help="准确率统计的行数")
+    parser.add_argument("--repo-files", type=int, default=4000, help="快速路径对比用仓库的小文件数")
+    parser.add_argument("--repo-big-mb", type=int, default=64, help="快速路径对比用仓库中大日志的大小")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    print(f"{'准确率':<12}{'完全还原':>10}{'有损还原':>10}{'未识别':>10}{'误改':>8}")
+    for label, stats in accuracy(mod, args.samples).items():
+        print(f"{label:<12}{stats['exact']:>10}{stats['lossy']:>10}{stats['missed']:>10}{stats['changed']:>8}")
+
+    numpy_loader = mod._optional_numpy
+    with tempfile.TemporaryDirectory(prefix="cef-scan-") as tmp:
+        root = Path(tmp) / "tree"
+        total = build_tree(root, args.files, args.size_kb * 1024)
+        mb = total / (1 << 20)
+        print(f"\n目录树: {sum(1 for _ in root.rglob('*.log'))} 个文件，{mb:.1f} MB，线程 {args.workers}")
+        rows = []
+        modes = [("numpy", numpy_loader), ("str.translate", lambda: None)] if numpy_loader() is not None else [
+            ("str.translate", numpy_loader)
+        ]
+        for label, loader in modes:
+            mod._optional_numpy = loader
+            try:
+                elapsed, summary = timed_scan(mod, [root], args.repeat, workers=args.workers)
+            finally:
+                mod._optional_numpy = numpy_loader
+            rows.append((f"扫描 [{label}]", elapsed, summary))
+
+        store = mod.BackupStore(Path(tmp) / "backup")
+        work = Path(tmp) / "work"
+        shutil.copytree(root, work)
+        started = time.perf_counter()
+        summary = mod.EncodingScanner(repair=True, store=store, workers=args.workers).run([work])
+        rows.append(("修复 [含备份]", time.perf_counter() - started, summary))
+        _elapsed, after = timed_scan(mod, [work], 1, workers=args.workers)
+
+        repo = Path(tmp) / "repo"
+        repo_mb = build_repo(repo, args.repo_files, args.repo_big_mb) / (1 << 20)
+        fast_rows = []
+        for label, fast_path in (("关闭", False), ("开启", True)):
+            elapsed, summary = timed_scan(mod, [repo], args.repeat, workers=args.workers, fast_path=fast_path)
+            fast_rows.append((label, elapsed, summary))
+
+    print(f"{'模式':<20}{'耗时':>10}{'吞吐':>12}{'乱码文件':>10}{'修复行':>10}")
+    for label, elapsed, summary in rows:
+        findings = summary["findings"]
+        lines = sum(result.lines for result in findings)
+        print(f"{label:<20}{elapsed * 1000:>8.0f}ms{mb / elapsed:>8.0f} MB/s{len(findings):>10}{lines:>10}")
+    print(f"修复后复扫仍有乱码的文件: {sum(1 for r in after['findings'] if r.fixed)}")
+
+    print(f"\nASCII 为主的仓库: {args.repo_files + 1} 个文件，{repo_mb:.1f} MB")
+    print(f"{'快速路径':<12}{'耗时':>10}{'吞吐':>12}{'纯 ASCII':>10}{'UTF-8':>8}")
+    for label, elapsed, summary in fast_rows:
+        kinds = summary["kinds"]
+        print(f"{label:<12}{elapsed * 1000:>8.0f}ms{repo_mb / elapsed:>8.0f} MB/s{kinds['ascii'][0]:>10}{kinds['utf-8'][0]:>8}")
+    print(f"加速比 x{fast_rows[0][1] / fast_rows[1][1]:.1f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,84 @@
+"""单个大文件的多进程分块解码（--decode-file）：吞吐随进程数的扩展情况。
+
+生成 UTF-8 与 GBK 两份中文日志（--size-mb），对 1、2、4 … CPU 数个进程分别执行：
+  - 校验：只解码不输出；
+  - 转码：GBK → UTF-8 写入临时文件（UTF-8 源文件只做校验）。
+另以单进程直接 read() + decode() 作为基线。文件已在页缓存中，结果反映 CPU 侧开销。
+
+用法：
+  python benchmarks/bench_parallel_decode.py
+  python benchmarks/bench_parallel_decode.py --size-mb 2048 --workers 1,2,4,8,16
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module  # noqa: E402
+from textgen import corpus_text  # noqa: E402
+
+
+def write_corpus(path: Path, encoding: str, size: int) -> int:
+    unit = corpus_text("utf8", 4 << 20).encode(encoding)
+    written = 0
+    with open(path, "wb") as fh:
+        while written < size:
+            fh.write(unit)
+            written += len(unit)
+    return written
+
+
+def best_of(repeat: int, func) -> float:
+    best = float("inf")
+    for _ in range(repeat):
+        started = time.perf_counter()
+        func()
+        best = min(best, time.perf_counter() - started)
+    return best
+
+
+def main() -> int:
+    cpus = os.cpu_count() or 1
+    default_workers = sorted({1, *(n for n in (2, 4, 8, 16, 32) if n <= cpus), cpus})
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=256)
+    parser.add_argument("--workers", default=",".join(map(str, default_workers)), help="逗号分隔的进程数列表")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+    worker_counts = [int(n) for n in args.workers.split(",")]
+
+    mod = load_app_module()
+    with tempfile.TemporaryDirectory(prefix="cef-decode-") as tmp:
+        rows = []
+        for encoding in ("utf-8", "gbk"):
+            source = Path(tmp) / f"big.{encoding}.log"
+            size = write_corpus(source, encoding, args.size_mb << 20)
+            mb = size / (1 << 20)
+            baseline = best_of(args.repeat, lambda: source.read_bytes().decode(encoding))
+            rows.append((encoding, "read()+decode()", 1, mb / baseline, 1.0))
+            for mode in ("校验", "转码") if encoding != "utf-8" else ("校验",):
+                single = None
+                for workers in worker_counts:
+                    decoder = mod.ChunkedDecoder(encoding, workers=workers)
+                    output = Path(tmp) / "out.log" if mode == "转码" else None
+                    elapsed = best_of(args.repeat, lambda: decoder.run(source, output))
+                    single = single or elapsed
+                    rows.append((encoding, mode, workers, mb / elapsed, single / elapsed))
+            source.unlink()
+
+    print(f"文件 {args.size_mb} MB，CPU {cpus} 个，取 {args.repeat} 次最好成绩")
+    print(f"{'编码':<8}{'模式':<18}{'进程数':>6}{'吞吐':>14}{'加速比':>10}")
+    for encoding, mode, workers, rate, speedup in rows:
+        print(f"{encoding:<8}{mode:<18}{workers:>6}{rate:>9.0f} MB/s{speedup:>9.2f}x")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""并发恢复 vs 串行恢复：在端到端伪环境中对比 _run_restore 的耗时。
+
+每轮先执行一次配置（不计时）生成原始配置备份，再分别以 _io_workers=1（串行）与默认并发数恢复，
+两种方式交替运行以抵消缓存与磁盘状态的影响。--io-latency-ms 为 Documents 下的文件操作注入固定延迟，
+模拟重定向到网络共享的“文档”目录（这是并发恢复收益最大的场景）。
+
+用法：
+  python benchmarks/bench_parallel_restore.py -n 20
+  python benchmarks/bench_parallel_restore.py --io-latency-ms 15
+"""
+
+from __future__ import annotations
+
+import argparse
+import contextlib
+import functools
+import pathlib
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from bench_end_to_end import percentile, ps_profiles_for  # noqa: E402
+from common import fake_registry_data, load_app_module, make_headless_app, sandbox_env  # noqa: E402
+
+# 只包装底层调用：exists/is_file 经由 stat，read_*/write_* 经由 open，避免同一操作重复计延迟
+_PATCHED_METHODS = ("stat", "open", "unlink", "mkdir")
+
+
+@contextlib.contextmanager
+def simulated_latency(prefix: Path, seconds: float):
+    """对 prefix 下路径的常用文件操作追加 sleep（释放 GIL，行为接近网络 I/O 等待）。"""
+    if seconds <= 0:
+        yield
+        return
+    prefix_str = str(prefix)
+    originals = {name: getattr(pathlib.Path, name) for name in _PATCHED_METHODS}
+
+    def wrap(func):
+        @functools.wraps(func)
+        def wrapper(self, *args, **kwargs):
+            if str(self).startswith(prefix_str):
+                time.sleep(seconds)
+            return func(self, *args, **kwargs)
+
+        return wrapper
+
+    for name, func in originals.items():
+        setattr(pathlib.Path, name, wrap(func))
+    try:
+        yield
+    finally:
+        for name, func in originals.items():
+            setattr(pathlib.Path, name, func)
+
+
+def timed_restore(app, workers: int) -> float:
+    app._io_workers = workers
+    start = time.perf_counter()
+    app._run_restore()
+    return time.perf_counter() - start
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("-n", "--iterations", type=int, default=15)
+    parser.add_argument("--workers", type=int, default=5, help="并发恢复的工作线程数")
+    parser.add_argument("--io-latency-ms", type=float, default=0.0, help="Documents 下每次文件操作的附加延迟（毫秒）")
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    samples: dict[str, list[float]] = {"serial": [], "parallel": []}
+    with sandbox_env() as (_root, env):
+        app = make_headless_app(registry=mod.MemoryRegistryBackend(data=fake_registry_data(env)))
+        snapshot = app._detect_all_paths(False)
+        documents = Path(env["USERPROFILE"]) / "Documents"
+        with simulated_latency(documents, args.io_latency_ms / 1000):
+            for i in range(args.iterations + 1):
+                order = (("serial", 1), ("parallel", args.workers))
+                if i % 2:
+                    order = order[::-1]
+                for label, workers in order:
+                    app._run_setup(snapshot.git_exe, ps_profiles_for(app))
+                    elapsed = timed_restore(app, workers)
+                    if i:  # 第一轮为预热
+                        samples[label].append(elapsed)
+        errors = [message for level, message in app.logs if level == "error"]
+
+    print(f"{args.iterations} 轮，Documents 附加延迟 {args.io_latency_ms:g} ms，并发数 {args.workers}")
+    for label in ("serial", "parallel"):
+        values = samples[label]
+        print(
+            f"{label:10s} p50 {statistics.median(values) * 1000:8.2f} ms  "
+            f"p95 {percentile(values, 95) * 1000:8.2f} ms  max {max(values) * 1000:8.2f} ms"
+        )
+    speedup = statistics.median(samples["serial"]) / statistics.median(samples["parallel"])
+    print(f"p50 加速比 x{speedup:.2f}")
+    if errors:
+        print(f"流程日志中有 {len(errors)} 条错误，例如：{errors[0]}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,101 @@
+"""文件名乱码批量修复（--rename-fix）：规划、执行与回滚的耗时随条目数的变化。
+
+构造目录树（--entries 个条目，每目录 --fanout 项）：多数为 ASCII 名称，--bad-share 比例为按 cp437/Latin-1
+误解读的 GBK 中文名称（含目录），另有少量正常中文与带重音字母的名称（不应被改动）。依次测量：
+  - 规划：一次 os.scandir 遍历与打分；
+  - 执行：分批写预写日志并重命名；
+  - 回滚：按日志逆序改回，并核对目录树与原样一致。
+
+用法：
+  python benchmarks/bench_rename_fix.py
+  python benchmarks/bench_rename_fix.py --entries 500000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module  # noqa: E402
+
+WORDS = ("项目", "文档", "报告", "说明", "第一章", "会议记录", "数据", "备份", "图片", "合同", "终稿", "附件")
+LEGIT = ("中文名称", "café", "Müller", "naïve résumé")
+
+
+def build(root: Path, entries: int, fanout: int, bad_share: float) -> tuple[int, set[str]]:
+    """返回 (应修复的条目数, 目录树快照)。"""
+    rng = random.Random(7)
+    expected = 0
+    folders = [root]
+    created = 0
+    while created < entries:
+        parent = folders[created // fanout] if created // fanout < len(folders) else folders[-1]
+        is_dir = rng.random() < 1 / fanout * 1.5
+        if rng.random() < bad_share:
+            name = f"{rng.choice(WORDS)}{rng.choice(WORDS)}{created}"
+            name = name.encode("gbk").decode(rng.choice(("cp437", "latin-1")))
+            expected += 1
+        elif rng.random() < 0.02:
+            name = f"{rng.choice(LEGIT)}{created}"
+        else:
+            name = f"file_{created}"
+        path = parent / (name if is_dir else name + ".txt")
+        if is_dir:
+            path.mkdir()
+            folders.append(path)
+        else:
+            path.touch()
+        created += 1
+    return expected, snapshot(root)
+
+
+def snapshot(root: Path) -> set[str]:
+    return {os.path.relpath(os.path.join(folder, name), root) for folder, dirs, files in os.walk(root) for name in dirs + files}
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--entries", type=int, default=200_000)
+    parser.add_argument("--fanout", type=int, default=200, help="每个目录的条目数")
+    parser.add_argument("--bad-share", type=float, default=0.1, help="乱码名称的比例")
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    mod._mojibake_scorer()
+    with tempfile.TemporaryDirectory(prefix="cef-rename-") as tmp:
+        root = Path(tmp) / "tree"
+        root.mkdir()
+        expected, before = build(root, args.entries, args.fanout, args.bad_share)
+        repairer = mod.FilenameRepairer(Path(tmp) / "journal")
+
+        plan = repairer.plan([root])
+        started = time.perf_counter()
+        result = repairer.apply(plan["actions"])
+        applied = time.perf_counter() - started
+        started = time.perf_counter()
+        undone = repairer.undo(result["journal"])
+        reverted = time.perf_counter() - started
+        identical = snapshot(root) == before
+
+    planned = len(plan["actions"])
+    print(f"条目 {plan['entries']} 个，应修复 {expected} 个，计划修复 {planned} 个，冲突 {len(plan['conflicts'])} 个")
+    print(f"{'阶段':<10}{'耗时':>10}{'速率':>16}")
+    for label, elapsed, count in (
+        ("规划", float(plan["elapsed"]), plan["entries"]),
+        ("执行", applied, result["renamed"]),
+        ("回滚", reverted, undone["restored"]),
+    ):
+        print(f"{label:<10}{elapsed:>8.2f} s{count / elapsed if elapsed else 0:>10.0f} 项/s")
+    print(f"回滚后目录树与原样一致: {identical}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
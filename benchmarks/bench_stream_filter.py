@@ -0,0 +1,114 @@
+"""管道过滤器（--filter）：批量吞吐与交互延迟。
+
+1. 吞吐：对 UTF-8 / GBK 中文日志与纯 ASCII 日志（--size-mb），分别在进程内以 64 KB read1() 读取转码，
+   以及通过真实管道运行 `python Code-encoding-fix.py --filter`（含进程启动），输出丢弃；
+2. 交互延迟：启动过滤器子进程，逐行写入并等待该行从输出端读回，统计每行往返时间的中位数与 P99，
+   对照直接 cat 的往返时间。
+
+用法：
+  python benchmarks/bench_stream_filter.py
+  python benchmarks/bench_stream_filter.py --size-mb 512 --lines 500
+"""
+
+from __future__ import annotations
+
+import argparse
+import io
+import os
+import shutil
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import APP_PATH, load_app_module  # noqa: E402
+from textgen import corpus_text  # noqa: E402
+
+
+class _NullSink:
+    def write(self, data: bytes) -> int:
+        return len(data)
+
+    def flush(self) -> None:
+        pass
+
+
+def bulk(mod, path: Path, per_line: bool, repeat: int) -> tuple[float, float]:
+    """返回 (进程内耗时, 管道耗时)，各取最好成绩。"""
+    best_inproc = best_pipe = float("inf")
+    args = [sys.executable, str(APP_PATH), "--filter"] + (["--filter-per-line"] if per_line else [])
+    for _ in range(repeat):
+        with open(path, "rb") as fh:
+            started = time.perf_counter()
+            mod.StreamTranscoder(fallback_encoding="gbk", per_line=per_line).run(io.BufferedReader(fh), _NullSink())
+            best_inproc = min(best_inproc, time.perf_counter() - started)
+        with open(path, "rb") as fh:
+            started = time.perf_counter()
+            subprocess.run(args, stdin=fh, stdout=subprocess.DEVNULL, check=True)
+            best_pipe = min(best_pipe, time.perf_counter() - started)
+    return best_inproc, best_pipe
+
+
+def round_trips(command: list[str], lines: int) -> list[float]:
+    proc = subprocess.Popen(command, stdin=subprocess.PIPE, stdout=subprocess.PIPE, bufsize=0)
+    samples = []
+    try:
+        for i in range(lines):
+            payload = f"第 {i} 行 build step ok\n".encode("utf-8")
+            started = time.perf_counter()
+            proc.stdin.write(payload)
+            received = b""
+            while not received.endswith(b"\n"):
+                received += os.read(proc.stdout.fileno(), 65536)
+            samples.append(time.perf_counter() - started)
+    finally:
+        proc.stdin.close()
+        proc.wait()
+    return samples[1:]
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=128)
+    parser.add_argument("--lines", type=int, default=200, help="交互延迟测量的行数")
+    parser.add_argument("-r", "--repeat", type=int, default=3)
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    rows = []
+    with tempfile.TemporaryDirectory(prefix="cef-filter-") as tmp:
+        for kind, encoding in (("ascii", "ascii"), ("utf8", "utf-8"), ("utf8", "gbk")):
+            unit = corpus_text(kind, 4 << 20).encode(encoding)
+            path = Path(tmp) / f"{kind}.{encoding}.log"
+            with open(path, "wb") as fh:
+                for _ in range(max(1, (args.size_mb << 20) // len(unit))):
+                    fh.write(unit)
+            mb = path.stat().st_size / (1 << 20)
+            for per_line in (False, True):
+                inproc, pipe = bulk(mod, path, per_line, args.repeat)
+                rows.append((encoding, "逐行回退" if per_line else "自动识别", mb / inproc, mb / pipe))
+            path.unlink()
+
+    print(f"批量吞吐（{args.size_mb} MB，取 {args.repeat} 次最好成绩）")
+    print(f"{'输入':<8}{'模式':<12}{'进程内':>14}{'管道(含启动)':>16}")
+    for encoding, mode, inproc, pipe in rows:
+        print(f"{encoding:<8}{mode:<12}{inproc:>9.0f} MB/s{pipe:>11.0f} MB/s")
+
+    print(f"\n交互延迟（{args.lines} 行，逐行写入后等待回读）")
+    print(f"{'命令':<20}{'中位数':>12}{'P99':>12}")
+    commands = [("--filter", [sys.executable, str(APP_PATH), "--filter"])]
+    if shutil.which("cat"):
+        commands.insert(0, ("cat（对照）", ["cat"]))
+    for label, command in commands:
+        samples = sorted(round_trips(command, args.lines))
+        p99 = samples[min(len(samples) - 1, int(len(samples) * 0.99))]
+        print(f"{label:<20}{statistics.median(samples) * 1e3:>10.3f}ms{p99 * 1e3:>10.3f}ms")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,206 @@
+"""文本热路径基准套件（无界面，可在 Linux 上运行）。
+
+覆盖标记块提取/清理、漂移分析、等效配置判断、JSONC 清洗与宽松解析、VS Code 块追加/移除，
+输入为 1KB~50MB 的合成文件（孤立标记、重复块、压缩 JSON 等变体，见 textgen.py）。
+
+每个用例重复运行取最小值与中位数；结果可保存为基线 JSON，之后的运行与基线比较，
+慢于基线超过阈值即标记为回归并以非零状态退出。基线按机器保存在本地（默认 benchmarks/.baseline/）。
+
+用法：
+  python benchmarks/bench_text_hotpaths.py                      # 1KB~10MB，与基线比较
+  python benchmarks/bench_text_hotpaths.py --sizes all          # 含 50MB
+  python benchmarks/bench_text_hotpaths.py --save-baseline      # 记录当前结果为基线
+  python benchmarks/bench_text_hotpaths.py -k strip_json --sizes 1KB,1MB
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import statistics
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+import textgen  # noqa: E402
+from common import (  # noqa: E402
+    BASELINE_DIR,
+    load_app_module,
+    load_baseline,
+    make_headless_app,
+    run_metadata,
+    sandbox_env,
+    save_baseline,
+)
+
+DEFAULT_BASELINE = BASELINE_DIR / "text_hotpaths.json"
+DEFAULT_SIZES = ["1KB", "64KB", "1MB", "10MB"]
+
+
+class Case:
+    """一个基准用例：setup(size) 生成输入（不计时），run(input) 为被测调用。"""
+
+    def __init__(self, name: str, setup: Callable[[int], object], run: Callable[[object], object]) -> None:
+        self.name = name
+        self.setup = setup
+        self.run = run
+
+
+def build_cases(app, workdir: Path) -> list[Case]:
+    mod = load_app_module()
+    SetupApp = mod.SetupApp
+    ps_block = SetupApp._expected_powershell_block()
+    bash_block = SetupApp._expected_bash_block()
+    PS_START, PS_END = mod.PROFILE_MARKER_START, mod.PROFILE_MARKER_END
+    BASH_START, BASH_END = mod.BASH_MARKER_START, mod.BASH_MARKER_END
+    vscode_block = [ln.strip() for ln in app._append_vscode_block("{\n}\n")[0].splitlines()[1:-1]]
+
+    def ps(variant: str) -> Callable[[int], str]:
+        return lambda size: textgen.shell_text("ps", variant, size, ps_block, PS_START, PS_END)
+
+    def bash(variant: str) -> Callable[[int], str]:
+        return lambda size: textgen.shell_text("bash", variant, size, bash_block, BASH_START, BASH_END)
+
+    def to_file(make: Callable[[int], str], suffix: str) -> Callable[[int], Path]:
+        def setup(size: int) -> Path:
+            path = workdir / f"input-{size}{suffix}"
+            path.write_text(make(size), encoding="utf-8")
+            return path
+
+        return setup
+
+    def settings(variant: str, with_block: bool = False) -> Callable[[int], str]:
+        return lambda size: textgen.settings_json(variant, size, vscode_block if with_block else None)
+
+    cases: list[Case] = []
+    for variant in ("clean", "orphan", "duplicate"):
+        cases.append(
+            Case(
+                f"strip_block_tolerant[{variant}]",
+                ps(variant),
+                lambda text: SetupApp._strip_block_tolerant(text, PS_START, PS_END, ps_block),
+            )
+        )
+        cases.append(
+            Case(
+                f"extract_marker_blocks[{variant}]",
+                bash(variant),
+                lambda text: SetupApp._extract_marker_blocks(text, BASH_START, BASH_END),
+            )
+        )
+    for variant in ("clean", "orphan", "duplicate", "equivalent"):
+        cases.append(
+            Case(
+                f"analyze_marker_block[ps-{variant}]",
+                to_file(ps(variant), f"-{variant}.ps1"),
+                lambda path: app._analyze_marker_block(
+                    path, PS_START, PS_END, ps_block, equivalent_check=SetupApp._equivalent_powershell_profile
+                ),
+            )
+        )
+    cases.append(Case("equivalent_powershell_profile[equivalent]", ps("equivalent"), SetupApp._equivalent_powershell_profile))
+    cases.append(Case("equivalent_powershell_profile[clean]", ps("clean"), SetupApp._equivalent_powershell_profile))
+    cases.append(Case("equivalent_bashrc[equivalent]", bash("equivalent"), SetupApp._equivalent_bashrc))
+    cases.append(Case("equivalent_bashrc[clean]", bash("clean"), SetupApp._equivalent_bashrc))
+    # 追加 24 条与 chcp 同组的站点规则：组内已有规则命中时不再查找其余规则
+    site_rules = [
+        mod.EquivalenceRule("powershell", f"site.{idx}", "session", rf"Import-Module\s+SiteUtf8Module{idx}\b")
+        for idx in range(24)
+    ]
+    many_rules = mod.EquivalenceEngine(mod.DEFAULT_EQUIVALENCE_RULES + tuple(site_rules))
+    cases.append(Case("equivalence_engine[ps+24rules]", ps("equivalent"), many_rules.checker("powershell")))
+    for variant in ("minified", "commented"):
+        cases.append(
+            Case(
+                f"strip_json_comments_and_trailing_commas[{variant}]",
+                settings(variant),
+                SetupApp._strip_json_comments_and_trailing_commas,
+            )
+        )
+        cases.append(Case(f"load_json_relaxed[{variant}]", to_file(settings(variant), f"-{variant}.json"), app._load_json_relaxed))
+    cases.append(Case("append_vscode_block[commented]", settings("commented"), app._append_vscode_block))
+    cases.append(Case("append_vscode_block[with-block]", settings("commented", True), app._append_vscode_block))
+    cases.append(Case("remove_vscode_block[with-block]", settings("commented", True), app._remove_vscode_block))
+    cases.append(Case("remove_vscode_block[minified]", settings("minified"), app._remove_vscode_block))
+    return cases
+
+
+def measure(case: Case, size: int, repeat: int, budget: float) -> dict[str, float]:
+    data = case.setup(size)
+    times: list[float] = []
+    deadline = time.perf_counter() + budget
+    while len(times) < repeat:
+        start = time.perf_counter()
+        case.run(data)
+        times.append(time.perf_counter() - start)
+        # 大输入单次即超预算时不再重复
+        if time.perf_counter() > deadline and times:
+            break
+    best = min(times)
+    return {
+        "min_s": best,
+        "median_s": statistics.median(times),
+        "runs": len(times),
+        "mb_per_s": (size / (1024 * 1024)) / best if best > 0 else float("inf"),
+    }
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", default=",".join(DEFAULT_SIZES), help="逗号分隔，如 1KB,1MB；all 表示全部（含 50MB）")
+    parser.add_argument("-k", dest="keyword", default="", help="只运行名称包含该关键字的用例")
+    parser.add_argument("--repeat", type=int, default=5)
+    parser.add_argument("--budget", type=float, default=2.0, help="单个用例单个规模的重复预算（秒）")
+    parser.add_argument("--baseline", type=Path, default=DEFAULT_BASELINE)
+    parser.add_argument("--save-baseline", action="store_true", help="把本次结果写入基线文件")
+    parser.add_argument("--threshold", type=float, default=0.25, help="慢于基线超过该比例判为回归")
+    parser.add_argument("--json", type=Path, default=None, help="另存本次结果 JSON")
+    args = parser.parse_args()
+
+    size_names = list(textgen.SIZES) if args.sizes == "all" else [s.strip() for s in args.sizes.split(",") if s.strip()]
+    unknown = [s for s in size_names if s not in textgen.SIZES]
+    if unknown:
+        parser.error(f"未知规模: {', '.join(unknown)}（可选 {', '.join(textgen.SIZES)}）")
+
+    baseline = {} if args.save_baseline else load_baseline(args.baseline)
+
+    results: dict[str, dict] = {}
+    regressions: list[str] = []
+    with sandbox_env(), tempfile.TemporaryDirectory(prefix="cef-text-") as tmp:
+        app = make_headless_app()
+        cases = [c for c in build_cases(app, Path(tmp)) if args.keyword in c.name]
+        for case in cases:
+            for size_name in size_names:
+                key = f"{case.name}@{size_name}"
+                res = measure(case, textgen.SIZES[size_name], args.repeat, args.budget)
+                results[key] = res
+                flag = ""
+                base = baseline.get(key)
+                if base:
+                    ratio = res["min_s"] / base["min_s"] if base["min_s"] > 0 else 1.0
+                    flag = f"  x{ratio:.2f}"
+                    if ratio > 1 + args.threshold:
+                        flag += "  回归!"
+                        regressions.append(key)
+                print(f"{key:60s} {res['min_s'] * 1000:10.3f} ms  {res['mb_per_s']:9.1f} MB/s{flag}", flush=True)
+
+    if args.json:
+        payload = {**run_metadata(), "results": results}
+        args.json.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
+    if args.save_baseline:
+        save_baseline(args.baseline, results)
+        print(f"基线已写入 {args.baseline}")
+    if regressions:
+        print(f"\n{len(regressions)} 个用例慢于基线超过 {args.threshold:.0%}：")
+        for key in regressions:
+            print(f"  - {key}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
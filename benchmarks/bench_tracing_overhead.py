@@ -0,0 +1,60 @@
+"""Tracer 开销基准：对比未包装、包装但未启用、启用三种情况下的单次调用耗时，
+并在无界面宿主上跑一次完整检测/配置/恢复，导出 trace 文件供 chrome://tracing 查看。
+
+用法：python benchmarks/bench_tracing_overhead.py [--calls 1000000] [--export trace.json]
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module, make_headless_app, sandbox_env  # noqa: E402
+
+
+def _per_call_ns(func, calls: int) -> float:
+    start = time.perf_counter()
+    for _ in range(calls):
+        func()
+    return (time.perf_counter() - start) / calls * 1e9
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--calls", type=int, default=1_000_000)
+    parser.add_argument("--export", type=Path, default=None, help="写出完整流程的 trace 文件")
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    tracer = mod.Tracer()
+
+    def plain() -> None:
+        return None
+
+    wrapped = tracer.traced("bench.noop")(plain)
+
+    base = _per_call_ns(plain, args.calls)
+    disabled = _per_call_ns(wrapped, args.calls)
+    tracer.enable()
+    tracer.max_events = 0  # 只测记录路径，不保留事件
+    enabled = _per_call_ns(wrapped, min(args.calls, 200_000))
+    print(f"未包装 {base:.0f} ns/次，已包装未启用 {disabled:.0f} ns/次（+{disabled - base:.0f}），启用 {enabled:.0f} ns/次")
+
+    if args.export:
+        mod.TRACER.enable(args.export)
+        with sandbox_env():
+            app = make_headless_app()
+            app._detect_all_paths(log=False)
+            app._run_setup(app._git_exe, [(app._ps5_profile_path, "Windows PowerShell 5.1")])
+            app._run_restore()
+        out = mod.TRACER.export()
+        print(f"已导出 {len(mod.TRACER.events())} 个 span 到 {out}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
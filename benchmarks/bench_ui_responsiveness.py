@@ -0,0 +1,135 @@
+"""UI 响应性基准：在检测 / 执行配置 / 恢复期间测量 Tk 事件循环的最长停顿。
+
+原理：主线程每 HEARTBEAT_MS 预约一次心跳，两次心跳的实际间隔减去预期间隔即为停顿。
+在伪目录环境中运行（不触碰真实用户配置），需要可用的图形显示。
+
+用法：python benchmarks/bench_ui_responsiveness.py [--rounds N] [--budget-ms 50]
+"""
+
+from __future__ import annotations
+
+import argparse
+import json
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import has_display, load_app_module, sandbox_env  # noqa: E402
+
+HEARTBEAT_MS = 5
+PHASE_TIMEOUT = 60.0
+
+
+class StallMeter:
+    """记录心跳间隔中超出预期的部分。"""
+
+    def __init__(self, root) -> None:
+        self.root = root
+        self.max_stall = 0.0
+        self._last = time.perf_counter()
+        self._active = False
+
+    def start(self) -> None:
+        self._active = True
+        self._last = time.perf_counter()
+        self.root.after(HEARTBEAT_MS, self._tick)
+
+    def reset(self) -> None:
+        self.max_stall = 0.0
+        self._last = time.perf_counter()
+
+    def stop(self) -> None:
+        self._active = False
+
+    def _tick(self) -> None:
+        now = time.perf_counter()
+        stall = now - self._last - HEARTBEAT_MS / 1000
+        if stall > self.max_stall:
+            self.max_stall = stall
+        self._last = now
+        if self._active:
+            self.root.after(HEARTBEAT_MS, self._tick)
+
+
+def run(rounds: int) -> dict[str, list[float]]:
+    import tkinter as tk
+
+    mod = load_app_module()
+    results: dict[str, list[float]] = {"detect": [], "apply": [], "restore": []}
+    with sandbox_env():
+        root = tk.Tk()
+        app = mod.SetupApp(root)
+        # 模态框直接确认，避免阻塞流程
+        app._show_modal = lambda *args, **kwargs: True
+        meter = StallMeter(root)
+
+        def idle() -> bool:
+            return not app.is_running and not app._detecting
+
+        phases = [
+            ("detect", lambda: app._detect_all_paths_in_thread(log=True)),
+            ("apply", app._start_setup),
+            ("restore", app._restore_configs),
+        ]
+        plan = [phase for _ in range(rounds) for phase in phases]
+
+        def wait_idle(then) -> None:
+            deadline = time.perf_counter() + PHASE_TIMEOUT
+
+            def poll() -> None:
+                if idle() or time.perf_counter() > deadline:
+                    then()
+                else:
+                    root.after(HEARTBEAT_MS, poll)
+
+            poll()
+
+        def next_phase() -> None:
+            if not plan:
+                meter.stop()
+                root.after(50, root.destroy)
+                return
+            name, action = plan.pop(0)
+            meter.reset()
+            action()
+
+            def record() -> None:
+                results[name].append(meter.max_stall * 1000)
+                root.after(20, next_phase)
+
+            # 给工作线程一点时间置位 is_running / _detecting
+            root.after(HEARTBEAT_MS, lambda: wait_idle(record))
+
+        meter.start()
+        # 启动时的自动检测完成后再开始计时
+        root.after(200, lambda: wait_idle(next_phase))
+        root.mainloop()
+    return results
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--rounds", type=int, default=3)
+    parser.add_argument("--budget-ms", type=float, default=50.0, help="单阶段允许的最长停顿")
+    parser.add_argument("--json", action="store_true", help="以 JSON 输出结果")
+    args = parser.parse_args()
+
+    if not has_display():
+        print("跳过：当前环境没有图形显示（DISPLAY 未设置）。")
+        return 0
+
+    results = run(args.rounds)
+    summary = {name: {"max_stall_ms": round(max(vals), 2) if vals else None, "runs": len(vals)} for name, vals in results.items()}
+    if args.json:
+        print(json.dumps(summary, ensure_ascii=False, indent=2))
+    else:
+        for name, info in summary.items():
+            print(f"{name:8s} 最长停顿 {info['max_stall_ms']} ms（{info['runs']} 次）")
+    worst = max((v for vals in results.values() for v in vals), default=0.0)
+    return 1 if worst > args.budget_ms else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,107 @@
+"""ZIP 成员名改写（--zip-utf8）：吞吐与磁盘复制的对比，以及内存占用。
+
+生成一个约 --size-mb 的压缩包（--members 个成员，名称为 GBK 编码的中文且未置 UTF-8 标志，
+内容为不可压缩的随机数据），测量：
+  - 改写耗时与吞吐，对照 shutil.copyfile 复制同一文件；
+  - 改写过程的 Python 内存峰值（tracemalloc，单独运行；只随成员数增长，与压缩包大小无关）；
+  - 用 zipfile 打开结果，核对成员名与 CRC。
+
+用法：
+  python benchmarks/bench_zip_names.py
+  python benchmarks/bench_zip_names.py --size-mb 4096 --members 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import os
+import shutil
+import struct
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module  # noqa: E402
+
+WORDS = ("项目", "文档", "报告", "说明", "第一章", "会议记录", "数据", "备份", "图片", "合同")
+
+
+def build(path: Path, size: int, members: int) -> list[str]:
+    """用 zipfile 写出后，把本地文件头与中央目录中的 UTF-8 名称改回 GBK 并清除标志位 11（模拟中文 Windows 的压缩包）。"""
+    names = [f"{WORDS[i % len(WORDS)]}/{WORDS[(i // 7) % len(WORDS)]}{i}.bin" for i in range(members)]
+    chunk = os.urandom(1 << 20)
+    per_member = max(1, size // members)
+    with zipfile.ZipFile(path, "w", zipfile.ZIP_STORED) as zf:
+        for name in names:
+            with zf.open(name, "w", force_zip64=per_member > (1 << 30)) as out:
+                remaining = per_member
+                while remaining > 0:
+                    out.write(chunk[: min(remaining, len(chunk))])
+                    remaining -= len(chunk)
+    # 名称只会变短（UTF-8 三字节 → GBK 两字节），原地改写需要移动数据，这里借助改写器的反向操作完成
+    mod = load_app_module()
+    encode_back = mod.ZipNameRewriter("utf-8")
+    encode_back.convert_name = lambda raw, flags, legacy=True: (raw.decode("utf-8").encode("gbk"), "converted")  # type: ignore[method-assign]
+    original_flag = encode_back.UTF8_FLAG
+    tmp = path.with_suffix(".gbk.zip")
+    encode_back.rewrite(path, tmp)
+    with open(tmp, "r+b") as fh:
+        data = bytearray(fh.read())
+        for sig, flag_at in ((b"PK\x03\x04", 6), (b"PK\x01\x02", 8)):
+            pos = data.find(sig)
+            while pos >= 0:
+                (flags,) = struct.unpack_from("<H", data, pos + flag_at)
+                struct.pack_into("<H", data, pos + flag_at, flags & ~original_flag)
+                pos = data.find(sig, pos + 4)
+        fh.seek(0)
+        fh.write(data)
+    os.replace(tmp, path)
+    return names
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--size-mb", type=int, default=512)
+    parser.add_argument("--members", type=int, default=5000)
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    with tempfile.TemporaryDirectory(prefix="cef-zip-") as tmp:
+        source = Path(tmp) / "archive.zip"
+        names = build(source, args.size_mb << 20, args.members)
+        size_mb = source.stat().st_size / (1 << 20)
+        with zipfile.ZipFile(source) as zf:
+            garbled = sum(name not in names for name in zf.namelist())
+
+        started = time.perf_counter()
+        shutil.copyfile(source, Path(tmp) / "copy.zip")
+        copy_elapsed = time.perf_counter() - started
+        (Path(tmp) / "copy.zip").unlink()
+
+        output = Path(tmp) / "archive.utf8.zip"
+        stats = mod.ZipNameRewriter().rewrite(source, output)
+        # tracemalloc 会显著拖慢逐成员的处理，内存峰值单独再跑一次测量
+        tracemalloc.start()
+        mod.ZipNameRewriter().rewrite(source, Path(tmp) / "traced.zip")
+        _current, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+        with zipfile.ZipFile(output) as zf:
+            matched = zf.namelist() == names
+            bad = zf.testzip()
+
+    elapsed = float(stats["elapsed"])
+    print(f"压缩包 {size_mb:.0f} MB，{stats['entries']} 个成员，改写前 zipfile 读出乱码名称 {garbled} 个")
+    print(f"{'操作':<16}{'耗时':>10}{'吞吐':>14}")
+    print(f"{'shutil.copyfile':<16}{copy_elapsed:>8.2f} s{size_mb / copy_elapsed:>9.0f} MB/s")
+    print(f"{'--zip-utf8':<16}{elapsed:>8.2f} s{size_mb / elapsed:>9.0f} MB/s")
+    print(f"转换 {stats['converted']} 个；内存峰值 {peak / (1 << 20):.1f} MB；名称全部正确: {matched}；CRC 校验: {bad or '通过'}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,100 @@
+"""字节二元组编码分类器（EncodingClassifier / --detect-encoding）的边界用例检查。
+
+1. 只有一个高位字节的文件（单独分类、位于批次末尾或中间）不报错，结果为空列表，且不影响同批其他文件；
+2. 只读文件开头（截断在多字节字符中间）的合法 UTF-8 仍判为 UTF-8；不是截断读取时，末尾不完整的字符照常视为非法；
+3. 以上在 NumPy 批量路径与纯 Python 后备路径下结果一致。
+
+任一检查失败时打印反例并以非零状态退出。
+
+用法：
+  python benchmarks/check_encoding_classifier.py
+"""
+
+from __future__ import annotations
+
+import argparse
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module  # noqa: E402
+
+GBK_TEXT = "今天上午，项目组在会议室讨论了下一季度的开发计划。".encode("gbk")
+UTF8_TEXT = "配置文件不存在时使用默认设置，并在日志中记录警告。".encode("utf-8")
+
+
+def check_short_blobs(mod) -> list[str]:
+    classifier = mod.EncodingClassifier()
+    failures: list[str] = []
+    for label, blobs in (
+        ("末尾单字节", [GBK_TEXT, b"\xb5"]),
+        ("中间单字节", [GBK_TEXT, b"\xb5", GBK_TEXT]),
+        ("仅单字节", [b"\xb5", b"\xa4"]),
+        ("高位字节结尾", [GBK_TEXT, b"a\xb5"]),
+    ):
+        try:
+            results = classifier.classify_many(blobs)
+        except Exception as exc:  # noqa: BLE001
+            failures.append(f"{label}: {type(exc).__name__}: {exc}")
+            continue
+        for blob, ranked in zip(blobs, results):
+            if len(blob) == 1 and ranked != []:
+                failures.append(f"{label}: {blob!r} 应为 []，实际 {ranked}")
+            if blob == GBK_TEXT and ranked != classifier.classify(GBK_TEXT):
+                failures.append(f"{label}: 同批的 GBK 文本结果被单字节文件改变 {ranked}")
+    single = classifier.classify(b"\xb5")
+    if single != []:
+        failures.append(f"classify(b'\\xb5') 应为 []，实际 {single}")
+    return failures
+
+
+def check_truncated_utf8(mod) -> list[str]:
+    classifier = mod.EncodingClassifier()
+    failures: list[str] = []
+    # 在每个可能的位置截断（包括多字节字符中间）
+    for cut in range(len(UTF8_TEXT) - 8, len(UTF8_TEXT)):
+        head = UTF8_TEXT[:cut]
+        ranked = classifier.classify(head, truncated=True)
+        if not ranked or ranked[0][0] != "utf-8":
+            failures.append(f"截断于 {cut} 字节的 UTF-8 开头: {ranked}")
+    # 非截断读取：结尾缺半个字符的不是合法 UTF-8
+    broken = UTF8_TEXT[:-1]
+    if classifier.classify(broken) == [("utf-8", 1.0)]:
+        failures.append("非截断读取时，末尾不完整的 UTF-8 被判为 UTF-8")
+    return failures
+
+
+def check_fallback(mod) -> list[str]:
+    """纯 Python 后备路径与 NumPy 路径的结果一致（未安装 NumPy 时两者相同，检查照常通过）。"""
+    blobs = [GBK_TEXT, b"\xb5", UTF8_TEXT[:-1], b"a\xb5", GBK_TEXT + b"\xb5"]
+    expected = mod.EncodingClassifier().classify_many(blobs)
+    numpy_loader = mod._optional_numpy
+    mod._optional_numpy = lambda: None
+    try:
+        actual = mod.EncodingClassifier().classify_many(blobs)
+    finally:
+        mod._optional_numpy = numpy_loader
+    failures: list[str] = []
+    for blob, left, right in zip(blobs, expected, actual):
+        if [name for name, _ in left] != [name for name, _ in right] or any(
+            abs(a - b) > 1e-3 for (_, a), (_, b) in zip(left, right)
+        ):
+            failures.append(f"{blob[:12]!r}: NumPy {left} / 纯 Python {right}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.parse_args()
+
+    mod = load_app_module()
+    failures = check_short_blobs(mod) + check_truncated_utf8(mod) + check_fallback(mod)
+    for failure in failures[:10]:
+        print(f"[FAIL] {failure}")
+    print(f"边界用例检查：失败 {len(failures)} 个")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,147 @@
+"""等效配置判定（EquivalenceEngine）的一致性检查：与改造前的逐条正则实现逐一对比判定结果。
+
+1. 随机生成 PowerShell profile / .bashrc（含分行书写的 $PSDefaultParameterValues 哈希表、缩进、空行、
+   大小写变化与干扰行），新旧实现的 (是否等效, 说明) 必须完全一致；
+2. 规则重叠：与内置规则在同一位置命中的站点规则仍要计入，命中行号指向规则所在行而不是前面的空行。
+
+任一检查失败时打印反例并以非零状态退出。
+
+用法：
+  python benchmarks/check_equivalence.py
+  python benchmarks/check_equivalence.py --samples 20000
+"""
+
+from __future__ import annotations
+
+import argparse
+import random
+import re
+import sys
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent))
+
+from common import load_app_module  # noqa: E402
+
+
+# ---- 改造前的实现（判定语义的基准） ----
+
+
+def legacy_powershell(text: str) -> tuple[bool, str]:
+    has_input = bool(re.search(r"\[console\]::\s*inputencoding\s*=\s*.*utf8", text, flags=re.IGNORECASE))
+    has_output = bool(re.search(r"\[console\]::\s*outputencoding\s*=\s*.*utf8", text, flags=re.IGNORECASE))
+    has_outputencoding = bool(re.search(r"\$outputencoding\s*=\s*.*utf8", text, flags=re.IGNORECASE))
+    lower = text.lower()
+    has_psdefaults = ("$psdefaultparametervalues" in lower) and (":encoding" in lower) and ("utf8" in lower)
+    has_chcp = bool(re.search(r"(?:^|\s)chcp\s+65001\b", text, flags=re.IGNORECASE))
+    ok = has_input and has_output and (has_psdefaults or has_outputencoding or has_chcp)
+    if not ok:
+        return False, ""
+    reasons: list[str] = []
+    if has_chcp:
+        reasons.append("检测到 chcp 65001")
+    if has_outputencoding:
+        reasons.append("检测到 $OutputEncoding=UTF-8")
+    if has_psdefaults:
+        reasons.append("检测到 PSDefaultParameterValues(Encoding)")
+    return True, "；".join(reasons) if reasons else "检测到关键 UTF-8 设置"
+
+
+def legacy_bashrc(text: str) -> tuple[bool, str]:
+    flags = re.IGNORECASE | re.MULTILINE
+    has_lang = bool(re.search(r"^\s*export\s+LANG\s*=\s*['\"]?.*utf-?8", text, flags=flags))
+    has_lc_all = bool(re.search(r"^\s*export\s+LC_ALL\s*=\s*['\"]?.*utf-?8", text, flags=flags))
+    lower = text.lower()
+    has_git = ("core.quotepath" in lower) or ("i18n.commitencoding" in lower) or ("i18n.logoutputencoding" in lower)
+    if not (has_lang and has_lc_all and has_git):
+        return False, ""
+    return True, "检测到 LANG/LC_ALL 为 UTF-8 且包含 git 编码配置"
+
+
+# ---- 随机输入 ----
+
+PS_PIECES = (
+    ["[Console]::InputEncoding = [System.Text.UTF8Encoding]::new()", "[console]::inputencoding=[text.encoding]::UTF8"],
+    ["[Console]::OutputEncoding = [System.Text.UTF8Encoding]::new()", "[CONSOLE]::OutputEncoding = 'utf8'"],
+    ["chcp 65001 | Out-Null", "& chcp 65001 > $null"],
+    ["$OutputEncoding = [System.Text.UTF8Encoding]::new()", "$outputencoding = 'utf8'"],
+    [
+        "$PSDefaultParameterValues['Out-File:Encoding'] = 'utf8'",
+        "$PSDefaultParameterValues = @{\n    'Out-File:Encoding' = 'utf8'\n    '*:Encoding' = 'utf8'\n}",
+        "$PSDefaultParameterValues = @{\n  'Set-Content:Encoding' =\n    'UTF8'\n}",
+        "$PSDefaultParameterValues = @{}\n$PSDefaultParameterValues.Add('*:Encoding', 'utf8')",
+    ],
+)
+PS_NOISE = ["Set-Alias ll Get-ChildItem", "Import-Module posh-git", "# comment", "", "    "]
+BASH_PIECES = (
+    ['export LANG="zh_CN.UTF-8"', "  export LANG=en_US.utf8", "\n\nexport LANG=C.UTF-8"],
+    ['export LC_ALL="zh_CN.UTF-8"', "\texport LC_ALL=en_US.UTF8"],
+    ["git config --global core.quotepath false", "git config --global i18n.commitEncoding utf-8"],
+)
+BASH_NOISE = ["alias ll='ls -alF'", 'export PATH="$HOME/bin:$PATH"', "# comment", "", "   "]
+
+
+def random_text(rng: random.Random, pieces, noise) -> str:
+    lines = [rng.choice(noise) for _ in range(rng.randint(0, 6))]
+    for options in pieces:
+        if rng.random() < 0.8:
+            lines.insert(rng.randint(0, len(lines)), rng.choice(options))
+    return "\n".join(lines) + "\n"
+
+
+def check_random(mod, samples: int) -> list[str]:
+    rng = random.Random(0)
+    failures: list[str] = []
+    for _ in range(samples):
+        for pieces, noise, legacy, new in (
+            (PS_PIECES, PS_NOISE, legacy_powershell, mod._equivalent_powershell_profile),
+            (BASH_PIECES, BASH_NOISE, legacy_bashrc, mod._equivalent_bashrc),
+        ):
+            text = random_text(rng, pieces, noise)
+            if legacy(text) != new(text):
+                failures.append(f"{legacy.__name__}: 旧 {legacy(text)} / 新 {new(text)}\n{text}")
+    return failures
+
+
+def check_overlap(mod) -> list[str]:
+    failures: list[str] = []
+    bashrc = '\n\nexport LANG="zh_CN.UTF-8"\nexport LC_ALL="zh_CN.UTF-8"\ngit config --global core.quotepath false\n'
+    engine = mod.EquivalenceEngine(mod.DEFAULT_EQUIVALENCE_RULES)
+    errors = engine.set_site_rules(
+        [{"profile": "bash", "name": "site.lang", "group": "locale_utf8", "pattern": r"export\s+LANG=\S*UTF-8"}]
+    )
+    result = engine.evaluate("bash", bashrc)
+    if errors or not result.ok:
+        failures.append(f"与 bash.lang 同位置命中的站点规则被遮住: {result}")
+    expected = {("bash.lang", 3), ("site.lang", 3), ("bash.lc_all", 4), ("bash.git_quotepath", 5)}
+    if set(result.matches) != expected:
+        failures.append(f"命中或行号不符: {result.matches}，应为 {sorted(expected)}")
+    # 同一位置的三条重叠规则全部计入，且各只记录一次
+    engine = mod.EquivalenceEngine(
+        [
+            mod.EquivalenceRule("x", "a", "g1", r"chcp"),
+            mod.EquivalenceRule("x", "b", "g2", r"chcp\s+65001"),
+            mod.EquivalenceRule("x", "c", "g3", r"\bc\w+"),
+        ]
+    )
+    result = engine.evaluate("x", "line\n  chcp 65001\n")
+    if not result.ok or sorted(result.matches) != [("a", 2), ("b", 2), ("c", 2)]:
+        failures.append(f"重叠规则: {result}")
+    return failures
+
+
+def main() -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--samples", type=int, default=5000)
+    args = parser.parse_args()
+
+    mod = load_app_module()
+    failures = check_random(mod, args.samples) + check_overlap(mod)
+    for failure in failures[:10]:
+        print(f"[FAIL] {failure}")
+    print(f"随机输入 {args.samples * 2} 个、重叠规则用例 2 组：失败 {len(failures)} 个")
+    return 1 if failures else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
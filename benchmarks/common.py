@@ -0,0 +1,209 @@
+"""基准脚本公共工具：加载主模块、构造隔离的伪 Windows 目录环境。"""
+
+from __future__ import annotations
+
+import contextlib
+import importlib.util
+import os
+import stat
+import sys
+import tempfile
+from pathlib import Path
+from types import ModuleType
+
+REPO_ROOT = Path(__file__).resolve().parents[1]
+APP_PATH = REPO_ROOT / "Code-encoding-fix.py"
+
+_module: ModuleType | None = None
+
+
+def load_app_module() -> ModuleType:
+    """按文件路径加载 Code-encoding-fix.py（文件名含连字符，无法直接 import）。"""
+    global _module
+    if _module is None:
+        spec = importlib.util.spec_from_file_location("code_encoding_fix", APP_PATH)
+        assert spec and spec.loader
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[spec.name] = module
+        spec.loader.exec_module(module)
+        _module = module
+    return _module
+
+
+def _write_stub_exe(path: Path) -> None:
+    """写入可执行的占位程序：--version 返回 0，供 _verify_bash 等调用。"""
+    path.parent.mkdir(parents=True, exist_ok=True)
+    path.write_text("#!/bin/sh\nexit 0\n", encoding="utf-8")
+    path.chmod(path.stat().st_mode | stat.S_IXUSR | stat.S_IXGRP | stat.S_IXOTH)
+
+
+START_MENU_SHORTCUTS = (
+    "Git/Git Bash.lnk",
+    "Git/Git CMD.lnk",
+    "Windows PowerShell/Windows PowerShell.lnk",
+    "Windows PowerShell/Windows PowerShell ISE.lnk",
+    "PowerShell/PowerShell 7 (x64).lnk",
+    "Visual Studio Code/Visual Studio Code.lnk",
+)
+
+
+def build_fake_tree(root: Path, path_stubs: bool = True) -> dict[str, str]:
+    """在 root 下构造 Program Files / System32 / AppData / 开始菜单 / 用户目录，返回需设置的环境变量。
+
+    path_stubs=True 时把 powershell、pwsh、git、code 的占位程序链接到 root/bin 并前置到 PATH（命中快速路径）；
+    False 时 PATH 只含空目录，检测需走 Program Files 枚举、卸载注册表与开始菜单等回退路径。
+    """
+    home = root / "Users" / "bench"
+    appdata = home / "AppData" / "Roaming"
+    local_appdata = home / "AppData" / "Local"
+    program_files = root / "Program Files"
+    program_data = root / "ProgramData"
+    system_root = root / "Windows"
+    vscode_root = local_appdata / "Programs" / "Microsoft VS Code"
+
+    executables = {
+        "powershell": system_root / "System32" / "WindowsPowerShell" / "v1.0" / "powershell.exe",
+        "pwsh": program_files / "PowerShell" / "7" / "pwsh.exe",
+        "git": program_files / "Git" / "cmd" / "git.exe",
+        "code": vscode_root / "bin" / "code.cmd",
+    }
+    _write_stub_exe(program_files / "Git" / "bin" / "bash.exe")
+    _write_stub_exe(system_root / "System32" / "cmd.exe")
+    _write_stub_exe(vscode_root / "Code.exe")
+    _write_stub_exe(local_appdata / "Microsoft" / "WindowsApps" / "wt.exe")
+    for exe in executables.values():
+        _write_stub_exe(exe)
+
+    # 开始菜单快捷方式仅作占位（.lnk 内容由 PowerShell COM 解析，非 Windows 上解析结果为空）
+    for menu_root in (program_data, appdata):
+        programs = menu_root / "Microsoft" / "Windows" / "Start Menu" / "Programs"
+        for rel in START_MENU_SHORTCUTS:
+            lnk = programs / rel
+            lnk.parent.mkdir(parents=True, exist_ok=True)
+            lnk.write_bytes(b"L\x00\x00\x00")
+
+    bin_dir = root / "bin"
+    bin_dir.mkdir(parents=True, exist_ok=True)
+    if path_stubs:
+        for name, target in executables.items():
+            link = bin_dir / name
+            if not link.exists():
+                link.symlink_to(target)
+
+    (home / "Documents").mkdir(parents=True, exist_ok=True)
+    settings = appdata / "Code" / "User" / "settings.json"
+    settings.parent.mkdir(parents=True, exist_ok=True)
+    settings.write_text('{\n  // 用户设置\n  "editor.fontSize": 14,\n}\n', encoding="utf-8")
+    (home / ".bashrc").write_text("alias ll='ls -l'\n", encoding="utf-8")
+    program_data.mkdir(parents=True, exist_ok=True)
+
+    # 保留系统目录以便 /bin/sh 等仍可用，但让占位程序优先
+    path = os.pathsep.join([str(bin_dir), "/usr/bin", "/bin"]) if path_stubs else str(bin_dir)
+    return {
+        "HOME": str(home),
+        "USERPROFILE": str(home),
+        "APPDATA": str(appdata),
+        "LOCALAPPDATA": str(local_appdata),
+        "ProgramFiles": str(program_files),
+        "ProgramW6432": str(program_files),
+        "ProgramFiles(x86)": str(root / "Program Files (x86)"),
+        "ProgramData": str(program_data),
+        "SystemRoot": str(system_root),
+        "PATH": path,
+    }
+
+
+def fake_registry_data(env: dict[str, str], noise: int = 300) -> dict[str, dict[str, dict[str, object]]]:
+    """伪注册表内容：卸载项（Git / PowerShell 7 / VS Code 及 noise 条无关软件）、控制台与用户环境变量。"""
+    uninstall = r"Software\Microsoft\Windows\CurrentVersion\Uninstall"
+    program_files = Path(env["ProgramFiles"])
+    hklm: dict[str, dict[str, object]] = {
+        rf"{uninstall}\Git_is1": {"DisplayName": "Git", "InstallLocation": str(program_files / "Git")},
+        rf"{uninstall}\{{PowerShell-7-x64}}": {
+            "DisplayName": "PowerShell 7-x64",
+            "InstallLocation": str(program_files / "PowerShell" / "7"),
+        },
+    }
+    for i in range(noise):
+        hklm[rf"{uninstall}\{{Noise-{i:04d}}}"] = {
+            "DisplayName": f"Example Runtime {i}",
+            "InstallLocation": str(program_files / f"Example {i}"),
+        }
+    hkcu: dict[str, dict[str, object]] = {
+        rf"{uninstall}\{{771FD6B0-FA20-440A-A002-3B3BAC16DC50}}_is1": {
+            "DisplayName": "Microsoft Visual Studio Code (User)",
+            "InstallLocation": str(Path(env["LOCALAPPDATA"]) / "Programs" / "Microsoft VS Code"),
+        },
+        "Console": {"FaceName": "Consolas", "FontSize": 0x100000},
+        "Environment": {"TEMP": str(Path(env["LOCALAPPDATA"]) / "Temp")},
+    }
+    return {"HKLM": hklm, "HKCU": hkcu}
+
+
+@contextlib.contextmanager
+def sandbox_env(root: Path | None = None, path_stubs: bool = True):
+    """临时切换到伪目录环境；退出时恢复原环境变量。产出 (根目录, 环境变量字典)。"""
+    with contextlib.ExitStack() as stack:
+        if root is None:
+            root = Path(stack.enter_context(tempfile.TemporaryDirectory(prefix="cef-bench-")))
+        env = build_fake_tree(root, path_stubs=path_stubs)
+        saved = {k: os.environ.get(k) for k in env}
+        os.environ.update(env)
+        try:
+            yield root, env
+        finally:
+            for key, value in saved.items():
+                if value is None:
+                    os.environ.pop(key, None)
+                else:
+                    os.environ[key] = value
+
+
+def has_display() -> bool:
+    """Tk 能否创建窗口（无 DISPLAY 的 Linux 上返回 False）。"""
+    if sys.platform.startswith("win") or sys.platform == "darwin":
+        return True
+    return bool(os.environ.get("DISPLAY") or os.environ.get("WAYLAND_DISPLAY"))
+
+
+
+def make_headless_app(registry=None, debug: bool = False):
+    """构造不创建任何 Tk 控件的 SetupApp（见主模块 HeadlessSetupApp）：日志收集到 app.logs，
+    模态框直接确认，检测/配置/恢复流程可直接同步调用。"""
+    return load_app_module().HeadlessSetupApp(registry=registry, debug=debug)
+
+
+BASELINE_DIR = Path(__file__).resolve().parent / ".baseline"
+
+
+def run_metadata() -> dict[str, str]:
+    """结果文件附带的运行环境信息。"""
+    import platform
+    import time
+
+    return {
+        "python": sys.version.split()[0],
+        "platform": platform.platform(),
+        "created": time.strftime("%Y-%m-%d %H:%M:%S"),
+    }
+
+
+def load_baseline(path: Path) -> dict[str, dict]:
+    """读取基线结果；文件不存在或损坏时返回空字典。"""
+    import json
+
+    try:
+        return json.loads(path.read_text(encoding="utf-8")).get("results", {})
+    except (OSError, ValueError):
+        return {}
+
+
+def save_baseline(path: Path, results: dict[str, dict]) -> None:
+    """合并写入基线：只覆盖本次运行过的用例，保留其余条目。"""
+    import json
+
+    merged = load_baseline(path)
+    merged.update(results)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    payload = {**run_metadata(), "results": merged}
+    path.write_text(json.dumps(payload, ensure_ascii=False, indent=2), encoding="utf-8")
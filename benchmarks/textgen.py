@@ -0,0 +1,166 @@
+"""基准用合成输入：按目标大小生成 PowerShell profile / .bashrc / settings.json 文本。
+
+变体：
+- clean：单个标准配置块 + 填充内容
+- orphan：只有开始标记的残缺块
+- duplicate：两个配置块
+- equivalent：无标记但含等效 UTF-8 设置
+- minified：单行紧凑 JSON（仅 settings.json）
+- commented：带 // 与 /* */ 注释、尾逗号的 JSONC（仅 settings.json）
+
+另有编码扫描语料（corpus_text）：纯 ASCII 源码、中文日志与按 Windows cp936 误解码的乱码行。
+"""
+
+from __future__ import annotations
+
+import codecs
+import json
+import random
+
+SIZES = {
+    "1KB": 1024,
+    "64KB": 64 * 1024,
+    "1MB": 1024 * 1024,
+    "10MB": 10 * 1024 * 1024,
+    "50MB": 50 * 1024 * 1024,
+}
+
+_PS_FILLER = [
+    "Set-Alias ll Get-ChildItem",
+    "function prompt { \"PS $($executionContext.SessionState.Path.CurrentLocation)> \" }",
+    "# 用户自定义：导入常用模块",
+    "Import-Module posh-git -ErrorAction SilentlyContinue",
+    "$env:PATH += ';C:\\Tools\\bin'",
+]
+_BASH_FILLER = [
+    "alias ll='ls -alF'",
+    "export PATH=\"$HOME/bin:$PATH\"",
+    "# 用户自定义：历史记录",
+    "HISTSIZE=10000",
+    "[ -f ~/.git-completion.bash ] && . ~/.git-completion.bash",
+]
+
+
+def _fill(lines: list[str], size: int) -> list[str]:
+    out: list[str] = []
+    total = 0
+    i = 0
+    while total < size:
+        line = f"{lines[i % len(lines)]}  # {i}"
+        out.append(line)
+        total += len(line.encode("utf-8")) + 1
+        i += 1
+    return out
+
+
+def shell_text(kind: str, variant: str, size: int, block: str, start: str, end: str) -> str:
+    """kind 为 "ps" 或 "bash"；block 为含标记的标准配置块。"""
+    filler = _fill(_PS_FILLER if kind == "ps" else _BASH_FILLER, max(0, size - len(block.encode("utf-8"))))
+    half = len(filler) // 2
+    head, tail = filler[:half], filler[half:]
+    if variant == "clean":
+        body = head + [block] + tail
+    elif variant == "orphan":
+        inner = block.split("\n")[1:-1]
+        body = head + [start] + inner[: len(inner) // 2] + tail
+    elif variant == "duplicate":
+        body = head + [block] + tail + [block]
+    elif variant == "equivalent":
+        if kind == "ps":
+            equiv = [
+                "chcp 65001 | Out-Null",
+                "[Console]::InputEncoding = [System.Text.UTF8Encoding]::new()",
+                "[Console]::OutputEncoding = [System.Text.UTF8Encoding]::new()",
+                "$OutputEncoding = [System.Text.UTF8Encoding]::new()",
+            ]
+        else:
+            equiv = [
+                'export LANG="zh_CN.UTF-8"',
+                'export LC_ALL="zh_CN.UTF-8"',
+                "git config --global core.quotepath false",
+            ]
+        body = head + equiv + tail
+    else:
+        raise ValueError(variant)
+    return "\n".join(body) + "\n"
+
+
+def settings_json(variant: str, size: int, block_lines: list[str] | None = None) -> str:
+    """生成 VS Code settings.json；block_lines 为工具标记块（不含缩进与换行）。"""
+    entries: list[tuple[str, object]] = []
+    total = 0
+    i = 0
+    while total < size:
+        key = f"ext{i % 97}.setting{i}"
+        value: object = [f"值{i}", i, True] if i % 5 == 0 else (f"https://example.com/{i}//path" if i % 3 == 0 else i)
+        entries.append((key, value))
+        total += len(key) + 24
+        i += 1
+    if variant == "minified":
+        return json.dumps(dict(entries), ensure_ascii=False, separators=(",", ":"))
+    lines = ["{"]
+    for idx, (key, value) in enumerate(entries):
+        if variant == "commented" and idx % 7 == 0:
+            lines.append(f"    // 注释 {idx}: 用户设置")
+        if variant == "commented" and idx % 53 == 0:
+            lines.append(f"    /* 块注释 {idx} */")
+        lines.append(f"    {json.dumps(key)}: {json.dumps(value, ensure_ascii=False)},")
+    if block_lines:
+        lines.extend(f"    {ln}" for ln in block_lines)
+    elif variant != "commented":
+        lines[-1] = lines[-1].rstrip(",")
+    lines.append("}")
+    return "\n".join(lines) + "\n"
+
+
+# ---- 编码扫描语料 ----
+
+LOG_LINES = [
+    "2024-05-01 12:00:{i:02d} INFO  服务启动完成，监听端口 8080",
+    "2024-05-01 12:00:{i:02d} WARN  连接数据库失败，正在重试（第 {i} 次）",
+    "2024-05-01 12:00:{i:02d} INFO  配置文件已保存到 C:\\Users\\dev\\AppData\\Roaming",
+    "2024-05-01 12:00:{i:02d} DEBUG request id={i} path=/api/v1/items status=200",
+    "2024-05-01 12:00:{i:02d} ERROR 编码问题导致终端输出乱码，请检查代码页设置",
+    "2024-05-01 12:00:{i:02d} INFO  用户“张三”登录成功；耗时 {i} ms",
+]
+ASCII_LINES = [
+    "def handler_{i}(request):",
+    "    return {{'status': 200, 'id': {i}}}",
+    "# TODO: cleanup item {i}",
+    "export const value{i} = {i} * 2;",
+]
+
+
+def _windows_cp936_error(exc: UnicodeDecodeError) -> tuple[str, int]:
+    # 模拟 Windows 代码页 936：0x80 映射为 €，其余非法字节写为 '?'
+    bad = exc.object[exc.start : exc.start + 1]
+    return ("€" if bad == b"\x80" else "?"), exc.start + 1
+
+
+codecs.register_error("bench-cp936", _windows_cp936_error)
+
+
+def mojibake(text: str, times: int = 1) -> str:
+    """把 UTF-8 文本按 Windows cp936 解码 times 次，得到“鍙戦€?”式乱码。"""
+    for _ in range(times):
+        text = text.encode("utf-8").decode("gbk", "bench-cp936")
+    return text
+
+
+def corpus_text(kind: str, size: int, seed: int = 0) -> str:
+    """kind: ascii / utf8（中文日志）/ mojibake（每 4 行 1 行乱码）/ double（含两次误转的行）。"""
+    rng = random.Random(seed)
+    lines: list[str] = []
+    total = 0
+    i = 0
+    while total < size:
+        if kind == "ascii":
+            line = rng.choice(ASCII_LINES).format(i=i % 60)
+        else:
+            line = rng.choice(LOG_LINES).format(i=i % 60)
+            if kind in ("mojibake", "double") and i % 4 == 0:
+                line = mojibake(line, 2 if kind == "double" and i % 8 == 0 else 1)
+        lines.append(line)
+        total += len(line.encode("utf-8")) + 1
+        i += 1
+    return "\n".join(lines) + "\n"